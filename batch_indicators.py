@@ -0,0 +1,172 @@
+# batch_indicators.py — cross-symbol indicator pass on (n_bars, n_symbols) blocks (same outputs as indicators._compute_one_tf)
+from __future__ import annotations
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+import numpy as np, pandas as pd
+from pandas.api.indexers import BaseIndexer
+
+from candles import Candles, as_candles
+from indicators import _compute_one_tf, TfIndicators, CORE_OUTPUTS, PCTL_WINDOW, PCTL_MIN_PERIODS, used_keys
+from indicator_cache import config_hash
+
+OUTPUTS = CORE_OUTPUTS
+_TFS = ("M5", "M15", "H1", "H4", "D1")
+_PCTL = (("bbw_pctl", "bbw"), ("atr_pctl", "atr"), ("vol_pctl", "volume"))   # output, nguồn
+
+def _stack(cs: List[Candles], col: str) -> pd.DataFrame:
+    # mỗi cột = một symbol; rolling/ewm của pandas chạy từng cột bằng đúng kernel 1-D
+    return pd.DataFrame(np.column_stack([np.asarray(c[col], dtype=np.float64) for c in cs]), copy=False)
+
+@lru_cache(maxsize=64)
+def _segment_bounds(num_values: int, window: int, seg_len: int) -> Tuple[np.ndarray, np.ndarray]:
+    i = np.arange(num_values, dtype=np.int64)
+    start, end = np.maximum(i + 1 - window, i - i % seg_len), i + 1
+    start.flags.writeable = False; end.flags.writeable = False
+    return start, end
+
+class _SegmentIndexer(BaseIndexer):
+    """Trailing fixed window over concatenated symbols; never reaches back past a segment start."""
+    def get_window_bounds(self, num_values=0, min_periods=None, center=None, closed=None, step=None):
+        return _segment_bounds(num_values, self.window_size, self.seg_len)
+
+def _rolling(x: pd.DataFrame, w: int, how: str = "mean", min_periods: Optional[int] = None, **kw) -> pd.DataFrame:
+    # DataFrame.rolling gọi kernel một lần mỗi cột; nối mọi symbol thành một chuỗi 1-D
+    # -> một lần gọi, kernel reset ở đầu mỗi đoạn nên kết quả giống hệt rolling từng symbol
+    n, k = x.shape
+    flat = pd.Series(np.ascontiguousarray(x.to_numpy().T).ravel(), copy=False)
+    roll = flat.rolling(_SegmentIndexer(window_size=w, seg_len=n), min_periods=w if min_periods is None else min_periods)
+    r = getattr(roll, how)(**kw)
+    return pd.DataFrame(r.to_numpy().reshape(k, n).T, copy=False)
+
+def _safe(x: pd.DataFrame) -> pd.DataFrame:
+    # = indicators._safe_series cho từng cột (ffill rồi 0)
+    return x.ffill().fillna(0.0) if np.isnan(x.to_numpy()).any() else x
+
+def _block(cs: List[Candles], tf: Optional[str] = None, want: Optional[Set[str]] = None) -> List[TfIndicators]:
+    """
+    One pass over equally long windows of several symbols. Every formula is
+    the one in indicators.py applied column-wise, so each symbol's outputs
+    are identical to _compute_one_tf on its own window. `want` limits the
+    pass to those outputs; anything else stays lazy per symbol.
+    """
+    if want is not None:
+        want = set(want) | {src for name, src in _PCTL if name in want}
+    need = (lambda k: True) if want is None else (lambda k: k in want)
+    rh, rl, rc, rv = (_stack(cs, k) for k in ("high", "low", "close", "volume"))
+    close, high, low, vol = _safe(rc), _safe(rh), _safe(rl), _safe(rv)
+    res: Dict[str, pd.DataFrame] = {"close": close, "volume": vol}
+
+    for n in (21, 50, 200):
+        if need(f"ema{n}"):
+            res[f"ema{n}"] = close.ewm(span=n, adjust=False).mean()
+
+    if need("rsi"):
+        delta = close.diff()
+        gain = _rolling(delta.where(delta > 0, 0.0), 14)
+        loss = _rolling(-delta.where(delta < 0, 0.0), 14)
+        res["rsi"] = (100 - (100 / (1 + gain / loss.replace(0, np.nan)))).ffill().fillna(50.0)
+
+    if need("atr") or need("adx"):
+        prev_close = close.shift(1)
+        tr = np.fmax(np.fmax((high - low).abs().to_numpy(), (high - prev_close).abs().to_numpy()),
+                     (low - prev_close).abs().to_numpy())
+        atr = _rolling(pd.DataFrame(tr, copy=False), 14)   # TR/ATR dùng chung cho atr và adx
+        res["atr"] = atr.ffill()
+        if need("adx"):
+            up = high.diff(); down = -low.diff()
+            plus_dm = up.where((up > down) & (up > 0), 0.0)
+            minus_dm = down.where((down > up) & (down > 0), 0.0)
+            atr_nz = atr.replace(0, np.nan)
+            plus_di = 100 * (_rolling(plus_dm, 14) / atr_nz)
+            minus_di = 100 * (_rolling(minus_dm, 14) / atr_nz)
+            dx = (100 * (plus_di - minus_di).abs() / (plus_di + minus_di).replace(0, np.nan)).fillna(0.0)
+            res["adx"] = _rolling(dx, 14).ffill()
+
+    if need("bbw"):
+        ma = _rolling(close, 20); std = _rolling(close, 20, "std")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            bbw = ((ma + 2.0 * std) - (ma - 2.0 * std)) / ma.replace(0, np.nan)
+        res["bbw"] = bbw.replace([np.inf, -np.inf], np.nan).ffill()
+
+    if need("vwap"):
+        typical = (rh + rl + rc) / 3.0
+        res["vwap"] = ((typical * rv).cumsum() / rv.cumsum().replace(0, np.nan)).ffill()
+
+    if need("vol_ma20"):
+        res["vol_ma20"] = _rolling(vol, 20).ffill()
+
+    # percentile rank trong cửa sổ trượt (skiplist của pandas, một lần gọi cho cả block)
+    for name, src in _PCTL:
+        if need(name):
+            res[name] = _rolling(res[src], PCTL_WINDOW, "rank", PCTL_MIN_PERIODS, pct=True)
+
+    # (n_bars, n_symbols) -> hàng liên tục theo symbol, trả Series không copy
+    rows = {k: np.ascontiguousarray(v.to_numpy().T) for k, v in res.items()}
+    idx = pd.RangeIndex(len(cs[0]))
+    return [TfIndicators(c, tf, {k: pd.Series(rows[k][j], index=idx, name=k, copy=False) for k in rows})
+            for j, c in enumerate(cs)]
+
+class BatchIndicatorEngine:
+    """
+    compute_many(): indicators for a whole universe at once. Windows of one
+    timeframe are grouped by length and each group is computed as one 2-D
+    block; leftovers (unique lengths, < 2 bars) go through _compute_one_tf.
+    Per-symbol results have the same shape as IndicatorEngine.compute_all.
+    """
+    def __init__(self, min_group: int = 2, selective: bool = True):
+        self.min_group = max(2, int(min_group))
+        self.selective = selective   # chỉ tính sẵn các output mà consumer của TF đó đã đọc
+        self.stats = {"blocks": 0, "batched": 0, "single": 0, "fallback": 0}
+
+    def _one(self, c: Candles, tf: Optional[str] = None) -> Dict[str, Any]:
+        self.stats["single"] += 1
+        try: return _compute_one_tf(c, tf)
+        except Exception: return {"df": Candles.empty()}
+
+    def compute_many(self, raw: Dict[str, Dict[str, Any]], cfg: Dict[str, Any], cache=None) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """
+        raw: symbol -> {tf: {"df": Candles}} (fetch_all_timeframes output).
+        `cache` (indicator_cache.IndicatorCache): hits skip the batch, misses are stored after it.
+        """
+        out: Dict[str, Dict[str, Dict[str, Any]]] = {s: {} for s in raw}
+        chash = config_hash(cfg) if cache is not None else None
+        groups: Dict[Tuple[str, int], List[Tuple[str, Candles]]] = defaultdict(list)
+        for sym, raw_tf in raw.items():
+            for tf, wrap in (raw_tf or {}).items():
+                df = wrap.get("df") if isinstance(wrap, dict) else wrap
+                try:
+                    c = as_candles(df)
+                except Exception:
+                    out[sym][tf] = {"df": Candles.empty()}
+                    continue
+                hit = cache.get(sym, tf, c, chash) if cache is not None else None
+                if hit is not None:
+                    out[sym][tf] = hit
+                    continue
+                groups[(tf, len(c))].append((sym, c))
+        for (tf, n), members in groups.items():
+            if n < 2 or len(members) < self.min_group:
+                for sym, c in members:
+                    out[sym][tf] = self._one(c, tf)
+                    if cache is not None:
+                        cache.put(sym, tf, c, chash, out[sym][tf])
+                continue
+            used = used_keys(tf) & set(OUTPUTS) if self.selective else set()
+            try:
+                res = _block([c for _, c in members], tf, used or None)
+                self.stats["blocks"] += 1
+                self.stats["batched"] += len(members)
+            except Exception:
+                self.stats["fallback"] += 1
+                res = [self._one(c, tf) for _, c in members]
+            for (sym, c), r in zip(members, res):
+                out[sym][tf] = r
+                if cache is not None:
+                    cache.put(sym, tf, c, chash, r)
+        for sym in out:
+            for tf in _TFS:
+                if tf not in out[sym]:
+                    out[sym][tf] = _compute_one_tf(None, tf)
+        return out
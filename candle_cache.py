@@ -0,0 +1,210 @@
+# candle_cache.py — on-disk candle store (symbol/timeframe/month partitions)
+from __future__ import annotations
+import argparse, json, os
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from candles import TF_MS
+
+# Fixed-width records, appended raw to <root>/<SYMBOL>/<tf>/<YYYY-MM>.bin.
+# Raw files can be np.memmap'ed directly and appended without rewriting.
+CANDLE_DTYPE = np.dtype([("timestamp", "<i8"), ("open", "<f8"), ("high", "<f8"),
+                         ("low", "<f8"), ("close", "<f8"), ("volume", "<f8")])
+
+def _sym_dir(symbol: str) -> str:
+    return symbol.replace("/", "_").replace(":", "_").upper()
+
+def _month(ts: np.ndarray) -> np.ndarray:
+    return ts.astype("datetime64[ms]").astype("datetime64[M]").astype(str)
+
+def _dedupe(arr: np.ndarray) -> np.ndarray:
+    """Sort by timestamp, keep the last written row of each timestamp."""
+    if not len(arr):
+        return arr
+    ts = arr["timestamp"]
+    if len(arr) < 2 or bool(np.all(ts[1:] > ts[:-1])):
+        return arr   # already clean -> giữ nguyên view memmap (zero-copy)
+    order = np.argsort(arr["timestamp"], kind="stable")
+    arr = arr[order]
+    keep = np.r_[arr["timestamp"][1:] != arr["timestamp"][:-1], True]
+    return arr[keep]
+
+def to_records(df) -> np.ndarray:
+    out = np.empty(len(df), dtype=CANDLE_DTYPE)
+    for c in CANDLE_DTYPE.names:
+        out[c] = np.asarray(df[c])
+    return out
+
+class DiskCandleCache:
+    """
+    Append-only candle files partitioned by symbol/timeframe/month.
+      - append(): write-through of closed bars (duplicates tolerated)
+      - read(): memory-maps the partitions, dedupes (last write wins)
+      - check()/compact(): integrity report and rewrite sorted + deduped
+      - checked_from(): how far back the history before the first bar is known
+        (meta.json next to the partitions; HistoryDownloader resumes)
+    """
+    def __init__(self, root: str = "candles"):
+        self.root = root
+
+    def _dir(self, symbol: str, tf: str) -> str:
+        return os.path.join(self.root, _sym_dir(symbol), tf)
+
+    def partitions(self, symbol: str, tf: str) -> List[str]:
+        d = self._dir(symbol, tf)
+        if not os.path.isdir(d):
+            return []
+        return sorted(os.path.join(d, f) for f in os.listdir(d) if f.endswith(".bin"))
+
+    @staticmethod
+    def _load(path: str) -> np.ndarray:
+        if os.path.getsize(path) < CANDLE_DTYPE.itemsize:
+            return np.empty(0, dtype=CANDLE_DTYPE)
+        n = os.path.getsize(path) // CANDLE_DTYPE.itemsize   # bỏ record ghi dở (nếu có)
+        return np.memmap(path, dtype=CANDLE_DTYPE, mode="r", shape=(n,))
+
+    def append(self, symbol: str, tf: str, rows) -> int:
+        recs = rows if isinstance(rows, np.ndarray) else to_records(rows)
+        if not len(recs):
+            return 0
+        d = self._dir(symbol, tf)
+        os.makedirs(d, exist_ok=True)
+        months = _month(recs["timestamp"])
+        for m in np.unique(months):
+            with open(os.path.join(d, f"{m}.bin"), "ab") as f:
+                f.write(recs[months == m].tobytes())
+        return len(recs)
+
+    def read(self, symbol: str, tf: str, start: Optional[int] = None, end: Optional[int] = None,
+             last: Optional[int] = None) -> np.ndarray:
+        """Deduped, sorted records in [start, end]; `last` keeps only the newest N bars."""
+        parts = self.partitions(symbol, tf)
+        if start is not None or end is not None:
+            lo = str(_month(np.array([start]))[0]) if start is not None else ""
+            hi = str(_month(np.array([end]))[0]) if end is not None else "9999"
+            parts = [p for p in parts if lo <= os.path.basename(p)[:-4] <= hi]
+        chunks: List[np.ndarray] = []
+        need = last
+        for p in reversed(parts):   # newest partition first so `last` can stop early
+            # mỗi timestamp chỉ nằm trong partition tháng của nó -> dedupe/lọc từng partition,
+            # đếm `last` trên số bar thật (không tính bản ghi trùng hay ngoài [start, end])
+            arr = _dedupe(self._load(p))
+            if start is not None:
+                arr = arr[arr["timestamp"] >= start]
+            if end is not None:
+                arr = arr[arr["timestamp"] <= end]
+            chunks.append(arr)
+            if need is not None:
+                need -= len(arr)
+                if need <= 0:
+                    break
+        if not chunks:
+            return np.empty(0, dtype=CANDLE_DTYPE)
+        arr = chunks[0] if len(chunks) == 1 else np.concatenate(chunks[::-1])
+        if last is not None:
+            arr = arr[-last:]
+        return arr
+
+    def read_df(self, symbol: str, tf: str, **kw):
+        import pandas as pd
+        arr = self.read(symbol, tf, **kw)
+        return pd.DataFrame({c: np.asarray(arr[c]) for c in CANDLE_DTYPE.names})
+
+    def last_ts(self, symbol: str, tf: str) -> Optional[int]:
+        arr = self.read(symbol, tf, last=1)
+        return int(arr["timestamp"][-1]) if len(arr) else None
+
+    def first_ts(self, symbol: str, tf: str) -> Optional[int]:
+        parts = self.partitions(symbol, tf)
+        for p in parts:   # partition sớm nhất có dữ liệu
+            a = self._load(p)
+            if len(a):
+                return int(a["timestamp"].min())
+        return None
+
+    def checked_from(self, symbol: str, tf: str) -> Optional[int]:
+        """Earliest timestamp the history before the first stored bar is known (downloaded or empty) from."""
+        try:
+            with open(os.path.join(self._dir(symbol, tf), "meta.json"), "r", encoding="utf-8") as f:
+                v = json.load(f).get("checked_from")
+            return None if v is None else int(v)
+        except (OSError, ValueError, AttributeError):
+            return None
+
+    def set_checked_from(self, symbol: str, tf: str, ts: int) -> None:
+        """Records that nothing before the first stored bar is missing down to `ts` (listing date / empty pages)."""
+        d = self._dir(symbol, tf)
+        os.makedirs(d, exist_ok=True)
+        tmp = os.path.join(d, "meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"checked_from": int(ts)}, f)
+        os.replace(tmp, os.path.join(d, "meta.json"))
+
+    def check(self, symbol: str, tf: str) -> Dict[str, Any]:
+        """Integrity report: raw vs unique rows, out-of-order writes and missing-bar gaps."""
+        tf_ms = TF_MS.get(tf)
+        raw = 0; unsorted = 0
+        for p in self.partitions(symbol, tf):
+            a = self._load(p)
+            raw += len(a)
+            unsorted += int(np.count_nonzero(np.diff(a["timestamp"]) <= 0)) if len(a) > 1 else 0
+        arr = self.read(symbol, tf)
+        gaps = []
+        if tf_ms and len(arr) > 1:
+            d = np.diff(arr["timestamp"])
+            for i in np.flatnonzero(d > tf_ms):
+                gaps.append({"from": int(arr["timestamp"][i]), "to": int(arr["timestamp"][i + 1]),
+                             "missing": int(d[i] // tf_ms - 1)})
+        misaligned = int(np.count_nonzero(arr["timestamp"] % tf_ms)) if tf_ms and len(arr) else 0
+        return {"symbol": symbol, "tf": tf, "rows": len(arr), "duplicates": raw - len(arr),
+                "unsorted": unsorted, "misaligned": misaligned, "gaps": gaps}
+
+    def compact(self, symbol: str, tf: str) -> Dict[str, int]:
+        """Rewrite every partition sorted and deduped (atomic replace per file)."""
+        before = after = 0
+        for p in self.partitions(symbol, tf):
+            a = self._load(p)
+            before += len(a)
+            clean = _dedupe(np.array(a))
+            after += len(clean)
+            del a
+            tmp = p + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(clean.tobytes())
+            os.replace(tmp, p)
+        return {"rows_before": before, "rows_after": after}
+
+    def series(self) -> List[tuple]:
+        out = []
+        if not os.path.isdir(self.root):
+            return out
+        for sd in sorted(os.listdir(self.root)):
+            d = os.path.join(self.root, sd)
+            if not os.path.isdir(d):   # file lạ ở gốc cache (README, .DS_Store...) -> bỏ qua
+                continue
+            for tf in sorted(os.listdir(d)):
+                if os.path.isdir(os.path.join(d, tf)):
+                    out.append((sd, tf))
+        return out
+
+def main():
+    p = argparse.ArgumentParser(description="Candle cache integrity check / compaction")
+    p.add_argument("cmd", choices=["check", "compact"])
+    p.add_argument("--root", default="candles")
+    p.add_argument("--symbol", default=None, help="e.g. BTC/USDT (default: all)")
+    p.add_argument("--tf", default=None)
+    args = p.parse_args()
+    cache = DiskCandleCache(args.root)
+    for sd, tf in cache.series():
+        if args.symbol and _sym_dir(args.symbol) != sd:
+            continue
+        if args.tf and args.tf != tf:
+            continue
+        res = cache.check(sd, tf) if args.cmd == "check" else {"symbol": sd, "tf": tf, **cache.compact(sd, tf)}
+        if args.cmd == "check":
+            res["gaps"] = res["gaps"][:20] + ([{"more": len(res["gaps"]) - 20}] if len(res["gaps"]) > 20 else [])
+        print(json.dumps(res))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# candles.py — compact columnar OHLCV container (int64 timestamps + float OHLCV arrays)
+from __future__ import annotations
+from typing import Any, Iterable, List, Optional
+
+import numpy as np
+
+COLUMNS = ("timestamp", "open", "high", "low", "close", "volume")
+# ms per bar of each ccxt timeframe (DataFeed, candle cache, fake exchange, MTF alignment)
+TF_MS = {"1m": 60_000, "5m": 300_000, "15m": 900_000, "1h": 3_600_000, "4h": 14_400_000, "1d": 86_400_000}
+_PRICE_COLS = COLUMNS[1:]
+
+def _num(col, dtype) -> np.ndarray:
+    a = np.asarray(col)
+    if a.dtype == object:   # giá dạng chuỗi từ nguồn cũ -> coerce như pd.to_numeric
+        import pandas as pd
+        a = pd.to_numeric(col, errors="coerce").to_numpy()
+    return a.astype(dtype, copy=False)
+
+class Candles:
+    """
+    One contiguous array per column: int64 open-time (ms) plus float64
+    (or float32) open/high/low/close/volume, sorted by timestamp.
+
+      - c["close"] returns the column array itself (no copy)
+      - c[a:b] / c[-n:] are zero-copy views; c[mask] / c[idx] gather a copy
+      - to_frame() builds the pandas view legacy callers expect, once per object
+
+    Instances are treated as immutable: DataFeed hands them out and replaces
+    them on merge, so slices given out earlier stay valid.
+    """
+    __slots__ = COLUMNS + ("_frame",)
+
+    def __init__(self, timestamp, open, high, low, close, volume):
+        self.timestamp = timestamp
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self._frame = None
+
+    # --- constructors ---------------------------------------------------
+    @classmethod
+    def empty(cls, dtype=np.float64) -> "Candles":
+        f = np.empty(0, dtype=dtype)
+        return cls(np.empty(0, dtype=np.int64), f, f, f, f, f)
+
+    @classmethod
+    def from_ohlcv(cls, rows: Optional[List[list]], dtype=np.float64) -> "Candles":
+        """ccxt list-of-lists [[ts, o, h, l, c, v], ...] -> Candles (one (6, n) block, rows are the columns)."""
+        if rows is None or not len(rows):
+            return cls.empty(dtype)
+        a = np.array(rows, dtype=np.float64)
+        if a.ndim != 2 or a.shape[1] < 6:
+            raise ValueError(f"expected rows of [ts, o, h, l, c, v], got shape {a.shape}")
+        block = np.ascontiguousarray(a[:, 1:6].T, dtype=dtype)
+        return cls(a[:, 0].astype(np.int64), *block)
+
+    @classmethod
+    def from_frame(cls, df, dtype=np.float64) -> "Candles":
+        """DataFrame/record array with the OHLCV columns -> Candles (sorted by timestamp)."""
+        if isinstance(df, Candles):
+            return df if df.dtype == np.dtype(dtype) else df.astype(dtype)
+        if df is None or not len(df):
+            return cls.empty(dtype)
+        have = set(df.columns) if hasattr(df, "columns") else set(df.dtype.names or ())
+        ts = np.asarray(df["timestamp"]).astype(np.int64, copy=False)
+        cols = [_num(df[c], dtype) if c in have else np.full(len(ts), np.nan, dtype=dtype) for c in _PRICE_COLS]
+        out = cls(ts, *cols)
+        if len(ts) > 1 and not bool(np.all(ts[1:] >= ts[:-1])):
+            out = out.take(np.argsort(ts, kind="stable"))
+        return out
+
+    @classmethod
+    def concat(cls, parts: Iterable["Candles"]) -> "Candles":
+        parts = list(parts)
+        full = [p for p in parts if len(p)]
+        if not full:
+            # giữ dtype của đầu vào (float32 của compact/store) thay vì mặc định float64
+            return cls.empty(np.result_type(*[p.dtype for p in parts]) if parts else np.float64)
+        parts = full
+        if len(parts) == 1:
+            return parts[0]
+        return cls(*[np.concatenate([getattr(p, c) for p in parts]) for c in COLUMNS])
+
+    # --- access ---------------------------------------------------------
+    @property
+    def dtype(self) -> np.dtype:
+        return self.close.dtype
+
+    @property
+    def columns(self) -> tuple:
+        return COLUMNS
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, c).nbytes for c in COLUMNS)
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+    def __contains__(self, col: str) -> bool:
+        return col in COLUMNS
+
+    def __getitem__(self, key: Any):
+        if isinstance(key, str):
+            if key not in COLUMNS:
+                raise KeyError(key)
+            return getattr(self, key)
+        if isinstance(key, slice):
+            return Candles(*[getattr(self, c)[key] for c in COLUMNS])
+        return self.take(key)
+
+    def take(self, idx) -> "Candles":
+        """Gather rows by integer index or boolean mask (copies)."""
+        return Candles(*[getattr(self, c)[idx] for c in COLUMNS])
+
+    def last_ts(self) -> Optional[int]:
+        return int(self.timestamp[-1]) if len(self.timestamp) else None
+
+    def astype(self, dtype) -> "Candles":
+        return Candles(self.timestamp, *[getattr(self, c).astype(dtype) for c in _PRICE_COLS])
+
+    def dedupe(self) -> "Candles":
+        """Sorted by timestamp, last row of each timestamp wins."""
+        ts = self.timestamp
+        if len(ts) < 2 or bool(np.all(ts[1:] > ts[:-1])):
+            return self
+        order = np.argsort(ts, kind="stable")
+        s = ts[order]
+        keep = np.r_[s[1:] != s[:-1], True]
+        return self.take(order[keep])
+
+    def to_frame(self):
+        """pandas view for legacy callers (RangeIndex, same columns as data.to_dataframe). Cached."""
+        if self._frame is None:
+            import pandas as pd
+            self._frame = pd.DataFrame({c: getattr(self, c) for c in COLUMNS}, copy=False)
+        return self._frame
+
+    def __repr__(self) -> str:
+        span = f"{self.timestamp[0]}..{self.timestamp[-1]}" if len(self) else "-"
+        return f"Candles(n={len(self)}, ts={span}, dtype={self.dtype})"
+
+def as_candles(x, dtype=np.float64) -> Candles:
+    """Accept Candles, a DataFrame, or None (legacy inputs of the indicator/VFI stages)."""
+    if isinstance(x, Candles):
+        return x
+    if x is None:
+        return Candles.empty(dtype)
+    return Candles.from_frame(x, dtype)
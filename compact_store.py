@@ -0,0 +1,185 @@
+# compact_store.py — opt-in float32 indicator storage: one preallocated block per (symbol, tf), light column views
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, Optional, Tuple
+
+import numpy as np, pandas as pd
+
+_ROW_STEP = 4
+
+class ColView:
+    """
+    Read-only view of one indicator column inside a CompactBlock. Covers what
+    the decision path does with a Series (len, .iloc[i] -> float, .iloc[a:b],
+    np.asarray) without a pandas object per column; series() gives a float64
+    Series for code that needs the full API. Valid until the same
+    (symbol, tf) is computed again (next cycle): copy to keep values longer.
+    """
+    __slots__ = ("_a", "name")
+
+    def __init__(self, a: np.ndarray, name: Optional[str] = None):
+        self._a = a
+        self.name = name
+
+    @property
+    def iloc(self) -> "ColView":
+        return self
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._a
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._a.dtype
+
+    def __len__(self) -> int:
+        return len(self._a)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return ColView(self._a[i], self.name)
+        return float(self._a[i])
+
+    def __array__(self, dtype=None, copy=None):
+        a = self._a if dtype is None else self._a.astype(dtype, copy=False)
+        return a.copy() if copy else a
+
+    def to_numpy(self, dtype=None) -> np.ndarray:
+        return self.__array__(dtype)
+
+    def series(self) -> pd.Series:
+        return pd.Series(self._a.astype(np.float64), name=self.name, copy=False)
+
+    def __repr__(self) -> str:
+        return f"ColView(name={self.name}, n={len(self._a)}, last={self._a[-1] if len(self._a) else None})"
+
+class CompactBlock:
+    """
+    float32 storage of one (symbol, tf): a row per indicator key × bars.
+    Allocated once and overwritten every cycle; rows are assigned on first
+    use and keep their slot, so steady state allocates nothing. A longer
+    window (warm-up grew data.limit) reallocates; views handed out earlier
+    keep the old buffer alive until dropped.
+    """
+    __slots__ = ("buf", "rows", "n")
+
+    def __init__(self, n_rows: int, cap: int):
+        self.buf = np.empty((max(1, int(n_rows)), max(1, int(cap))), dtype=np.float32)
+        self.rows: Dict[str, int] = {}
+        self.n = 0
+
+    @property
+    def nbytes(self) -> int:
+        return self.buf.nbytes
+
+    def fit(self, n: int) -> "CompactBlock":
+        if n > self.buf.shape[1]:
+            self.buf = np.empty((self.buf.shape[0], n), dtype=np.float32)
+            self.rows.clear()
+        self.n = n
+        return self
+
+    def owns(self, v) -> bool:
+        return isinstance(v, ColView) and v._a.base is self.buf
+
+    def put(self, key: str, values):
+        """Copy a length-n column into the block and return its view; anything else is returned unchanged."""
+        n = self.n
+        if n == 0 or not isinstance(values, (pd.Series, np.ndarray, ColView)) or len(values) != n:
+            return values
+        r = self.rows.get(key)
+        if r is None:
+            r = len(self.rows)
+            if r == self.buf.shape[0]:   # thêm hàng: cấp lại, chép phần đã có (store nhớ số hàng cho block sau)
+                buf = np.empty((r + _ROW_STEP, self.buf.shape[1]), dtype=np.float32)
+                buf[:r] = self.buf[:r]
+                self.buf = buf
+            self.rows[key] = r
+        self.buf[r, :n] = np.asarray(values)
+        view = self.buf[r, :n]
+        view.flags.writeable = False
+        return ColView(view, key)
+
+class CompactStore:
+    """
+    Blocks per (symbol, tf), LRU within a byte budget. attach() moves the
+    outputs of a compute_all result into the blocks; keys computed lazily
+    afterwards land there too (TfIndicators.compact). An evicted block is
+    only dropped, never reused, so views still held stay correct.
+    """
+    def __init__(self, budget_mb: float = 256.0):
+        self.budget = int(float(budget_mb) * 2**20)
+        self._blocks: "OrderedDict[Tuple[str, str], CompactBlock]" = OrderedDict()
+        self.stats = {"alloc": 0, "grow": 0, "evict": 0}
+        self._rows: Dict[str, int] = {}   # số hàng đã thấy mỗi tf -> block mới cấp đủ ngay
+
+    @property
+    def nbytes(self) -> int:
+        return sum(b.nbytes for b in self._blocks.values())
+
+    def metrics(self) -> Dict[str, Any]:
+        return {"blocks": len(self._blocks), "mb": round(self.nbytes / 2**20, 1),
+                "budget_mb": round(self.budget / 2**20, 1), **self.stats}
+
+    def block(self, symbol: str, tf: str, n: int, n_rows: int) -> CompactBlock:
+        key = (symbol, tf)
+        b = self._blocks.get(key)
+        if b is None:
+            b = self._blocks[key] = CompactBlock(max(n_rows, self._rows.get(tf, 0)), n)
+            self.stats["alloc"] += 1
+        else:
+            self._blocks.move_to_end(key)
+            self._rows[tf] = max(self._rows.get(tf, 0), len(b.rows))
+            if n > b.buf.shape[1]:
+                self.stats["grow"] += 1
+        b.fit(n)
+        total = self.nbytes
+        while total > self.budget and len(self._blocks) > 1:
+            k, old = next(iter(self._blocks.items()))
+            if k == key:
+                break
+            del self._blocks[k]
+            total -= old.nbytes
+            self.stats["evict"] += 1
+        return b
+
+    def attach(self, symbol: str, ind: Dict[str, Any]) -> Dict[str, Any]:
+        from indicators import TfIndicators, used_keys, CORE_OUTPUTS
+        for tf, t in (ind or {}).items():
+            if isinstance(t, TfIndicators) and len(t.df):
+                rows = max(len(CORE_OUTPUTS), len(used_keys(tf) - {"df"}))
+                t.compact(self.block(symbol, tf, len(t.df), rows))
+        return ind
+
+_RAW = ("df", "high", "low", "close", "volume")   # bọc thẳng cột Candles, không nằm trong block
+
+def _stored(keys: Iterable[str]) -> set:
+    from indicators import REGISTRY
+    out, todo = set(), list(keys)
+    while todo:
+        k = todo.pop()
+        if k in out or k not in REGISTRY:
+            continue
+        out.add(k)
+        todo.extend(REGISTRY[k].inputs)
+    return out - set(_RAW)
+
+def budget_report(cfg: Dict[str, Any], n_symbols: int, bars: Dict[str, int]) -> Dict[str, Any]:
+    """Startup estimate of what a cycle holds: indicator columns (float64 Series vs float32 blocks) + candles."""
+    from indicators import CORE_OUTPUTS, used_keys
+    cc = ((cfg or {}).get("indicators") or {}).get("compact") or {}
+    dt = np.dtype((((cfg or {}).get("data") or {}).get("candles") or {}).get("dtype", "float64"))
+    ind = cand = 0
+    for tf, n in bars.items():
+        ind += len(_stored(used_keys(tf) or CORE_OUTPUTS)) * n
+        cand += n * (8 + 5 * dt.itemsize)
+    mb = lambda b: round(b * n_symbols / 2**20, 1)
+    out = {"symbols": n_symbols, "bars": bars, "indicators_float64_mb": mb(ind * 8),
+           "indicators_compact_mb": mb(ind * 4), "candles_mb": mb(cand), "candles_dtype": dt.name}
+    if cc.get("enabled") and (((cfg or {}).get("indicators") or {}).get("cache") or {}).get("enabled"):
+        out["compact"] = {"off": "indicators.cache enabled"}   # engine_flow._active_compact bỏ qua compact
+    elif cc.get("enabled"):
+        budget = float(cc.get("budget_mb", 256))
+        out["compact"] = {"budget_mb": budget, "fits": mb(ind * 4) <= budget}
+    return out
@@ -0,0 +1,7 @@
+# console_log.py — print logger dùng chung (engine_flow, data) khi không truyền logger
+from __future__ import annotations
+
+class SafeLogger:
+    def info(self, msg: str): print(msg, flush=True)
+    def warn(self, msg: str): print("[WARN]", msg, flush=True)
+    def error(self, msg: str): print("[ERROR]", msg, flush=True)
@@ -1,44 +1,437 @@
 # data.py — FINAL (support enhance.m5_trigger + fixed limit lookup)
 from __future__ import annotations
-import asyncio, time
-from typing import Dict, Any, Optional, List
+import asyncio, heapq, itertools, time
+from collections import deque
+from typing import Dict, Any, Optional, List, Callable, Awaitable
 import ccxt
+import numpy as np
 
-_VALID_TF = {"5m":"5m","15m":"15m","1h":"1h","4h":"4h","1d":"1d","1D":"1d"}
+from candles import TF_MS, Candles, as_candles
+from console_log import SafeLogger
+from indicators import used_keys, warmup_bars, anchored
+
+_VALID_TF = {"1m":"1m","5m":"5m","15m":"15m","1h":"1h","4h":"4h","1d":"1d","1D":"1d"}
+
+_OHLCV_COLS = ["timestamp","open","high","low","close","volume"]
+_TF_KEY = {"1m":"M1","5m":"M5","15m":"M15","1h":"H1","4h":"H4","1d":"D1"}
+_MAX_PAGE = 1500
 
 def _norm_tf(tf: str) -> str:
     return _VALID_TF.get(str(tf or "").strip(), str(tf or "").lower())
 
+def _is_async_client(ex) -> bool:
+    return asyncio.iscoroutinefunction(getattr(ex, "fetch_ohlcv", None))
+
+def _override_base_url(ex, base_url: Optional[str]) -> None:
+    # exchange.base_url: send every REST call to another host (e.g. fake_exchange.py)
+    if not base_url:
+        return
+    from urllib.parse import urlsplit
+    base = str(base_url).rstrip("/")
+    api = ex.urls.get("api") or {}
+    for k, u in list(api.items()):
+        if isinstance(u, str):
+            api[k] = base + urlsplit(u).path
+
 def build_exchange(cfg: dict) -> ccxt.binance:
     ex_cfg = cfg.get("exchange", {}) if isinstance(cfg, dict) else {}
-    ex = ccxt.binance({
+    if str(ex_cfg.get("name", "binance")).lower() == "fake":
+        from fake_exchange import build_fake_exchange   # offline load/soak runs
+        return build_fake_exchange(cfg)
+    # ccxt's own throttle is switched off while RequestScheduler is on (the default). That is
+    # only safe because every REST call of this client (DataFeed, HistoryDownloader, spot twin)
+    # goes through RequestScheduler.submit; load_markets() is the one unscheduled call, at boot.
+    # Code that calls the client directly must set exchange.ccxt_rate_limit=true as a backstop.
+    sched_on = bool(((cfg.get("data") or {}).get("scheduler") or {}).get("enabled", True)) if isinstance(cfg, dict) else True
+    params = {
         "apiKey": ex_cfg.get("apiKey"),
         "secret": ex_cfg.get("secret"),
-        "enableRateLimit": True,
+        "enableRateLimit": bool(ex_cfg.get("ccxt_rate_limit", not sched_on)),
         "options": {"defaultType": "future" if ex_cfg.get("market","FUTURES").upper()=="FUTURES" else "spot"}
-    })
+    }
+    if str(ex_cfg.get("backend", "sync")).lower() == "async":
+        import ccxt.async_support as ccxt_async
+        ex = ccxt_async.binance(params)
+        _override_base_url(ex, ex_cfg.get("base_url"))
+        return ex   # session + markets are set up by open_exchange() inside the event loop
+    ex = ccxt.binance(params)
+    _override_base_url(ex, ex_cfg.get("base_url"))
     ex.load_markets()
     return ex
 
+def build_spot_exchange(cfg: dict, ex):
+    """
+    Spot client paired with the futures client `ex` (data.spot_twin): same
+    credentials/backend, market SPOT. The fake exchange returns a twin over
+    its own market and clock. Async clients still need open_exchange().
+    """
+    if hasattr(ex, "spot_twin"):
+        return ex.spot_twin()
+    ex_cfg = dict(cfg.get("exchange", {}) or {})
+    ex_cfg["market"] = "SPOT"
+    return build_exchange({**cfg, "exchange": ex_cfg})
+
+async def open_exchange(ex, cfg: dict) -> None:
+    """
+    Async backend only: attach one pooled keep-alive aiohttp session to the
+    client and load markets. No-op for the sync client (build_exchange already
+    loaded markets).
+    """
+    if not _is_async_client(ex):
+        return
+    ex_cfg = cfg.get("exchange", {}) if isinstance(cfg, dict) else {}
+    if getattr(ex, "session", False) is None:
+        import aiohttp
+        pool = int(ex_cfg.get("pool_size", 64))
+        conn = aiohttp.TCPConnector(limit=pool, limit_per_host=pool, ttl_dns_cache=300,
+                                    keepalive_timeout=float(ex_cfg.get("keepalive_sec", 60)),
+                                    enable_cleanup_closed=True)
+        ex.session = aiohttp.ClientSession(connector=conn, trust_env=ex.aiohttp_trust_env)
+    await ex.load_markets()
+
+async def close_exchange(ex) -> None:
+    if _is_async_client(ex):
+        await ex.close()
+
+def exchange_ms(ex) -> int:
+    # ccxt keeps local-minus-server drift in options["timeDifference"] (adjustForTimeDifference)
+    opts = getattr(ex, "options", None) or {}
+    return int(time.time()*1000) - int(opts.get("timeDifference", 0) or 0)
+
 async def fetch_ohlcv(ex: ccxt.binance, symbol: str, tf: str, *, since: Optional[int], limit: int) -> List[list]:
     tf = _norm_tf(tf)
+    if _is_async_client(ex):
+        return await ex.fetch_ohlcv(symbol, timeframe=tf, since=since, limit=limit)
     return await asyncio.to_thread(ex.fetch_ohlcv, symbol, timeframe=tf, since=since, limit=limit)
 
 def to_dataframe(ohlcv: List[list]):
     import pandas as pd
     if not ohlcv:
-        return pd.DataFrame(columns=["timestamp","open","high","low","close","volume"])
-    df = pd.DataFrame(ohlcv, columns=["timestamp","open","high","low","close","volume"])
+        return pd.DataFrame(columns=_OHLCV_COLS)
+    df = pd.DataFrame(ohlcv, columns=_OHLCV_COLS)
     for c in ["open","high","low","close","volume"]:
         df[c] = pd.to_numeric(df[c], errors="coerce")
     return df
 
+def resample_ohlcv(candles, tf_ms: int) -> Candles:
+    """
+    Aggregate sorted OHLCV rows into UTC-aligned buckets of `tf_ms` (Binance
+    aligns every interval to epoch 00:00 UTC): first open, max high, min low,
+    last close, summed volume. The last bucket may be partial (forming).
+    """
+    c = as_candles(candles)
+    if not len(c):
+        return Candles.empty(c.dtype)
+    ts = c.timestamp
+    bucket = ts // tf_ms * tf_ms
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], len(ts)] - 1
+    return Candles(bucket[starts], c.open[starts], np.maximum.reduceat(c.high, starts),
+                   np.minimum.reduceat(c.low, starts), c.close[ends], np.add.reduceat(c.volume, starts))
+
+class CandleStore:
+    """
+    In-memory candle buffer per "symbol:tf" key, bounded to `maxlen` bars.
+    merge() folds a delta fetch into the buffer on timestamp: the delta wins
+    on equal timestamps (so the still-forming bar is replaced in place), old
+    bars the delta does not carry are kept, and the oldest bars are dropped
+    past `maxlen`. Each merge builds new Candles arrays, so views handed out
+    earlier are never mutated.
+    """
+    def __init__(self, dtype=np.float64):
+        self.dtype = np.dtype(dtype)
+        self._empty = Candles.empty(self.dtype)
+        self._frames: Dict[str, Candles] = {}
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._frames
+
+    def get(self, key: str) -> Candles:
+        return self._frames.get(key, self._empty)
+
+    def last_ts(self, key: str) -> Optional[int]:
+        c = self._frames.get(key)
+        return c.last_ts() if c is not None else None
+
+    def merge(self, key: str, delta, maxlen: int) -> Candles:
+        old = self._frames.get(key)
+        if delta is None or not len(delta):
+            return self.get(key)
+        delta = Candles.from_frame(delta, self.dtype).dedupe()
+        if old is not None and len(old):
+            # bỏ trước phần đầu buffer chắc chắn bị cắt (>= len(delta) bar mới hơn luôn còn lại)
+            lo = int(np.searchsorted(old.timestamp, delta.timestamp[0], side="left"))
+            cut = min(lo, max(0, lo + len(delta) - maxlen)) if maxlen > 0 else 0
+            merged = Candles.concat([old[cut:], delta]).dedupe()
+        else:
+            merged = delta
+        if maxlen > 0 and len(merged) > maxlen:
+            merged = merged[-maxlen:]
+        self._frames[key] = merged
+        return merged
+
+    def drop(self, key: str) -> None:
+        self._frames.pop(key, None)
+
+    def join(self, key: str, other: str) -> Candles:
+        """
+        Rows of `other` aligned to the timestamps of `key` (same length, NaN
+        prices / zero volume where `other` has no bar). When `other` holds the
+        same run of timestamps the result is a slice of its arrays (no copy);
+        otherwise one gather.
+        """
+        a, b = self.get(key), self.get(other)
+        n, ta, tb = len(a), a.timestamp, b.timestamp
+        if n and len(b):
+            lo = int(np.searchsorted(tb, ta[0]))
+            if lo + n <= len(tb) and np.array_equal(tb[lo:lo + n], ta):
+                return b[lo:lo + n]
+        idx = np.searchsorted(tb, ta)
+        hit = idx < len(tb)
+        hit[hit] = tb[idx[hit]] == ta[hit]
+        take = np.where(hit, idx, 0)
+        cols = []
+        for c in ("open", "high", "low", "close", "volume"):
+            v = getattr(b, c)[take] if len(b) else np.zeros(n, dtype=self.dtype)
+            v[~hit] = 0.0 if c == "volume" else np.nan
+            cols.append(v)
+        return Candles(ta, *cols)
+
+class TfRefreshScheduler:
+    """
+    Decides per "symbol:tf" key whether a refetch is due. Fast timeframes
+    (M5/M15 by default) are refetched every cycle; higher timeframes only
+    once a new bar has closed on the exchange clock (plus `close_grace_ms`
+    so the closed bar is final) or when the forming bar is older than its
+    freshness window (`data.refresh.forming_max_age_sec`).
+    """
+    _DEF_MAX_AGE = {"1h": 60, "4h": 300, "1d": 900}
+
+    def __init__(self, cfg: dict):
+        rc = (cfg.get("data", {}) if isinstance(cfg, dict) else {}).get("refresh", {}) or {}
+        self.enabled = bool(rc.get("enabled", True))
+        self.fast = {_norm_tf(tf) for tf in rc.get("fast_tfs", ["5m","15m"])}
+        max_age = dict(self._DEF_MAX_AGE)
+        max_age.update({_norm_tf(k): v for k, v in (rc.get("forming_max_age_sec") or {}).items()})
+        self.max_age_ms = {tf: int(float(v)*1000) for tf, v in max_age.items()}
+        self.grace_ms = int(rc.get("close_grace_ms", 2000))
+        self._last: Dict[str,int] = {}
+        self.stats = {"fetched": 0, "skipped": 0}
+
+    def due(self, key: str, ccxt_tf: str, now_ms: int) -> bool:
+        last = self._last.get(key)
+        if not self.enabled or ccxt_tf in self.fast or last is None or ccxt_tf not in TF_MS:
+            return True
+        tf_ms = TF_MS[ccxt_tf]
+        if (now_ms - self.grace_ms) // tf_ms > (last - self.grace_ms) // tf_ms:
+            return True
+        return now_ms - last >= self.max_age_ms.get(ccxt_tf, 0)
+
+    def mark(self, key: str, now_ms: int) -> None:
+        self._last[key] = now_ms
+        self.stats["fetched"] += 1
+
+    def skip(self) -> None:
+        self.stats["skipped"] += 1
+
+def kline_weight(limit: int, futures: bool = True) -> int:
+    """Binance request weight of one klines call (futures scales with limit, spot is flat)."""
+    if not futures:
+        return 2
+    if limit < 100: return 1
+    if limit < 500: return 2
+    if limit <= 1000: return 5
+    return 10
+
+class RequestScheduler:
+    """
+    Global gate for exchange REST calls shared by every symbol.
+      - token bucket refilled at `weight_per_min * utilization` (Binance request weight)
+      - at most `max_concurrency` calls in flight
+      - a call starts once it holds both a slot and its weight; both go to the
+        lowest priority value first, FIFO within a priority
+        (PRIO_POSITION < PRIO_FAST < PRIO_SLOW). The head waiter blocks the ones
+        behind it, so under rate-limit pressure a position call is the next to
+        get weight instead of queueing behind slow calls already holding slots.
+    Queue wait (submit -> call start, incl. token wait) is recorded per priority.
+    """
+    PRIO_POSITION, PRIO_FAST, PRIO_SLOW = 0, 1, 2
+    _PRIO_NAMES = {0: "position", 1: "fast", 2: "slow"}
+
+    def __init__(self, cfg: dict):
+        sc = (cfg.get("data", {}) if isinstance(cfg, dict) else {}).get("scheduler", {}) or {}
+        self.enabled = bool(sc.get("enabled", True))
+        self.max_concurrency = max(1, int(sc.get("max_concurrency", 8)))
+        per_min = float(sc.get("weight_per_min", 2400)) * float(sc.get("utilization", 0.8))
+        self.rate = per_min / 60.0
+        self.capacity = float(sc.get("burst_weight", per_min / 6.0))
+        self._tokens = self.capacity
+        self._refill_at = time.monotonic()
+        self._active = 0
+        self._waiters: list = []   # heap (priority, seq, weight, future)
+        self._timer = None         # hẹn dispatch lại khi đủ token cho waiter đầu hàng
+        self._seq = itertools.count()
+        self._waits: Dict[int, deque] = {p: deque(maxlen=512) for p in self._PRIO_NAMES}
+        self._counts: Dict[int, int] = {p: 0 for p in self._PRIO_NAMES}
+        # 429/418 from the exchange: stop spending weight for `penalty_sec`
+        self.penalty_sec = float(sc.get("penalty_sec", 5.0))
+        self.penalties = 0
+
+    async def submit(self, priority: int, weight: int, call: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.enabled:
+            return await call()
+        t0 = time.monotonic()
+        await self._acquire(priority, min(float(weight), self.capacity))
+        try:
+            self._record(priority, time.monotonic() - t0)
+            try:
+                return await call()
+            except (ccxt.RateLimitExceeded, ccxt.DDoSProtection):
+                self.penalize()
+                raise
+        finally:
+            self._release()
+
+    def penalize(self) -> None:
+        """Rate-limit response: drain the bucket so nothing is sent for `penalty_sec`."""
+        self.penalties += 1
+        self._refill()
+        self._tokens = min(self._tokens, -self.rate * self.penalty_sec)   # không cộng dồn
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._refill_at) * self.rate)
+        self._refill_at = now
+
+    async def _acquire(self, priority: int, weight: float) -> None:
+        if not self._waiters and self._active < self.max_concurrency:
+            self._refill()
+            if self._tokens >= weight:
+                self._tokens -= weight
+                self._active += 1
+                return
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), weight, fut))
+        self._dispatch()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            # slot + weight were already handed over to us -> give them back
+            if fut.done() and not fut.cancelled():
+                self._tokens += weight
+                self._release()
+            else:
+                self._dispatch()   # có thể ta đang chặn đầu hàng
+            raise
+
+    def _release(self) -> None:
+        self._active -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Grant slot + weight to waiters in heap order while both are available."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._waiters:
+            _, _, weight, fut = self._waiters[0]
+            if fut.done():   # waiter đã hủy
+                heapq.heappop(self._waiters)
+                continue
+            if self._active >= self.max_concurrency:
+                return   # _release() gọi lại
+            self._refill()
+            if self._tokens < weight:
+                self._timer = asyncio.get_running_loop().call_later(
+                    (weight - self._tokens) / self.rate, self._dispatch)
+                return
+            heapq.heappop(self._waiters)
+            self._tokens -= weight
+            self._active += 1
+            fut.set_result(None)
+
+    def _record(self, priority: int, wait_sec: float) -> None:
+        p = priority if priority in self._waits else self.PRIO_SLOW
+        self._waits[p].append(wait_sec)
+        self._counts[p] += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"in_flight": self._active, "queued": len(self._waiters), "tokens": round(self._tokens, 1),
+                               "penalties": self.penalties}
+        for p, name in self._PRIO_NAMES.items():
+            w = sorted(self._waits[p])
+            if not w:
+                out[name] = {"n": self._counts[p]}
+                continue
+            out[name] = {
+                "n": self._counts[p],
+                "avg_wait_ms": round(1000 * sum(w) / len(w), 1),
+                "p95_wait_ms": round(1000 * w[min(len(w) - 1, int(0.95 * len(w)))], 1),
+                "max_wait_ms": round(1000 * w[-1], 1),
+            }
+        return out
+
 class DataFeed:
-    def __init__(self, exchange, cfg, logger):
+    def __init__(self, exchange, cfg, logger, spot_exchange=None):
         self.ex = exchange
         self.cfg = cfg
-        self.log = logger
-        self.last_since: Dict[str,int] = {}
+        self.log = logger or SafeLogger()
+        # data.candles.dtype: "float64" (mặc định) hoặc "float32" cho OHLCV
+        self._dtype = np.dtype(((cfg.get("data", {}) if isinstance(cfg, dict) else {}).get("candles", {}) or {}).get("dtype", "float64"))
+        self.store = CandleStore(self._dtype)
+        self.refresh = TfRefreshScheduler(cfg)
+        self.sched = RequestScheduler(cfg)
+        self.hot_symbols: set = set()
+        opts = getattr(exchange, "options", None) or {}
+        self._futures = str(opts.get("defaultType", "future")) != "spot"
+        # data.spot_twin: nến spot M15 cùng symbol cho FSD (feed futures), chung budget scheduler
+        st = (cfg.get("data", {}) if isinstance(cfg, dict) else {}).get("spot_twin", {}) or {}
+        self.spot_ex = spot_exchange if (st.get("enabled", False) and self._futures) else None
+        # data.derive: chỉ fetch base (M5, hoặc M1) rồi dựng M15/H1/H4/D1 tại chỗ
+        dv = (cfg.get("data", {}) if isinstance(cfg, dict) else {}).get("derive", {}) or {}
+        # data.cache: ghi xuống đĩa các bar đã đóng, boot lại chỉ cần fetch phần gap
+        cc = (cfg.get("data", {}) if isinstance(cfg, dict) else {}).get("cache", {}) or {}
+        self.disk = None
+        if cc.get("enabled", False):
+            from candle_cache import DiskCandleCache
+            self.disk = DiskCandleCache(cc.get("root", "candles"))
+        self._persisted: Dict[str,int] = {}
+        self.derive_base = _norm_tf(dv.get("base_tf", "5m")) if dv.get("enabled", False) else None
+        self._keep: Dict[str,int] = {}
+        self._derived_upto: Dict[str,int] = {}
+        # stream mode (kline_stream.KlineStream): store được đẩy dữ liệu, REST chỉ để seed/vá gap
+        self.streaming = False
+        self.live_keys: Optional[set] = None   # keys trên socket đang nối (KlineStream); None = mọi key theo `streaming`
+        self._pending: Dict[str,list] = {}
+        self._stale: set = set()
+        self._gap_from: Dict[str,int] = {}   # bar cuối trước gap -> REST vá từ đây, không từ bar sau gap
+        if self.derive_base:
+            # base buffer phải phủ trọn bucket lớn nhất (D1) để bar đang hình thành được dựng đủ
+            self._keep[self.derive_base] = min(_MAX_PAGE, TF_MS["1d"] // TF_MS[self.derive_base] + 1)
+        # data.warmup: độ dài cửa sổ mỗi TF = warm-up của các indicator đang được đọc ở TF đó
+        wu = (cfg.get("data", {}) if isinstance(cfg, dict) else {}).get("warmup", {}) or {}
+        self.warmup = bool(wu.get("enabled", False))
+        self._warm_min = int(wu.get("min_bars", 30))
+        self._page = _MAX_PAGE if self._futures else 1000
+        self._warm_max = int(wu.get("max_bars", self._page))
+        self._sized: Dict[str,int] = {}   # limit của lần fetch đầy đủ gần nhất
+        self.keys: Dict[str,set] = {}     # indicator khai báo mỗi TF (declare); cộng thêm key đọc thực tế
+        self.fetch_stats = {"full": 0, "delta": 0, "pages": 0, "bars_requested": 0, "spot": 0}
+
+    def set_hot_symbols(self, symbols) -> None:
+        """Symbols with open positions; their fetches jump the scheduler queue."""
+        self.hot_symbols = set(symbols or [])
+
+    def metrics(self) -> Dict[str, Any]:
+        return {"refresh": dict(self.refresh.stats), "scheduler": self.sched.metrics(), "fetch": dict(self.fetch_stats)}
+
+    def declare(self, keys: Dict[str, set]) -> None:
+        """Indicator keys consumers read per timeframe (engine_flow.indicator_keys); data.warmup sizes from these."""
+        self.keys = {tf: set(ks) for tf, ks in (keys or {}).items()}
+
+    def warmup_plan(self) -> Dict[str, int]:
+        """Window length per timeframe as currently sized (data.warmup or data.limit)."""
+        return {_TF_KEY[tf]: self._limit(tf) for tf in ("5m", "15m", "1h", "4h", "1d")}
 
     async def fetch_all_timeframes(self, symbol: str) -> Dict[str, Any]:
         enh = (self.cfg.get("enhance") or {}).get("m5_trigger", {})
@@ -47,32 +440,446 @@ class DataFeed:
         if need_m5: tfs.insert(0, "M5")
 
         map_tf = {"M5":"5m","M15":"15m","H1":"1h","H4":"4h","D1":"1d"}
+        if self.derive_base:
+            if self.spot_ex is None:
+                return await self._fetch_derived(symbol, tfs, map_tf)
+            out, _ = await asyncio.gather(self._fetch_derived(symbol, tfs, map_tf), self._fetch_spot(symbol))
+            self._spot_into(symbol, out)
+            return out
         tasks = [self._fetch_tf(symbol, map_tf[tf]) for tf in tfs]
+        if self.spot_ex is not None:
+            tasks.append(self._fetch_spot(symbol))
         res = await asyncio.gather(*tasks, return_exceptions=True)
 
         out: Dict[str,Any] = {}
         for tf, r in zip(tfs, res):
             if isinstance(r, Exception):
                 self.log.error(f"[DATA][{symbol}][{tf}] fetch error: {r}")
+                key = f"{symbol}:{map_tf[tf]}"
+                if key in self.store:
+                    out[tf] = {"df": self.store.get(key)}   # dùng tạm bản cũ, cycle sau fetch lại
                 continue
             out[tf] = r
+        if self.spot_ex is not None:
+            self._spot_into(symbol, out)
         return out
 
+    def _spot_into(self, symbol: str, out: Dict[str, Any]) -> None:
+        if "M15" in out and f"spot:{symbol}:15m" in self.store:
+            out["M15"]["spot"] = self.store.join(f"{symbol}:15m", f"spot:{symbol}:15m")
+
+    async def _fetch_spot(self, symbol: str) -> None:
+        """
+        Spot M15 twin of a futures symbol into the store ("spot:SYMBOL:15m"):
+        same refresh cadence as the futures M15 key, requests go through the
+        shared RequestScheduler at spot weight. One page at most; the join
+        pads bars older than that with NaN. Errors are only logged: without
+        spot bars FSD is simply not computed.
+        """
+        key, lim = f"spot:{symbol}:15m", min(self._limit("15m"), 1000)
+        now_ms = self._exchange_ms()
+        if key in self.store and not self.refresh.due(key, "15m", now_ms):
+            return
+        since = self._since(key, "15m", lim)
+        n = lim if since is None else min(lim, (now_ms - since) // TF_MS["15m"] + 2)
+        prio = RequestScheduler.PRIO_POSITION if symbol in self.hot_symbols else RequestScheduler.PRIO_FAST
+        spot_sym = symbol.split(":")[0]
+        try:
+            ohlcv = await self.sched.submit(prio, kline_weight(n, False),
+                                            lambda: fetch_ohlcv(self.spot_ex, spot_sym, "15m", since=since, limit=n))
+        except Exception as e:
+            self.log.error(f"[DATA][{symbol}][SPOT] fetch error: {e}")
+            return
+        self.refresh.mark(key, now_ms)
+        self.fetch_stats["spot"] += 1
+        delta = Candles.from_ohlcv(ohlcv, self._dtype)
+        if len(delta):
+            delta = delta[(delta.close > 0) & (delta.high >= delta.low)]
+        self.store.merge(key, delta, lim)
+
+    async def _fetch_derived(self, symbol: str, tfs: List[str], map_tf: Dict[str,str]) -> Dict[str, Any]:
+        """
+        Base-feed mode: one request per symbol per cycle for the base series.
+        Each higher timeframe is fetched once to seed its history (again when
+        its window grows), then kept current by resampling the base bars of
+        every bucket the delta touched.
+        """
+        base = self.derive_base
+        base_key = f"{symbol}:{base}"
+        prev_last = self._derived_upto.get(base_key)
+        # seed TF chưa có, hoặc nạp lại TF có _limit vừa tăng (resample chỉ nối thêm bar mới)
+        seeds = [tf for tf in tfs if map_tf[tf] != base
+                 and (f"{symbol}:{map_tf[tf]}" not in self.store
+                      or self._grown(f"{symbol}:{map_tf[tf]}", self._limit(map_tf[tf])))]
+        res = await asyncio.gather(self._fetch_tf(symbol, base), *[self._fetch_tf(symbol, map_tf[tf]) for tf in seeds],
+                                   return_exceptions=True)
+        for tf, r in zip(["base"] + seeds, res):
+            if isinstance(r, Exception):
+                self.log.error(f"[DATA][{symbol}][{tf}] fetch error: {r}")
+        if isinstance(res[0], Exception):
+            return {}
+
+        base_df = res[0]["df"]
+        if len(base_df):
+            self._derived_upto[base_key] = base_df.last_ts()
+        out: Dict[str,Any] = {}
+        for tf in tfs:
+            ccxt_tf = map_tf[tf]
+            key = f"{symbol}:{ccxt_tf}"
+            if ccxt_tf == base:
+                out[tf] = {"df": base_df}
+                continue
+            if len(base_df) and TF_MS[ccxt_tf] > TF_MS[base]:
+                tf_ms = TF_MS[ccxt_tf]
+                first = int(base_df.timestamp[0])
+                start = (prev_last if prev_last is not None else first) // tf_ms * tf_ms
+                if start < first:   # bucket chỉ phủ một phần trong buffer -> giữ bar đã có
+                    start += tf_ms
+                part = base_df[base_df["timestamp"] >= start]
+                if len(part):
+                    self._merge(symbol, ccxt_tf, resample_ohlcv(part, tf_ms), self._limit(ccxt_tf))
+            if key in self.store:
+                out[tf] = {"df": self.store.get(key)}
+        return out
+
+    def _limit(self, ccxt_tf: str) -> int:
+        lim = int(self.cfg.get("data",{}).get("limit",{}).get(_TF_KEY[ccxt_tf], 200))
+        if self.warmup:
+            tf = _TF_KEY[ccxt_tf]
+            keys = self.keys.get(tf, set()) | used_keys(tf)
+            need = warmup_bars(keys) + 1   # + bar đang hình thành
+            # vwap (cộng dồn từ đầu cửa sổ) -> không rút ngắn dưới data.limit
+            lim = max(need, self._warm_min, lim if anchored(keys) else 0)
+            lim = min(lim, self._warm_max)
+        return max(lim, self._keep.get(ccxt_tf, 0))
+
+    def _stream_live(self, key: str) -> bool:
+        return self.streaming and (self.live_keys is None or key in self.live_keys)
+
+    def _grown(self, key: str, lim: int) -> bool:
+        # cửa sổ đang giữ ngắn hơn limit hiện tại (warm-up tăng do indicator mới được đọc)
+        return key in self.store and self._sized.get(key, lim) < lim
+
     async def _fetch_tf(self, symbol: str, ccxt_tf: str) -> Dict[str, Any]:
-        tf_key = {"5m":"M5","15m":"M15","1h":"H1","4h":"H4","1d":"D1"}[ccxt_tf]
-        lim = int(self.cfg.get("data",{}).get("limit",{}).get(tf_key, 200))
-        use_inc = bool(self.cfg.get("data",{}).get("incremental", True))
-        ms_now = int(time.time()*1000)
+        lim = self._limit(ccxt_tf)
         key = f"{symbol}:{ccxt_tf}"
-        since = self.last_since.get(key) if use_inc else None
-        ohlcv = await fetch_ohlcv(self.ex, symbol, ccxt_tf, since=since, limit=lim)
-        if ohlcv:
-            self.last_since[key] = max(ohlcv[-1][0] - 1, ms_now - 3600*1000)
-        df = to_dataframe(ohlcv)
-        if len(df):
+        now_ms = self._exchange_ms()
+        if self.disk is not None and key not in self.store and key not in self._persisted:
+            self._warm_start(symbol, ccxt_tf, lim)
+        # cửa sổ cần dài hơn -> nạp lại cả cửa sổ, như key stale
+        grow = self._grown(key, lim)
+        if self._stream_live(key) and key in self.store and key not in self._stale and not grow:
+            self._apply_pending(symbol, ccxt_tf)
+            return {"df": self.store.get(key)}
+        if key in self.store and key not in self._stale and not grow and not self.refresh.due(key, ccxt_tf, now_ms):
+            self.refresh.skip()
+            return {"df": self.store.get(key)}
+        since = None if grow else self._since(key, ccxt_tf, lim)
+        if symbol in self.hot_symbols:
+            prio = RequestScheduler.PRIO_POSITION
+        elif ccxt_tf in self.refresh.fast:
+            prio = RequestScheduler.PRIO_FAST
+        else:
+            prio = RequestScheduler.PRIO_SLOW
+        if since is None:
+            ohlcv = await self._backfill(symbol, ccxt_tf, lim, prio, now_ms)
+            self._sized[key] = lim
+        else:
+            # delta: chỉ xin số bar từ bar cuối đã có tới bar đang hình thành (+1 phòng lệch đồng hồ)
+            n = min(lim, (now_ms - since) // TF_MS[ccxt_tf] + 2)
+            self.fetch_stats["delta"] += 1
+            self.fetch_stats["bars_requested"] += n
+            ohlcv = await self.sched.submit(
+                prio, kline_weight(n, self._futures),
+                lambda: fetch_ohlcv(self.ex, symbol, ccxt_tf, since=since, limit=n))
+        self.refresh.mark(key, now_ms)
+        self._stale.discard(key)
+        self._gap_from.pop(key, None)
+        delta = Candles.from_ohlcv(ohlcv, self._dtype)
+        if len(delta):
             sanity = self.cfg.get("data",{}).get("sanity",{})
+            ok = None
             if sanity.get("reject_zero_close", True):
-                df = df[df["close"] > 0]
+                ok = delta.close > 0
             if sanity.get("reject_high_lt_low", True):
-                df = df[df["high"] >= df["low"]]
-        return {"df": df}
+                ok = (delta.high >= delta.low) if ok is None else ok & (delta.high >= delta.low)
+            if ok is not None and not ok.all():
+                delta = delta[ok]
+        return {"df": self._merge(symbol, ccxt_tf, delta, lim)}
+
+    async def _backfill(self, symbol: str, ccxt_tf: str, lim: int, prio: int, now_ms: int) -> List[list]:
+        """Newest `lim` bars; windows longer than one page are paged forward from their first bar."""
+        self.fetch_stats["full"] += 1
+        self.fetch_stats["bars_requested"] += lim
+        if lim <= self._page:
+            self.fetch_stats["pages"] += 1
+            return await self.sched.submit(
+                prio, kline_weight(lim, self._futures),
+                lambda: fetch_ohlcv(self.ex, symbol, ccxt_tf, since=None, limit=lim))
+        tf_ms = TF_MS[ccxt_tf]
+        cur = (now_ms // tf_ms - (lim - 1)) * tf_ms
+        rows: List[list] = []
+        while True:
+            since = cur
+            page = await self.sched.submit(
+                prio, kline_weight(self._page, self._futures),
+                lambda: fetch_ohlcv(self.ex, symbol, ccxt_tf, since=since, limit=self._page))
+            self.fetch_stats["pages"] += 1
+            if not page:
+                break
+            rows.extend(page)
+            nxt = int(page[-1][0]) + tf_ms
+            if nxt <= cur or len(page) < self._page or nxt > now_ms:
+                break
+            cur = nxt
+        return rows
+
+    def _merge(self, symbol: str, ccxt_tf: str, delta, maxlen: int):
+        key = f"{symbol}:{ccxt_tf}"
+        df = self.store.merge(key, delta, maxlen)
+        if self.disk is not None and len(delta):
+            # chỉ persist bar đã đóng và mới hơn bar cuối đã ghi
+            closed_before = self._exchange_ms() - TF_MS[ccxt_tf]
+            done = self._persisted.get(key, -1)
+            ts = df["timestamp"]
+            new = df[(ts > done) & (ts <= closed_before)]
+            if len(new):
+                try:
+                    self.disk.append(symbol, ccxt_tf, new)
+                    self._persisted[key] = new.last_ts()
+                except Exception as e:
+                    self.log.error(f"[DATA][{symbol}][{ccxt_tf}] cache write error: {e}")
+        return df
+
+    def ingest_kline(self, symbol: str, ccxt_tf: str, row: list, closed: bool) -> None:
+        """
+        Push path from the kline stream. Forming-bar updates are only buffered
+        (latest wins) and folded in on the next read; closed bars are merged
+        at once. A jump past the next expected bar marks the key stale and
+        remembers the last bar before the hole, so the next read refetches
+        over REST from there rather than from the post-gap bar.
+        """
+        ccxt_tf = _norm_tf(ccxt_tf)
+        key = f"{symbol}:{ccxt_tf}"
+        if key not in self.store:
+            return   # chưa có lịch sử (seed qua REST trước)
+        if not closed:
+            self._pending[key] = row
+            return
+        last = self.store.last_ts(key)
+        if last is not None and int(row[0]) > last + TF_MS[ccxt_tf]:
+            self._stale.add(key)
+            self._gap_from.setdefault(key, last)   # nhiều gap trước lần đọc -> giữ gap sớm nhất
+        pend = self._pending.pop(key, None)
+        rows = [pend, row] if pend is not None and int(pend[0]) > int(row[0]) else [row]
+        self._merge(symbol, ccxt_tf, Candles.from_ohlcv(rows, self._dtype), self._limit(ccxt_tf))
+
+    def _apply_pending(self, symbol: str, ccxt_tf: str) -> None:
+        row = self._pending.pop(f"{symbol}:{ccxt_tf}", None)
+        if row is not None:
+            self._merge(symbol, ccxt_tf, Candles.from_ohlcv([row], self._dtype), self._limit(ccxt_tf))
+
+    def _warm_start(self, symbol: str, ccxt_tf: str, lim: int) -> None:
+        key = f"{symbol}:{ccxt_tf}"
+        try:
+            c = Candles.from_frame(np.array(self.disk.read(symbol, ccxt_tf, last=lim)), self._dtype)   # copy ra khỏi memmap
+        except Exception as e:
+            self.log.error(f"[DATA][{symbol}][{ccxt_tf}] cache read error: {e}")
+            c = None
+        self._persisted[key] = c.last_ts() if c is not None and len(c) else -1
+        if c is not None and len(c):
+            # đĩa chỉ có bar đã đóng: tính cả các bar delta kế tiếp sẽ nạp, không thì _grown() luôn đúng
+            held = len(self.store.merge(key, c, lim))
+            self._sized[key] = held + (self._exchange_ms() - c.last_ts()) // TF_MS[ccxt_tf]
+
+    def _exchange_ms(self) -> int:
+        return exchange_ms(self.ex)
+
+    def _since(self, key: str, ccxt_tf: str, lim: int) -> Optional[int]:
+        # Refetch from the last stored (possibly still-forming) bar so it gets replaced,
+        # or from the last bar before a stream gap; fall back to a full window when the
+        # gap no longer fits in one page.
+        if not bool(self.cfg.get("data",{}).get("incremental", True)):
+            return None
+        last = self.store.last_ts(key)
+        if last is None:
+            return None
+        last = min(last, self._gap_from.get(key, last))
+        gap_bars = (self._exchange_ms() - last) // TF_MS[ccxt_tf] + 1
+        return last if gap_bars < lim else None
+
+class HistoryDownloader:
+    """
+    Bulk OHLCV history into a DiskCandleCache, one task per symbol, all
+    requests through the shared RequestScheduler (PRIO_SLOW).
+      - empty cache: page forward from `start_ms`
+      - cache older than `start_ms` missing: page backwards from the first stored bar
+        (or from where an earlier run stopped: cache.checked_from, so resumes do not
+        re-walk the empty pages before a symbol's listing)
+      - then page forward from the last stored bar to `end_ms`/now (closed bars only)
+      - then refetch every gap reported by cache.check()
+    Each page is appended as soon as it arrives, so an interrupted run resumes
+    from what is on disk. Gaps the exchange itself has (maintenance, delisting
+    pauses) stay in the report as `gaps_left`.
+    """
+    def __init__(self, ex, cache, sched: Optional[RequestScheduler] = None, logger=None,
+                 page_limit: Optional[int] = None, retries: int = 5):
+        self.ex = ex
+        self.cache = cache
+        self.sched = sched or RequestScheduler({})
+        self.log = logger or SafeLogger()
+        opts = getattr(ex, "options", None) or {}
+        self._futures = str(opts.get("defaultType", "future")) != "spot"
+        self.page_limit = int(page_limit or (_MAX_PAGE if self._futures else 1000))
+        self.retries = max(0, int(retries))
+
+    async def _page(self, symbol: str, tf: str, since: int) -> Candles:
+        delay = 1.0
+        for attempt in range(self.retries + 1):
+            try:
+                rows = await self.sched.submit(
+                    RequestScheduler.PRIO_SLOW, kline_weight(self.page_limit, self._futures),
+                    lambda: fetch_ohlcv(self.ex, symbol, tf, since=since, limit=self.page_limit))
+                return Candles.from_ohlcv(rows)
+            except (ccxt.NetworkError, ccxt.ExchangeError) as e:
+                if attempt >= self.retries or isinstance(e, (ccxt.BadSymbol, ccxt.BadRequest)):
+                    raise
+                self.log.warn(f"[DOWNLOAD][{symbol}][{tf}] {type(e).__name__}: {e} (retry in {delay:.0f}s)")
+                await asyncio.sleep(delay)
+                delay = min(60.0, delay * 2)
+        return Candles.empty()
+
+    def _write(self, symbol: str, tf: str, c: Candles, st: Dict[str, Any]) -> None:
+        if len(c):
+            st["written"] += self.cache.append(symbol, tf, c)
+
+    async def _forward(self, symbol: str, tf: str, since: int, until: int, st: Dict[str, Any]) -> None:
+        """[since, until) page by page; stops early once a page comes back short (caught up)."""
+        tf_ms = TF_MS[tf]
+        cur = since
+        while cur < until:
+            raw = await self._page(symbol, tf, cur)
+            st["pages"] += 1
+            page = raw[raw.timestamp < until]
+            if not len(page):
+                return
+            self._write(symbol, tf, page, st)
+            nxt = int(page.timestamp[-1]) + tf_ms
+            if nxt <= cur or len(raw) < self.page_limit:
+                return
+            cur = nxt
+
+    async def _backward(self, symbol: str, tf: str, first: int, start: int, st: Dict[str, Any]) -> None:
+        """Pages ending at `first` walking back to `start`; empty pages are stepped over."""
+        tf_ms = TF_MS[tf]
+        while first > start:
+            since = max(start, first - self.page_limit * tf_ms)
+            page = await self._page(symbol, tf, since)
+            st["pages"] += 1
+            page = page[page.timestamp < first]
+            if not len(page):
+                # lỗ của sàn dài hơn 1 trang hay trước ngày list: không phân biệt được -> lùi tiếp tới start
+                first = since
+                continue
+            self._write(symbol, tf, page, st)
+            first = int(page.timestamp[0])
+
+    async def symbol(self, symbol: str, tf: str, start_ms: int, end_ms: Optional[int] = None) -> Dict[str, Any]:
+        tf = _norm_tf(tf)
+        tf_ms = TF_MS[tf]
+        start = -(-int(start_ms) // tf_ms) * tf_ms
+        # chỉ ghi bar đã đóng
+        until = min(int(end_ms) if end_ms is not None else 1 << 62, exchange_ms(self.ex) // tf_ms * tf_ms)
+        st: Dict[str, Any] = {"symbol": symbol, "tf": tf, "pages": 0, "written": 0, "status": "ok"}
+        t0 = time.monotonic()
+        try:
+            first, last = self.cache.first_ts(symbol, tf), self.cache.last_ts(symbol, tf)
+            if last is None:
+                await self._forward(symbol, tf, start, until, st)
+                if st["written"]:   # sàn trả bar sớm nhất từ `since`: trước bar đầu là trống
+                    self.cache.set_checked_from(symbol, tf, start)
+            else:
+                # đã lùi tới `checked` ở lần chạy trước (trước ngày list / trang trống) -> không đi lại
+                checked = self.cache.checked_from(symbol, tf)
+                top = first if checked is None else min(first, checked)
+                if top > start:
+                    await self._backward(symbol, tf, top, start, st)
+                    self.cache.set_checked_from(symbol, tf, start)
+                await self._forward(symbol, tf, last + tf_ms, until, st)
+            rep = self.cache.check(symbol, tf)
+            for g in rep["gaps"]:
+                if g["to"] > start:
+                    await self._forward(symbol, tf, max(start, g["from"] + tf_ms), g["to"], st)
+            if st["written"]:
+                self.cache.compact(symbol, tf)
+            rep = self.cache.check(symbol, tf)
+            st.update({"first": self.cache.first_ts(symbol, tf), "last": self.cache.last_ts(symbol, tf),
+                       "rows": rep["rows"], "gaps_left": len(rep["gaps"])})
+        except Exception as e:
+            st.update({"status": "error", "error": f"{type(e).__name__}: {e}"})
+            self.log.error(f"[DOWNLOAD][{symbol}][{tf}] {e}")
+        st["sec"] = round(time.monotonic() - t0, 2)
+        return st
+
+    async def run(self, symbols: List[str], tfs: List[str], start_ms: int, end_ms: Optional[int] = None,
+                  on_done: Optional[Callable[[Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+        async def one(sym: str, tf: str):
+            r = await self.symbol(sym, tf, start_ms, end_ms)
+            if on_done:
+                on_done(r)
+            return r
+        return list(await asyncio.gather(*[one(s, tf) for s in symbols for tf in tfs]))
+
+def _parse_ms(x: Optional[str]) -> Optional[int]:
+    if x is None:
+        return None
+    if str(x).isdigit():
+        return int(x)
+    from datetime import datetime, timezone
+    d = datetime.fromisoformat(str(x))
+    return int((d if d.tzinfo else d.replace(tzinfo=timezone.utc)).timestamp() * 1000)
+
+def main():
+    import argparse, json
+    p = argparse.ArgumentParser(description="Bulk OHLCV history download into the candle cache (resumable)")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    d = sub.add_parser("download")
+    d.add_argument("--config", default=None, help="config json (exchange/data.scheduler/symbols)")
+    d.add_argument("--symbols", default=None, help="comma list; default: config symbols")
+    d.add_argument("--tf", default="5m", help="comma list, e.g. 5m,15m")
+    d.add_argument("--days", type=float, default=365.0)
+    d.add_argument("--start", default=None, help="ISO date (UTC) or epoch ms; overrides --days")
+    d.add_argument("--end", default=None)
+    d.add_argument("--root", default=None, help="candle cache root (default data.cache.root or 'candles')")
+    d.add_argument("--market", default=None, help="FUTURES|SPOT (overrides config)")
+    args = p.parse_args()
+
+    cfg: Dict[str, Any] = {}
+    if args.config:
+        with open(args.config, "r", encoding="utf-8") as f:
+            cfg = json.load(f)
+    if args.market:
+        cfg.setdefault("exchange", {})["market"] = args.market
+    symbols = [s.strip() for s in args.symbols.split(",")] if args.symbols else (cfg.get("symbols") or ["BTC/USDT"])
+    tfs = [_norm_tf(t) for t in args.tf.split(",")]
+    root = args.root or ((cfg.get("data") or {}).get("cache") or {}).get("root", "candles")
+    end_ms = _parse_ms(args.end)
+
+    async def _run():
+        from candle_cache import DiskCandleCache
+        ex = build_exchange(cfg)
+        await open_exchange(ex, cfg)
+        try:
+            start_ms = _parse_ms(args.start)
+            if start_ms is None:
+                start_ms = exchange_ms(ex) - int(args.days * 86_400_000)
+            dl = HistoryDownloader(ex, DiskCandleCache(root), RequestScheduler(cfg))
+            res = await dl.run(symbols, tfs, start_ms, end_ms, on_done=lambda r: print(json.dumps(r), flush=True))
+            print(json.dumps({"done": len(res), "errors": sum(r["status"] != "ok" for r in res),
+                              "written": sum(r["written"] for r in res), "scheduler": dl.sched.metrics()}), flush=True)
+        finally:
+            await close_exchange(ex)
+    asyncio.run(_run())
+
+if __name__ == "__main__":
+    main()
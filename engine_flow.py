@@ -1,25 +1,135 @@
 # engine_flow.py — FINAL (Adaptive Trend Mode glue)
 from __future__ import annotations
 import asyncio, time, traceback
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, Optional, Set, Tuple
 
 from order_manager import OrderManager
-from vfi_module import calc_vfi_features, vfi_score
-from engine_vote import decide_side as voter_decide_side
+from vfi_module import calc_vfi_features, vfi_score, vfi_feature_matrix, vfi_score_batch
+from engine_vote import decide_side as voter_decide_side, decide_side_batch, vote_plan
+from candles import as_candles
+from console_log import SafeLogger
 
 try:
-    from indicators import IndicatorEngine
+    from indicators import IndicatorEngine, set_backend, indicator_backend
 except Exception:
-    IndicatorEngine = None
-
-class _SafeLogger:
-    def info(self, msg: str): print(msg, flush=True)
-    def warn(self, msg: str): print("[WARN]", msg, flush=True)
-    def error(self, msg: str): print("[ERROR]", msg, flush=True)
+    IndicatorEngine = set_backend = indicator_backend = None
+try:
+    from incremental_indicators import IncrementalIndicatorEngine
+except Exception:
+    IncrementalIndicatorEngine = None
+try:
+    from batch_indicators import BatchIndicatorEngine
+except Exception:
+    BatchIndicatorEngine = None
+try:
+    from indicator_cache import IndicatorCache, CachedIndicatorEngine
+except Exception:
+    IndicatorCache = CachedIndicatorEngine = None
+try:
+    from compact_store import CompactStore
+except Exception:
+    CompactStore = None
+try:
+    from vfi_cache import VfiCache
+except Exception:
+    VfiCache = None
 
-_logger = _SafeLogger()
+_logger = SafeLogger()
 _order_mgr = OrderManager()
 _indicator_engine = IndicatorEngine() if IndicatorEngine else None
+_incremental_engine = IncrementalIndicatorEngine() if IncrementalIndicatorEngine else None
+_batch_engine = BatchIndicatorEngine() if BatchIndicatorEngine else None
+_indicator_cache = IndicatorCache() if IndicatorCache else None
+_cached_engine = CachedIndicatorEngine(_indicator_cache) if _indicator_cache is not None else None
+_compact_store = None
+_compact_rejected = False
+_vfi_cache = VfiCache() if VfiCache else None
+
+def _use_incremental(cfg: dict) -> bool:
+    return _incremental_engine is not None and bool(_resolve(cfg, "indicators", "incremental").get("enabled"))
+
+def _active_cache(cfg: dict):
+    # indicators.cache: memo theo (symbol, tf, bar đóng cuối, config hash); opt-in
+    cc = _resolve(cfg, "indicators", "cache")
+    if _indicator_cache is None or not cc.get("enabled"):
+        return None
+    _indicator_cache.max_entries = max(1, int(cc.get("max_entries", 512)))
+    return _indicator_cache
+
+_backend_failed: set = set()
+
+def _active_vfi_cache(cfg: dict):
+    # indicators.vfi_cache.enabled (opt-in): VFI M15 tính một lần cho mỗi trạng thái cửa sổ, dùng chung mọi consumer
+    if _vfi_cache is None or not _resolve(cfg, "indicators", "vfi_cache").get("enabled"):
+        return None
+    return _vfi_cache
+
+def _active_compact(cfg: dict):
+    # indicators.compact: {"enabled": false, "budget_mb": 256} -> output float32 trong block cấp sẵn mỗi (symbol, tf)
+    global _compact_store, _compact_rejected
+    cc = _resolve(cfg, "indicators", "compact")
+    if CompactStore is None or not cc.get("enabled"):
+        return None
+    if _resolve(cfg, "indicators", "cache").get("enabled"):
+        # entry của indicators.cache sống qua nhiều cycle, view của block thì bị cycle sau ghi đè -> không kết hợp
+        if not _compact_rejected:
+            _compact_rejected = True
+            _logger.warn("[ENGINE_FLOW] indicators.compact ignored: not supported together with indicators.cache")
+        return None
+    if _compact_store is None:
+        _compact_store = CompactStore(cc.get("budget_mb", 256))
+    _compact_store.budget = int(float(cc.get("budget_mb", 256)) * 2**20)
+    return _compact_store
+
+def _compacted(symbol: str, ind: Dict[str, Any], cfg: dict) -> Dict[str, Any]:
+    store = _active_compact(cfg)
+    return store.attach(symbol, ind) if store is not None else ind
+
+def _with_spot(ind: Dict[str, Any], raw_tf: Dict[str, Any]) -> Dict[str, Any]:
+    # data.spot_twin: nến spot M15 đã căn theo timestamp futures -> ind["M15"]["spot"] cho FSD
+    # (luôn ghi đè: TfIndicators từ cache dùng chung giá trị với cycle trước)
+    m15, spot = (ind or {}).get("M15"), ((raw_tf or {}).get("M15") or {}).get("spot")
+    if m15 is not None and (spot is not None or m15.get("spot") is not None):
+        m15["spot"] = spot
+    return ind
+
+def _apply_backend(cfg: dict) -> None:
+    # indicators.backend: "pandas" (tham chiếu) | "numpy" | "polars"; config_hash gồm cả mục này -> đổi backend là miss cache.
+    # Chỉ áp cho key tính lười qua REGISTRY: pass batch 2-D, incremental và tail của cache có kernel riêng (khớp pandas).
+    if set_backend is None:
+        return
+    want = str(_resolve(cfg, "indicators").get("backend", "pandas"))
+    if want == indicator_backend() or want in _backend_failed:
+        return
+    try:
+        set_backend(want)
+    except Exception as e:
+        _backend_failed.add(want)
+        _logger.warn(f"[ENGINE_FLOW] indicator backend {want!r} unavailable, using pandas: {e}")
+        set_backend("pandas")
+
+def _pick_indicator_engine(cfg: dict):
+    # indicators.incremental.enabled: giữ state theo (symbol, tf), chỉ tính bar mới
+    if _use_incremental(cfg):
+        return _incremental_engine
+    if _active_cache(cfg) is not None:
+        return _cached_engine
+    return _indicator_engine
+
+def indicator_metrics() -> Dict[str, Any]:
+    """Indicator-stage counters (cache hit/miss per tf, batch, incremental) for the periodic metrics log."""
+    out: Dict[str, Any] = {}
+    if _indicator_cache is not None and _indicator_cache.stats:
+        out["cache"] = _indicator_cache.metrics()
+    if _batch_engine is not None and _batch_engine.stats["blocks"]:
+        out["batch"] = dict(_batch_engine.stats)
+    if _incremental_engine is not None and _incremental_engine.stats["seeded"]:
+        out["incremental"] = dict(_incremental_engine.stats)
+    if _compact_store is not None:
+        out["compact"] = _compact_store.metrics()
+    if _vfi_cache is not None and any(_vfi_cache.stats.values()):
+        out["vfi"] = _vfi_cache.metrics()
+    return out
 
 def _now_ts() -> int: return int(time.time())
 
@@ -44,7 +154,7 @@ def _ago(series, bars: int, default=0.0) -> float:
 def _age_sec(df) -> Optional[int]:
     try:
         if df is None or len(df) == 0: return None
-        ts = int(df["timestamp"].iloc[-1])
+        ts = as_candles(df).last_ts()
         if ts > 10_000_000_000: ts //= 1000
         return max(0, _now_ts() - ts)
     except Exception:
@@ -64,19 +174,74 @@ def _as_decision(x) -> tuple[str, float]:
         return str(x.get("side","NEUTRAL")).upper(), float(x.get("confidence", x.get("score", 0.0)))
     return "NEUTRAL", 0.0
 
-def _calc_vfi(indicators: dict, cfg: dict) -> Tuple[float, Dict[str, float]]:
+def _vfi_features(indicators: dict, cfg: dict, symbol: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    # None = VFI tắt hoặc M15 chưa đủ bar -> điểm 0
     enable_vfi = bool(_resolve(cfg, "features").get("enable_vfi", True) or (cfg.get("vfi") is not None))
     if not enable_vfi:
-        return 0.0, {"long": 0.0, "short": 0.0}
+        return None
     m15 = (indicators.get("M15") or {}).get("df")
-    if m15 is None or len(getattr(m15, "index", [])) < 30:
+    if m15 is None or len(m15) < 30:
+        return None
+    cache = _active_vfi_cache(cfg) if symbol else None
+    m15i = indicators.get("M15") or {}
+    vwap, atr, spot = m15i.get("vwap"), m15i.get("atr"), m15i.get("spot")
+    if cache is not None:
+        return cache.features(symbol, m15, vwap=vwap, atr=atr, spot_df_m15=spot)
+    return calc_vfi_features(m15, vwap=vwap, atr=atr, spot_df_m15=spot)
+
+def indicator_keys(cfg: dict) -> Dict[str, Set[str]]:
+    """
+    Indicator keys the decision path reads per timeframe under `cfg` (VFI,
+    M5 trigger, vote, OrderManager), declared rather than observed: reads
+    behind data-dependent early returns are included. DataFeed sizes its
+    warm-up windows from this (main.py).
+    """
+    out: Dict[str, Set[str]] = {}
+    def add(keys: Dict[str, Set[str]]):
+        for tf, ks in keys.items():
+            out.setdefault(tf, set()).update(ks)
+    if bool(_resolve(cfg, "features").get("enable_vfi", True) or (cfg.get("vfi") is not None)):
+        add({"M15": {"vwap", "atr", "spot"}})
+    if _resolve(cfg, "enhance", "m5_trigger").get("enabled"):
+        add({"M15": {"bbw"}, "H1": {"adx"}, "M5": {"close", "vwap", "ema21"}})
+    add(vote_plan(cfg).keys())
+    add(OrderManager.INDICATOR_KEYS)
+    return out
+
+def _calc_vfi(indicators: dict, cfg: dict, symbol: Optional[str] = None) -> Tuple[float, Dict[str, float]]:
+    feats = _vfi_features(indicators, cfg, symbol)
+    if feats is None:
         return 0.0, {"long": 0.0, "short": 0.0}
-    feats = calc_vfi_features(m15, vwap=(indicators.get("M15") or {}).get("vwap"), atr=(indicators.get("M15") or {}).get("atr"))
     sc_long = vfi_score(feats, "LONG")
     sc_short = vfi_score(feats, "SHORT")
     flow = (sc_long - sc_short) / 100.0
     return float(flow), {"long": float(sc_long), "short": float(sc_short)}
 
+def _calc_vfi_many(ind_all: Dict[str, dict], cfg: dict) -> Dict[str, Tuple[float, Dict[str, float]]]:
+    """
+    _calc_vfi for the whole universe: features per symbol (VfiCache), then
+    one vfi_score_batch over the (symbols × features) matrix. A symbol whose
+    features fail is left out; _decide_symbol then computes it itself and
+    reports the error for that symbol only.
+    """
+    out: Dict[str, Tuple[float, Dict[str, float]]] = {}
+    syms, feats = [], []
+    for sym, ind in ind_all.items():
+        try:
+            f = _vfi_features(ind or {}, cfg, sym)
+        except Exception:
+            continue
+        if f is None:
+            out[sym] = (0.0, {"long": 0.0, "short": 0.0})
+        else:
+            syms.append(sym); feats.append(f)
+    if feats:
+        sc = vfi_score_batch(vfi_feature_matrix(feats))
+        flow = (sc["LONG"] - sc["SHORT"]) / 100.0
+        for i, sym in enumerate(syms):
+            out[sym] = (float(flow[i]), {"long": float(sc["LONG"][i]), "short": float(sc["SHORT"][i])})
+    return out
+
 def _m5_trigger_bump(ind: dict, cfg: dict, state: dict, symbol: str) -> float:
     enh = _resolve(cfg, "enhance", "m5_trigger", default={"enabled": False})
     if not enh.get("enabled"): return 0.0
@@ -100,7 +265,7 @@ def _m5_trigger_bump(ind: dict, cfg: dict, state: dict, symbol: str) -> float:
     # kiểm tra thời gian nến M5 cuối cùng
     df = m5.get("df")
     if df is None or len(df)==0: return 0.0
-    ts_last = int(df["timestamp"].iloc[-1]); 
+    ts_last = as_candles(df).last_ts()
     if ts_last > 10_000_000_000: ts_last //= 1000
     if ts_last - last_ts < anti_gap:
         return 0.0
@@ -120,9 +285,8 @@ def _m5_trigger_bump(ind: dict, cfg: dict, state: dict, symbol: str) -> float:
         last_trigger_map[symbol] = ts_last
     return bump
 
-async def run_symbol_cycle(symbol: str, data_feed, cfg: dict, state: dict) -> Dict[str, Any]:
-    t0 = time.time()
-    result: Dict[str, Any] = {
+def _new_result(symbol: str) -> Dict[str, Any]:
+    return {
         "symbol": symbol,
         "status": "INIT",
         "decision": ("FLAT", 0.0),
@@ -132,106 +296,298 @@ async def run_symbol_cycle(symbol: str, data_feed, cfg: dict, state: dict) -> Di
         "latency_sec": 0.0,
     }
 
+async def _guarded(symbol: str, state: dict, t0: float, body) -> Dict[str, Any]:
+    result = _new_result(symbol)
     englog = state.get("engine_logger") or _logger
-    notifier = state.get("notifier")
-    trade_sim = state.get("trade_sim")
-
     try:
-        raw_tf = await data_feed.fetch_all_timeframes(symbol)
-        if not raw_tf:
-            raise RuntimeError("fetch_all_timeframes returned empty")
+        await body(result)
+    except Exception as e:
+        englog.error(f"[ENGINE_FLOW][{symbol}] {e}\n{traceback.format_exc()}")
+        result["status"] = "ERROR"
+    finally:
+        result["latency_sec"] = round(time.time() - t0, 3)
+        return result
 
-        if _indicator_engine is None:
-            raise RuntimeError("IndicatorEngine missing")
+def _lag_guarded(indicators: dict, cfg: dict, vfi: Tuple[float, Dict[str, float]]) -> bool:
+    # enhance.lag_guard: H1/H4 cũ và VFI flow yếu -> trung lập hóa quyết định
+    enh_lag = _resolve(cfg, "enhance", "lag_guard", default={"enabled": False})
+    if not enh_lag.get("enabled"):
+        return False
+    h1_age = _age_sec((indicators.get("H1") or {}).get("df"))
+    h4_age = _age_sec((indicators.get("H4") or {}).get("df"))
+    h1_max = int(enh_lag.get("h1_max_age", 7200))
+    h4_max = int(enh_lag.get("h4_max_age", 21600))
+    skip_if_flow = float(enh_lag.get("skip_if_vfi_flow_over", 0.2))
+    if ((h1_age and h1_age > h1_max) or (h4_age and h4_age > h4_max)) and abs(vfi[0]) < skip_if_flow:
+        return bool(enh_lag.get("neutral_if_true", True))
+    return False
 
-        indicators = _indicator_engine.compute_all(symbol, raw_tf, cfg)
-        if not indicators:
-            raise RuntimeError("compute_all returned empty")
+def _groups(indicators: dict, cfg: dict, state: dict, symbol: str, vfi_flow: float) -> Dict[str, float]:
+    # --- nhóm gốc (nếu chưa có tally_groups chuyên sâu) ---
+    groups = {
+        "flow": vfi_flow,
+        "trend": 0.0,
+        "momentum": 0.0,
+        "mean": 0.0
+    }
+    # --- Early bump từ M5 trigger (nếu bật) ---
+    m5_bump = _m5_trigger_bump(indicators, cfg, state, symbol)
+    if m5_bump:
+        groups["momentum"] += m5_bump
+    return groups
 
-        # --- Lag guard trên H1/H4 ---
-        enh_lag = _resolve(cfg, "enhance", "lag_guard", default={"enabled": False})
-        if enh_lag.get("enabled"):
-            h1_age = _age_sec((indicators.get("H1") or {}).get("df"))
-            h4_age = _age_sec((indicators.get("H4") or {}).get("df"))
-            h1_max = int(enh_lag.get("h1_max_age", 7200))
-            h4_max = int(enh_lag.get("h4_max_age", 21600))
-            vfi_flow_tmp, vfi_scores_tmp = _calc_vfi(indicators, cfg)
-            skip_if_flow = float(enh_lag.get("skip_if_vfi_flow_over", 0.2))
-            if ((h1_age and h1_age > h1_max) or (h4_age and h4_age > h4_max)) and abs(vfi_flow_tmp) < skip_if_flow:
-                if enh_lag.get("neutral_if_true", True):
-                    # trung lập hóa quyết định vì dữ liệu cũ
-                    result.update({
-                        "status":"LAG_GUARD",
-                        "groups":{},
-                        "vfi_flow": vfi_flow_tmp,
-                        "vfi_scores": vfi_scores_tmp,
-                        "decision": ("FLAT", 0.0)
-                    })
-                    return result
-
-        # --- VFI ---
-        vfi_flow, vfi_scores = _calc_vfi(indicators, cfg)
-
-        # --- nhóm gốc (nếu chưa có tally_groups chuyên sâu) ---
-        groups = {
-            "flow": vfi_flow,
-            "trend": 0.0,
-            "momentum": 0.0,
-            "mean": 0.0
-        }
+def _vote_many(ind_all: Dict[str, dict], vfi_all: Dict[str, Tuple[float, Dict[str, float]]], cfg: dict,
+               state: dict) -> Dict[str, Tuple[Dict[str, float], Dict[str, Any]]]:
+    """
+    Groups (with the M5 bump) and vote for every symbol past the lag guard,
+    the vote in one decide_side_batch call (compiled VotePlan). Symbols
+    without precomputed VFI, or failing here, are left to _decide_symbol;
+    if the batch itself fails (one malformed symbol), every symbol gets
+    (groups, None): _decide_symbol redoes only the vote, so the error is
+    reported for that symbol only and the M5 bump (already recorded in
+    state) is kept.
+    """
+    try:
+        plan = vote_plan(cfg)
+    except Exception:
+        return {}
+    syms, inds, groups, scores = [], [], [], []
+    for sym, ind in ind_all.items():
+        vfi = vfi_all.get(sym)
+        if vfi is None or not ind:
+            continue
+        try:
+            if _lag_guarded(ind, cfg, vfi):
+                continue
+            g = _groups(ind, cfg, state, sym, vfi[0])
+        except Exception:
+            continue
+        syms.append(sym); inds.append(ind); groups.append(g); scores.append(vfi[1])
+    if not syms:
+        return {}
+    try:
+        out, full = decide_side_batch(inds, cfg, scores, groups)
+        return {sym: (groups[i], plan.vote(out, i, full[i])) for i, sym in enumerate(syms)}
+    except Exception:
+        return {sym: (groups[i], None) for i, sym in enumerate(syms)}
+
+async def _decide_symbol(symbol: str, indicators: dict, cfg: dict, state: dict, result: Dict[str, Any],
+                         vfi: Optional[Tuple[float, Dict[str, float]]] = None,
+                         vote: Optional[Tuple[Dict[str, float], Dict[str, Any]]] = None) -> None:
+    """
+    Lag guard, VFI, vote and order handling on already computed indicators
+    (fills `result`). `vfi` = (flow, scores) and `vote` = (groups, vote)
+    precomputed for the universe (_calc_vfi_many / _vote_many); computed
+    here when absent (vote = (groups, None): groups reused, vote redone).
+    """
+    if vfi is None:
+        vfi = _calc_vfi(indicators, cfg, symbol)
+    englog = state.get("engine_logger") or _logger
+    notifier = state.get("notifier")
+    trade_sim = state.get("trade_sim")
+
+    # --- Lag guard trên H1/H4 ---
+    if _lag_guarded(indicators, cfg, vfi):
+        # trung lập hóa quyết định vì dữ liệu cũ
+        result.update({
+            "status":"LAG_GUARD",
+            "groups":{},
+            "vfi_flow": vfi[0],
+            "vfi_scores": vfi[1],
+            "decision": ("FLAT", 0.0)
+        })
+        return
 
-        # --- Early bump từ M5 trigger (nếu bật) ---
-        m5_bump = _m5_trigger_bump(indicators, cfg, state, symbol)
-        if m5_bump:
-            groups["momentum"] += m5_bump
+    # --- VFI ---
+    vfi_flow, vfi_scores = vfi
 
-        # --- Vote ---
+    # --- Vote ---
+    if vote is None or vote[1] is None:
+        # groups đã tính (kèm M5 bump đã ghi vào state) thì dùng lại, không tính lần hai
+        groups = vote[0] if vote is not None else _groups(indicators, cfg, state, symbol, vfi_flow)
         ctx_vote = {
             "indicators": indicators,
             "config": cfg,
             "group_scores": groups,
             "vfi_scores": vfi_scores,
         }
-        vote = voter_decide_side(ctx_vote) or {"side": "NEUTRAL", "score": 0.0}
-        side, conf = _as_decision((vote.get("side","NEUTRAL"), vote.get("score",0.0)))
+        vote = voter_decide_side(ctx_vote)
+    else:
+        groups, vote = vote
+    vote = vote or {"side": "NEUTRAL", "score": 0.0}
+    side, conf = _as_decision((vote.get("side","NEUTRAL"), vote.get("score",0.0)))
 
-        result.update({
-            "status": "OK",
-            "groups": groups,
-            "vfi_flow": vfi_flow,
-            "vfi_scores": vfi_scores,
-            "decision": (side, conf)
+    result.update({
+        "status": "OK",
+        "groups": groups,
+        "vfi_flow": vfi_flow,
+        "vfi_scores": vfi_scores,
+        "decision": (side, conf)
+    })
+
+    # --- log snapshot chi tiết (nếu có logger) ---
+    if englog and hasattr(englog, "log_vote_snapshot"):
+        englog.log_vote_snapshot({
+            "symbol": symbol,
+            "regime": "",  # (để ngỏ, sẽ điền khi có RegimeDetector)
+            "trend": groups.get("trend",0.0),
+            "momentum": groups.get("momentum",0.0),
+            "mean": groups.get("mean",0.0),
+            "flow": groups.get("flow",0.0),
+            "score": conf,
+            "side": side,
+            "details": vote.get("details", {})
         })
 
-        # --- log snapshot chi tiết (nếu có logger) ---
-        if englog and hasattr(englog, "log_vote_snapshot"):
-            englog.log_vote_snapshot({
-                "symbol": symbol,
-                "regime": "",  # (để ngỏ, sẽ điền khi có RegimeDetector)
-                "trend": groups.get("trend",0.0),
-                "momentum": groups.get("momentum",0.0),
-                "mean": groups.get("mean",0.0),
-                "flow": groups.get("flow",0.0),
-                "score": conf,
-                "side": side,
-                "details": vote.get("details", {})
-            })
-
-        # --- handle trades ---
-        if side in ("LONG", "SHORT"):
-            _order_mgr.open_if_ok(
-                {"symbol": symbol, "cfg": cfg, "indicators": indicators, "trade_sim": trade_sim, "notifier": notifier, "logger": englog},
-                side,
-            )
-        _order_mgr.manage({"symbol": symbol, "cfg": cfg, "indicators": indicators, "trade_sim": trade_sim, "notifier": notifier, "logger": englog})
+    # --- handle trades ---
+    if side in ("LONG", "SHORT"):
+        _order_mgr.open_if_ok(
+            {"symbol": symbol, "cfg": cfg, "indicators": indicators, "trade_sim": trade_sim, "notifier": notifier, "logger": englog},
+            side,
+        )
+    _order_mgr.manage({"symbol": symbol, "cfg": cfg, "indicators": indicators, "trade_sim": trade_sim, "notifier": notifier, "logger": englog,
+                       "vfi_cache": _active_vfi_cache(cfg)})
 
-    except Exception as e:
-        englog.error(f"[ENGINE_FLOW][{symbol}] {e}\n{traceback.format_exc()}")
-        result["status"] = "ERROR"
-    finally:
-        result["latency_sec"] = round(time.time() - t0, 3)
-        return result
+async def run_symbol_cycle(symbol: str, data_feed, cfg: dict, state: dict) -> Dict[str, Any]:
+    async def body(result):
+        raw_tf = await data_feed.fetch_all_timeframes(symbol)
+        if not raw_tf:
+            raise RuntimeError("fetch_all_timeframes returned empty")
+
+        ind_engine = _pick_indicator_engine(cfg)
+        if ind_engine is None:
+            raise RuntimeError("IndicatorEngine missing")
+
+        indicators = _with_spot(_compacted(symbol, ind_engine.compute_all(symbol, raw_tf, cfg), cfg), raw_tf)
+        if not indicators:
+            raise RuntimeError("compute_all returned empty")
+        await _decide_symbol(symbol, indicators, cfg, state, result)
+    return await _guarded(symbol, state, time.time(), body)
+
+def _staged(cfg: dict) -> Dict[str, bool]:
+    # mỗi giai đoạn theo lô có công tắc riêng (đều opt-in); bật một cái là engine_loop chạy theo giai đoạn
+    return {
+        "indicators": _batch_engine is not None and not _use_incremental(cfg)
+                      and bool(_resolve(cfg, "indicators", "batch").get("enabled")),
+        "vfi": bool(_resolve(cfg, "indicators", "vfi_batch").get("enabled")),
+        "vote": bool(_resolve(cfg, "voting", "batch").get("enabled")),
+    }
 
 async def engine_loop(symbols: list[str], data_feed, cfg: dict, state: dict):
-    tasks = [run_symbol_cycle(sym, data_feed, cfg, state) for sym in symbols]
-    return await asyncio.gather(*tasks, return_exceptions=True)
+    _apply_backend(cfg)
+    # symbol đang có vị thế được ưu tiên trong hàng đợi fetch
+    if hasattr(data_feed, "set_hot_symbols"):
+        pos = _order_mgr.position
+        data_feed.set_hot_symbols([pos["symbol"]] if pos else [])
+    staged = _staged(cfg)
+    if not any(staged.values()):
+        tasks = [run_symbol_cycle(sym, data_feed, cfg, state) for sym in symbols]
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    # theo giai đoạn: fetch toàn bộ -> indicator cả universe (2-D nếu indicators.batch) -> VFI/vote theo lô -> từng symbol
+    fetch_sec: Dict[str, float] = {}
+
+    async def _fetch(sym: str):
+        t = time.time()
+        try:
+            return await data_feed.fetch_all_timeframes(sym)
+        finally:
+            fetch_sec[sym] = time.time() - t
+    fetched = await asyncio.gather(*[_fetch(s) for s in symbols], return_exceptions=True)
+    ready = {s: r for s, r in zip(symbols, fetched) if r and not isinstance(r, BaseException)}
+    ind_all = None
+    if staged["indicators"]:
+        try:
+            ind_all = _batch_engine.compute_many(ready, cfg, cache=_active_cache(cfg))
+        except Exception as e:
+            (state.get("engine_logger") or _logger).warn(f"[ENGINE_FLOW] batch indicators failed, per-symbol fallback: {e}")
+    ind_err: Dict[str, Exception] = {}
+    if ind_all is None:
+        ind_all = {}
+        for s, r in ready.items():
+            try:
+                ind_all[s] = _pick_indicator_engine(cfg).compute_all(s, r, cfg)
+            except Exception as e:
+                ind_err[s] = e   # báo lỗi trong stage() của riêng symbol đó
+    ind_all = {s: _with_spot(_compacted(s, ind, cfg), ready.get(s)) for s, ind in ind_all.items()}
+    vfi_all: Dict[str, Tuple[float, Dict[str, float]]] = {}
+    if staged["vfi"]:
+        vfi_all = _calc_vfi_many(ind_all, cfg)   # điểm VFI cả universe một lượt
+    elif staged["vote"]:
+        for s, ind in ind_all.items():   # vote theo lô cần VFI từng symbol; _decide_symbol dùng lại
+            try:
+                vfi_all[s] = _calc_vfi(ind, cfg, s)
+            except Exception:
+                pass
+    votes = _vote_many(ind_all, vfi_all, cfg, state) if staged["vote"] else {}   # vote cả universe một lượt (VotePlan)
+
+    def stage(sym, raw):
+        async def body(result):
+            if isinstance(raw, BaseException):
+                raise raw
+            if not raw:
+                raise RuntimeError("fetch_all_timeframes returned empty")
+            if sym in ind_err:
+                raise ind_err[sym]
+            indicators = ind_all.get(sym)
+            if not indicators:
+                raise RuntimeError("compute_all returned empty")
+            await _decide_symbol(sym, indicators, cfg, state, result, vfi_all.get(sym), votes.get(sym))
+        return body
+    # latency_sec theo symbol: fetch của chính nó + phần quyết định (không tính các pass dùng chung)
+    return [await _guarded(sym, state, time.time() - fetch_sec.get(sym, 0.0), stage(sym, raw))
+            for sym, raw in zip(symbols, fetched)]
+
+async def engine_stream_loop(symbols: list[str], data_feed, cfg: dict, state: dict, stream,
+                             on_result=None, stop=None):
+    """
+    Chế độ stream: mỗi symbol chạy run_symbol_cycle ngay khi bar trigger của nó
+    đóng (mặc định M15, thêm M5 nếu enhance.m5_trigger bật) thay vì theo timer.
+    Symbol nào có stream nằm trên socket đang mất kết nối (stream.offline_symbols())
+    thì quay về poll REST mỗi stream.fallback_interval_sec; các socket còn sống
+    vẫn chạy theo sự kiện.
+    """
+    sc = cfg.get("stream") or {}
+    m5_on = bool(_resolve(cfg, "enhance", "m5_trigger", default={"enabled": False}).get("enabled"))
+    triggers = set(sc.get("trigger_tfs") or (["5m", "15m"] if m5_on else ["15m"]))
+    fallback = float(sc.get("fallback_interval_sec", cfg.get("interval_sec", 60)))
+    wanted = set(symbols)
+    queue: asyncio.Queue = asyncio.Queue()
+    queued: set = set()
+    locks: Dict[str, asyncio.Lock] = {s: asyncio.Lock() for s in symbols}
+    running: set = set()
+
+    def _on_event(ev):
+        if ev.closed and ev.tf in triggers and ev.symbol in wanted and ev.symbol not in queued:
+            queued.add(ev.symbol)
+            queue.put_nowait(ev.symbol)
+    stream.subscribe(_on_event)
+
+    async def _one(sym: str):
+        _apply_backend(cfg)
+        async with locks[sym]:
+            if hasattr(data_feed, "set_hot_symbols"):
+                pos = _order_mgr.position
+                data_feed.set_hot_symbols([pos["symbol"]] if pos else [])
+            r = await run_symbol_cycle(sym, data_feed, cfg, state)
+            if on_result: on_result(r)
+
+    last_poll = time.time()
+    while not (stop and stop()):
+        try:
+            sym = await asyncio.wait_for(queue.get(), timeout=1.0)
+        except asyncio.TimeoutError:
+            if time.time() - last_poll >= fallback:
+                last_poll = time.time()
+                offline = set(stream.offline_symbols())
+                poll = [s for s in symbols if s in offline]
+                if poll:
+                    for r in await engine_loop(poll, data_feed, cfg, state):
+                        if on_result and not isinstance(r, Exception): on_result(r)
+            continue
+        queued.discard(sym)
+        t = asyncio.create_task(_one(sym))
+        running.add(t)
+        t.add_done_callback(running.discard)
+    if running:
+        await asyncio.gather(*running, return_exceptions=True)
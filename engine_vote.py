@@ -1,6 +1,10 @@
 # engine_vote.py — FINAL (Adaptive Trend Mode)
 from __future__ import annotations
-from typing import Dict, Any, Tuple
+import hashlib, json
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+import numpy as np
 
 def _resolve(cfg: dict, *keys, default=None):
     cur = cfg or {}
@@ -8,7 +12,7 @@ def _resolve(cfg: dict, *keys, default=None):
         cur = cur.get(k, {})
     return cur if cur else (default if default is not None else {})
 
-def _last(series, default=0.0) -> float:
+def last_value(series, default=0.0) -> float:
     try:
         if series is None:
             return float(default)
@@ -18,7 +22,7 @@ def _last(series, default=0.0) -> float:
     except Exception:
         return float(default)
 
-def _ago(series, bars: int, default=0.0) -> float:
+def value_ago(series, bars: int, default=0.0) -> float:
     try:
         if series is None or bars <= 0:
             return float(default)
@@ -31,12 +35,270 @@ def _ago(series, bars: int, default=0.0) -> float:
     except Exception:
         return float(default)
 
+SIDES = ("NEUTRAL", "LONG", "SHORT", "FLAT")
+R_EMA_SLOPE, R_ADX_SLOPE, R_EARLY, R_D1_CUT = 1, 2, 4, 8
+
+_ALIGN = ("close", "ema21", "ema50", "ema200")
+
+def _full_groups(group_scores: Optional[Dict[str, Any]], vfi_scores: Dict[str, Any]) -> Dict[str, Any]:
+    groups = dict(group_scores or {})
+    groups.setdefault("flow", float((vfi_scores.get("long",0.0) - vfi_scores.get("short",0.0)) / 100.0))
+    groups.setdefault("trend", 0.0)
+    groups.setdefault("momentum", 0.0)
+    groups.setdefault("mean", 0.0)
+    return groups
+
+def _num(v) -> float:
+    try:
+        return float(v)
+    except Exception:
+        return 0.0   # nhóm không ra số -> cộng 0 (bỏ qua trong tổng có trọng số)
+
+class _Col:
+    """A Series/ColView as its ndarray (no copy, no .iloc per read); other values go through last_value/value_ago."""
+    __slots__ = ("x", "a")
+
+    def __init__(self, x):
+        self.x = x
+        v = getattr(x, "values", None) if hasattr(x, "iloc") else None
+        self.a = v if isinstance(v, np.ndarray) and v.ndim == 1 else None
+
+def _last_v(c: _Col, default=0.0) -> float:
+    a = c.a
+    if a is None:
+        return last_value(c.x, default)
+    try:
+        return float(a[-1])
+    except Exception:
+        return float(default)
+
+def _ago_v(c: _Col, bars: int, default=0.0) -> float:
+    a = c.a
+    if a is None:
+        return value_ago(c.x, bars, default)
+    try:
+        if bars <= 0:
+            return float(default)
+        idx = -1 - int(bars)
+        return float(a[idx] if abs(idx) <= len(a) else a[0])
+    except Exception:
+        return float(default)
+
+class VotePlan:
+    """
+    decide_side with its config resolved once: thresholds, group weights and
+    the enhance.* switches as floats. gather() reads only the per-symbol
+    values the enabled rules use (one last_value/value_ago each) into arrays; decide()
+    votes all symbols at once with the float operations of the per-symbol
+    vote it replaced in the same order, so sides and scores are identical
+    (tests/test_engine_vote.py keeps that version as reference). vote()
+    rebuilds the decide_side dict of one symbol (reason strings, details).
+    """
+    def __init__(self, cfg: Dict[str, Any]):
+        voter = _resolve(cfg, "voter")
+        self.long_thr  = float(voter.get("long_threshold", 0.02))
+        self.short_thr = float(voter.get("short_threshold", -0.02))
+        self.d1_cut    = float(voter.get("d1_contra_conf_cut", 0.30))
+        self.weights   = _resolve(cfg, "voting", "group_weights", default={"flow":0.2,"trend":0.35,"momentum":0.25,"mean":0.2})
+        self.w: List[Tuple[str, float]] = []
+        for k, w in (self.weights or {}).items():
+            try:
+                self.w.append((k, float(w)))
+            except Exception:
+                pass
+
+        enhance = _resolve(cfg, "enhance", default={})
+        ema = _resolve(enhance, "ema_slope", default={"enabled": False})
+        adx = _resolve(enhance, "adx_slope", default={"enabled": False})
+        early = _resolve(enhance, "early_anticipate", default={"enabled": False})
+        self.ema_on = bool(ema.get("enabled"))
+        if self.ema_on:
+            self.ema_lb    = int(ema.get("lookback", 3))
+            self.ema_bonus = float(ema.get("bonus", 0.02))
+            self.ema_pen   = float(ema.get("penalty", -0.02))
+            mb = ema.get("min_bbw", 0.10)
+            try:
+                self.ema_min_bbw = None if mb is None else float(mb)
+            except Exception:   # min_bbw không ra số -> ema slope luôn 0
+                self.ema_on = False
+        self.adx_on = bool(adx.get("enabled"))
+        if self.adx_on:
+            self.adx_lb    = int(adx.get("lookback", 3))
+            self.adx_delta = float(adx.get("delta", 5))
+            self.adx_bonus = float(adx.get("bonus", 0.02))
+            self.adx_vfi   = bool(adx.get("need_vfi_delta_pos", True))
+        self.early_on = bool(early.get("enabled"))
+        if self.early_on:
+            self.early_min   = float(early.get("min_vfi", 55))
+            self.early_bonus = float(early.get("bonus", 0.04))
+
+    def keys(self) -> Dict[str, Set[str]]:
+        """Indicator keys gather() reads per timeframe (data.warmup sizes the windows from these)."""
+        out: Dict[str, Set[str]] = {tf: set(_ALIGN) for tf in ("H1", "H4", "D1")}
+        out["H1"].add("adx")
+        if self.ema_on and self.ema_min_bbw is not None:
+            out["H1"].add("bbw")
+        if self.adx_on and self.adx_vfi:
+            out["M15"] = {"close"}
+        return out
+
+    def gather(self, indicators: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+        """Struct-of-arrays of the per-symbol inputs (defaults as in decide_side)."""
+        n = len(indicators)
+        cols: Dict[str, np.ndarray] = {}
+        def col(k):
+            a = cols.get(k)
+            if a is None:
+                a = cols[k] = np.empty(n)
+            return a
+        for i, ind in enumerate(indicators):
+            H1, H4, D1 = ind.get("H1", {}), ind.get("H4", {}), ind.get("D1", {})
+            for tf, t in (("h1", H1), ("h4", H4), ("d1", D1)):
+                for k in _ALIGN:
+                    col(f"{tf}_{k}")[i] = _last_v(_Col(t.get(k)))
+            h1_adx = _Col(H1.get("adx"))
+            col("h1_adx")[i] = _last_v(h1_adx)
+            if self.ema_on:
+                if self.ema_min_bbw is not None:
+                    col("h1_bbw")[i] = _last_v(_Col(H1.get("bbw")))
+                col("h1_ema21_ago")[i] = _ago_v(_Col(H1.get("ema21")), self.ema_lb, 0.0)
+                col("h4_ema21_ago")[i] = _ago_v(_Col(H4.get("ema21")), self.ema_lb, 0.0)
+            if self.adx_on:
+                col("h1_adx_ago")[i] = _ago_v(h1_adx, self.adx_lb, 0.0)
+                if self.adx_vfi:
+                    m15_close = _Col(ind.get("M15", {}).get("close"))
+                    col("m15_close")[i] = _last_v(m15_close)
+                    col("m15_close_p1")[i] = _ago_v(m15_close, 1, 0.0)
+            if self.early_on:
+                col("h1_ema21_p1")[i] = _ago_v(_Col(H1.get("ema21")), 1, cols["h1_ema21"][i])
+                col("h1_ema50_p1")[i] = _ago_v(_Col(H1.get("ema50")), 1, cols["h1_ema50"][i])
+        return cols
+
+    def _ema_slope(self, cur, prev, bbw) -> np.ndarray:
+        slope = cur - prev
+        out = np.where(slope > 0, self.ema_bonus, np.where(slope < 0, self.ema_pen, 0.0))
+        return out if bbw is None else np.where(bbw < self.ema_min_bbw, 0.0, out)
+
+    def decide(self, X: Dict[str, np.ndarray], vfi_long, vfi_short, groups: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """
+        Vote over arrays: X from gather(), vfi_long/vfi_short scores, groups
+        {name: array} (flow/trend/momentum/mean already filled). Returns side
+        (int8 index into SIDES), score, reasons (R_* bits) and the detail terms.
+        """
+        vl, vs = np.asarray(vfi_long, dtype=np.float64), np.asarray(vfi_short, dtype=np.float64)
+        n = len(vl)
+        def align(tf):   # EMA xếp tầng close/21/50/200 -> ±0.06
+            c, a, b, d = (X[f"{tf}_{k}"] for k in _ALIGN)
+            return np.where((c > a) & (a > b) & (b > d), 0.06, np.where((c < a) & (a < b) & (b < d), -0.06, 0.0))
+        adx = X["h1_adx"]
+        trend = 0.0 + align("h1")
+        trend = trend + align("h4") * 0.5
+        trend = trend + np.where(adx >= 25, 0.02, np.where(adx <= 12, -0.01, 0.0))
+        d1 = align("d1")
+        zero = np.zeros(n)
+        reasons = np.zeros(n, dtype=np.uint8)
+
+        slope = zero
+        if self.ema_on:
+            bbw = X.get("h1_bbw")   # H4 cũng xét theo bbw H1 (như decide_side)
+            slope = 0.0 + self._ema_slope(X["h1_ema21"], X["h1_ema21_ago"], bbw)
+            slope = slope + 0.5 * self._ema_slope(X["h4_ema21"], X["h4_ema21_ago"], bbw)
+            reasons |= np.where(slope != 0.0, R_EMA_SLOPE, 0).astype(np.uint8)
+        adx_b = zero
+        if self.adx_on:
+            ok = (adx - X["h1_adx_ago"]) >= self.adx_delta
+            if self.adx_vfi:
+                ok &= ~((X["m15_close"] - X["m15_close_p1"]) <= 0)
+            adx_b = 0.0 + np.where(ok, self.adx_bonus, 0.0)
+            reasons |= np.where(adx_b != 0.0, R_ADX_SLOPE, 0).astype(np.uint8)
+        early = zero
+        if self.early_on:
+            e21, e50, p21, p50 = X["h1_ema21"], X["h1_ema50"], X["h1_ema21_p1"], X["h1_ema50_p1"]
+            cross = ((p21 <= p50) & (e21 > e50)) | ((p21 >= p50) & (e21 < e50))
+            best = np.where(vs > vl, vs, vl)   # max(long, short) của Python
+            hit = (best >= self.early_min) & cross
+            early = np.where(hit, self.early_bonus, 0.0)
+            reasons |= np.where(hit, R_EARLY, 0).astype(np.uint8)
+
+        total = zero + 0.0
+        for k, w in self.w:
+            g = groups.get(k)
+            total = total + (zero if g is None else np.asarray(g, dtype=np.float64)) * w
+        score = total + trend + slope + adx_b + early
+        side = np.where(score >= self.long_thr, 1, np.where(score <= self.short_thr, 2,
+                        np.where(np.abs(score) < 0.01, 3, 0))).astype(np.int8)
+        cut = d1 * score < 0
+        score = np.where(cut, score * max(0.0, 1.0 - self.d1_cut), score)
+        reasons |= np.where(cut, R_D1_CUT, 0).astype(np.uint8)
+        score = np.where(score > 1.0, 1.0, np.where(score < -1.0, -1.0, score))
+        return {"side": side, "score": score, "reasons": reasons, "trend_bias": trend, "slope_bonus": slope,
+                "adx_slope_bonus": adx_b, "early_bonus": early, "d1_align": d1}
+
+    def vote(self, out: Dict[str, np.ndarray], i: int, groups: Dict[str, Any]) -> Dict[str, Any]:
+        """decide_side result of row i of decide()."""
+        r = int(out["reasons"][i])
+        slope, adx_b = float(out["slope_bonus"][i]), float(out["adx_slope_bonus"][i])
+        reasons = []
+        if r & R_EMA_SLOPE: reasons.append(f"ema_slope:{slope:+.2f}")
+        if r & R_ADX_SLOPE: reasons.append(f"adx_slope:{adx_b:+.2f}")
+        if r & R_EARLY:     reasons.append("early_anticipate")
+        if r & R_D1_CUT:    reasons.append("d1_contra_cut")
+        details = {
+            "trend_bias": round(float(out["trend_bias"][i]), 4),
+            "slope_bonus": round(slope, 4),
+            "adx_slope_bonus": round(adx_b, 4),
+            "early_bonus": round(float(out["early_bonus"][i]), 4),
+            "weights": self.weights,
+            "groups": {k: round(float(v),4) for k,v in groups.items()},
+            "d1_align": round(float(out["d1_align"][i]), 4)
+        }
+        return {"side": SIDES[int(out["side"][i])], "score": float(out["score"][i]), "reasons": reasons, "details": details}
+
+_PLANS: "OrderedDict[str, VotePlan]" = OrderedDict()
+
+def _plan_key(cfg: Dict[str, Any]) -> str:
+    # nội dung các mục VotePlan đọc (không theo id(cfg): config sửa tại chỗ / id bị dùng lại)
+    sec = {k: (cfg or {}).get(k) for k in ("voter", "voting", "enhance")}
+    return hashlib.blake2b(json.dumps(sec, sort_keys=True, default=str).encode(), digest_size=8).hexdigest()
+
+def vote_plan(cfg: Dict[str, Any]) -> VotePlan:
+    """
+    VotePlan for a config, compiled on first use and kept for the most recent
+    configs, keyed by the content of its voter / voting / enhance sections
+    (a config edited in place gets a new plan).
+    """
+    key = _plan_key(cfg)
+    plan = _PLANS.get(key)
+    if plan is not None:
+        _PLANS.move_to_end(key)
+        return plan
+    plan = _PLANS[key] = VotePlan(cfg)
+    while len(_PLANS) > 8:
+        _PLANS.popitem(last=False)
+    return plan
+
+def decide_side_batch(indicators: List[Dict[str, Any]], cfg: Dict[str, Any], vfi_scores: List[Dict[str, Any]],
+                      group_scores: Optional[List[Dict[str, Any]]] = None) -> Tuple[Dict[str, np.ndarray], List[Dict[str, Any]]]:
+    """
+    decide_side for many symbols in one pass: (arrays from VotePlan.decide,
+    per-symbol groups with flow/trend/momentum/mean filled). VotePlan.vote
+    turns a row back into the decide_side dict.
+    """
+    plan = vote_plan(cfg)
+    vfi_scores = [v or {"long": 0.0, "short": 0.0} for v in vfi_scores]
+    groups = [_full_groups(g, v) for g, v in zip(group_scores or [None] * len(vfi_scores), vfi_scores)]
+    keys = {k for k, _ in plan.w}
+    G = {k: np.array([_num(g.get(k, 0.0)) for g in groups], dtype=np.float64) for k in keys}
+    out = plan.decide(plan.gather(indicators), [float(v.get("long", 0.0)) for v in vfi_scores],
+                      [float(v.get("short", 0.0)) for v in vfi_scores], G)
+    return out, groups
+
 def _ema_slope_score(ema, lookback: int, bonus: float, penalty: float, min_bbw: float, bbw) -> float:
     try:
-        if min_bbw is not None and _last(bbw, 0.0) < float(min_bbw):
+        if min_bbw is not None and last_value(bbw, 0.0) < float(min_bbw):
             return 0.0
-        cur = _last(ema, 0.0)
-        prev = _ago(ema, lookback, 0.0)
+        cur = last_value(ema, 0.0)
+        prev = value_ago(ema, lookback, 0.0)
         slope = cur - prev
         if slope > 0: return float(bonus)
         if slope < 0: return float(penalty)
@@ -46,13 +308,13 @@ def _ema_slope_score(ema, lookback: int, bonus: float, penalty: float, min_bbw:
 
 def _adx_slope_score(adx, lookback: int, delta_need: float, bonus: float, need_vfi_delta_pos: bool, vfi_long) -> float:
     try:
-        cur = _last(adx, 0.0)
-        prev = _ago(adx, lookback, 0.0)
+        cur = last_value(adx, 0.0)
+        prev = value_ago(adx, lookback, 0.0)
         delta = cur - prev
         if delta >= float(delta_need):
             if need_vfi_delta_pos:
-                vfi_now = _last(vfi_long, 0.0)
-                vfi_prev = _ago(vfi_long, 1, 0.0)
+                vfi_now = last_value(vfi_long, 0.0)
+                vfi_prev = value_ago(vfi_long, 1, 0.0)
                 if vfi_now - vfi_prev <= 0:
                     return 0.0
             return float(bonus)
@@ -60,8 +322,8 @@ def _adx_slope_score(adx, lookback: int, delta_need: float, bonus: float, need_v
     except Exception:
         return 0.0
 
-def _ema_align_bias(close, ema21, ema50, ema200) -> float:
-    c = _last(close); e21=_last(ema21); e50=_last(ema50); e200=_last(ema200)
+def _ema_align_bias(t: Dict[str, Any]) -> float:
+    c = last_value(t.get("close")); e21 = last_value(t.get("ema21")); e50 = last_value(t.get("ema50")); e200 = last_value(t.get("ema200"))
     if c>e21>e50>e200:  return 0.06
     if c<e21<e50<e200:  return -0.06
     return 0.0
@@ -89,27 +351,14 @@ def decide_side(ctx: Dict[str, Any]) -> Dict[str, Any]:
       - vfi_scores: {"long","short"}
     Return:
       {"side": "LONG|SHORT|NEUTRAL|FLAT", "score": float, "reasons": [...], "details": {...}}
+    Vote của một symbol, đọc đúng các indicator VotePlan.keys() khai báo; decide_side_batch
+    cho cùng kết quả trên nhiều symbol (tests/test_engine_vote.py).
     """
     indicators: Dict[str, Dict[str, Any]] = ctx.get("indicators") or {}
     cfg = ctx.get("config") or {}
     vfi_scores = ctx.get("vfi_scores") or {"long": 0.0, "short": 0.0}
-    groups = dict(ctx.get("group_scores") or {})
-
-    # --- lấy các series cần thiết ---
-    M15 = indicators.get("M15", {})
-    H1  = indicators.get("H1", {})
-    H4  = indicators.get("H4", {})
-    D1  = indicators.get("D1", {})
-
-    m15_close = M15.get("close"); m15_vwap = M15.get("vwap"); m15_atr = M15.get("atr"); m15_bbw = M15.get("bbw")
-    h1_adx = H1.get("adx"); h1_bbw = H1.get("bbw")
-    h1_close = H1.get("close"); h1_e21=H1.get("ema21"); h1_e50=H1.get("ema50"); h1_e200=H1.get("ema200")
-    h4_adx = H4.get("adx"); h4_close = H4.get("close"); h4_e21=H4.get("ema21"); h4_e50=H4.get("ema50"); h4_e200=H4.get("ema200")
-    d1_close = D1.get("close"); d1_e21=D1.get("ema21"); d1_e50=D1.get("ema50"); d1_e200=D1.get("ema200")
-
-    vfi_long = indicators.get("M15", {}).get("close")  # chỉ để lấy index length an toàn
-    # vfi_score đã có sẵn trong ctx['vfi_scores'], ta chỉ dùng vfi_long delta qua ctx['vfi_scores'] không đủ index
-    # nên để _adx_slope_score yêu cầu need_vfi_delta_pos=False nếu thiếu series.
+    H1, H4, D1 = indicators.get("H1", {}), indicators.get("H4", {}), indicators.get("D1", {})
+    h1_adx, h1_e21 = H1.get("adx"), H1.get("ema21")
 
     # --- cấu hình chung ---
     voter = _resolve(cfg, "voter")
@@ -122,22 +371,16 @@ def decide_side(ctx: Dict[str, Any]) -> Dict[str, Any]:
     enh_adx  = _resolve(enhance, "adx_slope", default={"enabled": False})
     enh_early= _resolve(enhance, "early_anticipate", default={"enabled": False})
 
-    # --- base group scores nếu thiếu ---
-    groups.setdefault("flow", float((vfi_scores.get("long",0.0) - vfi_scores.get("short",0.0)) / 100.0))
-    groups.setdefault("trend", 0.0)
-    groups.setdefault("momentum", 0.0)
-    groups.setdefault("mean", 0.0)
+    groups = _full_groups(ctx.get("group_scores"), vfi_scores)
 
     # --- macro bias H1/H4/D1 ---
     reasons = []
     trend_bias = 0.0
-    # EMA alignment
-    trend_bias += _ema_align_bias(h1_close, h1_e21, h1_e50, h1_e200)
-    trend_bias += _ema_align_bias(h4_close, h4_e21, h4_e50, h4_e200) * 0.5  # H4 ảnh hưởng nhẹ hơn
-    # ADX bias
-    trend_bias += _macro_adx_bias(_last(h1_adx, 0.0))
+    trend_bias += _ema_align_bias(H1)
+    trend_bias += _ema_align_bias(H4) * 0.5  # H4 ảnh hưởng nhẹ hơn
+    trend_bias += _macro_adx_bias(last_value(h1_adx, 0.0))
     # D1 nghịch pha cắt bớt độ tin cậy, áp dụng ở cuối (details)
-    d1_align = _ema_align_bias(d1_close, d1_e21, d1_e50, d1_e200)
+    d1_align = _ema_align_bias(D1)
 
     # --- EMA slope (H1/H4) ---
     slope_bonus = 0.0
@@ -146,8 +389,9 @@ def decide_side(ctx: Dict[str, Any]) -> Dict[str, Any]:
         bonus    = float(enh_ema.get("bonus", 0.02))
         penalty  = float(enh_ema.get("penalty", -0.02))
         min_bbw  = enh_ema.get("min_bbw", 0.10)
+        h1_bbw = H1.get("bbw") if min_bbw is not None else None
         slope_bonus += _ema_slope_score(h1_e21, lookback, bonus, penalty, min_bbw, h1_bbw)
-        slope_bonus += 0.5 * _ema_slope_score(h4_e21, lookback, bonus, penalty, min_bbw, h1_bbw)
+        slope_bonus += 0.5 * _ema_slope_score(H4.get("ema21"), lookback, bonus, penalty, min_bbw, h1_bbw)
         if slope_bonus != 0.0:
             reasons.append(f"ema_slope:{slope_bonus:+.2f}")
 
@@ -158,7 +402,7 @@ def decide_side(ctx: Dict[str, Any]) -> Dict[str, Any]:
         delta    = float(enh_adx.get("delta", 5))
         bonus    = float(enh_adx.get("bonus", 0.02))
         need_vfi_pos = bool(enh_adx.get("need_vfi_delta_pos", True))
-        # nếu không có vfi series đầy đủ thì bỏ điều kiện vfi delta
+        vfi_long = indicators.get("M15", {}).get("close") if need_vfi_pos else None
         adx_slope_bonus += _adx_slope_score(h1_adx, lookback, delta, bonus, need_vfi_pos, vfi_long)
         if adx_slope_bonus != 0.0:
             reasons.append(f"adx_slope:{adx_slope_bonus:+.2f}")
@@ -166,9 +410,9 @@ def decide_side(ctx: Dict[str, Any]) -> Dict[str, Any]:
     # --- Early anticipate (EMA21 cross EMA50 + VFI mạnh) ---
     early_bonus = 0.0
     if enh_early.get("enabled"):
-        # xác định cắt 21/50 gần đây trên H1
-        e21_now = _last(h1_e21, 0.0); e50_now = _last(h1_e50, 0.0)
-        e21_prev = _ago(h1_e21, 1, e21_now); e50_prev = _ago(h1_e50, 1, e50_now)
+        h1_e50 = H1.get("ema50")
+        e21_now = last_value(h1_e21, 0.0); e50_now = last_value(h1_e50, 0.0)
+        e21_prev = value_ago(h1_e21, 1, e21_now); e50_prev = value_ago(h1_e50, 1, e50_now)
         cross_up   = (e21_prev <= e50_prev) and (e21_now > e50_now)
         cross_down = (e21_prev >= e50_prev) and (e21_now < e50_now)
         min_vfi = float(enh_early.get("min_vfi", 55))
@@ -185,18 +429,15 @@ def decide_side(ctx: Dict[str, Any]) -> Dict[str, Any]:
     score = float(base_score)
     if score >= long_thr:   side = "LONG"
     elif score <= short_thr: side = "SHORT"
-    else:
-        # score nhỏ → sàn về FLAT để tránh nhiễu
-        if abs(score) < 0.01:
-            side = "FLAT"
+    elif abs(score) < 0.01:
+        side = "FLAT"   # score nhỏ → sàn về FLAT để tránh nhiễu
 
     # --- D1 nghịch pha → cắt bớt confidence ---
-    d1_cut = float(_resolve(cfg, "voter").get("d1_contra_conf_cut", 0.30))
+    d1_cut = float(voter.get("d1_contra_conf_cut", 0.30))
     if d1_align * score < 0:  # trái pha
         score *= max(0.0, 1.0 - d1_cut)
         reasons.append("d1_contra_cut")
 
-    # Giới hạn score bền vững
     if score > 1.0: score = 1.0
     if score < -1.0: score = -1.0
 
@@ -209,5 +450,4 @@ def decide_side(ctx: Dict[str, Any]) -> Dict[str, Any]:
         "groups": {k: round(float(v),4) for k,v in groups.items()},
         "d1_align": round(d1_align, 4)
     }
-
     return {"side": side, "score": float(score), "reasons": reasons, "details": details}
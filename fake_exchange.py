@@ -0,0 +1,713 @@
+# fake_exchange.py — local Binance-like exchange (REST server + in-process ccxt stand-in) for load/soak tests
+from __future__ import annotations
+import argparse, asyncio, json, random, threading, time, zlib
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from candles import TF_MS
+
+_MASK = (1 << 64) - 1
+
+def _splitmix(x: np.ndarray) -> np.ndarray:
+    x = (x + np.uint64(0x9E3779B97F4A7C15))
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+def _uniform(seed: int, ts: np.ndarray, k: int) -> np.ndarray:
+    """Deterministic U[0,1) per (seed, ts, k) — no state, any range can be regenerated."""
+    with np.errstate(over="ignore"):
+        x = _splitmix(ts.astype(np.uint64) ^ np.uint64((seed * 31 + k) & _MASK))
+    return (x >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+class SyntheticMarket:
+    """
+    Deterministic OHLCV generator: price is a smooth function of time (a few
+    sine cycles around a per-symbol base) plus per-bar noise, so any window of
+    any interval can be served without storing history.
+    """
+    def __init__(self, symbols: List[str], seed: int = 7):
+        self.symbols = [s.replace("/", "").split(":")[0].upper() for s in symbols]
+        self.seed = int(seed)
+        self._sym_seed = {s: zlib.crc32(f"{s}:{self.seed}".encode()) for s in self.symbols}
+
+    def _price(self, s: int, t: np.ndarray) -> np.ndarray:
+        base = 1.0 + (s % 50000) / 10.0
+        ph = (s % 997) / 997.0 * 2 * np.pi
+        tt = t.astype(np.float64)
+        lp = (0.05 * np.sin(2 * np.pi * tt / 2.592e8 + ph)
+              + 0.02 * np.sin(2 * np.pi * tt / 2.52e7 + 2 * ph)
+              + 0.004 * np.sin(2 * np.pi * tt / 3.0e6 + 3 * ph))
+        return base * np.exp(lp)
+
+    def klines(self, symbol: str, interval_ms: int, *, start: Optional[int], end: Optional[int],
+               limit: int, now_ms: Optional[int] = None) -> np.ndarray:
+        """(n, 6) float64 array [open_time, o, h, l, c, v]; the last bar may still be forming."""
+        s = self._sym_seed.get(symbol)
+        if s is None:
+            return np.empty((0, 6))
+        now_ms = int(now_ms if now_ms is not None else time.time() * 1000)
+        last_open = now_ms // interval_ms * interval_ms
+        if end is not None:
+            last_open = min(last_open, int(end) // interval_ms * interval_ms)
+        if start is not None:
+            first = -(-int(start) // interval_ms) * interval_ms
+            last_open = min(last_open, first + (limit - 1) * interval_ms)
+        else:
+            first = last_open - (limit - 1) * interval_ms
+        if last_open < first:
+            return np.empty((0, 6))
+        ts = np.arange(first, last_open + 1, interval_ms, dtype=np.int64)
+        t_close = np.minimum(ts + interval_ms, now_ms)
+        o = self._price(s, ts)
+        c = self._price(s, t_close)
+        mid = self._price(s, (ts + t_close) // 2)
+        u1, u2, u3 = _uniform(s, ts, 1), _uniform(s, ts, 2), _uniform(s, ts, 3)
+        h = np.maximum(np.maximum(o, c), mid) * (1 + 0.002 * u1)
+        l = np.minimum(np.minimum(o, c), mid) * (1 - 0.002 * u2)
+        frac = (t_close - ts) / float(interval_ms)
+        v = (50.0 + 450.0 * u3) * interval_ms / 60_000.0 * frac
+        return np.column_stack([ts.astype(np.float64), o, h, l, c, v])
+
+class SpotBasis:
+    """
+    Spot side of a market for FakeExchange.spot_twin(): the same bars with
+    prices scaled by a small per-bar basis (fixed by open time, so the forming
+    bar keeps its basis), enough for futures-minus-spot to have a spread.
+    """
+    def __init__(self, market, basis_bp: float = 5.0, seed: int = 11):
+        self.market = market
+        self.symbols = market.symbols
+        self.basis = float(basis_bp) * 1e-4
+        self.seed = int(seed)
+
+    def klines(self, symbol: str, interval_ms: int, *, start: Optional[int], end: Optional[int],
+               limit: int, now_ms: Optional[int] = None) -> np.ndarray:
+        arr = self.market.klines(symbol, interval_ms, start=start, end=end, limit=limit, now_ms=now_ms)
+        if len(arr):
+            u = _uniform(self.seed, arr[:, 0].astype(np.int64), 0)
+            arr = arr.copy()   # ReplayMarket trả view của mảng đã nạp
+            arr[:, 1:5] *= (1.0 - self.basis * (0.5 + u))[:, None]
+        return arr
+
+class ReplayMarket:
+    """
+    Serves recorded candles from a DiskCandleCache root (see candle_cache.py)
+    through the same klines() interface. Only bars closed at `now_ms` are
+    returned, so a VirtualClock walks through the recording.
+    """
+    def __init__(self, root: str = "candles"):
+        from candle_cache import DiskCandleCache
+        self.cache = DiskCandleCache(root)
+        self._series = {}
+        for sd, tf in self.cache.series():
+            self._series.setdefault(sd.replace("_", ""), {})[tf] = sd
+        self.symbols = sorted(self._series)
+        self._arr: Dict[tuple, np.ndarray] = {}
+
+    def _load(self, symbol: str, tf: str) -> Optional[np.ndarray]:
+        k = (symbol, tf)
+        if k not in self._arr:
+            sd = self._series.get(symbol, {}).get(tf)
+            if sd is None:
+                return None
+            rec = self.cache.read(sd, tf)
+            self._arr[k] = np.column_stack([rec[c].astype(np.float64) for c in rec.dtype.names])
+        return self._arr[k]
+
+    def span(self) -> tuple:
+        first, last = [], []
+        for sym, tfs in self._series.items():
+            for tf, sd in tfs.items():
+                a = self.cache.read(sd, tf)
+                if len(a):
+                    first.append(int(a["timestamp"][0])); last.append(int(a["timestamp"][-1]))
+        return (min(first), max(last)) if first else (None, None)
+
+    def klines(self, symbol: str, interval_ms: int, *, start: Optional[int], end: Optional[int],
+               limit: int, now_ms: Optional[int] = None) -> np.ndarray:
+        tf = next((k for k, v in TF_MS.items() if v == interval_ms), None)
+        arr = self._load(symbol, tf) if tf else None
+        if arr is None or not len(arr):
+            return np.empty((0, 6))
+        ts = arr[:, 0]
+        now_ms = int(now_ms if now_ms is not None else time.time() * 1000)
+        hi = int(np.searchsorted(ts, now_ms - interval_ms, side="right"))
+        if end is not None:
+            hi = min(hi, int(np.searchsorted(ts, end, side="right")))
+        if start is not None:
+            lo = int(np.searchsorted(ts, start, side="left"))
+            return arr[lo:min(hi, lo + limit)]
+        return arr[max(0, hi - limit):hi]
+
+class VirtualClock:
+    """Exchange time running `speed` times faster than wall time from `start_ms`."""
+    def __init__(self, speed: float = 1.0, start_ms: Optional[int] = None):
+        self.speed = float(speed)
+        self._real0 = time.time()
+        self.start_ms = int(start_ms if start_ms is not None else self._real0 * 1000)
+
+    def now_ms(self) -> int:
+        return int(self.start_ms + (time.time() - self._real0) * 1000.0 * self.speed)
+
+class FaultInjector:
+    """Per-request latency (+ uniform jitter) and random 429 / 5xx failures."""
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, rate_429: float = 0.0,
+                 error_rate: float = 0.0, seed: Optional[int] = None):
+        self.latency_ms, self.jitter_ms = float(latency_ms), float(jitter_ms)
+        self.rate_429, self.error_rate = float(rate_429), float(error_rate)
+        self._rng = random.Random(seed)
+        self.stats = {"requests": 0, "429": 0, "errors": 0}
+
+    def delay_sec(self) -> float:
+        d = self.latency_ms + (self._rng.random() * self.jitter_ms if self.jitter_ms else 0.0)
+        return max(0.0, d) / 1000.0
+
+    def roll(self) -> Optional[str]:
+        """None = serve normally, "429" = rate limited, "error" = server error."""
+        self.stats["requests"] += 1
+        u = self._rng.random()
+        if u < self.rate_429:
+            self.stats["429"] += 1
+            return "429"
+        if u < self.rate_429 + self.error_rate:
+            self.stats["errors"] += 1
+            return "error"
+        return None
+
+def _market_info(sym: str, futures: bool) -> Dict[str, Any]:
+    base, quote = sym[:-4], sym[-4:]
+    info = {
+        "symbol": sym, "status": "TRADING", "baseAsset": base, "quoteAsset": quote,
+        "baseAssetPrecision": 8, "quotePrecision": 8, "orderTypes": ["LIMIT", "MARKET"],
+        "filters": [
+            {"filterType": "PRICE_FILTER", "minPrice": "0.0001", "maxPrice": "1000000", "tickSize": "0.0001"},
+            {"filterType": "LOT_SIZE", "minQty": "0.001", "maxQty": "1000000", "stepSize": "0.001"},
+        ],
+    }
+    if futures:
+        info.update({"pair": sym, "contractType": "PERPETUAL", "deliveryDate": 4133404800000,
+                     "onboardDate": 1569398400000, "marginAsset": quote, "pricePrecision": 4,
+                     "quantityPrecision": 3, "underlyingType": "COIN", "timeInForce": ["GTC"]})
+    else:
+        info.update({"isSpotTradingAllowed": True, "isMarginTradingAllowed": False,
+                     "permissions": ["SPOT"], "permissionSets": [["SPOT"]]})
+    return info
+
+class FakeBinanceServer:
+    """
+    aiohttp app exposing the public Binance endpoints ccxt needs for
+    load_markets/fetch_ohlcv (spot /api/v3, USD-M /fapi/v1, empty /dapi/v1),
+    plus a combined kline websocket on /stream (stream.url "ws://host:port/stream").
+    Point a client at it with config exchange.base_url.
+    """
+    def __init__(self, market, host: str = "127.0.0.1", port: int = 8765,
+                 latency_ms: float = 0.0, jitter_ms: float = 0.0, ws_tick_ms: int = 1000,
+                 faults: Optional[FaultInjector] = None, clock: Optional[VirtualClock] = None):
+        self.market = market
+        self.host, self.port = host, int(port)
+        self.faults = faults or FaultInjector(latency_ms, jitter_ms)
+        self.clock = clock or VirtualClock()
+        self.ws_tick_ms = int(ws_tick_ms)
+        self._runner = None
+
+    @property
+    def requests(self) -> int:
+        return self.faults.stats["requests"]
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def _fault(self):
+        """Apply injected latency; returns an error response to send instead, or None."""
+        from aiohttp import web
+        d = self.faults.delay_sec()
+        if d > 0:
+            await asyncio.sleep(d)
+        kind = self.faults.roll()
+        if kind == "429":
+            return web.json_response({"code": -1003, "msg": "Too many requests; fake rate limit."},
+                                     status=429, headers={"Retry-After": "1"})
+        if kind == "error":
+            return web.json_response({"code": -1001, "msg": "Internal error; fake fault."}, status=503)
+        return None
+
+    def _app(self):
+        from aiohttp import web
+
+        def exchange_info(futures: bool, empty: bool = False):
+            async def handler(request):
+                err = await self._fault()
+                if err is not None:
+                    return err
+                syms = [] if empty else [_market_info(s, futures) for s in self.market.symbols]
+                return web.json_response({"timezone": "UTC", "serverTime": self.clock.now_ms(),
+                                          "rateLimits": [], "exchangeFilters": [], "symbols": syms})
+            return handler
+
+        def klines(max_limit: int):
+            async def handler(request):
+                err = await self._fault()
+                if err is not None:
+                    return err
+                q = request.query
+                iv = TF_MS.get(q.get("interval", ""))
+                if iv is None:
+                    return web.json_response({"code": -1120, "msg": "Invalid interval."}, status=400)
+                lim = max(1, min(int(q.get("limit", 500)), max_limit))
+                start = int(q["startTime"]) if "startTime" in q else None
+                end = int(q["endTime"]) if "endTime" in q else None
+                arr = self.market.klines(q.get("symbol", ""), iv, start=start, end=end, limit=lim,
+                                         now_ms=self.clock.now_ms())
+                rows = [[int(r[0]), repr(r[1]), repr(r[2]), repr(r[3]), repr(r[4]), repr(r[5]),
+                         int(r[0]) + iv - 1, repr(r[4] * r[5]), 100, "0", "0", "0"] for r in arr.tolist()]
+                return web.Response(text=json.dumps(rows), content_type="application/json")
+            return handler
+
+        def kline_frame(sid: str, iv: str, ms: int, bar, closed: bool, now: int) -> str:
+            bar = [float(x) for x in bar]
+            t = int(bar[0])
+            return json.dumps({"stream": f"{sid.lower()}@kline_{iv}", "data": {
+                "e": "kline", "E": now, "s": sid, "k": {
+                    "t": t, "T": t + ms - 1, "s": sid, "i": iv, "o": repr(bar[1]), "h": repr(bar[2]),
+                    "l": repr(bar[3]), "c": repr(bar[4]), "v": repr(bar[5]), "x": closed}}})
+
+        async def ws_stream(request):
+            ws = web.WebSocketResponse(heartbeat=20)
+            await ws.prepare(request)
+            subs = []
+            for name in request.query.get("streams", "").split("/"):
+                sid, _, iv = name.partition("@kline_")
+                if iv in TF_MS:
+                    subs.append((sid.upper(), iv, TF_MS[iv]))
+            last_open: Dict[tuple, int] = {}
+
+            async def drain():   # đọc frame close của client, không thì ws.closed không bao giờ đổi
+                async for _ in ws:
+                    pass
+            reader = asyncio.create_task(drain())
+            try:
+                while not ws.closed:
+                    now = self.clock.now_ms()
+                    for sid, iv, ms in subs:
+                        cur = now // ms * ms
+                        prev = last_open.get((sid, iv))
+                        if prev is not None and cur > prev:   # bar vừa đóng -> gửi bản chốt x=true
+                            bar = self.market.klines(sid, ms, start=prev, end=prev, limit=1, now_ms=prev + ms)
+                            if len(bar):
+                                await ws.send_str(kline_frame(sid, iv, ms, bar[0], True, now))
+                        last_open[(sid, iv)] = cur
+                        bar = self.market.klines(sid, ms, start=cur, end=cur, limit=1, now_ms=now)
+                        if len(bar):
+                            await ws.send_str(kline_frame(sid, iv, ms, bar[0], False, now))
+                    await asyncio.sleep(self.ws_tick_ms / 1000.0)
+            except (ConnectionResetError, RuntimeError):
+                pass   # client đã ngắt
+            finally:
+                reader.cancel()
+            return ws
+
+        async def server_time(request):
+            err = await self._fault()
+            if err is not None:
+                return err
+            return web.json_response({"serverTime": self.clock.now_ms()})
+
+        app = web.Application()
+        app.router.add_get("/api/v3/exchangeInfo", exchange_info(False))
+        app.router.add_get("/fapi/v1/exchangeInfo", exchange_info(True))
+        app.router.add_get("/dapi/v1/exchangeInfo", exchange_info(True, empty=True))
+        app.router.add_get("/api/v3/klines", klines(1000))
+        app.router.add_get("/fapi/v1/klines", klines(1500))
+        app.router.add_get("/api/v3/time", server_time)
+        app.router.add_get("/fapi/v1/time", server_time)
+        app.router.add_get("/stream", ws_stream)
+        return app
+
+    async def start(self) -> None:
+        from aiohttp import web
+        self._runner = web.AppRunner(self._app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def start_in_thread(self) -> threading.Thread:
+        """Run the server on its own event loop so it does not share the client's loop."""
+        ready = threading.Event()
+
+        def _run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(self.start())
+            ready.set()
+            loop.run_forever()
+
+        th = threading.Thread(target=_run, name="fake-exchange", daemon=True)
+        th.start()
+        ready.wait(10)
+        return th
+
+class FakeExchange:
+    """
+    In-process stand-in for the async ccxt binance client: the subset DataFeed
+    and the engine touch (load_markets, fetch_ohlcv with since/limit,
+    fetch_ticker(s), paper create_order/fetch_balance, close). Exchange time
+    comes from a VirtualClock and is published via options["timeDifference"]
+    so DataFeed sees the virtual "now". Injected faults raise the ccxt error
+    types the real client would (RateLimitExceeded / ExchangeNotAvailable).
+    """
+    id = "fake"
+
+    def __init__(self, market, *, clock: Optional[VirtualClock] = None, faults: Optional[FaultInjector] = None,
+                 futures: bool = True, balance: float = 10_000.0):
+        self.market = market
+        self.clock = clock or VirtualClock()
+        self.faults = faults or FaultInjector()
+        self.futures = bool(futures)
+        self.options: Dict[str, Any] = {"defaultType": "future" if futures else "spot", "timeDifference": 0}
+        self.markets: Dict[str, Dict[str, Any]] = {}
+        self.symbols: List[str] = []
+        self.orders: List[Dict[str, Any]] = []
+        self.balance = {"USDT": float(balance)}
+        self.calls: Dict[str, int] = {}
+
+    @staticmethod
+    def market_id(symbol: str) -> str:
+        return symbol.replace("/", "").split(":")[0].upper()
+
+    def spot_twin(self, basis_bp: float = 5.0) -> "FakeExchange":
+        """Spot client over the same market, clock and faults (data.spot_twin), prices offset by SpotBasis."""
+        tw = type(self)(SpotBasis(self.market, basis_bp), clock=self.clock, faults=self.faults, futures=False)
+        tw._load_markets()
+        return tw
+
+    def _enter(self, method: str) -> float:
+        self.calls[method] = self.calls.get(method, 0) + 1
+        self.options["timeDifference"] = int(time.time() * 1000) - self.clock.now_ms()
+        return self.faults.delay_sec()
+
+    def _check(self) -> None:
+        import ccxt
+        kind = self.faults.roll()
+        if kind == "429":
+            raise ccxt.RateLimitExceeded("fake 429 Too many requests")
+        if kind == "error":
+            raise ccxt.ExchangeNotAvailable("fake 503 Internal error")
+
+    def _load_markets(self) -> Dict[str, Dict[str, Any]]:
+        out = {}
+        for sid in self.market.symbols:
+            base, quote = sid[:-4], sid[-4:]
+            sym = f"{base}/{quote}:{quote}" if self.futures else f"{base}/{quote}"
+            out[sym] = {"id": sid, "symbol": sym, "base": base, "quote": quote, "active": True,
+                        "type": "swap" if self.futures else "spot", "spot": not self.futures,
+                        "swap": self.futures, "contract": self.futures, "linear": self.futures or None,
+                        "precision": {"price": 0.0001, "amount": 0.001},
+                        "limits": {"amount": {"min": 0.001}, "cost": {"min": 5.0}}}
+        self.markets = out
+        self.symbols = list(out)
+        return out
+
+    def _ohlcv(self, symbol: str, timeframe: str, since: Optional[int], limit: Optional[int]) -> List[list]:
+        iv = TF_MS.get(timeframe)
+        if iv is None:
+            import ccxt
+            raise ccxt.BadRequest(f"fake: unsupported timeframe {timeframe}")
+        lim = max(1, min(int(limit or 500), 1500 if self.futures else 1000))
+        arr = self.market.klines(self.market_id(symbol), iv, start=since, end=None, limit=lim,
+                                 now_ms=self.clock.now_ms())
+        return [[int(r[0]), r[1], r[2], r[3], r[4], r[5]] for r in arr.tolist()]
+
+    def _ticker(self, symbol: str) -> Dict[str, Any]:
+        now = self.clock.now_ms()
+        sid = self.market_id(symbol)
+        arr = np.empty((0, 6))
+        for iv in (3_600_000, 900_000, 300_000, 60_000):   # 24h window từ TF sẵn có
+            arr = self.market.klines(sid, iv, start=now - 86_400_000, end=None,
+                                     limit=86_400_000 // iv + 1, now_ms=now)
+            if len(arr):
+                break
+        if not len(arr):
+            import ccxt
+            raise ccxt.BadSymbol(f"fake: no data for {symbol}")
+        last, first = float(arr[-1, 4]), float(arr[0, 1])
+        return {"symbol": symbol, "timestamp": now, "datetime": None, "open": first,
+                "high": float(arr[:, 2].max()), "low": float(arr[:, 3].min()), "last": last, "close": last,
+                "bid": last * 0.9999, "ask": last * 1.0001, "change": last - first,
+                "percentage": (last / first - 1.0) * 100 if first else None,
+                "baseVolume": float(arr[:, 5].sum()), "quoteVolume": float((arr[:, 4] * arr[:, 5]).sum()),
+                "info": {}}
+
+    def _order(self, symbol: str, type: str, side: str, amount: float, price: Optional[float]) -> Dict[str, Any]:
+        px = float(price) if (price is not None and type == "limit") else self._ticker(symbol)["last"]
+        cost = px * float(amount)
+        self.balance["USDT"] -= cost if side == "buy" else -cost
+        o = {"id": str(len(self.orders) + 1), "symbol": symbol, "type": type, "side": side,
+             "amount": float(amount), "filled": float(amount), "remaining": 0.0, "price": px,
+             "average": px, "cost": cost, "status": "closed", "timestamp": self.clock.now_ms(), "info": {}}
+        self.orders.append(o)
+        return o
+
+    def _balance(self) -> Dict[str, Any]:
+        usdt = self.balance["USDT"]
+        return {"USDT": {"free": usdt, "used": 0.0, "total": usdt},
+                "free": {"USDT": usdt}, "used": {"USDT": 0.0}, "total": {"USDT": usdt}, "info": {}}
+
+    async def _call(self, method: str, fn, *a):
+        d = self._enter(method)
+        if d > 0:
+            await asyncio.sleep(d)
+        self._check()
+        return fn(*a)
+
+    async def load_markets(self, reload: bool = False, params: Optional[dict] = None):
+        if self.markets and not reload:
+            return self.markets
+        return await self._call("load_markets", self._load_markets)
+
+    async def fetch_ohlcv(self, symbol: str, timeframe: str = "1m", since: Optional[int] = None,
+                          limit: Optional[int] = None, params: Optional[dict] = None) -> List[list]:
+        return await self._call("fetch_ohlcv", self._ohlcv, symbol, timeframe, since, limit)
+
+    async def fetch_ticker(self, symbol: str, params: Optional[dict] = None) -> Dict[str, Any]:
+        return await self._call("fetch_ticker", self._ticker, symbol)
+
+    async def fetch_tickers(self, symbols: Optional[List[str]] = None, params: Optional[dict] = None):
+        syms = symbols or self.symbols
+        return await self._call("fetch_tickers", lambda: {s: self._ticker(s) for s in syms})
+
+    async def create_order(self, symbol: str, type: str, side: str, amount: float,
+                           price: Optional[float] = None, params: Optional[dict] = None) -> Dict[str, Any]:
+        return await self._call("create_order", self._order, symbol, type, side, amount, price)
+
+    async def fetch_balance(self, params: Optional[dict] = None) -> Dict[str, Any]:
+        return await self._call("fetch_balance", self._balance)
+
+    async def close(self) -> None:
+        return None
+
+class FakeExchangeSync(FakeExchange):
+    """Blocking flavour (same surface as ccxt.binance); DataFeed runs it via to_thread."""
+    def _call(self, method: str, fn, *a):
+        d = self._enter(method)
+        if d > 0:
+            time.sleep(d)
+        self._check()
+        return fn(*a)
+
+    def load_markets(self, reload: bool = False, params: Optional[dict] = None):
+        if self.markets and not reload:
+            return self.markets
+        return self._call("load_markets", self._load_markets)
+
+    def fetch_ohlcv(self, symbol, timeframe="1m", since=None, limit=None, params=None):
+        return self._call("fetch_ohlcv", self._ohlcv, symbol, timeframe, since, limit)
+
+    def fetch_ticker(self, symbol, params=None):
+        return self._call("fetch_ticker", self._ticker, symbol)
+
+    def fetch_tickers(self, symbols=None, params=None):
+        syms = symbols or self.symbols
+        return self._call("fetch_tickers", lambda: {s: self._ticker(s) for s in syms})
+
+    def create_order(self, symbol, type, side, amount, price=None, params=None):
+        return self._call("create_order", self._order, symbol, type, side, amount, price)
+
+    def fetch_balance(self, params=None):
+        return self._call("fetch_balance", self._balance)
+
+    def close(self) -> None:
+        return None
+
+def build_fake_exchange(cfg: dict):
+    """
+    exchange.name == "fake": in-process exchange from exchange.fake
+      {symbols, seed, replay_root, start_ms, speed, latency_ms, jitter_ms, rate_429, error_rate}.
+    Synthetic candles for cfg["symbols"] (or N generated symbols) unless replay_root points
+    at a candle cache. exchange.backend picks the async (default) or sync flavour.
+    """
+    ex_cfg = cfg.get("exchange", {}) or {}
+    fc = ex_cfg.get("fake", {}) or {}
+    start_ms = fc.get("start_ms")
+    if fc.get("replay_root"):
+        market = ReplayMarket(fc["replay_root"])
+        if start_ms is None:
+            first, _ = market.span()
+            start_ms = None if first is None else first + int(fc.get("warmup_days", 3)) * 86_400_000
+    else:
+        syms = fc.get("symbols", cfg.get("symbols") or 50)
+        market = SyntheticMarket(_default_symbols(syms) if isinstance(syms, int) else syms, seed=int(fc.get("seed", 7)))
+    clock = VirtualClock(float(fc.get("speed", 1.0)), start_ms)
+    faults = FaultInjector(fc.get("latency_ms", 0.0), fc.get("jitter_ms", 0.0), fc.get("rate_429", 0.0),
+                           fc.get("error_rate", 0.0), seed=fc.get("fault_seed"))
+    futures = str(ex_cfg.get("market", "FUTURES")).upper() == "FUTURES"
+    cls = FakeExchangeSync if str(ex_cfg.get("backend", "async")).lower() == "sync" else FakeExchange
+    ex = cls(market, clock=clock, faults=faults, futures=futures)
+    if cls is FakeExchangeSync:
+        ex.load_markets()
+    return ex
+
+def _default_symbols(n: int) -> List[str]:
+    out = ["BTC/USDT", "ETH/USDT", "BNB/USDT", "SOL/USDT", "XRP/USDT"]
+    out += [f"F{i:03d}/USDT" for i in range(max(0, n - len(out)))]
+    return out[:n]
+
+async def _bench(args) -> Dict[str, Any]:
+    from data import build_exchange, open_exchange, close_exchange, fetch_ohlcv
+    cfg = {"exchange": {"market": args.market, "backend": args.backend, "base_url": args.url,
+                        "pool_size": args.concurrency}}
+    ex = build_exchange(cfg)
+    await open_exchange(ex, cfg)
+    symbols = [m for m in ex.symbols if (":" in m) == (args.market.upper() == "FUTURES")][:args.symbols]
+    sem = asyncio.Semaphore(args.concurrency)
+    lat: List[float] = []
+    errors = 0
+
+    async def one(i: int):
+        nonlocal errors
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                await fetch_ohlcv(ex, symbols[i % len(symbols)], args.tf, since=None, limit=args.limit)
+                lat.append(time.perf_counter() - t0)
+            except Exception:
+                errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(args.requests)])
+    wall = time.perf_counter() - t0
+    await close_exchange(ex)
+    lat.sort()
+    pick = lambda q: round(1000 * lat[min(len(lat) - 1, int(q * len(lat)))], 2) if lat else None
+    return {"backend": args.backend, "requests": args.requests, "concurrency": args.concurrency,
+            "errors": errors, "wall_sec": round(wall, 3), "req_per_sec": round(len(lat) / wall, 1) if wall else None,
+            "p50_ms": pick(0.5), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+class _SoakLog:
+    """Engine/DataFeed logger surface that only counts (500 symbols x faults would flood stdout)."""
+    def __init__(self):
+        self.counts = {"info": 0, "warn": 0, "error": 0, "trade_events": 0}
+        self.last_error: Optional[str] = None
+    def info(self, msg: str): self.counts["info"] += 1
+    def warn(self, msg: str): self.counts["warn"] += 1
+    def error(self, msg: str):
+        self.counts["error"] += 1
+        self.last_error = str(msg).splitlines()[0][:200]
+    def log_vote_snapshot(self, snap: dict): pass
+    def log_trade_event(self, ctx, event: str = "", pos=None, reason: str = ""): self.counts["trade_events"] += 1
+
+async def _soak(args) -> Dict[str, Any]:
+    """Full engine (DataFeed -> indicators -> vote -> OrderManager) against FakeExchange."""
+    from data import build_exchange, build_spot_exchange, open_exchange, close_exchange, DataFeed
+    from engine_flow import engine_loop, indicator_metrics
+    cfg: Dict[str, Any] = {}
+    if args.config:
+        with open(args.config, "r", encoding="utf-8") as f:
+            cfg = json.load(f)
+    symbols = _default_symbols(args.symbols)
+    cfg["symbols"] = symbols
+    cfg["exchange"] = {**(cfg.get("exchange") or {}), "name": "fake", "backend": args.backend, "market": "FUTURES",
+                       "fake": {"symbols": symbols, "speed": args.speed, "latency_ms": args.latency_ms,
+                                "jitter_ms": args.jitter_ms, "rate_429": args.rate_429,
+                                "error_rate": args.error_rate, "fault_seed": 1, "replay_root": args.replay}}
+    if args.replay:
+        cfg["exchange"]["fake"].pop("symbols")
+    if args.weight_per_min:
+        cfg.setdefault("data", {}).setdefault("scheduler", {})["weight_per_min"] = args.weight_per_min
+    ex = build_exchange(cfg)
+    await open_exchange(ex, cfg)
+    if args.replay:
+        symbols = cfg["symbols"] = [s.split(":")[0] for s in ex.symbols][:args.symbols]
+    log = _SoakLog()
+    spot = build_spot_exchange(cfg, ex) if ((cfg.get("data") or {}).get("spot_twin") or {}).get("enabled") else None
+    feed = DataFeed(ex, cfg, logger=log, spot_exchange=spot)
+    state: Dict[str, Any] = {"engine_logger": log}
+    walls: List[float] = []
+    for i in range(args.cycles):
+        t0 = time.perf_counter()
+        res = await engine_loop(symbols, feed, cfg, state)
+        wall = time.perf_counter() - t0
+        walls.append(wall)
+        st: Dict[str, int] = {}
+        lat = sorted(float(r.get("latency_sec", 0.0)) for r in res if isinstance(r, dict))
+        for r in res:
+            k = r.get("status", "?") if isinstance(r, dict) else "EXC"
+            st[k] = st.get(k, 0) + 1
+        print(json.dumps({"cycle": i + 1, "wall_sec": round(wall, 3), "sym_per_sec": round(len(symbols) / wall, 1),
+                          "status": st, "p95_symbol_sec": lat[int(0.95 * (len(lat) - 1))] if lat else None,
+                          "requests": ex.faults.stats["requests"]}), flush=True)
+        if args.interval > 0:
+            await asyncio.sleep(max(0.0, args.interval - wall))
+    await close_exchange(ex)
+    w = sorted(walls)
+    return {"summary": True, "backend": args.backend, "symbols": len(symbols), "cycles": len(walls),
+            "wall_p50_sec": round(w[len(w) // 2], 3), "wall_max_sec": round(w[-1], 3),
+            "sym_per_sec_p50": round(len(symbols) / w[len(w) // 2], 1),
+            "faults": ex.faults.stats, "calls": ex.calls, "data": feed.metrics(),
+            "indicators": indicator_metrics(), "log": log.counts, "last_error": log.last_error}
+
+def main():
+    p = argparse.ArgumentParser(description="Local fake Binance exchange: REST server, fetch load test, engine soak")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    ps = sub.add_parser("serve")
+    pb = sub.add_parser("bench")
+    pk = sub.add_parser("soak", help="run engine_loop cycles in-process against FakeExchange")
+    for sp in (ps, pb, pk):
+        sp.add_argument("--symbols", type=int, default=50)
+        sp.add_argument("--latency-ms", type=float, default=0.0)
+        sp.add_argument("--jitter-ms", type=float, default=0.0)
+        sp.add_argument("--rate-429", type=float, default=0.0, help="fraction of requests answered 429")
+        sp.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered 5xx")
+        sp.add_argument("--speed", type=float, default=1.0, help="virtual clock speed (x wall time)")
+        sp.add_argument("--replay", default=None, help="candle cache root to replay instead of synthetic bars")
+    for sp in (ps, pb):
+        sp.add_argument("--port", type=int, default=8765)
+    pb.add_argument("--url", default=None, help="existing server; spawns one in-process when omitted")
+    pb.add_argument("--backend", choices=["sync", "async"], default="async")
+    pb.add_argument("--market", default="FUTURES")
+    pb.add_argument("--requests", type=int, default=2000)
+    pb.add_argument("--concurrency", type=int, default=200)
+    pb.add_argument("--tf", default="15m")
+    pb.add_argument("--limit", type=int, default=200)
+    pk.add_argument("--backend", choices=["sync", "async"], default="async")
+    pk.add_argument("--cycles", type=int, default=5)
+    pk.add_argument("--interval", type=float, default=0.0, help="seconds between cycle starts (0 = back to back)")
+    pk.add_argument("--weight-per-min", type=float, default=None, help="override data.scheduler.weight_per_min")
+    pk.add_argument("--config", default=None, help="engine config json (defaults used when omitted)")
+    args = p.parse_args()
+
+    if args.cmd == "soak":
+        print(json.dumps(asyncio.run(_soak(args))))
+        return
+    market = ReplayMarket(args.replay) if args.replay else SyntheticMarket(_default_symbols(args.symbols))
+    start_ms = None
+    if args.replay:
+        first, _ = market.span()
+        start_ms = None if first is None else first + 3 * 86_400_000
+    srv = FakeBinanceServer(market, port=args.port, clock=VirtualClock(args.speed, start_ms),
+                            faults=FaultInjector(args.latency_ms, args.jitter_ms, args.rate_429, args.error_rate))
+    if args.cmd == "serve":
+        async def _serve():
+            await srv.start()
+            print(f"[FAKE] serving {len(srv.market.symbols)} symbols on {srv.base_url}", flush=True)
+            while True:
+                await asyncio.sleep(3600)
+        try:
+            asyncio.run(_serve())
+        except KeyboardInterrupt:
+            pass
+        return
+    if args.url is None:
+        srv.start_in_thread()
+        args.url = srv.base_url
+    print(json.dumps(asyncio.run(_bench(args))))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+# incremental_indicators.py — O(1)-per-bar indicator state (same outputs as indicators._compute_one_tf)
+from __future__ import annotations
+import math
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np, pandas as pd
+
+from candles import Candles, as_candles
+from indicators import _compute_one_tf, _safe_series, TfIndicators, PCTL_WINDOW, PCTL_MIN_PERIODS
+from order_stats import RollingOrderStat
+from rolling_state import Ewm, RollMean, RollVar, row, same_row
+
+_NAN = float("nan")
+# indicator outputs kept per bar, in this row order
+OUTPUTS = ("ema21", "ema50", "ema200", "atr", "adx", "bbw", "rsi", "vwap", "vol_ma20",
+           "bbw_pctl", "atr_pctl", "vol_pctl")
+_RSI, _ATR, _BBW = OUTPUTS.index("rsi"), OUTPUTS.index("atr"), OUTPUTS.index("bbw")
+_EMAS, _VWAP = (OUTPUTS.index("ema21"), OUTPUTS.index("ema50"), OUTPUTS.index("ema200")), OUTPUTS.index("vwap")
+_N_FFILL = OUTPUTS.index("bbw_pctl")   # output trước vị trí này được ffill
+# per committed bar, besides the outputs: vwap sums of the bar (NaN like cumsum), running vwap sums, safe close
+_CV, _CTPV, _RUN_V, _RUN_TPV, _C = range(5)
+# bars after a window start that rolling outputs still see it (percentile rank over 100 bars of a 20-bar bbw)
+_HEAD = PCTL_WINDOW + 20
+
+class TfState:
+    """
+    Recursive state of every _compute_one_tf indicator for one (symbol, tf):
+    EMA weights, rolling-window sums, VWAP cumulative sums, previous bar and
+    forward-fill carries. push() commits a closed bar; peek() evaluates a
+    forming bar against the committed state without changing it.
+    """
+    def __init__(self, cap: int):
+        self.ema = [Ewm.span(21), Ewm.span(50), Ewm.span(200)]
+        self.tr14 = RollMean(14)          # ATR và ADX dùng chung true range
+        self.pdm14, self.mdm14, self.dx14 = RollMean(14), RollMean(14), RollMean(14)
+        self.gain14, self.loss14 = RollMean(14), RollMean(14)
+        self.ma20, self.var20 = RollMean(20), RollVar(20)
+        self.vol20 = RollMean(20)
+        # percentile rank của bbw, atr (sau ffill) và volume
+        self.pctl = [RollingOrderStat(PCTL_WINDOW, PCTL_MIN_PERIODS) for _ in range(3)]
+        # carry: safe-series ffill (h, l, c, v), previous safe (h, l, c), vwap sums, output ffill
+        self.fill = [None, None, None, None]
+        self.prev: Optional[Tuple[float, float, float]] = None
+        self.cum_v, self.cum_tpv = 0.0, 0.0
+        self.last_out = [_NAN] * _N_FFILL
+        # committed outputs, one row per indicator; [lo, hi) is live
+        self.cap = cap
+        self.out = np.empty((len(OUTPUTS), cap), dtype=np.float64)
+        self.aux = np.empty((5, cap), dtype=np.float64)
+        self.ts = np.empty(cap, dtype=np.int64)
+        self.lo = self.hi = 0
+        self.last_raw: Optional[tuple] = None
+        self.anchor: Optional[int] = None   # timestamp bar đầu tiên đã push: output = batch từ bar này
+        self.head: Optional[tuple] = None   # (ts bar đầu cửa sổ, số bar, TfState) khi cửa sổ đã trượt khỏi anchor
+        self._aux_row: tuple = ()
+
+    @staticmethod
+    def _safe(x: float, carry: Optional[float]) -> float:
+        if x == x:
+            return x
+        return carry if carry is not None else 0.0
+
+    def _eval(self, raw: tuple, commit: bool) -> List[float]:
+        _, o, h_raw, l_raw, c_raw, v_raw = raw
+        h = self._safe(h_raw, self.fill[0]); l = self._safe(l_raw, self.fill[1])
+        c = self._safe(c_raw, self.fill[2]); v = self._safe(v_raw, self.fill[3])
+        f = (lambda acc, x: acc.push(x)) if commit else (lambda acc, x: acc.peek(x))
+
+        e21, e50, e200 = (f(e, c) for e in self.ema)
+
+        if self.prev is None:
+            tr = abs(h - l)
+            up = down = d = _NAN
+        else:
+            hp, lp, cp = self.prev
+            cands = [x for x in (abs(h - l), abs(h - cp), abs(l - cp)) if x == x]
+            tr = max(cands) if cands else _NAN
+            up = h - hp
+            down = -(l - lp)
+            d = c - cp
+        atr_m = f(self.tr14, tr)
+        pdm = up if (up > down and up > 0) else 0.0
+        mdm = down if (down > up and down > 0) else 0.0
+        pm, mm = f(self.pdm14, pdm), f(self.mdm14, mdm)
+        atr_d = atr_m if atr_m != 0 else _NAN
+        pdi = 100 * (pm / atr_d)
+        mdi = 100 * (mm / atr_d)
+        den = pdi + mdi
+        den = den if den != 0 else _NAN
+        dx = 100 * abs(pdi - mdi) / den
+        adx = f(self.dx14, dx if dx == dx else 0.0)
+
+        ma, var = f(self.ma20, c), f(self.var20, c)
+        std = _NAN if var != var else (0.0 if var < 0 else math.sqrt(var))
+        upper, lower = ma + 2.0 * std, ma - 2.0 * std
+        ma_d = ma if ma != 0 else _NAN
+        bbw = (upper - lower) / ma_d
+        bbw = _NAN if math.isinf(bbw) else bbw
+
+        gain = d if d > 0 else 0.0
+        loss = -(d if d < 0 else 0.0)
+        g, ls = f(self.gain14, gain), f(self.loss14, loss)
+        ls_d = ls if ls != 0 else _NAN
+        rsi = 100 - (100 / (1 + g / ls_d))
+
+        # vwap dùng cột raw (NaN -> output NaN, tổng cộng dồn bỏ qua NaN như cumsum)
+        tp = (h_raw + l_raw + c_raw) / 3.0
+        cum_v, cum_tpv = self.cum_v, self.cum_tpv
+        tpv = tp * v_raw
+        cv_out = cum_v + v_raw if v_raw == v_raw else _NAN
+        ctpv_out = cum_tpv + tpv if tpv == tpv else _NAN
+        cv_d = cv_out if cv_out != 0 else _NAN
+        vwap = ctpv_out / cv_d
+
+        volma = f(self.vol20, v)
+
+        vals = [e21, e50, e200, atr_m, adx, bbw, rsi, vwap, volma]
+        out = [x if x == x else lo for x, lo in zip(vals, self.last_out)]   # ffill
+        emit = out + [f(r, x) for r, x in zip(self.pctl, (out[_BBW], out[_ATR], v))]
+        if emit[_RSI] != emit[_RSI]:
+            emit[_RSI] = 50.0   # rsi: ffill rồi fillna(50)
+        if commit:
+            self.fill = [h if h_raw == h_raw else self.fill[0], l if l_raw == l_raw else self.fill[1],
+                         c if c_raw == c_raw else self.fill[2], v if v_raw == v_raw else self.fill[3]]
+            self.prev = (h, l, c)
+            if v_raw == v_raw:
+                self.cum_v = cv_out
+            if tpv == tpv:
+                self.cum_tpv = ctpv_out
+            self.last_out = out
+            self._aux_row = (cv_out, ctpv_out, self.cum_v, self.cum_tpv, c)
+        return emit
+
+    def push(self, raw: tuple) -> None:
+        if self.anchor is None:
+            self.anchor = raw[0]
+        vals = self._eval(raw, True)
+        if self.hi == self.cap:   # dồn phần còn sống về đầu buffer (nới gấp đôi nếu đầy)
+            n = self.hi - self.lo
+            if n * 2 > self.cap:
+                self.cap *= 2
+                out, aux = np.empty((len(OUTPUTS), self.cap)), np.empty((len(self.aux), self.cap))
+                ts = np.empty(self.cap, dtype=np.int64)
+            else:
+                out, aux, ts = self.out, self.aux, self.ts
+            out[:, :n] = self.out[:, self.lo:self.hi]
+            aux[:, :n] = self.aux[:, self.lo:self.hi]
+            ts[:n] = self.ts[self.lo:self.hi]
+            self.out, self.aux, self.ts = out, aux, ts
+            self.lo, self.hi = 0, n
+        self.out[:, self.hi] = vals
+        self.aux[:, self.hi] = self._aux_row
+        self.ts[self.hi] = raw[0]
+        self.hi += 1
+        self.last_raw = raw
+
+    def trim(self, keep: int) -> None:
+        self.lo = max(self.lo, self.hi - keep)
+
+    def peek(self, raw: tuple) -> List[float]:
+        return self._eval(raw, False)
+
+class IncrementalIndicatorEngine:
+    """
+    Drop-in for indicators.IndicatorEngine. Keeps a TfState per (symbol, tf):
+    bars before the last one are committed once (O(1) each), the last bar is
+    treated as forming and evaluated tentatively every call. A series seen for
+    the first time, or one whose committed bars no longer match the store
+    (revised bar, bar inserted into a gap, history extended backwards), is
+    re-seeded from its window. A window that slides forward (bounded store)
+    keeps its state, so every closed bar still costs O(1) to commit; outputs
+    stay those of a batch run over the window passed in:
+      - EMAs are rebased on the window's first bar,
+        E_w[i] = E[i] - f^i * (E[first] - close[first]) (f = 1 - alpha)
+      - VWAP subtracts the sums of the bars before the window
+      - the first _HEAD bars, where rolling outputs still see the window
+        start, come from a state seeded on them, once per window start
+    so a slide costs O(_HEAD) once, not O(window). Rebased values match
+    _compute_one_tf to float rounding (~1e-12 relative); unslid windows
+    match bit for bit.
+    """
+    def __init__(self, slack: int = 256):
+        self.slack = int(slack)
+        self._states: Dict[tuple, TfState] = {}
+        self.stats = {"seeded": 0, "committed": 0, "tentative": 0, "head": 0, "fallback": 0}
+
+    def reset(self, symbol: Optional[str] = None) -> None:
+        if symbol is None:
+            self._states.clear()
+        else:
+            for k in [k for k in self._states if k[0] == symbol]:
+                del self._states[k]
+
+    def _seed(self, key: tuple, c: Candles) -> TfState:
+        st = TfState(len(c) + self.slack)
+        for i in range(len(c) - 1):
+            st.push(row(c, i))
+        self._states[key] = st
+        self.stats["seeded"] += 1
+        return st
+
+    def _valid(self, st: TfState, c: Candles) -> Optional[int]:
+        """Index of the last committed bar inside `c`, or None when the state can't continue."""
+        if st.last_raw is None or st.hi == st.lo:
+            return None
+        ts = c.timestamp
+        j = int(np.searchsorted(ts, st.last_raw[0]))
+        if j >= len(c) or int(ts[j]) != st.last_raw[0] or not same_row(row(c, j), st.last_raw):
+            return None
+        if j + 1 > st.hi - st.lo or not np.array_equal(st.ts[st.hi - 1 - j:st.hi], ts[:j + 1]):
+            return None   # cửa sổ bắt đầu trước phần output đã lưu, hoặc bar giữa cửa sổ đã đổi
+        return j
+
+    def _rebase(self, st: TfState, c: Candles, block: np.ndarray, raw: tuple) -> None:
+        """Anchored rows of a window that slid past the seed -> batch values over that window (in place)."""
+        n = len(c)
+        s = st.hi - (n - 1)   # hàng buffer của bar đầu cửa sổ
+        h = min(_HEAD, n - 1)
+        ts0 = int(c.timestamp[0])
+        if st.head is None or st.head[:2] != (ts0, h):
+            hs = TfState(h + 1)
+            for i in range(h):
+                hs.push(row(c, i))
+            st.head = (ts0, h, hs)
+            self.stats["head"] += 1
+        hs = st.head[2]
+        block[:, :h] = hs.out[:, hs.lo:hs.hi]
+        if h == n - 1:   # cửa sổ ngắn: state của phần đầu là cả cửa sổ
+            block[:, -1] = hs.peek(raw)
+            return
+        p = np.arange(h, n, dtype=np.float64)
+        for k, e in zip(_EMAS, st.ema):
+            block[k, h:] -= e.factor ** p * (st.out[k, s] - st.aux[_C, s])
+        v, tpv = raw[5], (raw[2] + raw[3] + raw[4]) / 3.0 * raw[5]
+        cv = np.append(st.aux[_CV, s + h:st.hi], st.aux[_RUN_V, st.hi - 1] + v if v == v else _NAN)
+        ctpv = np.append(st.aux[_CTPV, s + h:st.hi], st.aux[_RUN_TPV, st.hi - 1] + tpv if tpv == tpv else _NAN)
+        cv -= st.aux[_RUN_V, s - 1]
+        ctpv -= st.aux[_RUN_TPV, s - 1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            vw = np.where(cv != 0, ctpv / cv, _NAN)
+        # ffill trong cửa sổ, tiếp từ giá trị cuối của phần đầu
+        block[_VWAP, h:] = pd.Series(np.r_[block[_VWAP, h - 1], vw]).ffill().to_numpy()[1:]
+
+    def update(self, symbol: str, tf: str, candles) -> Dict[str, Any]:
+        c = as_candles(candles)
+        n = len(c)
+        if n == 0:
+            return _compute_one_tf(c, tf)
+        key = (symbol, tf)
+        st = self._states.get(key)
+        j = self._valid(st, c) if st is not None else None
+        if st is None or j is None:
+            st = self._seed(key, c)
+            j = n - 2
+        for i in range(j + 1, n - 1):
+            st.push(row(c, i))
+            self.stats["committed"] += 1
+        st.trim(n + self.slack // 2)
+        if int(c.timestamp[0]) != st.anchor and st.hi - n < st.lo:
+            st = self._seed(key, c)   # bar trước cửa sổ đã bị cắt khỏi buffer: không trừ được tổng vwap
+        raw = row(c, n - 1)
+        tent = st.peek(raw)
+        self.stats["tentative"] += 1
+        block = np.empty((len(OUTPUTS), n), dtype=np.float64)
+        if n > 1:
+            block[:, :-1] = st.out[:, st.hi - (n - 1):st.hi]
+        block[:, -1] = tent
+        if int(c.timestamp[0]) != st.anchor:
+            self._rebase(st, c, block, raw)
+        out: Dict[str, Any] = {"df": c, "close": _safe_series(c.close, "close"),
+                               "volume": _safe_series(c.volume, "volume")}
+        for k, name in enumerate(OUTPUTS):
+            out[name] = pd.Series(block[k], copy=False)
+        if n < 2:
+            out["rsi"] = pd.Series(index=out["close"].index, data=np.nan, name="rsi")
+        return TfIndicators(c, tf, out)
+
+    def compute_all(self, symbol: str, raw_tf: Dict[str, Any], cfg: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        out = {}
+        for tf, wrap in (raw_tf or {}).items():
+            df = wrap.get("df") if isinstance(wrap, dict) else wrap
+            try:
+                out[tf] = self.update(symbol, tf, df)
+            except Exception:
+                self._states.pop((symbol, tf), None)
+                self.stats["fallback"] += 1
+                try: out[tf] = _compute_one_tf(df, tf)
+                except Exception: out[tf] = {"df": Candles.empty()}
+        for tf in ["M5", "M15", "H1", "H4", "D1"]:
+            out.setdefault(tf, _compute_one_tf(None, tf))
+        return out
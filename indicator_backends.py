@@ -0,0 +1,223 @@
+# indicator_backends.py — alternative implementations of registry indicators
+from __future__ import annotations
+import math
+from typing import Dict, Any, Callable, List
+
+import numpy as np, pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+import indicators as ind
+
+try:
+    import polars as pl   # optional: backend cột (chỉ đăng ký khi cài sẵn)
+except ImportError:
+    pl = None
+
+# Mỗi bản thay thế có cùng chữ ký với fn tham chiếu trong indicators.REGISTRY (nhận/trả
+# pd.Series). Đầu vào ngoài đường đi chính (NaN ở cột thô...) -> gọi thẳng bản tham chiếu.
+
+def _a(x) -> np.ndarray:
+    return np.asarray(x.to_numpy() if isinstance(x, pd.Series) else x, dtype=np.float64)
+
+def _out(a: np.ndarray, like, name: str) -> pd.Series:
+    return pd.Series(a, index=getattr(like, "index", None), name=name, copy=False)
+
+def _ref(name: str, *args, **kw):
+    return ind.REGISTRY[name].fn(*args, **kw)
+
+def _ffill(a: np.ndarray) -> np.ndarray:
+    ok = ~np.isnan(a)
+    if ok.all() or not ok.any():
+        return a
+    idx = np.where(ok, np.arange(len(a)), 0)
+    np.maximum.accumulate(idx, out=idx)
+    return a[idx]   # NaN đầu chuỗi trỏ về a[0] (cũng NaN) -> giữ nguyên như ffill
+
+def _diff(a: np.ndarray, n: int = 1) -> np.ndarray:
+    out = np.full(len(a), np.nan)
+    if len(a) > n:
+        out[n:] = a[n:] - a[:-n]
+    return out
+
+def _roll_mean(a: np.ndarray, n: int) -> np.ndarray:
+    # min_periods = n: cửa sổ có NaN -> NaN, như pandas
+    out = np.full(len(a), np.nan)
+    if len(a) >= n:
+        out[n - 1:] = sliding_window_view(a, n).sum(axis=1) / n
+    return out
+
+def _roll_std(a: np.ndarray, n: int) -> np.ndarray:
+    out = np.full(len(a), np.nan)
+    if len(a) >= n:
+        out[n - 1:] = sliding_window_view(a, n).std(axis=1, ddof=1)
+    return out
+
+_EMA_SCALE = 1e3   # khối đủ ngắn để d^-L <= 1e3 -> sai số tương đối ~1e-13
+
+def _ema_arr(a: np.ndarray, n: int) -> np.ndarray:
+    """ewm(span=n, adjust=False).mean() of a NaN-free array, block closed form (no per-bar loop)."""
+    alpha = 2.0 / (n + 1.0)
+    d = 1.0 - alpha
+    out = np.empty(len(a))
+    if not len(a):
+        return out
+    out[0] = a[0]
+    x = a[1:]
+    if not len(x):
+        return out
+    L = max(1, min(len(x), int(math.log(_EMA_SCALE) / -math.log(d))))
+    k = -(-len(x) // L)
+    X = np.zeros(k * L)
+    X[:len(x)] = x
+    X = X.reshape(k, L)
+    pw = d ** np.arange(1, L + 1)
+    P = pw * (alpha * np.cumsum(X / pw, axis=1))   # EMA từng khối, giá trị trước khối = 0
+    carry = np.empty(k)
+    c, dL = a[0], pw[-1]
+    for i in range(k):   # chỉ k = len/L bước vô hướng
+        carry[i] = c
+        c = dL * c + P[i, -1]
+    out[1:] = (P + pw * carry[:, None]).ravel()[:len(x)]
+    return out
+
+def _np_ema(s, n):
+    a = _a(s)
+    if np.isnan(a).any():
+        return _ref(f"ema{n}", s, n)
+    return _out(_ema_arr(a, n), s, f"ema{n}")
+
+def _np_macd_signal(m, n):
+    a = _a(m)
+    if np.isnan(a).any():
+        return _ref("macd_signal", m, n)
+    return _out(_ema_arr(a, n), m, "macd_signal")
+
+def _np_tr(high, low, close):
+    h, l, c = _a(high), _a(low), _a(close)
+    pc = np.r_[np.nan, c[:-1]]
+    with np.errstate(invalid="ignore"):
+        tr = np.fmax(np.fmax(np.abs(h - l), np.abs(h - pc)), np.abs(l - pc))
+    return _out(tr, high, None)
+
+def _np_atr_raw(tr, n):
+    return _out(_roll_mean(_a(tr), n), tr, None)
+
+def _np_atr(atr_raw):
+    return _out(_ffill(_a(atr_raw)), atr_raw, None)
+
+def _np_adx(high, low, atr, n=14):
+    h, l, atr_a = _a(high), _a(low), _a(atr)
+    up, down = _diff(h), -_diff(l)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pdm = np.where((up > down) & (up > 0), up, 0.0)
+        mdm = np.where((down > up) & (down > 0), down, 0.0)
+        atr_nz = np.where(atr_a == 0, np.nan, atr_a)
+        pdi = 100 * (_roll_mean(pdm, n) / atr_nz)
+        mdi = 100 * (_roll_mean(mdm, n) / atr_nz)
+        den = pdi + mdi
+        dx = 100 * np.abs(pdi - mdi) / np.where(den == 0, np.nan, den)
+    dx[np.isnan(dx)] = 0.0
+    return _out(_ffill(_roll_mean(dx, n)), high, None)
+
+def _np_bbw(close, n=20, k=2.0):
+    c = _a(close)
+    ma, std = _roll_mean(c, n), _roll_std(c, n)
+    upper, lower = ma + k * std, ma - k * std
+    with np.errstate(invalid="ignore", divide="ignore"):
+        bbw = (upper - lower) / np.where(ma == 0, np.nan, ma)
+    bbw[np.isinf(bbw)] = np.nan
+    return _out(_ffill(bbw), close, None)
+
+def _np_rsi(close, n=14):
+    c = _a(close)
+    if len(c) < 2:
+        return _ref("rsi", close, n)
+    d = _diff(c)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        gain = np.where(d > 0, d, 0.0)
+        loss = -np.where(d < 0, d, 0.0)
+        g, ls = _roll_mean(gain, n), _roll_mean(loss, n)
+        rsi = 100 - (100 / (1 + g / np.where(ls == 0, np.nan, ls)))
+    rsi = _ffill(rsi)
+    rsi[np.isnan(rsi)] = 50.0
+    return _out(rsi, close, "rsi")
+
+def _np_vwap(df):
+    if df is None or len(df) == 0 or "volume" not in df:
+        return _ref("vwap", df)
+    h, l, c, v = (_a(df[k]) for k in ("high", "low", "close", "volume"))
+    if np.isnan(h).any() or np.isnan(l).any() or np.isnan(c).any() or np.isnan(v).any():
+        return _ref("vwap", df)   # cumsum bỏ qua NaN: để bản tham chiếu lo
+    typical = (h + l + c) / 3.0
+    cv = np.cumsum(v)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        vw = np.cumsum(typical * v) / np.where(cv == 0, np.nan, cv)
+    return pd.Series(_ffill(vw), name="vwap", copy=False)
+
+def _np_vol_ma(s, n=20):
+    return _out(_ffill(_roll_mean(_a(s), n)), s, "volume")
+
+def _np_roc(close, n=10):
+    c = _a(close)
+    prev = np.full(len(c), np.nan)
+    if len(c) > n:
+        prev[n:] = c[:-n]
+    prev[prev == 0] = np.nan
+    return _out((c - prev) / prev * 100.0, close, "close")
+
+def _np_obv(close, volume):
+    c, v = _a(close), _a(volume)
+    sg = np.sign(_diff(c))
+    sg[np.isnan(sg)] = 0.0
+    return _out(np.cumsum(sg * v), close, None)
+
+def _np_obv_slope(obv, n):
+    return _out(_diff(_a(obv), n) / float(n), obv, None)
+
+_NUMPY: Dict[str, Callable[..., Any]] = {
+    "tr": _np_tr, "atr_raw": _np_atr_raw, "atr": _np_atr, "adx": _np_adx, "bbw": _np_bbw, "rsi": _np_rsi,
+    "vwap": _np_vwap, "vol_ma20": _np_vol_ma, "roc": _np_roc, "macd_signal": _np_macd_signal,
+    "obv": _np_obv, "obv_slope": _np_obv_slope,
+    **{f"ema{n}": _np_ema for n in (9, 12, 21, 26, 50, 200)},
+}
+
+# --- polars: rolling/ewm trên Series cột; phần ghép nối dùng lại helper numpy ---
+def _pl_ema(s, n):
+    a = _a(s)
+    if np.isnan(a).any():
+        return _ref(f"ema{n}", s, n)
+    return _out(pl.Series(a).ewm_mean(span=n, adjust=False).to_numpy(), s, f"ema{n}")
+
+def _pl_roll_mean(a: np.ndarray, n: int) -> np.ndarray:
+    return pl.Series(a).rolling_mean(window_size=n).fill_null(np.nan).to_numpy().astype(np.float64)
+
+def _pl_atr_raw(tr, n):
+    a = _a(tr)
+    return _out(_pl_roll_mean(a, n) if not np.isnan(a).any() else _roll_mean(a, n), tr, None)
+
+def _pl_vol_ma(s, n=20):
+    return _out(_ffill(_pl_roll_mean(_a(s), n)), s, "volume")
+
+def _pl_bbw(close, n=20, k=2.0):
+    c = _a(close)
+    ps = pl.Series(c)
+    ma = ps.rolling_mean(window_size=n).fill_null(np.nan).to_numpy().astype(np.float64)
+    std = ps.rolling_std(window_size=n, ddof=1).fill_null(np.nan).to_numpy().astype(np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        bbw = ((ma + k * std) - (ma - k * std)) / np.where(ma == 0, np.nan, ma)
+    bbw[np.isinf(bbw)] = np.nan
+    return _out(_ffill(bbw), close, None)
+
+_POLARS: Dict[str, Callable[..., Any]] = {
+    "atr_raw": _pl_atr_raw, "vol_ma20": _pl_vol_ma, "bbw": _pl_bbw,
+    **{f"ema{n}": _pl_ema for n in (9, 12, 21, 26, 50, 200)},
+}
+
+def available() -> List[str]:
+    return ["pandas", "numpy"] + (["polars"] if pl is not None else [])
+
+for _name, _fn in _NUMPY.items():
+    ind.register_impl("numpy", _name, _fn)
+if pl is not None:
+    for _name, _fn in _POLARS.items():
+        ind.register_impl("polars", _name, _fn)
@@ -0,0 +1,147 @@
+# indicator_cache.py — LRU memo of per-(symbol, tf) indicator outputs keyed by the last closed bar
+from __future__ import annotations
+import hashlib, json, zlib
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+import numpy as np, pandas as pd
+
+from candles import COLUMNS, Candles, as_candles
+from indicators import _compute_one_tf, _safe_series, TfIndicators
+from incremental_indicators import OUTPUTS, TfState
+from rolling_state import row, same_row
+
+def config_hash(cfg: Dict[str, Any]) -> str:
+    """Hash of the config section that can change indicator outputs."""
+    sec = (cfg or {}).get("indicators") or {}
+    return hashlib.blake2b(json.dumps(sec, sort_keys=True, default=str).encode(), digest_size=8).hexdigest()
+
+def _closed_crc(c: Candles) -> int:
+    # crc32 các cột trên bar đã đóng: bar giữa cửa sổ được sửa (merge/backfill) dù bar đóng cuối giữ nguyên
+    crc = 0
+    for col in COLUMNS:
+        crc = zlib.crc32(np.ascontiguousarray(getattr(c, col)[:-1]).tobytes(), crc)
+    return crc
+
+class _Entry:
+    __slots__ = ("n", "first_ts", "closed_row", "crc", "forming_row", "out", "state")
+
+    def __init__(self, c: Candles, out: TfIndicators):
+        n = len(c)
+        self.n, self.first_ts = n, int(c.timestamp[0])
+        self.closed_row, self.forming_row = row(c, n - 2), row(c, n - 1)
+        self.crc = _closed_crc(c)
+        self.out = out   # lazy: output consumer đọc thêm sau này cũng được giữ lại
+        self.state: Optional[TfState] = None   # dựng khi forming bar đổi lần đầu
+
+    def matches(self, c: Candles) -> bool:
+        n = len(c)
+        return n == self.n and int(c.timestamp[0]) == self.first_ts and same_row(row(c, n - 2), self.closed_row) \
+            and _closed_crc(c) == self.crc
+
+class IndicatorCache:
+    """
+    Memoizes _compute_one_tf per (symbol, tf, last_closed_ts, config_hash).
+    The last bar of a window is the forming one, so between closes only that
+    bar changes:
+      - hit:  window unchanged -> cached outputs returned as-is
+      - tail: forming bar changed -> closed-bar outputs reused, the last value
+              is evaluated from per-series state (incremental_indicators.TfState,
+              seeded on the closed bars the first time it is needed)
+      - miss: new closed bar / other window (closed bars compared by crc32,
+              so a revised bar inside the window misses too) -> full compute, stored
+    All indicators are causal, so outputs equal _compute_one_tf on the window.
+    Bounded LRU over entries; counters per timeframe.
+    """
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max(1, int(max_entries))
+        self._lru: "OrderedDict[Tuple[str, str, int, str], _Entry]" = OrderedDict()
+        self._last: Dict[Tuple[str, str], Tuple[str, str, int, str]] = {}
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, tf: str, what: str) -> None:
+        st = self.stats.get(tf)
+        if st is None:
+            st = self.stats[tf] = {"hit": 0, "tail": 0, "miss": 0, "evict": 0}
+        st[what] += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"entries": len(self._lru)}
+        for tf, st in self.stats.items():
+            calls = st["hit"] + st["tail"] + st["miss"]
+            out[tf] = {**st, "hit_rate": round((st["hit"] + st["tail"]) / calls, 3) if calls else 0.0}
+        return out
+
+    def get(self, symbol: str, tf: str, c: Candles, chash: str) -> Optional[Dict[str, Any]]:
+        """Cached outputs for window `c`, or None (caller computes and put()s)."""
+        n = len(c)
+        if n < 2:
+            return None
+        key = (symbol, tf, int(c.timestamp[-2]), chash)
+        e = self._lru.get(key)
+        if e is None or not e.matches(c):
+            self._count(tf, "miss")
+            return None
+        self._lru.move_to_end(key)
+        raw = row(c, n - 1)
+        if same_row(raw, e.forming_row):
+            self._count(tf, "hit")
+            return e.out.with_df(c)
+        done = e.out.computed()
+        if any(k in done for k in OUTPUTS):
+            if e.state is None:
+                st = TfState(n)
+                for i in range(n - 1):
+                    st.push(row(c, i))
+                e.state = st
+            tent = e.state.peek(raw)
+        # chỉ giá trị bar cuối đổi: vá các output đã tính, phần còn lại (ema9, macd...) tính lại lười nếu cần
+        vals: Dict[str, Any] = {"close": _safe_series(c.close, "close"), "volume": _safe_series(c.volume, "volume")}
+        for k, name in enumerate(OUTPUTS):
+            if name in done:
+                arr = np.array(done[name], dtype=np.float64)
+                arr[-1] = tent[k]
+                vals[name] = pd.Series(arr, name=name, copy=False)
+        e.out, e.forming_row = TfIndicators(c, tf, vals), raw
+        self._count(tf, "tail")
+        return e.out
+
+    def put(self, symbol: str, tf: str, c: Candles, chash: str, out) -> None:
+        if len(c) < 2 or not isinstance(out, TfIndicators):
+            return
+        key = (symbol, tf, int(c.timestamp[-2]), chash)
+        old = self._last.get((symbol, tf))
+        if old is not None and old != key:
+            self._lru.pop(old, None)   # bar mới đóng -> entry cũ của series này hết dùng
+        self._lru[key] = _Entry(c, out)
+        self._lru.move_to_end(key)
+        self._last[(symbol, tf)] = key
+        while len(self._lru) > self.max_entries:
+            k, _ = self._lru.popitem(last=False)
+            if self._last.get(k[:2]) == k:
+                del self._last[k[:2]]
+            self._count(k[1], "evict")
+
+    def compute(self, symbol: str, tf: str, df, chash: str) -> Dict[str, Any]:
+        c = as_candles(df)
+        out = self.get(symbol, tf, c, chash)
+        if out is None:
+            out = _compute_one_tf(c, tf)
+            self.put(symbol, tf, c, chash, out)
+        return out
+
+class CachedIndicatorEngine:
+    """IndicatorEngine.compute_all with the cache in front of _compute_one_tf."""
+    def __init__(self, cache: IndicatorCache):
+        self.cache = cache
+
+    def compute_all(self, symbol: str, raw_tf: Dict[str, Any], cfg: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        chash = config_hash(cfg)
+        out = {}
+        for tf, wrap in (raw_tf or {}).items():
+            df = wrap.get("df") if isinstance(wrap, dict) else wrap
+            try: out[tf] = self.cache.compute(symbol, tf, df, chash)
+            except Exception: out[tf] = {"df": Candles.empty()}
+        for tf in ["M5", "M15", "H1", "H4", "D1"]:
+            out.setdefault(tf, _compute_one_tf(None, tf))
+        return out
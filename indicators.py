@@ -1,11 +1,23 @@
 # indicators.py — FINAL (safe for M5 trigger + full field set)
 from __future__ import annotations
-from typing import Dict, Any
+import argparse, json, math
+from collections.abc import MutableMapping
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, Any, Callable, Iterator, List, Optional, Set, Tuple
 import numpy as np, pandas as pd
 
+from candles import Candles, as_candles
+from compact_store import ColView
+from order_stats import rolling_rank, rolling_median
+
 def _safe_series(s, name: str, fill=0.0) -> pd.Series:
     if s is None:
         return pd.Series(dtype="float64", name=name)
+    arr = s.to_numpy() if isinstance(s, pd.Series) else s
+    if isinstance(arr, np.ndarray) and arr.dtype == np.float64 and not np.isnan(arr).any():
+        # cột Candles / series đã sạch: bọc lại, không copy
+        return pd.Series(arr, index=getattr(s, "index", None), name=name, copy=False)
     try:
         out = pd.Series(pd.to_numeric(s, errors="coerce").astype(float))
     except Exception:
@@ -40,16 +52,19 @@ def _atr(high,low,close,n=14):
     tr=_true_range(high,low,close)
     return tr.rolling(n).mean().fillna(method="ffill")
 
-def _di_adx(high,low,close,n=14):
-    high=_safe_series(high,"high");low=_safe_series(low,"low");close=_safe_series(close,"close")
+def _adx_from(high,low,atr,n=14):
+    # atr: tr.rolling(n).mean() chưa ffill (dùng chung với _atr)
     up=high.diff();down=-low.diff()
     plus_dm=up.where((up>down)&(up>0),0.0);minus_dm=down.where((down>up)&(down>0),0.0)
-    tr=_true_range(high,low,close);atr=tr.rolling(n).mean()
     plus_di=100*(plus_dm.rolling(n).mean()/atr.replace(0,np.nan))
     minus_di=100*(minus_dm.rolling(n).mean()/atr.replace(0,np.nan))
     dx=(100*(plus_di-minus_di).abs()/(plus_di+minus_di).replace(0,np.nan)).fillna(0.0)
     return dx.rolling(n).mean().fillna(method="ffill")
 
+def _di_adx(high,low,close,n=14):
+    high=_safe_series(high,"high");low=_safe_series(low,"low");close=_safe_series(close,"close")
+    return _adx_from(high,low,_true_range(high,low,close).rolling(n).mean(),n)
+
 def _bbw(close,n=20,k=2.0):
     close=_safe_series(close,"close")
     ma=close.rolling(n).mean();std=close.rolling(n).std()
@@ -58,50 +73,312 @@ def _bbw(close,n=20,k=2.0):
         bbw=(upper-lower)/ma.replace(0,np.nan)
     return bbw.replace([np.inf,-np.inf],np.nan).fillna(method="ffill")
 
-def _vwap(df: pd.DataFrame):
+def _col(df, name: str) -> pd.Series:
+    x = df[name]
+    return x if isinstance(x, pd.Series) else pd.Series(np.asarray(x, dtype=np.float64), copy=False)
+
+def _vwap(df):
     if df is None or len(df)==0 or "volume" not in df: 
         return pd.Series(dtype="float64", name="vwap")
-    typical=(df["high"]+df["low"]+df["close"])/3.0
-    cum_vol=df["volume"].cumsum().replace(0,np.nan)
-    cum_tpv=(typical*df["volume"]).cumsum()
+    typical=(_col(df,"high")+_col(df,"low")+_col(df,"close"))/3.0
+    cum_vol=_col(df,"volume").cumsum().replace(0,np.nan)
+    cum_tpv=(typical*_col(df,"volume")).cumsum()
     vwap=(cum_tpv/cum_vol).fillna(method="ffill")
     vwap.name="vwap";return vwap
 
 def _vol_ma(s,n=20): return _safe_series(s,"volume").rolling(n).mean().fillna(method="ffill")
 
-def _compute_one_tf(df: pd.DataFrame) -> Dict[str, Any]:
+def _roc(close,n=10):
+    prev=close.shift(n).replace(0,np.nan)
+    return (close-prev)/prev*100.0
+
+def _obv(close,volume):
+    return (np.sign(close.diff()).fillna(0.0)*volume).cumsum()
+
+# ---------------------------------------------------------------------------
+# Registry: mỗi indicator khai báo input (tên indicator khác hoặc "df") + tham số.
+# TfIndicators tính lười theo yêu cầu và giữ lại trung gian (tr, atr thô, ema12/26...)
+# để các indicator dùng chung không tính lại.
+# ---------------------------------------------------------------------------
+@dataclass(frozen=True)
+class IndicatorSpec:
+    name: str
+    fn: Callable[..., Any]
+    inputs: Tuple[str, ...]
+    params: Dict[str, Any] = field(default_factory=dict)
+    public: bool = True   # False = trung gian, không liệt kê như output
+    warmup: int = 0       # số bar cần thêm (ngoài warm-up của input) trước khi giá trị đúng/hội tụ
+    anchored: bool = False   # giá trị phụ thuộc điểm đầu cửa sổ (cộng dồn) -> giữ nguyên độ dài cửa sổ cấu hình
+    impls: Dict[str, Callable[..., Any]] = field(default_factory=dict)   # backend -> cài đặt thay thế cho fn
+
+REGISTRY: Dict[str, IndicatorSpec] = {}
+
+def register(name: str, inputs: Tuple[str, ...], fn: Callable[..., Any], public: bool = True, warmup: int = 0,
+             anchored: bool = False, **params) -> IndicatorSpec:
+    spec = IndicatorSpec(name, fn, tuple(inputs), dict(params), public, int(warmup), anchored)
+    REGISTRY[name] = spec
+    return spec
+
+# Backend: `fn` của mỗi spec là bản tham chiếu (pandas); indicator_backends đăng ký bản
+# nhanh cùng chữ ký (nhận/trả pd.Series) qua register_impl. Key không có bản thay thế dùng fn.
+# Chỉ TfIndicators._get (tính lười) đi qua backend; batch_indicators._block, incremental và
+# tail của IndicatorCache dùng kernel riêng cho các output họ tính sẵn.
+_BACKEND = "pandas"
+
+def register_impl(backend: str, name: str, fn: Callable[..., Any]) -> None:
+    REGISTRY[name].impls[backend] = fn
+
+def set_backend(name: str) -> None:
+    """Select the implementation used for lazily computed indicators ("pandas" = reference)."""
+    global _BACKEND
+    if name != "pandas":
+        import indicator_backends
+        if name not in indicator_backends.available():
+            raise ValueError(f"indicator backend '{name}' not available: {indicator_backends.available()}")
+    _BACKEND = name
+
+def indicator_backend() -> str:
+    return _BACKEND
+
+# EMA đệ quy không bao giờ "đủ" hẳn: coi là hội tụ khi trọng số của giá trị seed < EMA_TOL
+EMA_TOL = 1e-3
+
+def _ema_warmup(n: int) -> int:
+    return int(math.ceil(math.log(EMA_TOL) / math.log(1.0 - 2.0 / (n + 1))))
+
+register("close", ("df",), lambda df: _safe_series(df["close"], "close"))
+register("volume", ("df",), lambda df: _safe_series(df["volume"], "volume"))
+register("high", ("df",), lambda df: _safe_series(df["high"], "high"), public=False)
+register("low", ("df",), lambda df: _safe_series(df["low"], "low"), public=False)
+register("tr", ("high", "low", "close"), _true_range, public=False, warmup=1)
+register("atr_raw", ("tr",), lambda tr, n: tr.rolling(n).mean(), public=False, warmup=14, n=14)
+for _n in (9, 12, 21, 26, 50, 200):
+    register(f"ema{_n}", ("close",), _ema, public=_n not in (12, 26), warmup=_ema_warmup(_n), n=_n)
+register("atr", ("atr_raw",), lambda a: a.fillna(method="ffill"))
+register("adx", ("high", "low", "atr_raw"), _adx_from, warmup=2 * 14, n=14)   # DM rolling rồi DX rolling
+register("bbw", ("close",), _bbw, warmup=20, n=20, k=2.0)
+register("rsi", ("close",), _rsi, warmup=14 + 1, n=14)
+register("vwap", ("df",), _vwap, anchored=True)   # cộng dồn từ đầu cửa sổ: không có warm-up cố định
+register("vol_ma20", ("volume",), _vol_ma, warmup=20, n=20)
+register("roc", ("close",), _roc, warmup=10, n=10)
+register("macd", ("ema12", "ema26"), lambda f, s: f - s)
+register("macd_signal", ("macd",), lambda m, n: m.ewm(span=n, adjust=False).mean(), warmup=_ema_warmup(9), n=9)
+register("macd_hist", ("macd", "macd_signal"), lambda m, sig: m - sig)
+register("obv", ("close", "volume"), _obv, public=False, warmup=1)
+register("obv_slope", ("obv",), lambda obv, n: obv.diff(n) / float(n), warmup=5, n=5)
+# percentile rank / median trên cửa sổ trượt (order_stats; NaN cho tới khi đủ min_periods)
+PCTL_WINDOW, PCTL_MIN_PERIODS = 100, 20
+for _src, _name in (("bbw", "bbw"), ("atr", "atr"), ("volume", "vol")):
+    register(f"{_name}_pctl", (_src,), rolling_rank, warmup=PCTL_WINDOW, n=PCTL_WINDOW, min_periods=PCTL_MIN_PERIODS)
+    register(f"{_name}_med", (_src,), rolling_median, warmup=PCTL_WINDOW, n=PCTL_WINDOW, min_periods=PCTL_MIN_PERIODS)
+
+# output batch/incremental/cache tính sẵn (output cố định trước khi có registry + các percentile)
+CORE_OUTPUTS = ("close","volume","ema21","ema50","ema200","atr","adx","bbw","rsi","vwap","vol_ma20",
+                "bbw_pctl","atr_pctl","vol_pctl")
+
+def _warmup_of(name: str) -> int:
+    spec = REGISTRY.get(name)
+    if spec is None:
+        return 0
+    return spec.warmup + max([_warmup_of(i) for i in spec.inputs if i != "df"] or [0])
+
+@lru_cache(maxsize=256)
+def _warmup_cached(keys: frozenset) -> int:
+    return max([_warmup_of(k) for k in keys] or [0])
+
+def warmup_bars(keys) -> int:
+    """Closed bars needed before every indicator in `keys` (and its inputs) is exact/converged."""
+    return _warmup_cached(frozenset(keys))
+
+def _anchored_of(name: str) -> bool:
+    spec = REGISTRY.get(name)
+    return spec is not None and (spec.anchored or any(_anchored_of(i) for i in spec.inputs))
+
+def anchored(keys) -> bool:
+    """True if any indicator in `keys` depends on where the window starts (no warm-up makes it window-independent)."""
+    return any(_anchored_of(k) for k in keys)
+
+_USAGE: Dict[str, Set[str]] = {}
+
+def indicator_usage() -> Dict[str, List[str]]:
+    """Keys consumers have read so far, per timeframe."""
+    return {tf: sorted(keys) for tf, keys in sorted(_USAGE.items())}
+
+def used_keys(tf: str) -> Set[str]:
+    return _USAGE.get(tf, set())
+
+def usage_report(usage: Optional[Dict[str, Set[str]]] = None) -> Dict[str, Any]:
+    """Used / never-read public indicators per timeframe: keys read so far, or `usage` (declared keys) if given."""
+    public = sorted(k for k, s in REGISTRY.items() if s.public)
+    return {tf: {"used": sorted(k for k in keys if k != "df"), "unused": [k for k in public if k not in keys]}
+            for tf, keys in sorted((_USAGE if usage is None else usage).items())}
+
+_MISSING = object()
+
+class TfIndicators(MutableMapping):
+    """
+    Indicator outputs of one timeframe as a lazy mapping. m["ema21"] computes
+    on first access (inputs resolved through REGISTRY, each computed once)
+    and caches; values given up front (batch/incremental/cache paths) are
+    returned as-is. Reads are recorded per timeframe for usage_report().
+    With a CompactBlock attached (indicators.compact) values are moved into
+    float32 rows of the block and returned as ColView once a read completes;
+    inputs evaluated for that read stay float64 until then.
+    Iteration, len() and `in` cover "df" plus the values held so far (no
+    evaluation); available() lists every key a read can produce.
+    """
+    __slots__ = ("df", "tf", "_vals", "block")
+
+    def __init__(self, df, tf: Optional[str] = None, values: Optional[Dict[str, Any]] = None, block=None):
+        self.df = df
+        self.tf = tf
+        self._vals: Dict[str, Any] = dict(values or {})
+        self._vals.pop("df", None)
+        self.block = block
+
+    def _get(self, key: str):
+        v = self._vals.get(key, _MISSING)
+        if v is not _MISSING:
+            return v
+        spec = REGISTRY.get(key)
+        if spec is None:
+            raise KeyError(key)
+        if len(self.df) == 0:
+            v = pd.Series(dtype="float64", name=key)
+        else:
+            try:
+                fn = spec.fn if _BACKEND == "pandas" else spec.impls.get(_BACKEND, spec.fn)
+                v = fn(*[self.df if i == "df" else self._arg(i) for i in spec.inputs], **spec.params)
+            except KeyError:
+                raise
+            except Exception as e:   # như trước: TF lỗi -> key vắng mặt (.get trả None)
+                raise KeyError(key) from e
+        self._vals[key] = v
+        return v
+
+    def _arg(self, key: str):
+        # input đã nén float32 -> Series float64 cho hàm trong REGISTRY
+        v = self._get(key)
+        return v.series() if isinstance(v, ColView) else v
+
+    def __getitem__(self, key: str):
+        _USAGE.setdefault(self.tf or "?", set()).add(key)
+        if key == "df":
+            return self.df
+        if self.block is None:
+            return self._get(key)
+        n = len(self._vals)
+        v = self._get(key)
+        if len(self._vals) != n:   # vừa tính thêm (kể cả input) ở float64 -> chuyển vào block
+            self._pack()
+            v = self._vals[key]
+        return v
+
+    def _pack(self) -> None:
+        b = self.block
+        cols = [getattr(self.df, c) for c in ("high", "low", "close", "volume")]
+        buf = b.buf
+        for k, v in list(self._vals.items()):
+            # Series bọc thẳng cột Candles (close/volume/high/low sạch) không tốn thêm bộ nhớ -> để nguyên
+            if b.owns(v) or (isinstance(v, pd.Series) and any(np.may_share_memory(v.to_numpy(), c) for c in cols)):
+                continue
+            self._vals[k] = b.put(k, v)
+        if b.buf is not buf:   # block vừa thêm hàng -> view cũ trỏ buffer cũ, chuyển nốt
+            self._pack()
+
+    def __setitem__(self, key: str, value) -> None:
+        if key == "df":
+            self.df = value
+        else:
+            self._vals[key] = value if self.block is None else self.block.put(key, value)
+
+    def __delitem__(self, key: str) -> None:
+        del self._vals[key]
+
+    def __iter__(self) -> Iterator[str]:
+        yield "df"
+        yield from list(self._vals)
+
+    def __len__(self) -> int:
+        return 1 + len(self._vals)
+
+    def __contains__(self, key) -> bool:
+        return key == "df" or key in self._vals
+
+    def available(self) -> List[str]:
+        """Keys a read can return: "df", values held, then public REGISTRY keys (no evaluation)."""
+        out = ["df", *self._vals]
+        out += [k for k, s in REGISTRY.items() if s.public and k not in self._vals]
+        return out
+
+    def materialize(self, keys=CORE_OUTPUTS) -> "TfIndicators":
+        """Compute `keys` now (benchmarks / eager callers); no usage recorded."""
+        for k in keys:
+            self._get(k)
+        if self.block is not None:
+            self._pack()
+        return self
+
+    def computed(self) -> Dict[str, Any]:
+        """Values computed so far (no evaluation)."""
+        return dict(self._vals)
+
+    def with_df(self, df) -> "TfIndicators":
+        """View of an identical window (new Candles object); shares computed values both ways."""
+        out = TfIndicators(df, self.tf, block=self.block)
+        out._vals = self._vals
+        return out
+
+    def compact(self, block) -> "TfIndicators":
+        """Move values into `block` (CompactStore); later lazy values are stored there too."""
+        self.block = block
+        self._pack()
+        return self
+
+    def __repr__(self) -> str:
+        return f"TfIndicators(tf={self.tf}, n={len(self.df)}, computed={sorted(self._vals)})"
+
+def _compute_one_tf(df, tf: Optional[str] = None) -> TfIndicators:
+    # Candles từ DataFeed đã sort + dedupe -> dùng thẳng; DataFrame cũ được sort/chuyển một lần
     if df is None or len(df)==0:
-        return {k: pd.Series(dtype="float64") for k in
-                ["df","close","volume","ema21","ema50","ema200","atr","adx","bbw","rsi","vwap","vol_ma20"]}
-    df=df.copy().sort_values("timestamp").reset_index(drop=True)
-    for c in ["timestamp","open","high","low","close","volume"]:
-        if c not in df.columns: df[c]=np.nan
-    close=_safe_series(df["close"],"close")
-    high=_safe_series(df["high"],"high")
-    low=_safe_series(df["low"],"low")
-    vol=_safe_series(df["volume"],"volume")
-    return {
-        "df":df,
-        "close":close,
-        "volume":vol,
-        "ema21":_ema(close,21),
-        "ema50":_ema(close,50),
-        "ema200":_ema(close,200),
-        "atr":_atr(high,low,close,14),
-        "adx":_di_adx(high,low,close,14),
-        "bbw":_bbw(close,20,2.0),
-        "rsi":_rsi(close,14),
-        "vwap":_vwap(df),
-        "vol_ma20":_vol_ma(vol,20)
-    }
+        return TfIndicators(Candles.empty(), tf)
+    return TfIndicators(as_candles(df), tf)
 
 class IndicatorEngine:
     def compute_all(self, symbol:str, raw_tf:Dict[str,Any], cfg:Dict[str,Any])->Dict[str,Dict[str,Any]]:
         out={}
         for tf,wrap in (raw_tf or {}).items():
             df = wrap.get("df") if isinstance(wrap, dict) else wrap
-            try: out[tf]=_compute_one_tf(df)
-            except Exception: out[tf]={"df":pd.DataFrame()}
+            try: out[tf]=_compute_one_tf(df, tf)
+            except Exception: out[tf]={"df":Candles.empty()}
         for tf in ["M5","M15","H1","H4","D1"]:
-            out.setdefault(tf, _compute_one_tf(pd.DataFrame()))
+            out.setdefault(tf, _compute_one_tf(None, tf))
         return out
+
+def main():
+    p = argparse.ArgumentParser(description="Indicator registry: list indicators / per-profile usage report")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list", help="registered indicators with inputs and parameters")
+    pu = sub.add_parser("usage", help="which indicators the decision path reads under each config profile")
+    pu.add_argument("--config", action="append", required=True, help="config json (repeatable)")
+    args = p.parse_args()
+    if args.cmd == "list":
+        for s in REGISTRY.values():
+            print(json.dumps({"name": s.name, "inputs": list(s.inputs), "params": s.params, "public": s.public,
+                              "warmup": _warmup_of(s.name), "anchored": _anchored_of(s.name)}))
+        return
+    for path in args.config:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                cfg = json.load(f)
+        except Exception as e:
+            print(json.dumps({"profile": path, "error": str(e)}))
+            continue
+        from engine_flow import indicator_keys
+        usage = usage_report(indicator_keys(cfg))
+        print(json.dumps({"profile": path, "usage": usage,
+                          "warmup_bars": {tf: warmup_bars(u["used"]) for tf, u in usage.items()},
+                          "anchored": sorted(tf for tf, u in usage.items() if anchored(u["used"]))}))
+
+if __name__ == "__main__":
+    main()
@@ -38,59 +38,80 @@ def adx(h: pd.Series, l: pd.Series, c: pd.Series, period: int = 14) -> pd.Series
     dx = ( (plus_di - minus_di).abs() / (plus_di + minus_di).replace(0, np.nan) ) * 100
     return dx.ewm(alpha=1/period, adjust=False).mean().fillna(0)
 
+def _st_loop(c, bu, bl, out):
+    # c/bu/bl: close + basic bands; out: direction (NaN-initialised), written in place.
+    # min/max viết tường minh để giữ đúng cách builtin min/max xử lý NaN
+    n = len(c)
+    fu_prev = bu[0]; fl_prev = bl[0]
+    st_nan = True
+    for i in range(1, n):
+        b_u = bu[i]; b_l = bl[i]
+        if c[i - 1] > fu_prev:
+            fu = fu_prev if fu_prev < b_u else b_u
+        else:
+            fu = b_u
+        if c[i - 1] < fl_prev:
+            fl = fl_prev if fl_prev > b_l else b_l
+        else:
+            fl = b_l
+        if st_nan:
+            out[i - 1] = -1.0
+        if c[i] > fu_prev:
+            d = 1.0; st = fl
+        elif c[i] < fl_prev:
+            d = -1.0; st = fu
+        else:
+            d = out[i - 1]; st = fl if d == 1.0 else fu
+        out[i] = d
+        st_nan = st != st
+        fu_prev = fu; fl_prev = fl
+    return out
+
+try:
+    from numba import njit as _njit
+    _st_loop_jit = _njit(cache=True, nogil=True)(_st_loop)
+except Exception:   # numba là tùy chọn
+    _st_loop_jit = None
+
 def supertrend(h: pd.Series, l: pd.Series, c: pd.Series, atr_period: int = 10, multiplier: float = 3.0) -> pd.Series:
     atr_val = atr(h, l, c, atr_period)
     basic_upperband = (h + l) / 2 + multiplier * atr_val
     basic_lowerband = (h + l) / 2 - multiplier * atr_val
 
-    final_upperband = basic_upperband.copy()
-    final_lowerband = basic_lowerband.copy()
-    st = pd.Series(index=c.index, dtype=float)
-    dir_long = pd.Series(index=c.index, dtype=int)  # 1 long, -1 short
-
-    for i in range(1, len(c)):
-        idx = c.index[i]
-        prev_idx = c.index[i-1]
-
-        final_upperband.iloc[i] = min(basic_upperband.iloc[i], final_upperband.iloc[i-1]) if c.iloc[i-1] > final_upperband.iloc[i-1] else basic_upperband.iloc[i]
-        final_lowerband.iloc[i] = max(basic_lowerband.iloc[i], final_lowerband.iloc[i-1]) if c.iloc[i-1] < final_lowerband.iloc[i-1] else basic_lowerband.iloc[i]
-
-        if np.isnan(st.iloc[i-1]):
-            st.iloc[i-1] = basic_upperband.iloc[i-1]
-            dir_long.iloc[i-1] = -1
-
-        if c.iloc[i] > final_upperband.iloc[i-1]:
-            dir_long.iloc[i] = 1
-            st.iloc[i] = final_lowerband.iloc[i]
-        elif c.iloc[i] < final_lowerband.iloc[i-1]:
-            dir_long.iloc[i] = -1
-            st.iloc[i] = final_upperband.iloc[i]
+    n = len(c)
+    cc = np.asarray(c, dtype=np.float64)
+    bu = np.asarray(basic_upperband, dtype=np.float64)
+    bl = np.asarray(basic_lowerband, dtype=np.float64)
+    out = np.full(n, np.nan)
+    if n > 1:
+        if _st_loop_jit is not None:
+            _st_loop_jit(cc, bu, bl, out)
         else:
-            dir_long.iloc[i] = dir_long.iloc[i-1]
-            st.iloc[i] = final_lowerband.iloc[i] if dir_long.iloc[i] == 1 else final_upperband.iloc[i]
-
-    dir_long = dir_long.fillna(method="ffill").fillna(-1)
-    return dir_long  # 1 = long, -1 = short
+            res = [np.nan] * n   # list indexing nhanh hơn ndarray trong loop Python thuần
+            _st_loop(cc.tolist(), bu.tolist(), bl.tolist(), res)
+            out = np.array(res, dtype=np.float64)
+    out[np.isnan(out)] = -1.0
+    return pd.Series(out, index=c.index)  # 1 = long, -1 = short
 
 def vwap(c: pd.Series, v: pd.Series, anchor: str = "daily_utc") -> pd.Series:
     if anchor != "daily_utc":
         raise NotImplementedError("Only daily_utc anchor is implemented")
-    df = pd.DataFrame({"c": c, "v": v}).copy()
-    dates = df.index.tz_convert("UTC").date if df.index.tz is not None else df.index.tz_localize("UTC").date
-    df["date"] = dates
-    vwap_vals = []
-    cum_pv = 0.0
-    cum_v = 0.0
-    prev_date = None
-    for i, row in df.iterrows():
-        if prev_date is None or row["date"] != prev_date:
-            cum_pv = 0.0
-            cum_v = 0.0
-            prev_date = row["date"]
-        cum_pv += row["c"] * (row["v"] if not np.isnan(row["v"]) else 0.0)
-        cum_v += (row["v"] if not np.isnan(row["v"]) else 0.0)
-        vwap_vals.append(cum_pv / cum_v if cum_v > 0 else row["c"])
-    return pd.Series(vwap_vals, index=c.index)
+    df = pd.DataFrame({"c": c, "v": v})
+    idx = df.index.tz_convert("UTC") if df.index.tz is not None else df.index.tz_localize("UTC")
+    day = idx.normalize().asi8
+    cc = df["c"].to_numpy(dtype=np.float64)
+    vv = df["v"].to_numpy(dtype=np.float64)
+    vv = np.where(np.isnan(vv), 0.0, vv)
+    pv = cc * vv
+    cum_pv = np.empty(len(cc)); cum_v = np.empty(len(cc))
+    starts = np.flatnonzero(np.r_[True, day[1:] != day[:-1]]) if len(day) else np.empty(0, dtype=np.intp)
+    # cumsum tuần tự trong từng phiên (reset khi đổi ngày UTC) -> khớp từng bit với cộng dồn từng dòng
+    for a, b in zip(starts, np.r_[starts[1:], len(cc)]):
+        np.cumsum(pv[a:b], out=cum_pv[a:b])
+        np.cumsum(vv[a:b], out=cum_v[a:b])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = np.where(cum_v > 0, cum_pv / cum_v, cc)
+    return pd.Series(out, index=c.index)
 
 def range_filter_direction(c: pd.Series, h: pd.Series, l: pd.Series, length: int = 20, atr_mult: float = 1.5) -> pd.Series:
     """
@@ -99,20 +120,13 @@ def range_filter_direction(c: pd.Series, h: pd.Series, l: pd.Series, length: int
     """
     base = ema(c, length)
     atr_val = atr(h, l, c, 14)
-    upper = base + atr_mult * atr_val
-    lower = base - atr_mult * atr_val
-    direction = pd.Series(index=c.index, dtype=int)
-    curr = -1
-    for i in range(len(c)):
-        if np.isnan(upper.iloc[i]) or np.isnan(lower.iloc[i]):
-            direction.iloc[i] = curr
-            continue
-        if c.iloc[i] > upper.iloc[i]:
-            curr = 1
-        elif c.iloc[i] < lower.iloc[i]:
-            curr = -1
-        direction.iloc[i] = curr
-    return direction.fillna(method="ffill").fillna(-1)
+    upper = (base + atr_mult * atr_val).to_numpy(dtype=np.float64)
+    lower = (base - atr_mult * atr_val).to_numpy(dtype=np.float64)
+    cc = np.asarray(c, dtype=np.float64)
+    ok = ~(np.isnan(upper) | np.isnan(lower))
+    # chỉ đổi hướng khi giá thoát band; còn lại giữ hướng trước (ffill), mặc định -1
+    flip = np.where(ok & (cc > upper), 1.0, np.where(ok & (cc < lower), -1.0, np.nan))
+    return pd.Series(flip, index=c.index).ffill().fillna(-1.0)
 
 def slope(series: pd.Series, lookback: int = 3) -> float:
     if len(series) < lookback + 1:
@@ -0,0 +1,195 @@
+# kline_stream.py — push-driven kline ingestion (Binance combined kline streams)
+from __future__ import annotations
+import asyncio, json
+from dataclasses import dataclass
+from typing import List, Optional, Callable, AsyncIterator
+
+_WS_URL = {"FUTURES": "wss://fstream.binance.com/stream", "SPOT": "wss://stream.binance.com:9443/stream"}
+
+@dataclass
+class KlineEvent:
+    symbol: str          # symbol as configured, e.g. "BTC/USDT"
+    tf: str              # ccxt timeframe, e.g. "15m"
+    closed: bool         # True = "bar closed", False = "bar updated"
+    row: List[float]     # [open_time_ms, open, high, low, close, volume]
+    event_ms: int
+
+class AiohttpWsTransport:
+    """Live transport: one aiohttp websocket per URL, yields text frames."""
+    reconnect = True
+
+    def __init__(self, heartbeat: float = 20.0):
+        self.heartbeat = heartbeat
+
+    async def messages(self, url: str) -> AsyncIterator[str]:
+        import aiohttp
+        async with aiohttp.ClientSession() as sess:
+            async with sess.ws_connect(url, heartbeat=self.heartbeat, autoping=True) as ws:
+                async for msg in ws:
+                    if msg.type == aiohttp.WSMsgType.TEXT:
+                        yield msg.data
+                    elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                        break
+
+class ReplayTransport:
+    """
+    Test/offline transport: replays recorded raw frames (jsonl written via
+    stream.record_path, or a list of str/dict) ignoring the URL.
+    `speed` scales the recorded gaps between frames (0 = as fast as possible).
+    """
+    reconnect = False
+
+    def __init__(self, source, speed: float = 0.0):
+        self.source = source
+        self.speed = float(speed)
+
+    def _frames(self) -> List[str]:
+        if isinstance(self.source, str):
+            with open(self.source, "r", encoding="utf-8") as f:
+                return [ln.rstrip("\n") for ln in f if ln.strip()]
+        return [m if isinstance(m, str) else json.dumps(m) for m in self.source]
+
+    async def messages(self, url: str) -> AsyncIterator[str]:
+        prev = None
+        for raw in self._frames():
+            if self.speed > 0:
+                try:
+                    ev = int(json.loads(raw).get("data", {}).get("E", 0))
+                except Exception:
+                    ev = 0
+                if prev and ev > prev:
+                    await asyncio.sleep((ev - prev) / 1000.0 / self.speed)
+                prev = ev or prev
+            else:
+                await asyncio.sleep(0)
+            yield raw
+
+class KlineStream:
+    """
+    Subscribes to <sym>@kline_<tf> for every symbol/timeframe, folds each
+    update into the DataFeed candle store and fans out KlineEvent to
+    subscribers ("bar updated" on every frame, "bar closed" when k.x is true).
+    Reconnects with backoff. Streams are split over several sockets past
+    `max_streams_per_conn`; DataFeed.live_keys holds the keys of the sockets
+    currently connected, so keys of a dropped socket fall back to REST polling
+    while the others stay push-fed (offline_symbols() for the engine).
+    """
+    def __init__(self, data_feed, symbols: List[str], tfs: List[str], *, url: Optional[str] = None,
+                 transport=None, max_streams_per_conn: int = 200, record_path: Optional[str] = None):
+        self.feed = data_feed
+        self.by_id = {s.replace("/", "").split(":")[0].upper(): s for s in symbols}
+        self.tfs = list(tfs)
+        self.url = url or _WS_URL["FUTURES"]
+        self.transport = transport or AiohttpWsTransport()
+        self.max_streams = max(1, int(max_streams_per_conn))
+        self.record_path = record_path
+        self._subs: List[Callable[[KlineEvent], None]] = []
+        self.feed.live_keys = set()
+        self._stop = False
+        self.stats = {"frames": 0, "closed": 0, "reconnects": 0, "errors": 0}
+
+    @classmethod
+    def from_config(cls, cfg: dict, data_feed, transport=None) -> "KlineStream":
+        sc = cfg.get("stream", {}) or {}
+        market = str((cfg.get("exchange") or {}).get("market", "FUTURES")).upper()
+        tfs = ["15m", "1h", "4h", "1d"]
+        if ((cfg.get("enhance") or {}).get("m5_trigger") or {}).get("enabled", False):
+            tfs.insert(0, "5m")
+        if getattr(data_feed, "derive_base", None):
+            tfs = [data_feed.derive_base]   # các TF cao hơn được dựng lại từ base
+        return cls(data_feed, cfg.get("symbols") or ["BTC/USDT"], sc.get("tfs", tfs),
+                   url=sc.get("url") or _WS_URL.get(market, _WS_URL["FUTURES"]), transport=transport,
+                   max_streams_per_conn=int(sc.get("max_streams_per_conn", 200)),
+                   record_path=sc.get("record_path"))
+
+    def subscribe(self, fn: Callable[[KlineEvent], None]) -> None:
+        self._subs.append(fn)
+
+    def _conns(self) -> List[tuple]:
+        """(url, store keys) per socket, at most `max_streams` streams each."""
+        subs = [(f"{sid.lower()}@kline_{tf}", f"{sym}:{tf}") for sid, sym in self.by_id.items() for tf in self.tfs]
+        chunks = [subs[i:i + self.max_streams] for i in range(0, len(subs), self.max_streams)]
+        return [(f"{self.url}?streams={'/'.join(n for n, _ in c)}", {k for _, k in c}) for c in chunks]
+
+    def _set_live(self, keys: set, up: bool) -> None:
+        live = self.feed.live_keys
+        if up:
+            live |= keys
+        else:
+            live -= keys
+        self.feed.streaming = bool(live)
+
+    def offline_symbols(self) -> List[str]:
+        """Symbols with a stream on a socket that is not connected (serve them over REST)."""
+        live = self.feed.live_keys
+        return [sym for sym in self.by_id.values() if any(f"{sym}:{tf}" not in live for tf in self.tfs)]
+
+    def parse(self, raw: str) -> Optional[KlineEvent]:
+        msg = json.loads(raw)
+        d = msg.get("data", msg)
+        k = d.get("k") if isinstance(d, dict) else None
+        if not k or d.get("e") != "kline":
+            return None
+        sym = self.by_id.get(str(k.get("s") or d.get("s", "")).upper())
+        if sym is None:
+            return None
+        row = [int(k["t"]), float(k["o"]), float(k["h"]), float(k["l"]), float(k["c"]), float(k["v"])]
+        return KlineEvent(sym, str(k["i"]), bool(k.get("x", False)), row, int(d.get("E", 0) or 0))
+
+    def handle(self, raw: str) -> Optional[KlineEvent]:
+        self.stats["frames"] += 1
+        try:
+            ev = self.parse(raw)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            self.stats["errors"] += 1
+            return None
+        if ev is None:
+            return None
+        self.feed.ingest_kline(ev.symbol, ev.tf, ev.row, ev.closed)
+        if ev.closed:
+            self.stats["closed"] += 1
+        for fn in self._subs:
+            try:
+                fn(ev)
+            except Exception:
+                self.stats["errors"] += 1
+        return ev
+
+    async def _consume(self, url: str, keys: set) -> None:
+        backoff = 1.0
+        while not self._stop:
+            connected = False
+            try:
+                rec = open(self.record_path, "a", encoding="utf-8") if self.record_path else None
+                try:
+                    async for raw in self.transport.messages(url):
+                        if not connected:
+                            connected = True
+                            self._set_live(keys, True)
+                            backoff = 1.0
+                        if rec:
+                            rec.write(raw + "\n")
+                        self.handle(raw)
+                        if self._stop:
+                            break
+                finally:
+                    if rec:
+                        rec.close()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.stats["errors"] += 1
+            finally:
+                if connected:
+                    self._set_live(keys, False)
+            if self._stop or not getattr(self.transport, "reconnect", True):
+                return
+            self.stats["reconnects"] += 1
+            await asyncio.sleep(backoff)
+            backoff = min(30.0, backoff * 2)
+
+    async def run(self) -> None:
+        await asyncio.gather(*[self._consume(u, keys) for u, keys in self._conns()])
+
+    def stop(self) -> None:
+        self._stop = True
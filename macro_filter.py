@@ -1,13 +1,15 @@
 from __future__ import annotations
 from typing import Dict, Any
 
+from engine_vote import last_value
+
 def detect_regime(ind: Dict[str, Any]) -> str:
     h1 = ind.get("H1", {}) or {}
     try:
-        adx = float(h1.get("adx", 0))
-        bbw = float(h1.get("bbw_pctl", 0.5))
-        atr_s = float(h1.get("atr_slope", 0))
-        vol = float(h1.get("vol", 0)); vma = float(h1.get("vol_ma50", 1) or 1)
+        adx = last_value(h1.get("adx", 0))
+        bbw = last_value(h1.get("bbw_pctl", 0.5), 0.5)
+        atr_s = last_value(h1.get("atr_slope", 0))
+        vol = last_value(h1.get("vol", 0)); vma = last_value(h1.get("vol_ma50", 1), 1.0) or 1.0
         if bbw < 0.15 and vol < 0.8 * vma:
             return "COMPRESSION"
         if bbw > 0.85 and (vol > 1.5 * vma or atr_s > 0):
@@ -3,8 +3,10 @@ from __future__ import annotations
 import asyncio, json, os, signal, time, traceback
 from typing import Dict, Any
 
-from data import build_exchange, DataFeed
-from engine_flow import engine_loop
+from data import build_exchange, build_spot_exchange, open_exchange, close_exchange, DataFeed
+from engine_flow import engine_loop, engine_stream_loop, indicator_metrics, indicator_keys
+from indicators import usage_report
+from compact_store import budget_report
 from trade_simulator import PaperTrader
 from notifier import Notifier
 from signal_manager import SignalManager
@@ -101,33 +103,68 @@ class CycleCSV:
 _last_decision_cache: Dict[str, tuple] = {}
 
 
+def handle_result(r: Dict[str, Any], cfg: dict, state: dict, cycles_csv: CycleCSV):
+    if isinstance(r, Exception):
+        log(f"[ERROR] symbol task error: {r}")
+        if state.get("notifier"):
+            state["notifier"].error(f"symbol task error: {r}")
+        return
+
+    # ghi CSV chu kỳ
+    cycles_csv.write(r)
+
+    # notify có điều kiện (anti-spam)
+    ntf = state.get("notifier")
+    if ntf and cfg.get("notifier", {}).get("notify_decision", False):
+        sym = r.get("symbol", "")
+        side, conf = _as_decision(r.get("decision", ("FLAT", 0.0)))
+        flow = float(r.get("vfi_flow", 0.0))
+        cur_key = (side, round(conf, 2), round(flow, 2))
+        if _last_decision_cache.get(sym) != cur_key:
+            _last_decision_cache[sym] = cur_key
+            ntf.decision(sym, side, float(conf), flow)
+
+    # ghi thêm vào logger nếu có
+    if state.get("engine_logger"):
+        state["engine_logger"].log_cycle(r)
+
+
 async def run_once(cfg: dict, data_feed: DataFeed, state: dict, cycles_csv: CycleCSV):
     symbols = cfg.get("symbols") or ["BTC/USDT"]
     results = await engine_loop(symbols, data_feed, cfg, state)
+
+    # metrics fetch (refresh/scheduler) định kỳ
+    every = int(cfg.get("data", {}).get("metrics_every_cycles", 20) or 0)
+    state["_cycle_no"] = state.get("_cycle_no", 0) + 1
+    if state["_cycle_no"] == 1:
+        # indicator nào thực sự được đọc với config này (phần còn lại không bao giờ được tính)
+        log(f"[IND] usage {json.dumps(usage_report())}")
+    if every > 0 and state["_cycle_no"] % every == 0 and hasattr(data_feed, "metrics"):
+        log(f"[DATA] {json.dumps(data_feed.metrics())}")
+        ind = indicator_metrics()
+        if ind:
+            log(f"[IND] {json.dumps(ind)}")
+
     for r in (results or []):
-        if isinstance(r, Exception):
-            log(f"[ERROR] symbol task error: {r}")
-            if state.get("notifier"):
-                state["notifier"].error(f"symbol task error: {r}")
-            continue
-
-        # ghi CSV chu kỳ
-        cycles_csv.write(r)
-
-        # notify có điều kiện (anti-spam)
-        ntf = state.get("notifier")
-        if ntf and cfg.get("notifier", {}).get("notify_decision", False):
-            sym = r.get("symbol", "")
-            side, conf = _as_decision(r.get("decision", ("FLAT", 0.0)))
-            flow = float(r.get("vfi_flow", 0.0))
-            cur_key = (side, round(conf, 2), round(flow, 2))
-            if _last_decision_cache.get(sym) != cur_key:
-                _last_decision_cache[sym] = cur_key
-                ntf.decision(sym, side, float(conf), flow)
-
-        # ghi thêm vào logger nếu có
-        if state.get("engine_logger"):
-            state["engine_logger"].log_cycle(r)
+        handle_result(r, cfg, state, cycles_csv)
+
+
+async def run_stream(cfg: dict, data_feed: DataFeed, state: dict, cycles_csv: CycleCSV, stop: "StopEvent"):
+    """stream.enabled: seed lịch sử qua REST một lần, sau đó chạy theo sự kiện đóng nến."""
+    from kline_stream import KlineStream
+    symbols = cfg.get("symbols") or ["BTC/USDT"]
+    await run_once(cfg, data_feed, state, cycles_csv)
+    stream = KlineStream.from_config(cfg, data_feed)
+    st_task = asyncio.create_task(stream.run())
+    log(f"[BOOT] stream mode | {len(symbols)} symbols | tfs={stream.tfs}")
+    try:
+        await engine_stream_loop(symbols, data_feed, cfg, state, stream,
+                                 on_result=lambda r: handle_result(r, cfg, state, cycles_csv),
+                                 stop=stop.is_set)
+    finally:
+        stream.stop()
+        st_task.cancel()
+        await asyncio.gather(st_task, return_exceptions=True)
 
 
 async def main():
@@ -138,11 +175,33 @@ async def main():
 
     try:
         exchange = build_exchange(cfg)
+        await open_exchange(exchange, cfg)
     except Exception as e:
         log(f"[FATAL] build_exchange error: {e}")
         return
 
-    data_feed = DataFeed(exchange, cfg, logger=None)
+    spot_ex = None
+    if ((cfg.get("data") or {}).get("spot_twin") or {}).get("enabled", False):
+        # client spot song song cho FSD; lỗi -> chạy tiếp không có FSD
+        try:
+            spot_ex = build_spot_exchange(cfg, exchange)
+            await open_exchange(spot_ex, cfg)
+        except Exception as e:
+            log(f"[WARN] spot twin unavailable, FSD off: {e}")
+            spot_ex = None
+
+    data_feed = DataFeed(exchange, cfg, logger=None, spot_exchange=spot_ex)
+    if data_feed.warmup:
+        # indicator mà decision path khai báo đọc mỗi TF với config này -> cỡ backfill mỗi TF
+        data_feed.declare(indicator_keys(cfg))
+        log(f"[DATA] warm-up bars per tf: {json.dumps(data_feed.warmup_plan())}")
+    # bộ nhớ giữ mỗi cycle (indicators float64 vs compact float32 + nến) so với indicators.compact.budget_mb
+    mem = budget_report(cfg, len(cfg.get("symbols") or ["BTC/USDT"]), data_feed.warmup_plan())
+    log(f"[MEM] {json.dumps(mem)}")
+    if not mem.get("compact", {}).get("fits", True):
+        log("[WARN] indicators.compact.budget_mb below the estimate: blocks will be evicted and reallocated every cycle")
+    if mem.get("compact", {}).get("off"):
+        log("[WARN] indicators.compact ignored: cached indicator outputs (indicators.cache) outlive the per-cycle blocks")
 
     trade_sim = PaperTrader(cfg)
     notifier = Notifier(cfg)
@@ -163,6 +222,15 @@ async def main():
     stop = StopEvent()
     install_signal_handlers(stop)
 
+    if (cfg.get("stream") or {}).get("enabled", False):
+        try:
+            await run_stream(cfg, data_feed, state, cycles_csv, stop)
+        finally:
+            await close_exchange(exchange)
+            if spot_ex is not None:
+                await close_exchange(spot_ex)
+        return
+
     timeout = max(15, interval * 2)
     backoff = 1.0
 
@@ -180,6 +248,10 @@ async def main():
         elapsed = time.time() - started
         await asyncio.sleep(max(0.0, interval - elapsed))
 
+    await close_exchange(exchange)
+    if spot_ex is not None:
+        await close_exchange(spot_ex)
+
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,78 @@
+# mtf_align.py — base bar → last closed higher-timeframe bar (look-ahead-free multi-timeframe joins)
+from __future__ import annotations
+from typing import Dict, Any, Iterable, Optional
+
+import numpy as np
+
+from candles import TF_MS, Candles, as_candles
+
+def align_index(base_ts, higher_ts, base_ms: int, higher_ms: int) -> np.ndarray:
+    """
+    For each base bar, the row of the last higher-timeframe bar already
+    closed when the base bar closes (-1 if none yet). Timestamps are bar
+    open times, ascending. A higher bar missing from `higher_ts` (exchange
+    gap) is never selected; the previous closed one is used instead.
+    """
+    t = np.asarray(base_ts, dtype=np.int64) + base_ms   # quyết định tại lúc bar base đóng
+    closes = np.asarray(higher_ts, dtype=np.int64) + higher_ms
+    return np.searchsorted(closes, t, side="right") - 1
+
+class MtfIndex:
+    """
+    Alignment of one base series with its higher timeframes, built once per
+    replay. idx[tf][i] is the row of `tf` a decision at the close of base bar
+    i may use. gather() maps any per-bar array of that timeframe onto the
+    base bars in one take. Live code reads iloc[-1] of the forming higher
+    bar instead; here only closed bars are visible, so nothing leaks.
+    """
+    def __init__(self, base_ts, base_tf: str, higher: Dict[str, Any]):
+        self.base_tf = base_tf
+        self.base_ts = np.asarray(base_ts, dtype=np.int64)
+        self.idx: Dict[str, np.ndarray] = {
+            tf: align_index(self.base_ts, ts, TF_MS[base_tf], TF_MS[tf]) for tf, ts in higher.items()}
+
+    @classmethod
+    def from_candles(cls, base, base_tf: str, higher: Dict[str, Any]) -> "MtfIndex":
+        return cls(as_candles(base).timestamp, base_tf, {tf: as_candles(c).timestamp for tf, c in higher.items()})
+
+    def __len__(self) -> int:
+        return len(self.base_ts)
+
+    def gather(self, tf: str, values, fill: float = np.nan) -> np.ndarray:
+        """values[idx] per base bar; `fill` where the timeframe has no closed bar yet."""
+        i = self.idx[tf]
+        v = np.asarray(values)
+        if v.dtype.kind in "iub":
+            v = v.astype(np.float64)
+        if not len(v):
+            return np.full(len(i), fill, dtype=np.float64)
+        out = v[np.maximum(i, 0)]
+        if len(i) and i[0] < 0:   # idx tăng dần -> -1 chỉ nằm ở đầu
+            out[: int(np.searchsorted(i, 0))] = fill
+        return out
+
+    def gather_many(self, tf: str, cols: Dict[str, Any], prefix: Optional[str] = None) -> Dict[str, np.ndarray]:
+        p = f"{tf}_" if prefix is None else prefix
+        return {p + k: self.gather(tf, v) for k, v in cols.items()}
+
+    def at(self, i: int) -> Dict[str, int]:
+        return {tf: int(ix[i]) for tf, ix in self.idx.items()}
+
+    def first_complete(self) -> int:
+        """First base row at which every higher timeframe has a closed bar."""
+        return max([int(np.searchsorted(ix, 0)) for ix in self.idx.values()] or [0])
+
+def higher_from_base(base, base_tf: str, tfs: Iterable[str]) -> Dict[str, Candles]:
+    """Higher timeframes resampled from the base bars (when they are not stored separately)."""
+    from data import resample_ohlcv
+    c = as_candles(base)
+    out: Dict[str, Candles] = {}
+    for tf in tfs:
+        tf_ms = TF_MS[tf]
+        if tf_ms <= TF_MS[base_tf]:
+            continue
+        r = resample_ohlcv(c, tf_ms)
+        if len(c) and int(c.timestamp[0]) % tf_ms:
+            r = r[1:]   # bucket đầu chỉ có một phần -> không phải bar đầy đủ
+        out[tf] = r
+    return out
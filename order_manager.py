@@ -6,6 +6,9 @@ import time
 from vfi_module import calc_vfi_features, vfi_exit_signal
 
 class OrderManager:
+    # indicator đọc mỗi TF (open/trailing: H1 atr + M15 close; VFI exit guard: M15 vwap/atr/spot)
+    INDICATOR_KEYS = {"H1": {"atr"}, "M15": {"close", "vwap", "atr", "spot"}}
+
     def __init__(self):
         self.position: Optional[Dict[str,Any]] = None  # {"symbol","side","qty","entry","sl","tp","vfi_prev_feats",...}
 
@@ -76,12 +79,15 @@ class OrderManager:
                 vfi_cfg = (ctx["cfg"].get("vfi") or {}).get("exit", {})
                 wick_th = float(vfi_cfg.get("wick_threshold", 0.8))
                 m15 = ctx["indicators"].get("M15", {}).get("df")
-                if m15 is not None and len(getattr(m15, "index", [])) >= 30:
-                    feats_now = calc_vfi_features(
-                        m15,
-                        vwap=ctx["indicators"].get("M15", {}).get("vwap"),
-                        atr=ctx["indicators"].get("M15", {}).get("atr")
-                    )
+                if m15 is not None and len(m15) >= 30:
+                    vwap = ctx["indicators"].get("M15", {}).get("vwap")
+                    atr = ctx["indicators"].get("M15", {}).get("atr")
+                    spot = ctx["indicators"].get("M15", {}).get("spot")
+                    cache = ctx.get("vfi_cache")   # cùng bản tính với engine_flow._calc_vfi trong cycle
+                    if cache is not None:
+                        feats_now = cache.features(ctx["symbol"], m15, vwap=vwap, atr=atr, spot_df_m15=spot)
+                    else:
+                        feats_now = calc_vfi_features(m15, vwap=vwap, atr=atr, spot_df_m15=spot)
                     prev_feats = self.position.get("vfi_prev_feats") or {}
                     exit_reason = vfi_exit_signal(prev_feats, feats_now, self.position["side"], wick_th)
                     self.position["vfi_prev_feats"] = feats_now
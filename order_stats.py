@@ -0,0 +1,90 @@
+# order_stats.py — rolling order statistics (percentile rank, median, quantile): batch over history + per-bar state
+from __future__ import annotations
+import math
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from typing import Optional
+
+import pandas as pd
+
+_NAN = float("nan")
+
+# --- batch: pandas rolling rank/median/quantile dùng skiplist O(log w) mỗi bar ---
+def rolling_rank(x: pd.Series, n: int, min_periods: Optional[int] = None) -> pd.Series:
+    """Percentile rank (0..1, ties averaged) of each value within its trailing n-bar window."""
+    return x.rolling(n, min_periods=min_periods).rank(pct=True)
+
+def rolling_median(x: pd.Series, n: int, min_periods: Optional[int] = None) -> pd.Series:
+    return x.rolling(n, min_periods=min_periods).median()
+
+def rolling_quantile(x: pd.Series, n: int, q: float, min_periods: Optional[int] = None) -> pd.Series:
+    return x.rolling(n, min_periods=min_periods).quantile(q)
+
+class RollingOrderStat:
+    """
+    Trailing n-bar window kept sorted, for per-bar updates. push() commits a
+    value and returns its percentile rank; peek() ranks a tentative value
+    (forming bar) without changing the window. Lookups are bisections over
+    the sorted window; insert/evict shift a contiguous list, which at these
+    window sizes is a memmove, cheaper than any pure-Python tree. Semantics
+    follow pandas rolling: NaN/±inf are not counted, output is NaN until
+    `min_periods` values are in the window.
+    """
+    __slots__ = ("n", "min_periods", "win", "srt")
+
+    def __init__(self, n: int, min_periods: Optional[int] = None):
+        self.n = int(n)
+        self.min_periods = self.n if min_periods is None else max(1, int(min_periods))
+        self.win: deque = deque()   # giá trị theo thứ tự thời gian (kể cả NaN) để biết cái nào rời cửa sổ
+        self.srt: list = []         # giá trị hữu hạn, đã sắp xếp
+
+    @staticmethod
+    def _ok(x: float) -> bool:
+        return x == x and not math.isinf(x)
+
+    def _rank(self, lo: int, hi: int, nobs: int) -> float:
+        # hạng trung bình của nhóm bằng nhau [lo+1 .. hi], chia cho số quan sát
+        if nobs < self.min_periods:
+            return _NAN
+        return (lo + 1 + hi) / 2.0 / nobs
+
+    def push(self, x: float) -> float:
+        if len(self.win) >= self.n:
+            old = self.win.popleft()
+            if self._ok(old):
+                del self.srt[bisect_left(self.srt, old)]
+        self.win.append(x)
+        if not self._ok(x):
+            return _NAN
+        insort(self.srt, x)
+        return self._rank(bisect_left(self.srt, x), bisect_right(self.srt, x), len(self.srt))
+
+    def peek(self, x: float) -> float:
+        if not self._ok(x):
+            return _NAN
+        lo, hi, nobs = bisect_left(self.srt, x), bisect_right(self.srt, x), len(self.srt)
+        if len(self.win) >= self.n and self._ok(self.win[0]):
+            old = self.win[0]
+            nobs -= 1
+            lo -= old < x
+            hi -= old <= x
+        return self._rank(lo, hi + 1, nobs + 1)
+
+    def quantile(self, q: float) -> float:
+        """pandas rolling quantile, linear interpolation, over the committed window."""
+        nobs = len(self.srt)
+        if nobs < self.min_periods or nobs == 0:
+            return _NAN
+        pos = q * (nobs - 1)
+        i = int(pos)
+        if i == pos:
+            return self.srt[i]
+        lo, hi = self.srt[i], self.srt[i + 1]
+        return lo + (hi - lo) * (pos - i)
+
+    def median(self) -> float:
+        nobs = len(self.srt)
+        if nobs < self.min_periods or nobs == 0:
+            return _NAN
+        m = nobs // 2
+        return self.srt[m] if nobs % 2 else (self.srt[m - 1] + self.srt[m]) / 2.0
@@ -0,0 +1,185 @@
+# rolling_state.py — O(1)-per-bar accumulators matching pandas (ewm / rolling mean / rolling var) and candle-row helpers
+from __future__ import annotations
+import math
+from collections import deque
+from typing import Optional, Tuple
+
+from candles import Candles
+
+_NAN = float("nan")
+
+def _signbit(x: float) -> bool:
+    return math.copysign(1.0, x) < 0
+
+def _finite(x: float) -> float:
+    # rolling() trong pandas coi ±inf là NaN
+    return _NAN if math.isinf(x) else x
+
+class Ewm:
+    """pandas ewm(com=...).mean() with adjust=False, ignore_na=False, min_periods=0."""
+    __slots__ = ("factor", "new_wt", "st")
+
+    def __init__(self, com: float):
+        alpha = 1.0 / (1.0 + com)
+        self.factor = 1.0 - alpha
+        self.new_wt = alpha
+        self.st: Optional[Tuple[float, float, int]] = None   # (weighted, old_wt, nobs)
+
+    @classmethod
+    def span(cls, n: int) -> "Ewm":
+        return cls((n - 1) / 2.0)
+
+    def _step(self, x: float) -> Tuple[float, float, int]:
+        if self.st is None:
+            return x, 1.0, int(x == x)
+        w, old_wt, nobs = self.st
+        obs = x == x
+        nobs += int(obs)
+        if w == w:
+            old_wt *= self.factor
+            if obs:
+                if w != x:   # pandas: tránh sai số trên chuỗi hằng
+                    w = old_wt * w + self.new_wt * x
+                    w /= (old_wt + self.new_wt)
+                old_wt = 1.0
+        elif obs:
+            w = x
+        return w, old_wt, nobs
+
+    @staticmethod
+    def _out(st) -> float:
+        return st[0] if st[2] >= 1 else _NAN
+
+    def push(self, x: float) -> float:
+        self.st = self._step(x)
+        return self._out(self.st)
+
+    def peek(self, x: float) -> float:
+        return self._out(self._step(x))
+
+class RollMean:
+    """pandas rolling(n, min_periods).mean(): Kahan add/remove sums, neg/same-value guards."""
+    __slots__ = ("n", "minp", "win", "st")
+
+    def __init__(self, n: int, minp: Optional[int] = None):
+        self.n = n
+        self.minp = n if minp is None else minp
+        self.win: deque = deque()
+        self.st = None   # (nobs, sum_x, neg_ct, comp_add, comp_remove, num_same, prev_value)
+
+    def _step(self, x: float):
+        x = _finite(x)
+        if self.st is None:
+            nobs, sum_x, neg_ct, ca, cr, same, prev = 0, 0.0, 0, 0.0, 0.0, 0, x
+        else:
+            nobs, sum_x, neg_ct, ca, cr, same, prev = self.st
+            if len(self.win) >= self.n:
+                v = self.win[0]
+                if v == v:
+                    nobs -= 1
+                    y = -v - cr
+                    t = sum_x + y
+                    cr = t - sum_x - y
+                    sum_x = t
+                    if _signbit(v):
+                        neg_ct -= 1
+        if x == x:
+            nobs += 1
+            y = x - ca
+            t = sum_x + y
+            ca = t - sum_x - y
+            sum_x = t
+            if _signbit(x):
+                neg_ct += 1
+            same = same + 1 if x == prev else 1
+            prev = x
+        return nobs, sum_x, neg_ct, ca, cr, same, prev
+
+    def _out(self, st) -> float:
+        nobs, sum_x, neg_ct, _, _, same, prev = st
+        if nobs >= self.minp and nobs > 0:
+            r = sum_x / nobs
+            if same >= nobs:
+                return prev
+            if neg_ct == 0 and r < 0:
+                return 0.0
+            if neg_ct == nobs and r > 0:
+                return 0.0
+            return r
+        return _NAN
+
+    def push(self, x: float) -> float:
+        self.st = self._step(x)
+        self.win.append(_finite(x))
+        if len(self.win) > self.n:
+            self.win.popleft()
+        return self._out(self.st)
+
+    def peek(self, x: float) -> float:
+        return self._out(self._step(x))
+
+class RollVar:
+    """pandas rolling(n).var(ddof=1): Welford with Kahan-compensated mean."""
+    __slots__ = ("n", "ddof", "win", "st")
+
+    def __init__(self, n: int, ddof: int = 1):
+        self.n, self.ddof = n, ddof
+        self.win: deque = deque()
+        self.st = None   # (nobs, mean_x, ssqdm_x, comp_add, comp_remove, num_same, prev_value)
+
+    def _step(self, x: float):
+        x = _finite(x)
+        if self.st is None:
+            nobs, mean_x, ssq, ca, cr, same, prev = 0.0, 0.0, 0.0, 0.0, 0.0, 0, x
+        else:
+            nobs, mean_x, ssq, ca, cr, same, prev = self.st
+            if len(self.win) >= self.n:
+                v = self.win[0]
+                if v == v:
+                    nobs -= 1
+                    if nobs:
+                        prev_mean = mean_x - cr
+                        y = v - cr
+                        t = y - mean_x
+                        cr = t + mean_x - y
+                        mean_x = mean_x - t / nobs
+                        ssq = ssq - (v - prev_mean) * (v - mean_x)
+                    else:
+                        mean_x = 0.0
+                        ssq = 0.0
+        if x == x:
+            nobs += 1
+            same = same + 1 if x == prev else 1
+            prev = x
+            prev_mean = mean_x - ca
+            y = x - ca
+            t = y - mean_x
+            ca = t + mean_x - y
+            mean_x = mean_x + t / nobs if nobs else 0.0
+            ssq = ssq + (x - prev_mean) * (x - mean_x)
+        return nobs, mean_x, ssq, ca, cr, same, prev
+
+    def _out(self, st) -> float:
+        nobs, _, ssq, _, _, same, _ = st
+        if nobs >= self.n and nobs > self.ddof:
+            if nobs == 1 or same >= nobs:
+                return 0.0
+            return ssq / (nobs - self.ddof)
+        return _NAN
+
+    def push(self, x: float) -> float:
+        self.st = self._step(x)
+        self.win.append(_finite(x))
+        if len(self.win) > self.n:
+            self.win.popleft()
+        return self._out(self.st)
+
+    def peek(self, x: float) -> float:
+        return self._out(self._step(x))
+
+def row(c: Candles, i: int) -> tuple:
+    return (int(c.timestamp[i]), float(c.open[i]), float(c.high[i]), float(c.low[i]),
+            float(c.close[i]), float(c.volume[i]))
+
+def same_row(a: tuple, b: tuple) -> bool:
+    return all(x == y or (x != x and y != y) for x, y in zip(a, b))
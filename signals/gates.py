@@ -3,6 +3,17 @@ import pandas as pd
 from .types import GateResult, Side
 from ..indicators.ta import ema, atr, adx, supertrend, vwap, range_filter_direction, rsi, slope
 
+def _as_frame(df) -> pd.DataFrame:
+    # DataFrame: copy như trước; Candles (candles.py) -> frame có index UTC theo open time (vwap daily_utc đọc index.tz)
+    if isinstance(df, pd.DataFrame):
+        return df.copy()
+    return df.to_frame().set_index(pd.to_datetime(df.timestamp, unit="ms", utc=True))
+
+def _last_ts_ms(df) -> int:
+    if not isinstance(df, pd.DataFrame):
+        return int(df.last_ts())
+    return int(df.index[-1].value // 1_000_000)  # ns->ms
+
 def _heavy_direction(ema200_up: bool, st_dir: int, rf_dir: int, side: Side) -> int:
     score = 0
     if side == "long":
@@ -16,7 +27,7 @@ def _heavy_direction(ema200_up: bool, st_dir: int, rf_dir: int, side: Side) -> i
     return score
 
 def compute_h1_gate(h1_df: pd.DataFrame, side: Side, cfg: Dict) -> Tuple[bool, Dict]:
-    h1 = h1_df.copy()
+    h1 = _as_frame(h1_df)
     ema200 = ema(h1["close"], 200)
     ema200_up = ema200.iloc[-1] > ema200.iloc[-2]
     st = supertrend(h1["high"], h1["low"], h1["close"], cfg["supertrend"]["atr_period"], cfg["supertrend"]["multiplier"]).iloc[-1]
@@ -33,7 +44,7 @@ def compute_h1_gate(h1_df: pd.DataFrame, side: Side, cfg: Dict) -> Tuple[bool, D
     }
 
 def compute_m15_features(m15_df: pd.DataFrame, h1_ctx: Dict, side: Side, cfg: Dict) -> Dict:
-    m15 = m15_df.copy()
+    m15 = _as_frame(m15_df)
     ema20 = ema(m15["close"], 20)
     ema50 = ema(m15["close"], 50)
     ema200 = ema(m15["close"], 200)
@@ -138,7 +149,7 @@ def compute_gates(h1_df: pd.DataFrame, m15_df: pd.DataFrame, symbol: str, side:
 
     return GateResult(
         symbol=symbol,
-        timeframe_m15_ts=int(m15_df.index[-1].value // 1_000_000),  # ns->ms
+        timeframe_m15_ts=_last_ts_ms(m15_df),
         side=side,
         h1_ok=h1_ok,
         m15_ok=m15_ok,
@@ -0,0 +1,18 @@
+# tests/conftest.py — shared fixed inputs (synthetic market at a fixed exchange clock)
+import pytest
+
+from candles import TF_MS, Candles
+from fake_exchange import SyntheticMarket, _default_symbols
+
+NOW_MS = 1_760_000_400_000 + 60_000   # bar cuối luôn đang hình thành, cùng dữ liệu mọi lần chạy
+
+
+@pytest.fixture
+def synthetic():
+    """synthetic(n_sym, bars, tf) -> [(symbol_id, Candles)] from a fixed-seed SyntheticMarket."""
+    def make(n_sym: int = 1, bars: int = 300, tf: str = "15m"):
+        mkt = SyntheticMarket(_default_symbols(n_sym))
+        return [(s, Candles.from_ohlcv(mkt.klines(s, TF_MS[tf], start=None, end=None, limit=bars,
+                                                   now_ms=NOW_MS).tolist()))
+                for s in mkt.symbols]
+    return make
@@ -0,0 +1,38 @@
+# tests/test_batch_indicators.py — 2-D block pass vs per-symbol _compute_one_tf
+import numpy as np
+
+from batch_indicators import BatchIndicatorEngine, OUTPUTS
+from candles import Candles
+from indicators import _compute_one_tf
+
+
+def _holes(c):
+    h = Candles(*[np.array(getattr(c, k)) for k in ("timestamp", "open", "high", "low", "close", "volume")])
+    h.close[5::97] = np.nan
+    h.volume[7::89] = np.nan
+    return h
+
+
+def test_block_matches_per_symbol(synthetic):
+    universe = synthetic(4, 300)
+    holes = _holes(universe[1][1])
+    # cửa sổ lẻ độ dài (đi nhánh đơn lẻ) + NaN để kiểm tra _safe
+    series = universe + [("ODD", universe[0][1][:150]), ("HOLES", holes), ("HOLES2", holes)]
+    eng = BatchIndicatorEngine(selective=False)
+    got = eng.compute_many({s: {"M15": {"df": c}} for s, c in series}, {})
+    for s, c in series:
+        ref = _compute_one_tf(c)
+        for k in OUTPUTS:
+            np.testing.assert_array_equal(got[s]["M15"][k].to_numpy(), ref[k].to_numpy(), err_msg=f"{s}:{k}")
+    assert eng.stats == {"blocks": 1, "batched": 6, "single": 1, "fallback": 0}
+    assert set(got["ODD"]) == {"M5", "M15", "H1", "H4", "D1"}
+
+
+def test_selective_block_leaves_unread_outputs_lazy(synthetic, monkeypatch):
+    import indicators
+    monkeypatch.setitem(indicators._USAGE, "M15", {"ema21", "bbw_pctl"})
+    universe = synthetic(3, 200)
+    got = BatchIndicatorEngine().compute_many({s: {"M15": {"df": c}} for s, c in universe}, {})
+    t = got[universe[0][0]]["M15"]
+    assert {"ema21", "bbw", "bbw_pctl"} <= set(t._vals) and "rsi" not in t._vals
+    np.testing.assert_array_equal(t["rsi"].to_numpy(), _compute_one_tf(universe[0][1])["rsi"].to_numpy())
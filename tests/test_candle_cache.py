@@ -0,0 +1,103 @@
+# tests/test_candle_cache.py — DiskCandleCache reads
+import numpy as np
+
+from candle_cache import DiskCandleCache, CANDLE_DTYPE
+from candles import TF_MS
+
+H = TF_MS["1h"]
+T0 = 1_759_276_800_000   # 2025-10-01 00:00 UTC -> tháng trước là 2025-09
+
+
+def _rows(ts, close=1.0):
+    out = np.zeros(len(ts), dtype=CANDLE_DTYPE)
+    out["timestamp"] = ts
+    out["open"] = out["high"] = out["low"] = out["close"] = close
+    return out
+
+
+def test_read_last_counts_deduped_bars(tmp_path):
+    cc = DiskCandleCache(str(tmp_path))
+    old = T0 - np.arange(10, 0, -1) * H            # 10 bar cuối tháng 9
+    new = T0 + np.arange(5) * H                    # 5 bar đầu tháng 10
+    cc.append("BTC/USDT", "1h", _rows(old))
+    cc.append("BTC/USDT", "1h", _rows(new))
+    cc.append("BTC/USDT", "1h", _rows(new, close=2.0))   # ghi lại -> 10 bản ghi, 5 bar
+    got = cc.read("BTC/USDT", "1h", last=8)
+    np.testing.assert_array_equal(got["timestamp"], np.r_[old[-3:], new])
+    assert (got["close"][-5:] == 2.0).all()   # bản ghi sau thắng
+
+
+def test_read_last_counts_bars_inside_range(tmp_path):
+    cc = DiskCandleCache(str(tmp_path))
+    old = T0 - np.arange(10, 0, -1) * H
+    new = T0 + np.arange(5) * H
+    cc.append("BTC/USDT", "1h", _rows(np.r_[old, new]))
+    got = cc.read("BTC/USDT", "1h", end=int(new[1]), last=4)
+    np.testing.assert_array_equal(got["timestamp"], np.r_[old[-2:], new[:2]])
+
+
+
+def test_check_reports_duplicates_unsorted_misaligned_and_gaps(tmp_path):
+    cc = DiskCandleCache(str(tmp_path))
+    ts = T0 + np.arange(6) * H
+    cc.append("BTC/USDT", "1h", _rows(ts[[0, 1, 2, 5]]))
+    cc.append("BTC/USDT", "1h", _rows(ts[[1]]))             # trùng + ghi lùi
+    cc.append("BTC/USDT", "1h", _rows([int(ts[5]) + 60_000]))   # lệch biên bar
+    rep = cc.check("BTC/USDT", "1h")
+    assert rep["rows"] == 5 and rep["duplicates"] == 1
+    assert rep["unsorted"] == 1 and rep["misaligned"] == 1
+    assert rep["gaps"] == [{"from": int(ts[2]), "to": int(ts[5]), "missing": 2}]
+
+
+def test_compact_rewrites_sorted_and_deduped(tmp_path):
+    cc = DiskCandleCache(str(tmp_path))
+    old = T0 - np.arange(3, 0, -1) * H
+    new = T0 + np.arange(3) * H
+    cc.append("BTC/USDT", "1h", _rows(np.r_[new, old]))
+    cc.append("BTC/USDT", "1h", _rows(new[:2], close=2.0))
+    before = cc.read("BTC/USDT", "1h").copy()
+    assert cc.compact("BTC/USDT", "1h") == {"rows_before": 8, "rows_after": 6}
+    rep = cc.check("BTC/USDT", "1h")
+    assert rep["duplicates"] == 0 and rep["unsorted"] == 0 and rep["gaps"] == []
+    np.testing.assert_array_equal(cc.read("BTC/USDT", "1h"), before)
+    assert list(cc.read("BTC/USDT", "1h")["close"]) == [1.0, 1.0, 1.0, 2.0, 2.0, 1.0]
+    assert cc.compact("BTC/USDT", "1h") == {"rows_before": 6, "rows_after": 6}
+
+
+def test_series_skips_plain_files(tmp_path):
+    cc = DiskCandleCache(str(tmp_path))
+    cc.append("BTC/USDT", "1h", _rows([T0]))
+    cc.append("ETH/USDT", "15m", _rows([T0]))
+    (tmp_path / "README").write_text("x")
+    (tmp_path / "BTC_USDT" / "notes.txt").write_text("x")
+    assert cc.series() == [("BTC_USDT", "1h"), ("ETH_USDT", "15m")]
+
+
+def test_datafeed_warm_starts_from_disk(tmp_path):
+    import asyncio, time
+    from data import DataFeed
+    from fake_exchange import FakeExchange, SyntheticMarket, VirtualClock
+
+    sym, m15 = "BTC/USDT", TF_MS["15m"]
+    t0 = T0 + 60_000
+    cfg = {"data": {"cache": {"enabled": True, "root": str(tmp_path)}, "limit": {"M15": 100}}}
+
+    def boot(now):
+        ex = FakeExchange(SyntheticMarket([sym]), clock=VirtualClock(speed=0.0, start_ms=now))
+        ex.options["timeDifference"] = int(time.time() * 1000) - now
+        return ex, DataFeed(ex, cfg, None)
+
+    _, feed = boot(t0)
+    asyncio.run(feed._fetch_tf(sym, "15m"))
+    disk = DiskCandleCache(str(tmp_path)).read(sym, "15m")
+    assert len(disk) == 99 and int(disk["timestamp"][-1]) == T0 - m15   # chỉ bar đã đóng
+
+    ex, feed = boot(t0 + 5 * m15)   # boot lại sau 5 bar
+    df = asyncio.run(feed._fetch_tf(sym, "15m"))["df"]
+    assert feed.fetch_stats["full"] == 0 and feed.fetch_stats["delta"] == 1
+    assert feed.fetch_stats["bars_requested"] <= 8
+    _, fresh = boot(t0 + 5 * m15)
+    ref = asyncio.run(fresh._fetch_tf(sym, "15m"))["df"]
+    np.testing.assert_array_equal(df.timestamp, ref.timestamp)
+    np.testing.assert_allclose(df.close, ref.close)
+    assert len(DiskCandleCache(str(tmp_path)).read(sym, "15m")) == 104
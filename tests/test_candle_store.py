@@ -0,0 +1,67 @@
+# tests/test_candle_store.py — CandleStore merge on timestamps
+import numpy as np
+
+from candles import Candles
+from data import CandleStore
+
+K = "BTC/USDT:15m"
+STEP = 900_000
+
+
+def _bars(idx, px=0.0):
+    idx = np.asarray(idx, dtype=np.int64)
+    f = idx.astype(np.float64) + px
+    return Candles(idx * STEP, f, f + 1, f - 1, f, f)
+
+
+def test_overlap_delta_wins_and_forming_bar_replaced():
+    st = CandleStore()
+    st.merge(K, _bars(range(10)), 100)
+    out = st.merge(K, _bars([8, 9, 10], px=0.5), 100)
+    assert list(out.timestamp // STEP) == list(range(11))
+    assert list(out.close[:8]) == list(range(8))
+    assert list(out.close[8:]) == [8.5, 9.5, 10.5]
+
+
+def test_old_bars_missing_from_sparse_delta_are_kept():
+    st = CandleStore()
+    st.merge(K, _bars(range(10)), 100)
+    out = st.merge(K, _bars([3, 7, 9], px=0.5), 100)   # 4..6 và 8 không có trong delta
+    assert list(out.timestamp // STEP) == list(range(10))
+    assert out.close[5] == 5.0 and out.close[8] == 8.0
+    assert out.close[3] == 3.5 and out.close[7] == 7.5 and out.close[9] == 9.5
+
+
+def test_gap_between_buffer_and_delta():
+    st = CandleStore()
+    st.merge(K, _bars(range(5)), 100)
+    out = st.merge(K, _bars([20, 21]), 100)
+    assert list(out.timestamp // STEP) == [0, 1, 2, 3, 4, 20, 21]
+
+
+def test_delta_older_than_buffer_is_interleaved():
+    st = CandleStore()
+    st.merge(K, _bars([5, 6, 7]), 100)
+    out = st.merge(K, _bars([1, 2, 6], px=0.5), 100)
+    assert list(out.timestamp // STEP) == [1, 2, 5, 6, 7]
+    assert out.close[3] == 6.5
+
+
+def test_maxlen_trims_oldest():
+    st = CandleStore()
+    st.merge(K, _bars(range(10)), 8)
+    assert list(st.get(K).timestamp // STEP) == list(range(2, 10))
+    out = st.merge(K, _bars([9, 10, 11], px=0.5), 8)
+    assert len(out) == 8
+    assert list(out.timestamp // STEP) == list(range(4, 12))
+    out = st.merge(K, _bars([6, 12]), 8)   # chồng lấn một phần + bar mới
+    assert list(out.timestamp // STEP) == list(range(5, 13))
+    assert out.close[1] == 6.0
+
+
+def test_merge_does_not_mutate_handed_out_views():
+    st = CandleStore()
+    first = st.merge(K, _bars(range(5)), 100)
+    snap = first.close.copy()
+    st.merge(K, _bars([4], px=0.5), 100)
+    assert np.array_equal(first.close, snap)
@@ -0,0 +1,65 @@
+# tests/test_candles.py — Candles columnar container
+import numpy as np
+import pytest
+
+from candles import Candles
+
+
+def _bars(n, dtype):
+    f = np.arange(n, dtype=dtype)
+    return Candles(np.arange(n, dtype=np.int64) * 60_000, f, f + 1, f - 1, f, f)
+
+
+def test_concat_keeps_dtype():
+    for dt in (np.float32, np.float64):
+        assert Candles.concat([_bars(3, dt), _bars(2, dt)]).dtype == dt
+        empty = Candles.concat([Candles.empty(dt), _bars(0, dt)])
+        assert len(empty) == 0 and empty.dtype == dt
+        assert all(getattr(empty, c).dtype == dt for c in ("open", "high", "low", "close", "volume"))
+        assert empty.timestamp.dtype == np.int64
+    assert Candles.concat([]).dtype == np.float64
+
+
+def test_from_ohlcv_builds_columns():
+    c = Candles.from_ohlcv([[0, 1.0, 2.0, 0.5, 1.5, 10.0], [60_000, 1.5, 2.5, 1.0, 2.0, 20.0]], np.float32)
+    assert c.timestamp.dtype == np.int64 and c.dtype == np.float32
+    assert list(c.timestamp) == [0, 60_000]
+    assert list(c.high) == [2.0, 2.5] and list(c.volume) == [10.0, 20.0]
+    assert len(Candles.from_ohlcv(None)) == 0 and len(Candles.from_ohlcv([])) == 0
+    with pytest.raises(ValueError):
+        Candles.from_ohlcv([[0, 1.0, 2.0]])
+
+
+def test_dedupe_sorts_and_keeps_last_row():
+    ts = np.array([120_000, 0, 60_000, 0, 120_000], dtype=np.int64)
+    f = np.arange(5, dtype=np.float64)
+    c = Candles(ts, f, f, f, f, f).dedupe()
+    assert list(c.timestamp) == [0, 60_000, 120_000]
+    assert list(c.close) == [3.0, 2.0, 4.0]
+    clean = _bars(4, np.float64)
+    assert clean.dedupe() is clean
+
+
+def test_slices_are_views_and_masks_copy():
+    c = _bars(6, np.float64)
+    tail = c[-3:]
+    assert len(tail) == 3 and list(tail.timestamp) == [180_000, 240_000, 300_000]
+    assert np.shares_memory(tail.close, c.close)
+    picked = c[c.close > 3]
+    assert list(picked.close) == [4.0, 5.0] and not np.shares_memory(picked.close, c.close)
+    assert c["close"] is c.close and "volume" in c
+    with pytest.raises(KeyError):
+        c["vwap"]
+
+
+def test_from_frame_sorts_and_coerces():
+    import pandas as pd
+    df = pd.DataFrame({"timestamp": [120_000, 0, 60_000], "open": ["3", "1", "x"],
+                       "high": [3.0, 1.0, 2.0], "low": [3.0, 1.0, 2.0], "close": [3.0, 1.0, 2.0]})
+    c = Candles.from_frame(df)
+    assert list(c.timestamp) == [0, 60_000, 120_000]
+    assert list(c.close) == [1.0, 2.0, 3.0]
+    assert c.open[0] == 1.0 and np.isnan(c.open[1]) and c.open[2] == 3.0   # chuỗi -> số, lỗi -> NaN
+    assert np.isnan(c.volume).all()   # cột thiếu -> NaN
+    assert Candles.from_frame(c) is c and Candles.from_frame(c, np.float32).dtype == np.float32
+    np.testing.assert_array_equal(c.to_frame()["close"].to_numpy(), c.close)
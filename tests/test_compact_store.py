@@ -0,0 +1,76 @@
+# tests/test_compact_store.py — float32 blocks vs float64 outputs and decisions
+import numpy as np
+import pytest
+
+import engine_flow
+from compact_store import _RAW, ColView, CompactStore
+from engine_vote import decide_side
+from indicators import CORE_OUTPUTS, IndicatorEngine
+
+TFS = (("M5", "5m"), ("M15", "15m"), ("H1", "1h"), ("H4", "4h"), ("D1", "1d"))
+
+
+def _universe(synthetic, n_sym=4, bars=300):
+    per_tf = {tf: synthetic(n_sym, bars, ctf) for tf, ctf in TFS}
+    syms = [s for s, _ in per_tf["M5"]]
+    return {s: {tf: {"df": per_tf[tf][i][1]} for tf, _ in TFS} for i, s in enumerate(syms)}
+
+
+def _decide(ind, cfg):
+    flow, scores = engine_flow._calc_vfi(ind, cfg)
+    return decide_side({"indicators": ind, "config": cfg, "group_scores": {"flow": flow}, "vfi_scores": scores})
+
+
+def test_compact_outputs_and_decisions_match_float64(synthetic):
+    raw = _universe(synthetic)
+    eng, store = IndicatorEngine(), CompactStore(64)
+    for s, r in raw.items():
+        ref = eng.compute_all(s, r, {})
+        got = store.attach(s, eng.compute_all(s, r, {}))
+        for tf, t in ref.items():
+            for k in CORE_OUTPUTS:
+                a, b = np.asarray(t[k], dtype=np.float64), np.asarray(got[tf][k], dtype=np.float64)
+                if k not in _RAW:   # close/volume vẫn là cột của candles
+                    assert isinstance(got[tf][k], ColView) and got[tf][k].dtype == np.float32
+                np.testing.assert_array_equal(np.isfinite(a), np.isfinite(b), err_msg=f"{s}:{tf}:{k}")
+                ok = np.isfinite(a)
+                np.testing.assert_allclose(b[ok], a[ok], rtol=1e-6, atol=1e-12, err_msg=f"{s}:{tf}:{k}")
+        assert _decide(got, {})["side"] == _decide(ref, {})["side"]
+    assert store.metrics()["alloc"] == len(raw) * len(TFS)
+
+
+def test_blocks_are_reused_and_views_read_only(synthetic):
+    raw = _universe(synthetic, 1, 120)
+    s = next(iter(raw))
+    eng, store = IndicatorEngine(), CompactStore(64)
+    v = store.attach(s, eng.compute_all(s, raw[s], {}))["M15"]["ema21"]
+    v.iloc[-1]
+    with pytest.raises(ValueError):
+        np.asarray(v)[0] = 1.0
+    store.attach(s, eng.compute_all(s, raw[s], {}))["M15"]["ema21"]
+    assert store.metrics()["alloc"] == len(TFS)   # chu kỳ sau ghi đè block cũ
+
+
+def test_budget_evicts_least_recent(synthetic):
+    store = CompactStore(budget_mb=0.001)   # ~1 KB: mỗi block mới đẩy block cũ ra
+    for i in range(3):
+        store.block(f"S{i}", "M15", 100, 2)
+    m = store.metrics()
+    assert m["blocks"] == 1 and m["evict"] == 2
+
+
+
+def test_compact_is_not_combined_with_indicator_cache(synthetic, monkeypatch):
+    from compact_store import budget_report
+    monkeypatch.setattr(engine_flow, "_compact_store", None)
+    monkeypatch.setattr(engine_flow, "_compact_rejected", False)
+    cfg = {"indicators": {"cache": {"enabled": True}, "compact": {"enabled": True}}}
+    (s, c), = synthetic(1, 120)
+    ind = engine_flow._compacted(s, IndicatorEngine().compute_all(s, {"M15": {"df": c}}, cfg), cfg)
+    # entry của cache giữ TfIndicators qua nhiều cycle -> không được trỏ vào block bị cycle sau ghi đè
+    assert ind["M15"].block is None and not isinstance(ind["M15"]["ema21"], ColView)
+    assert engine_flow._compact_store is None and engine_flow._compact_rejected
+    assert budget_report(cfg, 1, {"M15": 120})["compact"] == {"off": "indicators.cache enabled"}
+    cfg["indicators"]["cache"]["enabled"] = False
+    assert isinstance(engine_flow._compacted(s, IndicatorEngine().compute_all(s, {"M15": {"df": c}}, cfg), cfg)
+                      ["M15"]["ema21"], ColView)
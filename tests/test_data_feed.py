@@ -0,0 +1,69 @@
+# tests/test_data_feed.py — DataFeed window sizing against the fake exchange
+import asyncio, time
+
+import indicators
+from data import DataFeed
+from fake_exchange import FakeExchange, SyntheticMarket, VirtualClock
+
+SYM = "BTC/USDT"
+T0 = 1_760_000_400_000 + 60_000
+
+
+def _feed(data_cfg):
+    ex = FakeExchange(SyntheticMarket([SYM]), clock=VirtualClock(speed=0.0, start_ms=T0))
+    ex.options["timeDifference"] = int(time.time() * 1000) - T0   # giờ sàn ngay từ lần đọc đầu
+    return ex, DataFeed(ex, {"data": {"warmup": {"enabled": True, "min_bars": 30}, **data_cfg}}, None)
+
+
+def test_streamed_window_grows_when_warmup_grows(monkeypatch):
+    monkeypatch.setitem(indicators._USAGE, "M15", set())
+    ex, feed = _feed({})
+    asyncio.run(feed._fetch_tf(SYM, "15m"))
+    assert len(feed.store.get(f"{SYM}:15m")) == 30
+
+    feed.streaming = True   # key không stale -> trước đây trả store cũ, không nạp lại
+    indicators._USAGE["M15"].add("ema50")
+    lim = feed._limit("15m")
+    assert lim > 30
+    df = asyncio.run(feed._fetch_tf(SYM, "15m"))["df"]
+    assert len(df) == lim
+    calls = ex.calls["fetch_ohlcv"]
+    asyncio.run(feed._fetch_tf(SYM, "15m"))
+    assert ex.calls["fetch_ohlcv"] == calls   # nạp lại đúng một lần
+
+
+def test_derived_timeframe_grows_when_warmup_grows(monkeypatch):
+    monkeypatch.setitem(indicators._USAGE, "H1", set())
+    ex, feed = _feed({"derive": {"enabled": True, "base_tf": "5m"}})
+    tfs, map_tf = ["M5", "H1"], {"M5": "5m", "H1": "1h"}
+    out = asyncio.run(feed._fetch_derived(SYM, tfs, map_tf))
+    assert len(out["H1"]["df"]) == 30
+
+    indicators._USAGE["H1"].add("ema50")
+    lim = feed._limit("1h")
+    out = asyncio.run(feed._fetch_derived(SYM, tfs, map_tf))
+    assert len(out["H1"]["df"]) == lim
+
+
+def test_warm_started_window_grows_when_warmup_grows(monkeypatch, tmp_path):
+    monkeypatch.setitem(indicators._USAGE, "M15", set())
+    cache = {"cache": {"enabled": True, "root": str(tmp_path)}}
+    _, feed = _feed(cache)
+    asyncio.run(feed._fetch_tf(SYM, "15m"))   # ghi 29 bar đã đóng xuống đĩa
+
+    indicators._USAGE["M15"].add("ema50")
+    _, feed = _feed(cache)   # boot lại từ đĩa với warm-up dài hơn
+    df = asyncio.run(feed._fetch_tf(SYM, "15m"))["df"]
+    assert len(df) == feed._limit("15m")
+
+
+def test_declared_keys_size_window_before_any_read(monkeypatch):
+    from engine_flow import indicator_keys
+    monkeypatch.setattr(indicators, "_USAGE", {})
+    ex, feed = _feed({})
+    assert feed._limit("1h") == 30
+    feed.declare(indicator_keys({}))
+    lim = feed._limit("1h")
+    assert lim == indicators.warmup_bars({"ema200"}) + 1
+    df = asyncio.run(feed._fetch_tf(SYM, "1h"))["df"]
+    assert len(df) == lim and not feed._grown(f"{SYM}:1h", feed._limit("1h"))
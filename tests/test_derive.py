@@ -0,0 +1,69 @@
+# tests/test_derive.py — higher timeframes derived locally from the base series (data.derive)
+import asyncio, time
+
+import numpy as np
+
+from candles import Candles
+from data import DataFeed, resample_ohlcv
+from fake_exchange import FakeExchange, SyntheticMarket, VirtualClock
+
+SYM = "BTC/USDT"
+H1, H4, D1 = 3_600_000, 14_400_000, 86_400_000
+DAY0 = 1_760_054_400_000   # 00:00 UTC
+
+
+def _hourly(start, n):
+    ts = start + np.arange(n, dtype=np.int64) * H1
+    f = np.arange(n, dtype=np.float64)
+    return Candles(ts, 100 + f, 101 + f, 99 - f, 100.5 + f, np.ones(n))
+
+
+def test_h4_buckets_align_to_utc():
+    c = _hourly(DAY0 - 2 * H1, 9)   # 22:00 .. 06:00 UTC
+    out = resample_ohlcv(c, H4)
+    assert list(out.timestamp) == [DAY0 - H4, DAY0, DAY0 + H4]
+    assert list(out.open) == [100.0, 102.0, 106.0]
+    assert list(out.high) == [102.0, 106.0, 109.0]
+    assert list(out.low) == [98.0, 94.0, 91.0]
+    assert list(out.close) == [101.5, 105.5, 108.5]
+    assert list(out.volume) == [2.0, 4.0, 3.0]
+
+
+def test_d1_buckets_split_at_midnight_utc():
+    c = _hourly(DAY0 - 3 * H1, 30)
+    out = resample_ohlcv(c, D1)
+    assert list(out.timestamp) == [DAY0 - D1, DAY0, DAY0 + D1]
+    assert list(out.volume) == [3.0, 24.0, 3.0]
+    assert out.open[1] == 103.0 and out.close[1] == 126.5
+
+
+def test_incomplete_last_bucket_is_forming():
+    c = _hourly(DAY0, 6)   # H4 thứ hai mới có 2 bar
+    out = resample_ohlcv(c, H4)
+    assert list(out.timestamp) == [DAY0, DAY0 + H4]
+    assert out.close[-1] == c.close[-1] and out.high[-1] == c.high[-1]
+    assert out.volume[-1] == 2.0
+    assert len(resample_ohlcv(Candles.empty(), H4)) == 0
+
+
+def test_incremental_merge_matches_full_resample():
+    t0 = DAY0 + 13 * 300_000 + 60_000
+    ex = FakeExchange(SyntheticMarket([SYM]), clock=VirtualClock(speed=0.0, start_ms=t0))
+    cfg = {"data": {"derive": {"enabled": True, "base_tf": "5m"}, "limit": {"M5": 300, "H1": 30, "H4": 30}}}
+    feed = DataFeed(ex, cfg, None)
+    tfs, map_tf = ["M5", "H1", "H4"], {"M5": "5m", "H1": "1h", "H4": "4h"}
+    for step in range(12):
+        ex.clock.start_ms += 7 * 300_000
+        ex.options["timeDifference"] = int(time.time() * 1000) - ex.clock.now_ms()
+        out = asyncio.run(feed._fetch_derived(SYM, tfs, map_tf))
+        base = out["M5"]["df"]
+        for tf, tf_ms in (("H1", H1), ("H4", H4)):
+            full = resample_ohlcv(base, tf_ms)
+            full = full[full.timestamp >= base.timestamp[0]]   # bỏ bucket đầu chỉ phủ một phần
+            got = out[tf]["df"]
+            idx = np.searchsorted(got.timestamp, full.timestamp)
+            assert (got.timestamp[idx] == full.timestamp).all()
+            for c in ("open", "high", "low", "close", "volume"):
+                assert np.allclose(getattr(got, c)[idx], getattr(full, c)), (step, tf, c)
+            assert got.last_ts() == base.last_ts() // tf_ms * tf_ms
+    assert ex.calls["fetch_ohlcv"] == 12 + 2   # base mỗi cycle + seed H1/H4 một lần
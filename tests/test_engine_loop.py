@@ -0,0 +1,91 @@
+# tests/test_engine_loop.py — engine_loop stage switches (indicators.batch / indicators.vfi_batch / voting.batch)
+import asyncio, time
+from types import SimpleNamespace
+
+import pytest
+
+import engine_flow
+from data import DataFeed
+from fake_exchange import FakeExchange, SyntheticMarket, VirtualClock
+
+SYMS = ["BTC/USDT", "ETH/USDT", "SOL/USDT"]
+T0 = 1_760_000_400_000 + 60_000
+
+
+def _feed():
+    ex = FakeExchange(SyntheticMarket(SYMS), clock=VirtualClock(speed=0.0, start_ms=T0))
+    ex.options["timeDifference"] = int(time.time() * 1000) - T0
+    return DataFeed(ex, {"data": {"limit": {"M15": 120, "H1": 60, "H4": 60, "D1": 60}}}, None)
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    seen = {"vfi_batch": 0, "vote_batch": 0}
+    vfi_batch, vote_batch = engine_flow.vfi_score_batch, engine_flow.decide_side_batch
+
+    def _vfi(*a, **k):
+        seen["vfi_batch"] += 1
+        return vfi_batch(*a, **k)
+
+    def _vote(*a, **k):
+        seen["vote_batch"] += 1
+        return vote_batch(*a, **k)
+    monkeypatch.setattr(engine_flow, "vfi_score_batch", _vfi)
+    monkeypatch.setattr(engine_flow, "decide_side_batch", _vote)
+    monkeypatch.setattr(engine_flow, "_order_mgr",
+                        SimpleNamespace(position=None, open_if_ok=lambda ctx, side: None, manage=lambda ctx: None))
+    return seen
+
+
+def _run(cfg, feed=None):
+    res = asyncio.run(engine_flow.engine_loop(SYMS, feed or _feed(), cfg, {}))
+    return {r["symbol"]: r for r in res}
+
+
+def _same(a, b):
+    for s in SYMS:
+        assert a[s]["status"] == b[s]["status"] == "OK"
+        assert a[s]["decision"][0] == b[s]["decision"][0]
+        assert a[s]["decision"][1] == pytest.approx(b[s]["decision"][1])
+        assert a[s]["vfi_flow"] == pytest.approx(b[s]["vfi_flow"])
+
+
+def test_default_path_runs_no_batched_stage(calls):
+    _run({})
+    assert calls == {"vfi_batch": 0, "vote_batch": 0}
+
+
+def test_vfi_and_vote_batches_run_without_batch_indicators(calls):
+    ref = _run({})
+    got = _run({"indicators": {"vfi_batch": {"enabled": True}}, "voting": {"batch": {"enabled": True}}})
+    assert calls == {"vfi_batch": 1, "vote_batch": 1}
+    _same(ref, got)
+    assert any(got[s]["vfi_flow"] != 0.0 for s in SYMS)
+
+
+def test_vote_batch_alone_scores_vfi_per_symbol(calls):
+    ref = _run({})
+    got = _run({"voting": {"batch": {"enabled": True}}})
+    assert calls == {"vfi_batch": 0, "vote_batch": 1}
+    _same(ref, got)
+
+
+def test_batch_indicators_alone_keeps_scalar_vfi_and_vote(calls):
+    ref = _run({})
+    got = _run({"indicators": {"batch": {"enabled": True}}})
+    assert calls == {"vfi_batch": 0, "vote_batch": 0}
+    _same(ref, got)
+
+
+def test_staged_latency_is_per_symbol(calls):
+    feed = _feed()
+    fetch = feed.fetch_all_timeframes
+
+    async def slow(sym):
+        if sym == SYMS[0]:
+            await asyncio.sleep(0.3)
+        return await fetch(sym)
+    feed.fetch_all_timeframes = slow
+    got = _run({"voting": {"batch": {"enabled": True}}}, feed)
+    assert got[SYMS[0]]["latency_sec"] >= 0.3
+    assert all(got[s]["latency_sec"] < 0.3 for s in SYMS[1:])
@@ -0,0 +1,48 @@
+# tests/test_exchange_backend.py — async ccxt backend with a pooled session against the fake REST server
+import asyncio, socket
+
+import numpy as np
+
+from data import build_exchange, open_exchange, close_exchange, fetch_ohlcv
+from fake_exchange import FakeBinanceServer, SyntheticMarket, VirtualClock
+
+T0 = 1_760_000_400_000 + 60_000
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_async_backend_opens_fetches_and_closes():
+    srv = FakeBinanceServer(SyntheticMarket(["BTC/USDT"]), port=_free_port(),
+                            clock=VirtualClock(speed=0.0, start_ms=T0))
+    cfg = {"exchange": {"backend": "async", "base_url": srv.base_url, "pool_size": 4}}
+
+    async def main():
+        await srv.start()
+        try:
+            ex = build_exchange(cfg)
+            assert ex.session is None   # session chỉ được tạo trong event loop
+            await open_exchange(ex, cfg)
+            session = ex.session
+            assert session is not None and session.connector.limit == 4
+            assert "BTC/USDT:USDT" in ex.markets
+
+            rows = await asyncio.gather(*[fetch_ohlcv(ex, "BTC/USDT:USDT", "15m", since=None, limit=20)
+                                          for _ in range(3)])
+            assert ex.session is session   # mọi request dùng chung một pool
+            await close_exchange(ex)
+            assert session.closed
+            return rows
+        finally:
+            await srv.stop()
+
+    rows = asyncio.run(main())
+    assert srv.requests >= 4   # exchangeInfo + 3 klines
+    for r in rows:
+        ts = np.array([b[0] for b in r], dtype=np.int64)
+        assert len(ts) == 20 and (np.diff(ts) == 900_000).all()
+        assert ts[-1] == T0 // 900_000 * 900_000   # bar đang hình thành theo đồng hồ sàn giả
+    assert rows[0] == rows[1] == rows[2]
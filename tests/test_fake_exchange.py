@@ -0,0 +1,150 @@
+# tests/test_fake_exchange.py — SyntheticMarket / ReplayMarket paging, injected faults, /stream frames
+import asyncio, json, socket
+
+import ccxt
+import numpy as np
+import pytest
+
+from candle_cache import DiskCandleCache, CANDLE_DTYPE
+from candles import TF_MS
+from fake_exchange import (FakeBinanceServer, FakeExchange, FaultInjector, ReplayMarket, SyntheticMarket,
+                           VirtualClock)
+
+M15 = TF_MS["15m"]
+T0 = 1_760_000_400_000 + 60_000   # 1 phút sau open của một bar M15
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_synthetic_paging_limit_start_and_forming_bar():
+    mkt = SyntheticMarket(["BTC/USDT"])
+    tail = mkt.klines("BTCUSDT", M15, start=None, end=None, limit=10, now_ms=T0)
+    assert len(tail) == 10 and tail[-1, 0] == T0 // M15 * M15
+    assert (np.diff(tail[:, 0]) == M15).all()
+    assert tail[-1, 5] < tail[-2, 5]   # bar đang hình thành: volume theo phần đã trôi qua
+
+    first = int(tail[0, 0])
+    page = mkt.klines("BTCUSDT", M15, start=first + 1, end=None, limit=3, now_ms=T0)   # start làm tròn lên
+    np.testing.assert_array_equal(page, tail[1:4])
+    assert len(mkt.klines("BTCUSDT", M15, start=first, end=first + 2 * M15, limit=100, now_ms=T0)) == 3
+    assert len(mkt.klines("BTCUSDT", M15, start=T0 + M15, end=None, limit=5, now_ms=T0)) == 0
+    assert len(mkt.klines("NOPEUSDT", M15, start=None, end=None, limit=5, now_ms=T0)) == 0
+
+
+def test_fake_exchange_caps_page_size():
+    fut = FakeExchange(SyntheticMarket(["BTC/USDT"]), clock=VirtualClock(speed=0.0, start_ms=T0))
+    spot = fut.spot_twin()
+    rows = asyncio.run(fut.fetch_ohlcv("BTC/USDT:USDT", "15m", limit=5000))
+    assert len(rows) == 1500
+    assert len(asyncio.run(spot.fetch_ohlcv("BTC/USDT", "15m", limit=5000))) == 1000
+    with pytest.raises(ccxt.BadRequest):
+        asyncio.run(fut.fetch_ohlcv("BTC/USDT:USDT", "7m", limit=5))
+
+
+def test_replay_market_serves_only_closed_bars(tmp_path):
+    cc = DiskCandleCache(str(tmp_path))
+    rec = np.zeros(20, dtype=CANDLE_DTYPE)
+    rec["timestamp"] = T0 // M15 * M15 - np.arange(20, 0, -1) * M15
+    rec["close"] = np.arange(20)
+    cc.append("BTC/USDT", "15m", rec)
+    mkt = ReplayMarket(str(tmp_path))
+    assert mkt.symbols == ["BTCUSDT"]
+    now = int(rec["timestamp"][9]) + M15 + 1   # bar 9 vừa đóng
+    tail = mkt.klines("BTCUSDT", M15, start=None, end=None, limit=4, now_ms=now)
+    assert list(tail[:, 4]) == [6.0, 7.0, 8.0, 9.0]
+    page = mkt.klines("BTCUSDT", M15, start=int(rec["timestamp"][8]), end=None, limit=10, now_ms=now)
+    assert list(page[:, 4]) == [8.0, 9.0]
+    assert mkt.span() == (int(rec["timestamp"][0]), int(rec["timestamp"][-1]))
+
+
+def test_fault_injector_rates_are_reproducible():
+    a, b = FaultInjector(rate_429=0.2, error_rate=0.1, seed=3), FaultInjector(rate_429=0.2, error_rate=0.1, seed=3)
+    rolls = [a.roll() for _ in range(2000)]
+    assert rolls == [b.roll() for _ in range(2000)]
+    assert a.stats["requests"] == 2000
+    assert 300 < a.stats["429"] < 500 and 120 < a.stats["errors"] < 280
+    assert rolls.count("429") == a.stats["429"] and rolls.count("error") == a.stats["errors"]
+    assert FaultInjector(latency_ms=10, jitter_ms=0).delay_sec() == 0.01
+
+
+def test_injected_faults_raise_ccxt_errors():
+    ex = FakeExchange(SyntheticMarket(["BTC/USDT"]), clock=VirtualClock(speed=0.0, start_ms=T0),
+                      faults=FaultInjector(rate_429=1.0))
+    with pytest.raises(ccxt.RateLimitExceeded):
+        asyncio.run(ex.fetch_ohlcv("BTC/USDT:USDT", "15m", limit=5))
+    ex.faults = FaultInjector(error_rate=1.0)
+    with pytest.raises(ccxt.ExchangeNotAvailable):
+        asyncio.run(ex.fetch_ohlcv("BTC/USDT:USDT", "15m", limit=5))
+    assert ex.calls["fetch_ohlcv"] == 2
+
+
+def test_server_paging_limit_and_fault_status():
+    import aiohttp
+    srv = FakeBinanceServer(SyntheticMarket(["BTC/USDT"]), port=_free_port(),
+                            clock=VirtualClock(speed=0.0, start_ms=T0))
+
+    async def main():
+        await srv.start()
+        try:
+            async with aiohttp.ClientSession() as s:
+                async with s.get(f"{srv.base_url}/fapi/v1/klines",
+                                 params={"symbol": "BTCUSDT", "interval": "15m", "limit": "5000"}) as r:
+                    fut = await r.json()
+                async with s.get(f"{srv.base_url}/api/v3/klines",
+                                 params={"symbol": "BTCUSDT", "interval": "15m", "limit": "5000"}) as r:
+                    spot = await r.json()
+                async with s.get(f"{srv.base_url}/fapi/v1/klines",
+                                 params={"symbol": "BTCUSDT", "interval": "7m"}) as r:
+                    bad = r.status
+                srv.faults = FaultInjector(rate_429=1.0)
+                async with s.get(f"{srv.base_url}/fapi/v1/time") as r:
+                    limited = (r.status, r.headers.get("Retry-After"))
+                srv.faults = FaultInjector(error_rate=1.0)
+                async with s.get(f"{srv.base_url}/fapi/v1/time") as r:
+                    down = r.status
+            return fut, spot, bad, limited, down
+        finally:
+            await srv.stop()
+
+    fut, spot, bad, limited, down = asyncio.run(main())
+    assert len(fut) == 1500 and len(spot) == 1000
+    assert fut[-1][0] == T0 // M15 * M15 and fut[-1][6] == fut[-1][0] + M15 - 1
+    assert bad == 400 and limited == (429, "1") and down == 503
+
+
+def test_stream_sends_update_then_closed_bar():
+    import aiohttp
+    clock = VirtualClock(speed=0.0, start_ms=T0)
+    srv = FakeBinanceServer(SyntheticMarket(["BTC/USDT"]), port=_free_port(), clock=clock, ws_tick_ms=10)
+    open0 = T0 // M15 * M15
+
+    async def main():
+        await srv.start()
+        frames = []
+        try:
+            async with aiohttp.ClientSession() as s:
+                async with s.ws_connect(f"{srv.base_url}/stream?streams=btcusdt@kline_15m") as ws:
+                    frames.append(json.loads((await ws.receive()).data))
+                    clock.start_ms += M15   # bar open0 đóng
+                    while len(frames) < 20:
+                        frames.append(json.loads((await ws.receive()).data))
+                        if frames[-1]["data"]["k"]["x"]:
+                            frames.append(json.loads((await ws.receive()).data))
+                            break
+        finally:
+            await srv.stop()
+        return frames
+
+    frames = asyncio.run(main())
+    assert frames[0]["stream"] == "btcusdt@kline_15m"
+    k0 = frames[0]["data"]["k"]
+    assert k0["t"] == open0 and not k0["x"] and k0["s"] == "BTCUSDT" and k0["i"] == "15m"
+    closed = [f["data"]["k"] for f in frames if f["data"]["k"]["x"]]
+    assert len(closed) == 1 and closed[0]["t"] == open0 and closed[0]["T"] == open0 + M15 - 1
+    assert float(closed[0]["v"]) > float(k0["v"])   # bản chốt có đủ volume của cả bar
+    nxt = frames[-1]["data"]["k"]
+    assert nxt["t"] == open0 + M15 and not nxt["x"]
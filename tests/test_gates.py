@@ -0,0 +1,58 @@
+# tests/test_gates.py — signals/gates.py on Candles vs the legacy DataFrame input
+import importlib
+import importlib.util
+import os
+import sys
+import types
+
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _load_gates():
+    # gates.py dùng import tương đối (..indicators.ta, .types) -> dựng package cha tạm, nạp theo đường dẫn
+    pkg = types.ModuleType("bsgates")
+    pkg.__path__ = [ROOT]
+    sys.modules["bsgates"] = pkg
+    for sub in ("indicators", "signals"):   # indicators.py / signals.py che thư mục cùng tên
+        m = types.ModuleType(f"bsgates.{sub}")
+        m.__path__ = [os.path.join(ROOT, sub)]
+        sys.modules[m.__name__] = m
+    spec = importlib.util.spec_from_file_location("bsgates.signals.types", os.path.join(ROOT, "signals", "type.py"))
+    typ = importlib.util.module_from_spec(spec)
+    sys.modules["bsgates.signals.types"] = typ
+    spec.loader.exec_module(typ)
+    return importlib.import_module("bsgates.signals.gates")
+
+gates = _load_gates()
+
+CFG = {"supertrend": {"atr_period": 10, "multiplier": 3.0}, "range_filter": {"length": 20, "atr_mult": 1.5},
+       "atr_period": 14, "rsi_m15_period": 14, "anti_chase_atr_mult": 1.0, "adx_h1_period": 14,
+       "adx_h1_threshold": 20, "heavy_required_h1": 2, "heavy_required_m15": 2, "score_threshold_m15": 10}
+
+
+def _legacy(c):
+    # DataFrame cũ: index UTC theo open time
+    return c.to_frame().set_index(pd.to_datetime(c.timestamp, unit="ms", utc=True)).drop(columns="timestamp")
+
+
+@pytest.mark.parametrize("side", ["long", "short"])
+def test_m15_features_accept_candles(synthetic, side):
+    (_, m15), = synthetic(1, 300, "15m")
+    h1_ctx = {"ema200_up": True, "st_dir": 1, "rf_dir": -1}
+    got = gates.compute_m15_features(m15, h1_ctx, side, CFG)
+    assert got == gates.compute_m15_features(_legacy(m15), h1_ctx, side, CFG)
+    assert got["reasons"] and 0 <= got["score"] <= 18
+
+
+def test_gates_accept_candles_and_leave_frames_untouched(synthetic):
+    (sym, m15), = synthetic(1, 300, "15m")
+    (_, h1), = synthetic(1, 300, "1h")
+    frame = _legacy(m15)
+    before = frame.copy()
+    got = gates.compute_gates(h1, m15, sym, "long", CFG)
+    ref = gates.compute_gates(_legacy(h1), frame, sym, "long", CFG)
+    assert got == ref and got.timeframe_m15_ts == int(m15.timestamp[-1])
+    pd.testing.assert_frame_equal(frame, before)
@@ -0,0 +1,143 @@
+# tests/test_history_download.py — HistoryDownloader paging against the fake exchange
+import asyncio, time
+
+import ccxt
+import numpy as np
+
+from candle_cache import DiskCandleCache
+from candles import TF_MS
+from data import HistoryDownloader
+from fake_exchange import FakeExchange, SyntheticMarket, VirtualClock
+
+SYM = "BTC/USDT"
+H = TF_MS["1h"]
+NOW = 1_760_000_400_000 + 60_000
+PAGE = 20
+
+
+class _Holes:
+    """SyntheticMarket without the bars in [lo, hi) (exchange outages / before listing); klines
+    keeps the REST semantics: up to `limit` existing bars from `start`."""
+    def __init__(self, market, holes):
+        self.market, self.holes = market, holes
+        self.symbols = market.symbols
+
+    def _keep(self, ts):
+        ok = np.ones(len(ts), dtype=bool)
+        for lo, hi in self.holes:
+            ok &= ~((ts >= lo) & (ts < hi))
+        return ok
+
+    def klines(self, symbol, interval_ms, *, start, end, limit, now_ms=None):
+        if start is None:
+            arr = self.market.klines(symbol, interval_ms, start=None, end=end, limit=limit * 50, now_ms=now_ms)
+            return arr[self._keep(arr[:, 0])][-limit:]
+        out, cur = [], int(start)
+        while sum(map(len, out)) < limit:
+            arr = self.market.klines(symbol, interval_ms, start=cur, end=end, limit=limit, now_ms=now_ms)
+            if not len(arr):
+                break
+            out.append(arr[self._keep(arr[:, 0])])
+            cur = int(arr[-1, 0]) + interval_ms
+        return np.concatenate(out)[:limit] if out else np.empty((0, 6))
+
+
+def _exchange(holes=()):
+    ex = FakeExchange(_Holes(SyntheticMarket([SYM]), list(holes)), clock=VirtualClock(speed=0.0, start_ms=NOW))
+    ex.options["timeDifference"] = int(time.time() * 1000) - NOW
+    return ex
+
+
+def _download(ex, root, start, end=None, **kw):
+    dl = HistoryDownloader(ex, DiskCandleCache(str(root)), page_limit=PAGE, retries=0, **kw)
+    return dl, asyncio.run(dl.symbol(SYM, "1h", start, end))
+
+
+def _expected(ex, start, end):
+    ts = np.arange(start, end, H)
+    return ts[ex.market._keep(ts)]
+
+
+def test_backfill_crosses_empty_pages_and_stops_at_start(tmp_path):
+    end = NOW // H * H
+    start = end - 200 * H
+    hole = (end - 150 * H, end - 150 * H + 3 * PAGE * H)   # lỗ dài 3 trang giữa chừng
+    ex = _exchange([hole])
+    cache = DiskCandleCache(str(tmp_path))
+    recent = ex._ohlcv(SYM, "1h", end - 30 * H, 30)
+    cache.append(SYM, "1h", np.array([tuple(r) for r in recent], dtype=cache.read(SYM, "1h").dtype))
+
+    seen = []
+    orig = ex._ohlcv
+    ex._ohlcv = lambda s, tf, since, limit: seen.append(since) or orig(s, tf, since, limit)
+    _, st = _download(ex, tmp_path, start)
+    assert st["status"] == "ok"
+    np.testing.assert_array_equal(cache.read(SYM, "1h")["timestamp"], _expected(ex, start, end))
+    assert st["gaps_left"] == 1                      # lỗ của sàn vẫn được báo, không bịa bar
+    assert min(s for s in seen if s is not None) == start   # không lùi quá ngày bắt đầu
+
+
+def test_backfill_before_listing_stops_at_start(tmp_path):
+    end = NOW // H * H
+    start, listed = end - 200 * H, end - 90 * H
+    ex = _exchange([(0, listed)])
+    _, st = _download(ex, tmp_path, end - 40 * H)    # lần đầu: cache chỉ có 40 bar cuối
+    _, st = _download(ex, tmp_path, start)           # mở rộng về trước ngày list
+    got = DiskCandleCache(str(tmp_path)).read(SYM, "1h")["timestamp"]
+    assert st["status"] == "ok" and got[0] == listed and got[-1] == end - H
+    assert st["gaps_left"] == 0 and st["pages"] <= (end - start) // (PAGE * H) + 3
+
+
+def test_rerun_does_not_rewalk_pages_before_listing(tmp_path):
+    end = NOW // H * H
+    start, listed = end - 400 * H, end - 90 * H
+    ex = _exchange([(0, listed)])
+    _download(ex, tmp_path, end - 40 * H)
+    _, st = _download(ex, tmp_path, start)           # lùi qua ~15 trang trống tới start
+    assert st["pages"] > (listed - start) // (PAGE * H)
+    assert DiskCandleCache(str(tmp_path)).checked_from(SYM, "1h") == start
+
+    seen = []
+    orig = ex._ohlcv
+    ex._ohlcv = lambda s, tf, since, limit: seen.append(since) or orig(s, tf, since, limit)
+    _, st = _download(ex, tmp_path, start)           # chạy lại: không lùi lại qua các trang trống
+    assert st["status"] == "ok" and st["pages"] == 0 and not seen
+
+    seen.clear()
+    _, st = _download(ex, tmp_path, start - 2 * PAGE * H)   # start sớm hơn: chỉ lùi phần chưa xét
+    assert min(seen) == start - 2 * PAGE * H and st["pages"] == 2
+    assert DiskCandleCache(str(tmp_path)).checked_from(SYM, "1h") == start - 2 * PAGE * H
+
+
+def test_fresh_download_records_listing(tmp_path):
+    end = NOW // H * H
+    listed = end - 90 * H
+    ex = _exchange([(0, listed)])
+    _, st = _download(ex, tmp_path, end - 300 * H)   # cache trống: page tiến từ start, sàn trả từ ngày list
+    cache = DiskCandleCache(str(tmp_path))
+    assert cache.first_ts(SYM, "1h") == listed and cache.checked_from(SYM, "1h") == end - 300 * H
+    _, st = _download(ex, tmp_path, end - 300 * H)
+    assert st["pages"] == 0
+
+
+def test_interrupted_download_resumes(tmp_path):
+    end = NOW // H * H
+    start = end - 150 * H
+    ex = _exchange([(end - 100 * H, end - 96 * H)])
+    orig, n = ex._ohlcv, {"calls": 0}
+
+    def flaky(s, tf, since, limit):
+        n["calls"] += 1
+        if n["calls"] == 4:
+            raise ccxt.ExchangeNotAvailable("fake 503")
+        return orig(s, tf, since, limit)
+    ex._ohlcv = flaky
+    _, st = _download(ex, tmp_path / "a", start)
+    assert st["status"] == "error" and st["written"] > 0
+
+    _, st = _download(ex, tmp_path / "a", start)     # chạy lại: tiếp từ phần đã ghi
+    _, clean = _download(_exchange(ex.market.holes), tmp_path / "b", start)
+    assert st["status"] == "ok" and st["pages"] < clean["pages"]
+    a, b = (DiskCandleCache(str(tmp_path / r)).read(SYM, "1h") for r in ("a", "b"))
+    np.testing.assert_array_equal(a, b)
+    np.testing.assert_array_equal(a["timestamp"], _expected(ex, start, end))
@@ -0,0 +1,97 @@
+# tests/test_incremental_indicators.py — incremental state vs batch _compute_one_tf
+import numpy as np
+
+from candles import Candles
+from incremental_indicators import IncrementalIndicatorEngine, OUTPUTS
+from indicators import _compute_one_tf
+
+
+def _assert_same(ref, got, keys=OUTPUTS + ("close", "volume")):
+    for k in keys:
+        np.testing.assert_array_equal(got[k].to_numpy(), ref[k].to_numpy(), err_msg=k)
+
+
+def test_growing_window_matches_batch(synthetic):
+    (_, c), = synthetic(1, 260)
+    eng = IncrementalIndicatorEngine()
+    for end in range(50, len(c) + 1, 3):
+        win = c[:end]
+        # bar đang hình thành bị sửa rồi trả lại: peek() không được để lại dấu vết
+        fake = Candles(win.timestamp, win.open, win.high, win.low, win.close.copy(), win.volume)
+        fake.close[-1] *= 1.01
+        eng.update("X", "M15", fake)
+        _assert_same(_compute_one_tf(win), eng.update("X", "M15", win))
+    assert eng.stats["seeded"] == 1 and eng.stats["committed"] == len(c) - 50
+
+
+def _assert_close(ref, got, keys=OUTPUTS + ("close", "volume")):
+    # cửa sổ đã trượt khỏi bar seed: EMA/VWAP được tính lại theo bar đầu cửa sổ -> khớp tới sai số làm tròn
+    for k in keys:
+        np.testing.assert_allclose(got[k].to_numpy(), ref[k].to_numpy(), rtol=1e-10, atol=1e-12, err_msg=k)
+
+
+def test_sliding_window_matches_batch_on_window(synthetic):
+    (_, c), = synthetic(1, 700)
+    eng = IncrementalIndicatorEngine()
+    for end in range(300, len(c) + 1, 7):
+        win = c[end - 300:end]
+        for _ in range(2):   # gọi lại trên cùng cửa sổ: không seed lại, không tính lại phần đầu
+            _assert_close(_compute_one_tf(win), eng.update("X", "M15", win))
+    assert eng.stats["seeded"] == 1
+    assert eng.stats["committed"] == (len(c) - 300) // 7 * 7
+    assert eng.stats["head"] == (len(c) - 300) // 7
+
+
+def test_short_sliding_window_matches_batch(synthetic):
+    (_, c), = synthetic(1, 200)
+    eng = IncrementalIndicatorEngine()
+    for end in range(60, len(c) + 1, 5):   # cửa sổ ngắn hơn phần đầu: cả cửa sổ từ state của phần đầu
+        win = c[end - 60:end]
+        _assert_same(_compute_one_tf(win), eng.update("X", "M15", win))
+    assert eng.stats["seeded"] == 1
+
+
+def test_bounded_store_slide_takes_commit_path(synthetic):
+    from data import CandleStore
+    (_, c), = synthetic(1, 520)
+    st, eng = CandleStore(), IncrementalIndicatorEngine()
+    st.merge("X:15m", c[:200], 200)
+    eng.update("X", "M15", st.get("X:15m"))
+    for i in range(200, len(c)):
+        win = st.merge("X:15m", c[i - 1:i + 1], 200)   # bar cũ đóng + bar mới đang hình thành, bar đầu rơi ra
+        assert len(win) == 200
+        out = eng.update("X", "M15", win)
+        if i % 50 == 0:
+            _assert_close(_compute_one_tf(win), out)
+    assert eng.stats["seeded"] == 1
+    assert eng.stats["committed"] == len(c) - 200
+    # cửa sổ đã trượt 320 bar khỏi seed: vẫn là batch trên chính cửa sổ (VWAP không cộng dồn từ seed)
+    _assert_close(_compute_one_tf(win), out)
+    assert abs(out["vwap"].iloc[-1] - _compute_one_tf(c)["vwap"].iloc[-1]) > 1e-6
+
+
+def test_bar_filled_inside_window_reseeds(synthetic):
+    (_, c), = synthetic(1, 220)
+    eng = IncrementalIndicatorEngine()
+    holed = c.take(np.r_[0:150, 151:200])
+    eng.update("X", "M15", holed)
+    _assert_same(_compute_one_tf(c[:201]), eng.update("X", "M15", c[:201]))   # bar 150 được vá lại
+    assert eng.stats["seeded"] == 2
+
+
+def test_revised_bar_reseeds(synthetic):
+    (_, c), = synthetic(1, 120)
+    eng = IncrementalIndicatorEngine()
+    eng.update("X", "M15", c[:100])
+    rev = Candles(c.timestamp, c.open, c.high, c.low, c.close.copy(), c.volume)[:101]
+    rev.close[98] *= 1.02   # bar đã commit cuối cùng bị sàn sửa lại
+    _assert_same(_compute_one_tf(rev), eng.update("X", "M15", rev))
+    assert eng.stats["seeded"] == 2
+
+
+def test_tiny_windows():
+    eng = IncrementalIndicatorEngine()
+    assert len(eng.update("X", "M15", Candles.empty())["df"]) == 0
+    one = Candles.from_ohlcv([[0, 1.0, 1.1, 0.9, 1.05, 10.0]])
+    out = eng.update("X", "M15", one)
+    assert np.isnan(out["rsi"].to_numpy()).all() and out["ema21"].to_numpy()[0] == 1.05
@@ -0,0 +1,93 @@
+# tests/test_indicator_backends.py — every registered backend vs the pandas reference
+import numpy as np
+import pytest
+
+import indicators as ind
+import indicator_backends
+from candles import Candles
+
+TOL = 1e-9   # sai lệch tương đối tối đa
+PUBLIC = tuple(k for k, s in ind.REGISTRY.items() if s.public)
+# thuộc tính phải đúng với mọi backend: key -> (min, max)
+BOUNDS = {"rsi": (0.0, 100.0), "adx": (0.0, 100.0), "bbw": (0.0, np.inf), "atr": (0.0, np.inf),
+          "bbw_pctl": (0.0, 1.0), "atr_pctl": (0.0, 1.0), "vol_pctl": (0.0, 1.0), "vol_ma20": (0.0, np.inf)}
+
+
+def _datasets(synthetic):
+    out = {f"syn:{s}": c for s, c in synthetic(2, 300)}
+    base = next(iter(out.values()))
+    n = len(base)
+    col = lambda k: np.array(getattr(base, k), dtype=np.float64)
+    flat = np.full(n, 100.0)
+    out["flat"] = Candles(base.timestamp, flat, flat, flat, flat, col("volume"))
+    vol0 = col("volume"); vol0[: n // 3] = 0.0
+    out["zero_volume"] = Candles(base.timestamp, col("open"), col("high"), col("low"), col("close"), vol0)
+    holes = [col(k) for k in ("open", "high", "low", "close", "volume")]
+    for a, step in zip(holes, (53, 61, 67, 71, 59)):
+        a[3::step] = np.nan
+    out["nan_holes"] = Candles(base.timestamp, *holes)
+    out["tiny_price"] = Candles(base.timestamp, *(col(k) * 1e-7 for k in ("open", "high", "low", "close")), col("volume"))
+    for m in (1, 2, 15, 30):
+        out[f"len{m}"] = base[:m]
+    return out
+
+
+def _run(backend, c):
+    ind.set_backend(backend)
+    try:
+        t = ind._compute_one_tf(c)
+        return {k: v.to_numpy(dtype=np.float64) for k in PUBLIC if (v := t.get(k)) is not None}
+    finally:
+        ind.set_backend("pandas")
+
+
+@pytest.mark.parametrize("backend", [b for b in indicator_backends.available() if b != "pandas"])
+def test_backend_matches_pandas(backend, synthetic):
+    for name, c in _datasets(synthetic).items():
+        ref, got = _run("pandas", c), _run(backend, c)
+        # scale: giá trị đi qua 0 (macd, roc...) so theo độ lớn của chuỗi, hoặc mức giá khi chuỗi toàn 0
+        price = float(np.nanmax(np.abs(ref["close"]))) if len(ref["close"]) else 0.0
+        for k, r in ref.items():
+            g = got[k]
+            np.testing.assert_array_equal(np.isnan(g), np.isnan(r), err_msg=f"{name}:{k} NaN mask")
+            ok = ~np.isnan(r)
+            if ok.any():
+                scale = float(np.abs(r[ok]).max()) or price
+                rel = np.abs(g[ok] - r[ok]) / (np.abs(r[ok]) + max(scale, 1e-300))
+                assert rel.max() <= TOL, f"{name}:{k} rel {rel.max():.3g}"
+            lo, hi = BOUNDS.get(k, (-np.inf, np.inf))
+            v = g[~np.isnan(g)]
+            assert not len(v) or (v.min() >= lo - 1e-9 and v.max() <= hi + 1e-9), f"{name}:{k} out of range"
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        ind.set_backend("nope")
+    assert ind.indicator_backend() == "pandas"
+
+
+@pytest.mark.parametrize("backend", [b for b in indicator_backends.available() if b != "pandas"])
+def test_stream_loop_applies_backend(backend, monkeypatch):
+    import asyncio
+    import engine_flow
+    from types import SimpleNamespace
+    seen, subs = [], []
+
+    async def _cycle(sym, feed, cfg, state):
+        seen.append(ind.indicator_backend())
+        return {"symbol": sym}
+    monkeypatch.setattr(engine_flow, "run_symbol_cycle", _cycle)
+    stream = SimpleNamespace(subscribe=subs.append)
+    cfg = {"indicators": {"backend": backend}}
+
+    async def _main():
+        task = asyncio.create_task(engine_flow.engine_stream_loop(
+            ["BTC/USDT"], SimpleNamespace(streaming=True), cfg, {}, stream, stop=lambda: bool(seen)))
+        await asyncio.sleep(0)
+        subs[0](SimpleNamespace(closed=True, tf="15m", symbol="BTC/USDT"))
+        await asyncio.wait_for(task, 5)
+    try:
+        asyncio.run(_main())
+    finally:
+        ind.set_backend("pandas")
+    assert seen == [backend]
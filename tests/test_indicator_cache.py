@@ -0,0 +1,68 @@
+# tests/test_indicator_cache.py — cached / tail-patched outputs vs _compute_one_tf
+import numpy as np
+
+from candles import Candles
+from incremental_indicators import OUTPUTS
+from indicator_cache import IndicatorCache
+from indicators import _compute_one_tf
+
+BARS, PER_BAR = 120, 20   # 20 chu kỳ mỗi bar đóng
+
+
+def _forming(win, mult):
+    w = Candles(win.timestamp, win.open, win.high, win.low, win.close.copy(), win.volume)
+    w.close[-1] *= mult
+    return w
+
+
+def test_cycle_stream_matches_uncached(synthetic):
+    (_, full), = synthetic(1, BARS + 4)
+    cache = IndicatorCache()
+    rng = np.random.default_rng(3)
+    for cyc in range(4 * PER_BAR):
+        end = BARS + cyc // PER_BAR
+        w = _forming(full[end - BARS:end], 1 + rng.normal(0, 1e-3) if rng.random() < 0.7 else 1.0)
+        got = cache.compute("X", "M15", w, "h").materialize()
+        ref = _compute_one_tf(w).materialize()
+        for k in ("close", "volume") + OUTPUTS:
+            np.testing.assert_array_equal(np.asarray(got[k]), np.asarray(ref[k]), err_msg=f"{cyc}:{k}")
+    st = cache.metrics()["M15"]
+    assert st["miss"] == 4 and st["hit"] > 0 and st["tail"] > 0
+
+
+def test_tail_keeps_unread_outputs_lazy(synthetic):
+    (_, c), = synthetic(1, BARS)
+    cache = IndicatorCache()
+    first = cache.compute("X", "M15", c, "h")
+    first["ema21"]
+    w = _forming(c, 1.002)
+    got = cache.compute("X", "M15", w, "h")
+    assert set(got.computed()) - {"df"} <= {"ema21", "close", "volume"}
+    ref = _compute_one_tf(w)
+    for k in ("ema21", "rsi", "macd"):
+        np.testing.assert_array_equal(np.asarray(got[k]), np.asarray(ref[k]), err_msg=k)
+
+
+def test_config_hash_and_eviction(synthetic):
+    (_, a), (_, b) = synthetic(2, 60)
+    cache = IndicatorCache(max_entries=1)
+    cache.compute("A", "M15", a, "h1")
+    assert cache.get("A", "M15", a, "h2") is None   # config khác -> miss
+    assert cache.get("A", "M15", a, "h1") is not None
+    cache.compute("B", "M15", b, "h1")
+    assert cache.get("A", "M15", a, "h1") is None
+    assert cache.metrics()["M15"]["evict"] == 1
+
+
+def test_revised_bar_inside_window_misses(synthetic):
+    (_, c), = synthetic(1, BARS)
+    cache = IndicatorCache()
+    cache.compute("X", "M15", c, "h").materialize()
+    close = c.close.copy()
+    close[BARS // 2] *= 1.01   # bar đã đóng giữa cửa sổ được sửa; n, bar đầu, bar đóng cuối như cũ
+    w = Candles(c.timestamp, c.open, c.high, c.low, close, c.volume)
+    got = cache.compute("X", "M15", w, "h").materialize()
+    ref = _compute_one_tf(w).materialize()
+    for k in ("close",) + OUTPUTS:
+        np.testing.assert_array_equal(np.asarray(got[k]), np.asarray(ref[k]), err_msg=k)
+    assert cache.metrics()["M15"]["miss"] == 2
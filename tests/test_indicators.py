@@ -0,0 +1,70 @@
+# tests/test_indicators.py — TfIndicators mapping protocol
+import indicators as ind
+
+
+def test_mapping_reflects_computed_keys_only(synthetic):
+    (_, c), = synthetic(1, 300)
+    t = ind._compute_one_tf(c, "M15")
+    assert list(t) == ["df"] and len(t) == 1 and dict(t).keys() == {"df"}
+    assert "ema21" not in t and not t.computed()
+    assert "ema21" in t.available() and "rsi" in t.available()
+
+    t["ema21"]
+    assert "ema21" in t and list(t) == ["df", *t.computed()] and len(t) == 1 + len(t.computed())
+    assert "ema50" not in t   # chỉ key đã đọc, không kéo theo tính các key khác
+    assert t.get("rsi") is not None and "rsi" in t
+    assert t.get("nope") is None and "nope" not in t
+
+    del t["ema21"]
+    assert "ema21" not in t and "ema21" in t.available()
+    assert t["ema21"] is not None   # đọc lại -> tính lại
+
+
+def _read_by_decision_path(synthetic, cfg, m15_bbw=None):
+    import engine_flow
+    from engine_vote import decide_side
+    from order_manager import OrderManager
+    raw = {tf: {"df": synthetic(1, 300, ccxt_tf)[0][1]}
+           for tf, ccxt_tf in (("M5", "5m"), ("M15", "15m"), ("H1", "1h"), ("H4", "4h"), ("D1", "1d"))}
+    t = ind.IndicatorEngine().compute_all("BTC/USDT", raw, cfg)
+    if m15_bbw is not None:
+        t["M15"]["bbw"] = [m15_bbw]   # vượt/không vượt ngưỡng M5 trigger
+    ind._USAGE.clear()
+    flow, scores = engine_flow._calc_vfi(t, cfg)
+    engine_flow._m5_trigger_bump(t, cfg, {}, "BTC/USDT")
+    decide_side({"indicators": t, "config": cfg, "group_scores": {"flow": flow}, "vfi_scores": scores})
+    ctx = {"symbol": "BTC/USDT", "cfg": cfg, "indicators": t}
+    om = OrderManager()
+    try:   # float() của Series lỗi sau khi key đã được ghi nhận
+        om.open_if_ok(ctx, "LONG")
+    except Exception:
+        pass
+    om.position = {"symbol": "BTC/USDT", "side": "LONG", "qty": 1.0, "entry": 1.0, "sl": 0.0, "tp": 2.0}
+    try:
+        om.manage(ctx)
+    except Exception:
+        pass
+    return {tf: keys - {"df"} for tf, keys in ind._USAGE.items()}
+
+
+def test_declared_keys_cover_decision_reads(synthetic, monkeypatch):
+    from engine_flow import indicator_keys
+    monkeypatch.setattr(ind, "_USAGE", {})
+    on = {"enabled": True}
+    cfgs = [{}, {"features": {"enable_vfi": False}},
+            {"enhance": {"m5_trigger": on, "ema_slope": on, "adx_slope": on, "early_anticipate": on}},
+            {"enhance": {"ema_slope": {"enabled": True, "min_bbw": None}, "adx_slope": {"enabled": True, "need_vfi_delta_pos": False}}}]
+    for cfg in cfgs:
+        declared = indicator_keys(cfg)
+        for bbw in (None, 0.0, 1.0):
+            for tf, keys in _read_by_decision_path(synthetic, cfg, bbw).items():
+                assert keys <= declared.get(tf, set()), (cfg, tf, keys - declared.get(tf, set()))
+
+    # M5 trigger: lối ra sớm (M15 bbw và H1 adx thấp) không đọc M5, khai báo vẫn có
+    cfg = cfgs[2]
+    monkeypatch.setattr(ind, "_USAGE", {})
+    t = ind.IndicatorEngine().compute_all("BTC/USDT", {}, cfg)
+    import engine_flow
+    assert engine_flow._m5_trigger_bump(t, cfg, {}, "BTC/USDT") == 0.0 and "M5" not in ind._USAGE
+    assert indicator_keys(cfg)["M5"] == {"close", "vwap", "ema21"}
+    assert "M5" not in indicator_keys({})
@@ -0,0 +1,114 @@
+# tests/test_kline_stream.py — stream ingestion vs REST gap patching (fake exchange, replay frames)
+import asyncio, json, time
+
+import numpy as np
+
+from data import DataFeed
+from fake_exchange import FakeExchange, SyntheticMarket, VirtualClock
+from kline_stream import KlineStream, ReplayTransport
+
+SYM = "BTC/USDT"
+TF_MS = 900_000
+T0 = 1_760_000_400_000 + 60_000   # 1 phút sau open của một bar M15
+
+
+def _setup():
+    clock = VirtualClock(speed=0.0, start_ms=T0)   # đồng hồ đứng yên, test tự tua
+    ex = FakeExchange(SyntheticMarket([SYM]), clock=clock)
+    feed = DataFeed(ex, {"data": {"limit": {"M15": 50}}}, None)
+    return ex, feed
+
+
+def _advance(ex, bars):
+    ex.clock.start_ms += bars * TF_MS
+    ex.options["timeDifference"] = int(time.time() * 1000) - ex.clock.now_ms()
+
+
+def _frame(ex, open_ms, closed=True):
+    o, h, l, c, v = ex.market.klines("BTCUSDT", TF_MS, start=open_ms, end=None, limit=1,
+                                     now_ms=ex.clock.now_ms())[0, 1:].tolist()
+    return {"stream": "btcusdt@kline_15m",
+            "data": {"e": "kline", "E": open_ms + TF_MS, "s": "BTCUSDT",
+                     "k": {"t": open_ms, "i": "15m", "o": o, "h": h, "l": l, "c": c, "v": v, "x": closed}}}
+
+
+def _replay(ex, feed, opens):
+    feed.streaming = True
+    stream = KlineStream(feed, [SYM], ["15m"], transport=ReplayTransport([_frame(ex, t) for t in opens]))
+    asyncio.run(stream.run())
+    feed.live_keys.add(f"{SYM}:15m")   # replay kết thúc = mất kết nối; coi như stream vẫn sống
+    feed.streaming = True
+
+
+def test_dropped_bar_is_patched_over_rest():
+    ex, feed = _setup()
+    asyncio.run(feed._fetch_tf(SYM, "15m"))
+    b0 = feed.store.last_ts(f"{SYM}:15m")
+    _advance(ex, 4)
+    _replay(ex, feed, [b0, b0 + TF_MS, b0 + 3 * TF_MS])   # bar b0+2 bị rơi
+    assert f"{SYM}:15m" in feed._stale
+
+    df = asyncio.run(feed._fetch_tf(SYM, "15m"))["df"]
+    ts = np.asarray(df.timestamp, dtype=np.int64)
+    assert (np.diff(ts) == TF_MS).all()
+    assert ts[-1] == b0 + 4 * TF_MS
+    assert f"{SYM}:15m" not in feed._stale and not feed._gap_from
+
+
+def test_contiguous_stream_needs_no_rest():
+    ex, feed = _setup()
+    asyncio.run(feed._fetch_tf(SYM, "15m"))
+    b0 = feed.store.last_ts(f"{SYM}:15m")
+    calls = ex.calls["fetch_ohlcv"]
+    _advance(ex, 2)
+    _replay(ex, feed, [b0, b0 + TF_MS])
+
+    df = asyncio.run(feed._fetch_tf(SYM, "15m"))["df"]
+    assert ex.calls["fetch_ohlcv"] == calls
+    assert np.asarray(df.timestamp, dtype=np.int64)[-1] == b0 + TF_MS
+    assert (np.diff(np.asarray(df.timestamp, dtype=np.int64)) == TF_MS).all()
+
+
+class _SplitTransport:
+    """btcusdt socket stays up until released; every other socket fails to connect."""
+    reconnect = False
+
+    def __init__(self, frame):
+        self.frame, self.release, self.up = frame, asyncio.Event(), asyncio.Event()
+
+    async def messages(self, url):
+        if "btcusdt" not in url:
+            raise ConnectionError("fake: socket refused")
+        yield json.dumps(self.frame)
+        self.up.set()
+        await self.release.wait()
+
+
+def test_dropped_connection_falls_back_to_rest_for_its_keys():
+    eth = "ETH/USDT"
+    clock = VirtualClock(speed=0.0, start_ms=T0)
+    ex = FakeExchange(SyntheticMarket([SYM, eth]), clock=clock)
+    feed = DataFeed(ex, {"data": {"limit": {"M15": 50}}}, None)
+    for s in (SYM, eth):
+        asyncio.run(feed._fetch_tf(s, "15m"))
+    b0 = feed.store.last_ts(f"{SYM}:15m")
+    tr = _SplitTransport(_frame(ex, b0, closed=False))
+    stream = KlineStream(feed, [SYM, eth], ["15m"], transport=tr, max_streams_per_conn=1)
+    assert len(stream._conns()) == 2
+
+    async def main():
+        task = asyncio.create_task(stream.run())
+        await tr.up.wait()
+        assert feed.streaming and feed.live_keys == {f"{SYM}:15m"}
+        assert stream.offline_symbols() == [eth]
+        calls = ex.calls["fetch_ohlcv"]
+        await feed._fetch_tf(SYM, "15m")   # socket sống -> không REST
+        assert ex.calls["fetch_ohlcv"] == calls
+        await feed._fetch_tf(eth, "15m")   # socket rớt -> REST như khi không stream
+        assert ex.calls["fetch_ohlcv"] == calls + 1
+        tr.release.set()
+        await task
+
+    asyncio.run(main())
+    assert not feed.streaming and not feed.live_keys
+    assert stream.offline_symbols() == [SYM, eth]
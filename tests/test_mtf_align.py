@@ -0,0 +1,48 @@
+# tests/test_mtf_align.py — look-ahead-free alignment vs per-bar truncate-and-recompute
+import numpy as np
+
+from candles import TF_MS
+from indicators import _compute_one_tf
+from mtf_align import MtfIndex, align_index, higher_from_base
+
+M15, H1 = 900_000, 3_600_000
+
+
+def _slow_asof(base, base_tf, higher, tf, i, key):
+    # cách cũ: cắt khung lớn tới bar đã đóng rồi tính lại, lấy iloc[-1]
+    t = int(base.timestamp[i]) + TF_MS[base_tf]
+    n = int(np.count_nonzero(higher.timestamp + TF_MS[tf] <= t))
+    if n == 0:
+        return np.nan
+    return float(_compute_one_tf(higher[:n])[key].iloc[-1])
+
+
+def test_align_index_uses_only_closed_bars():
+    base = np.arange(12) * M15
+    higher = np.array([0, 2, 3]) * H1   # bar 1h thứ 2 bị thiếu (gap sàn)
+    # bar 1h [0,1h) đóng khi base bar 3 đóng; gap -> vẫn dùng bar 0; bar 2 đóng tại base 11
+    assert align_index(base, higher, M15, H1).tolist() == [-1, -1, -1, 0, 0, 0, 0, 0, 0, 0, 0, 1]
+    mi = MtfIndex(base, "15m", {"1h": higher})
+    assert mi.first_complete() == 3
+    g = mi.gather("1h", np.array([10, 20, 30]))
+    assert np.isnan(g[:3]).all() and g[3:].tolist() == [10.0] * 8 + [20.0]
+
+
+def test_gather_matches_recompute(synthetic):
+    (_, base), = synthetic(1, 3000)
+    base = base[np.arange(len(base)) % 397 != 5]   # vài lỗ dữ liệu
+    htfs = ["1h", "4h", "1d"]
+    higher = higher_from_base(base, "15m", htfs)
+    mi = MtfIndex.from_candles(base, "15m", higher)
+    for tf in htfs:
+        ix = mi.idx[tf]
+        ok = ix >= 0
+        assert not np.any(higher[tf].timestamp[ix[ok]] + TF_MS[tf] > mi.base_ts[ok] + M15), tf
+    picks = np.unique(np.r_[0, len(base) - 1, np.random.default_rng(5).integers(0, len(base), 8)])
+    for tf in htfs:
+        feats = _compute_one_tf(higher[tf], tf)
+        for k in ("ema200", "adx"):
+            got = mi.gather(tf, feats[k].to_numpy())
+            for i in picks:
+                ref = _slow_asof(base, "15m", higher[tf], tf, int(i), k)
+                assert ref == got[i] or (np.isnan(ref) and np.isnan(got[i])), (tf, k, int(i))
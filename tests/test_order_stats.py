@@ -0,0 +1,49 @@
+# tests/test_order_stats.py — per-bar RollingOrderStat vs pandas rolling rank/median/quantile
+import numpy as np, pandas as pd
+
+from order_stats import RollingOrderStat, rolling_median, rolling_quantile, rolling_rank
+
+W, MP = 60, 10
+
+
+def _naive_rank(x: np.ndarray, n: int, minp: int) -> np.ndarray:
+    # O(n·w): so sánh lại cả cửa sổ mỗi bar (định nghĩa rank trực tiếp)
+    out = np.full(len(x), np.nan)
+    for i in range(len(x)):
+        w = x[max(0, i - n + 1):i + 1]
+        w = w[np.isfinite(w)]
+        if np.isfinite(x[i]) and len(w) >= minp:
+            out[i] = ((w < x[i]).sum() + ((w == x[i]).sum() + 1) / 2.0) / len(w)
+    return out
+
+
+def _series():
+    rng = np.random.default_rng(11)
+    x = np.round(rng.gamma(2.0, 1.0, 400), 1)   # làm tròn -> có giá trị trùng
+    x[rng.random(400) < 0.02] = np.nan
+    x[7] = np.inf
+    return x
+
+
+def test_incremental_matches_pandas():
+    x = _series()
+    s = pd.Series(x)
+    finite = s.replace([np.inf, -np.inf], np.nan)
+    st = RollingOrderStat(W, MP)
+    peek, rank, med, q90 = (np.empty(len(x)) for _ in range(4))
+    for i, v in enumerate(x):
+        peek[i] = st.peek(float(v))
+        rank[i] = st.push(float(v))
+        med[i], q90[i] = st.median(), st.quantile(0.9)
+    ref = rolling_rank(s, W, MP).to_numpy()
+    np.testing.assert_array_equal(rank, ref)
+    np.testing.assert_array_equal(peek, ref)
+    np.testing.assert_array_equal(med, rolling_median(finite, W, MP).to_numpy())
+    np.testing.assert_array_equal(q90, rolling_quantile(finite, W, 0.9, MP).to_numpy())
+
+
+def test_rank_definition():
+    x = _series()
+    np.testing.assert_array_equal(rolling_rank(pd.Series(x), W, MP).to_numpy(), _naive_rank(x, W, MP))
+    st = RollingOrderStat(3, 1)
+    assert [st.push(v) for v in (1.0, 1.0, 2.0, 0.5)] == [1.0, 0.75, 1.0, 1 / 3]
@@ -0,0 +1,102 @@
+# tests/test_refresh_scheduler.py — TfRefreshScheduler bar-close alignment, alone and inside DataFeed
+import asyncio, time
+
+import pytest
+
+from candles import TF_MS
+from data import DataFeed, TfRefreshScheduler
+from fake_exchange import FakeExchange, SyntheticMarket, VirtualClock
+
+SYM = "BTC/USDT"
+H = TF_MS["1h"]
+T0 = 1_760_000_400_000   # ranh giới giờ UTC
+
+
+def _sched(grace_ms=2000, max_age=None) -> TfRefreshScheduler:
+    rc = {"close_grace_ms": grace_ms}
+    if max_age is not None:
+        rc["forming_max_age_sec"] = max_age
+    return TfRefreshScheduler({"data": {"refresh": rc}})
+
+
+@pytest.mark.parametrize("tf", ["1h", "4h", "1d"])
+def test_due_once_the_bar_has_closed_plus_grace(tf):
+    tf_ms = TF_MS[tf]
+    close = (T0 // tf_ms + 1) * tf_ms            # bar đang hình thành đóng lúc này
+    rs = _sched(max_age={tf: 10 * 86400})        # tắt refresh theo tuổi bar đang hình thành
+    rs.mark("k", close - tf_ms // 2)
+    assert not rs.due("k", tf, close - 1)
+    assert not rs.due("k", tf, close + 1999)     # trong grace: bar vừa đóng có thể chưa chốt
+    assert rs.due("k", tf, close + 2000)
+    rs.mark("k", close + 2000)
+    assert not rs.due("k", tf, close + tf_ms + 1999)
+    assert rs.due("k", tf, close + tf_ms + 2000)
+
+
+def test_fetch_inside_grace_is_repeated_after_it():
+    rs = _sched(max_age={"1h": 86400})
+    close = T0 + H
+    rs.mark("k", close + 500)                    # lấy lúc bar có thể chưa chốt
+    assert not rs.due("k", "1h", close + 1999)
+    assert rs.due("k", "1h", close + 2000)       # lấy lại bản đã chốt
+    rs.mark("k", close + 2000)
+    assert not rs.due("k", "1h", close + H - 1)
+
+
+def test_forming_bar_refreshed_by_age_and_fast_tfs_every_time():
+    rs = _sched()
+    rs.mark("k", T0 + 60_000)
+    assert not rs.due("k", "1h", T0 + 60_000 + 59_999)
+    assert rs.due("k", "1h", T0 + 120_000)       # 1h: forming_max_age_sec 60 mặc định
+    rs.mark("f", T0)
+    assert rs.due("f", "15m", T0 + 1) and rs.due("new", "4h", T0)
+
+
+# --- DataFeed: giờ sàn (timeDifference), bar đang hình thành được thay bằng bản đã chốt -----
+
+
+def _at(ex, ms: int) -> None:
+    # đồng hồ sàn đứng yên ở `ms`; giờ máy (time.time()) lệch tùy ý, bù bằng timeDifference như ccxt
+    ex.clock = VirtualClock(speed=0.0, start_ms=ms)
+    ex.options["timeDifference"] = int(time.time() * 1000) - ms
+
+
+def _feed(max_age_sec: int):
+    ex = FakeExchange(SyntheticMarket([SYM]), clock=VirtualClock(speed=0.0, start_ms=T0))
+    cfg = {"data": {"refresh": {"forming_max_age_sec": {"1h": max_age_sec}}}}
+    return ex, DataFeed(ex, cfg, None)
+
+
+def test_feed_replaces_forming_bar_after_close():
+    ex, feed = _feed(86400)
+    _at(ex, T0 + H // 2)
+    df = asyncio.run(feed._fetch_tf(SYM, "1h"))["df"]
+    assert int(df.timestamp[-1]) == T0                     # bar cuối đang hình thành
+    forming_close = float(df.close[-1])
+    calls = ex.calls["fetch_ohlcv"]
+
+    _at(ex, T0 + H - 5_000)                                # giờ máy đã qua giờ đóng từ lâu: không tính
+    asyncio.run(feed._fetch_tf(SYM, "1h"))
+    assert ex.calls["fetch_ohlcv"] == calls
+
+    _at(ex, T0 + H + 3_000)                                # qua giờ đóng + grace trên đồng hồ sàn
+    df = asyncio.run(feed._fetch_tf(SYM, "1h"))["df"]
+    assert ex.calls["fetch_ohlcv"] == calls + 1
+    assert int(df.timestamp[-1]) == T0 + H and int(df.timestamp[-2]) == T0
+    final = ex.market.klines(ex.market.symbols[0], H, start=T0, end=T0, limit=1, now_ms=T0 + 10 * H)[0]
+    assert float(df.close[-2]) == pytest.approx(final[4]) and float(df.close[-2]) != forming_close
+    assert len(set(df.timestamp.tolist())) == len(df)      # thay tại chỗ, không nhân đôi bar
+
+
+def test_feed_refreshes_forming_bar_by_age():
+    ex, feed = _feed(60)
+    _at(ex, T0 + 60_000)
+    first = float(asyncio.run(feed._fetch_tf(SYM, "1h"))["df"].close[-1])
+    calls = ex.calls["fetch_ohlcv"]
+    _at(ex, T0 + 90_000)
+    asyncio.run(feed._fetch_tf(SYM, "1h"))
+    assert ex.calls["fetch_ohlcv"] == calls                # còn trẻ hơn 60s -> dùng store
+    _at(ex, T0 + 121_000)
+    df = asyncio.run(feed._fetch_tf(SYM, "1h"))["df"]
+    assert ex.calls["fetch_ohlcv"] == calls + 1 and int(df.timestamp[-1]) == T0
+    assert float(df.close[-1]) != first
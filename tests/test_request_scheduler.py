@@ -0,0 +1,121 @@
+# tests/test_request_scheduler.py — RequestScheduler priority, cancellation and rate-limit penalty
+import asyncio
+import time
+
+import ccxt
+import pytest
+
+from data import RequestScheduler
+
+P, F, S = RequestScheduler.PRIO_POSITION, RequestScheduler.PRIO_FAST, RequestScheduler.PRIO_SLOW
+
+
+def _sched(max_concurrency=2, per_sec=100.0, burst=1.0, penalty_sec=5.0) -> RequestScheduler:
+    return RequestScheduler({"data": {"scheduler": {"max_concurrency": max_concurrency, "utilization": 1.0,
+                                                    "weight_per_min": per_sec * 60, "burst_weight": burst,
+                                                    "penalty_sec": penalty_sec}}})
+
+
+def test_position_call_gets_weight_before_queued_slow_calls():
+    sched = _sched()
+    order = []
+
+    def call(name):
+        async def run():
+            order.append(name)
+            await asyncio.sleep(0)
+        return run
+
+    async def main():
+        # bucket 1 weight, 100/s: slow-1 đi ngay, các call sau chờ token (có slot trống)
+        tasks = [asyncio.create_task(sched.submit(S, 1, call(f"slow-{i}"))) for i in range(1, 5)]
+        await asyncio.sleep(0.001)
+        tasks.append(asyncio.create_task(sched.submit(P, 1, call("position"))))
+        tasks.append(asyncio.create_task(sched.submit(F, 1, call("fast"))))
+        await asyncio.gather(*tasks)
+    asyncio.run(main())
+    assert order == ["slow-1", "position", "fast", "slow-2", "slow-3", "slow-4"]
+    m = sched.metrics()
+    assert m["in_flight"] == 0 and m["queued"] == 0 and m["slow"]["n"] == 4 and m["position"]["n"] == 1
+
+
+def test_fifo_within_priority_when_slots_are_full():
+    sched = _sched(max_concurrency=1, burst=100.0)
+    order, gate = [], None
+
+    async def main():
+        nonlocal gate
+        gate = asyncio.Event()
+
+        async def hold():
+            order.append("hold")
+            await gate.wait()
+
+        def call(name):
+            async def run():
+                order.append(name)
+            return run
+        first = asyncio.create_task(sched.submit(S, 1, hold))
+        await asyncio.sleep(0)
+        rest = [asyncio.create_task(sched.submit(p, 1, call(n))) for p, n in ((S, "s1"), (F, "f1"), (S, "s2"), (F, "f2"))]
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(first, *rest)
+    asyncio.run(main())
+    assert order == ["hold", "f1", "f2", "s1", "s2"]
+
+
+def test_cancelled_waiter_returns_granted_slot_and_weight():
+    sched = _sched(max_concurrency=1, burst=10.0)
+
+    async def main():
+        await sched._acquire(S, 1.0)   # giữ slot duy nhất
+        ran = []
+
+        async def call():
+            ran.append(1)
+        waiter = asyncio.create_task(sched.submit(P, 3, call))
+        await asyncio.sleep(0)
+        assert sched.metrics()["queued"] == 1
+        tokens = sched._tokens
+        sched._release()             # slot + weight trao cho waiter...
+        waiter.cancel()              # ...nhưng nó bị hủy trước khi chạy
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert not ran and sched._active == 0 and sched._tokens >= tokens
+        assert await sched.submit(S, 1, lambda: asyncio.sleep(0, "ok")) == "ok"
+        assert sched._active == 0
+    asyncio.run(main())
+
+
+def test_cancelled_head_waiter_unblocks_the_queue():
+    sched = _sched(max_concurrency=4, per_sec=1.0, burst=1.0)
+
+    async def main():
+        sched._tokens = 0.0
+        big = asyncio.create_task(sched.submit(P, 1, lambda: asyncio.sleep(0)))   # chờ ~1s token
+        await asyncio.sleep(0)
+        big.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await big
+        assert sched.metrics()["queued"] == 0 and sched._active == 0
+    asyncio.run(main())
+
+
+def test_rate_limit_response_drains_bucket():
+    sched = _sched(per_sec=100.0, burst=5.0, penalty_sec=0.05)
+
+    async def limited():
+        raise ccxt.RateLimitExceeded("429")
+
+    async def main():
+        with pytest.raises(ccxt.RateLimitExceeded):
+            await sched.submit(S, 1, limited)
+        assert sched.penalties == 1 and sched._tokens <= -100.0 * 0.05
+        sched.penalize()   # không cộng dồn
+        assert sched._tokens >= -100.0 * 0.05 - 1.0
+        t0 = time.monotonic()
+        await sched.submit(P, 1, lambda: asyncio.sleep(0))
+        return time.monotonic() - t0
+    waited = asyncio.run(main())
+    assert waited >= 0.05
@@ -0,0 +1,108 @@
+# tests/test_spot_join.py — futures/spot M15 join when spot bars are missing, offset or lagging
+import asyncio, time
+
+import numpy as np
+
+from candles import TF_MS, Candles
+from data import CandleStore, DataFeed
+from fake_exchange import FakeExchange, SyntheticMarket, VirtualClock
+
+SYM = "BTC/USDT"
+M15 = TF_MS["15m"]
+T0 = 1_760_000_400_000
+
+
+def _bars(ts, px=100.0):
+    ts = np.asarray(ts, dtype=np.int64)
+    p = px + np.arange(len(ts), dtype=np.float64)
+    return Candles(ts, p, p + 1, p - 1, p + 0.5, np.full(len(ts), 10.0))
+
+
+def _store(fut_ts, spot_ts):
+    st = CandleStore()
+    st.merge("F", _bars(fut_ts), 0)
+    if spot_ts is not None:
+        st.merge("S", _bars(spot_ts, 200.0), 0)
+    return st
+
+
+def _hit(j, fut_ts, spot_ts):
+    # hàng của futures có spot cùng timestamp: giá spot đúng bar đó, còn lại NaN / volume 0
+    ok = np.isin(fut_ts, spot_ts)
+    np.testing.assert_array_equal(j.timestamp, fut_ts)
+    assert np.isnan(j.close[~ok]).all() and (j.volume[~ok] == 0).all()
+    want = 200.0 + np.searchsorted(spot_ts, fut_ts[ok]) + 0.5
+    np.testing.assert_array_equal(j.close[ok], want)
+    return ok
+
+
+def test_same_bars_join_is_a_view():
+    ts = T0 + np.arange(50) * M15
+    st = _store(ts, np.r_[ts[0] - M15, ts])          # spot giữ thêm một bar cũ hơn
+    j = st.join("F", "S")
+    assert np.shares_memory(j.close, st.get("S").close)
+    _hit(j, ts, st.get("S").timestamp)
+
+
+def test_spot_shorter_than_futures_pads_the_head():
+    ts = T0 + np.arange(120) * M15
+    st = _store(ts, ts[-80:])                          # spot chỉ một trang, ngắn hơn cửa sổ futures
+    ok = _hit(st.join("F", "S"), ts, ts[-80:])
+    assert not ok[:40].any() and ok[40:].all()
+
+
+def test_spot_lagging_and_missing_bars():
+    ts = T0 + np.arange(60) * M15
+    spot = np.delete(ts[:-2], [10, 11, 30])            # trễ 2 bar cuối + lỗ giữa chừng
+    ok = _hit(_store(ts, spot).join("F", "S"), ts, spot)
+    assert not ok[-2:].any() and not ok[[10, 11, 30]].any() and ok.sum() == len(spot)
+
+
+def test_spot_offset_from_futures_never_matches():
+    ts = T0 + np.arange(40) * M15
+    ok = _hit(_store(ts, ts + 60_000).join("F", "S"), ts, ts + 60_000)   # lệch 1 phút: không khớp bar nào
+    assert not ok.any()
+
+
+def test_missing_spot_series_is_all_nan():
+    ts = T0 + np.arange(10) * M15
+    j = _store(ts, None).join("F", "S")
+    assert len(j) == 10 and np.isnan(j.close).all() and (j.volume == 0).all()
+    assert len(_store([], ts).join("F", "S")) == 0
+
+
+# --- DataFeed với spot twin của fake exchange --------------------------------------------
+
+
+def _feed(limit):
+    ex = FakeExchange(SyntheticMarket([SYM]), clock=VirtualClock(speed=0.0, start_ms=T0 + 60_000))
+    ex.options["timeDifference"] = int(time.time() * 1000) - (T0 + 60_000)
+    spot = ex.spot_twin()
+    cfg = {"data": {"spot_twin": {"enabled": True}, "limit": {"M15": limit}}}
+    return ex, spot, DataFeed(ex, cfg, None, spot_exchange=spot)
+
+
+def test_feed_spot_window_shorter_than_futures():
+    _, _, feed = _feed(1200)                           # spot: tối đa 1000 bar một trang
+    m15 = asyncio.run(feed.fetch_all_timeframes(SYM))["M15"]
+    fut, spot = m15["df"], m15["spot"]
+    assert len(spot) == len(fut) == 1200
+    np.testing.assert_array_equal(spot.timestamp, fut.timestamp)
+    assert np.isnan(spot.close[:200]).all() and not np.isnan(spot.close[200:]).any()
+
+
+def test_feed_spot_lagging_after_failed_fetch():
+    ex, spot_ex, feed = _feed(100)
+    asyncio.run(feed.fetch_all_timeframes(SYM))
+
+    def down(*a, **k):
+        raise RuntimeError("spot down")
+    spot_ex._ohlcv = down
+    now = T0 + 60_000 + 2 * M15                         # 2 bar futures mới, spot đứng yên
+    ex.clock = VirtualClock(speed=0.0, start_ms=now)
+    ex.options["timeDifference"] = int(time.time() * 1000) - now
+    m15 = asyncio.run(feed.fetch_all_timeframes(SYM))["M15"]
+    fut, spot = m15["df"], m15["spot"]
+    np.testing.assert_array_equal(spot.timestamp, fut.timestamp)
+    assert np.isnan(spot.close[-2:]).all() and not np.isnan(spot.close[:-2]).any()
+    assert float(spot.close[-3]) != float(fut.close[-3])   # giá spot thật (có basis), không phải futures
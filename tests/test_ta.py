@@ -0,0 +1,167 @@
+# tests/test_ta.py — indicators/ta.py kernels vs the per-bar .iloc loops they replaced
+import importlib.util
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def _load_ta():
+    # indicators.py (module) che mất package indicators/ -> nạp ta.py theo đường dẫn
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "indicators", "ta.py")
+    spec = importlib.util.spec_from_file_location("indicators_ta", path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+ta = _load_ta()
+
+
+# --- reference: the loop implementations the kernels replaced ----------------------
+
+
+def ref_supertrend(h, l, c, atr_period=10, multiplier=3.0):
+    atr_val = ta.atr(h, l, c, atr_period)
+    basic_upperband = (h + l) / 2 + multiplier * atr_val
+    basic_lowerband = (h + l) / 2 - multiplier * atr_val
+    final_upperband = basic_upperband.copy()
+    final_lowerband = basic_lowerband.copy()
+    st = pd.Series(index=c.index, dtype=float)
+    dir_long = pd.Series(index=c.index, dtype=int)
+    for i in range(1, len(c)):
+        final_upperband.iloc[i] = min(basic_upperband.iloc[i], final_upperband.iloc[i-1]) if c.iloc[i-1] > final_upperband.iloc[i-1] else basic_upperband.iloc[i]
+        final_lowerband.iloc[i] = max(basic_lowerband.iloc[i], final_lowerband.iloc[i-1]) if c.iloc[i-1] < final_lowerband.iloc[i-1] else basic_lowerband.iloc[i]
+        if np.isnan(st.iloc[i-1]):
+            st.iloc[i-1] = basic_upperband.iloc[i-1]
+            dir_long.iloc[i-1] = -1
+        if c.iloc[i] > final_upperband.iloc[i-1]:
+            dir_long.iloc[i] = 1
+            st.iloc[i] = final_lowerband.iloc[i]
+        elif c.iloc[i] < final_lowerband.iloc[i-1]:
+            dir_long.iloc[i] = -1
+            st.iloc[i] = final_upperband.iloc[i]
+        else:
+            dir_long.iloc[i] = dir_long.iloc[i-1]
+            st.iloc[i] = final_lowerband.iloc[i] if dir_long.iloc[i] == 1 else final_upperband.iloc[i]
+    return dir_long.ffill().fillna(-1)
+
+
+def ref_vwap(c, v, anchor="daily_utc"):
+    df = pd.DataFrame({"c": c, "v": v}).copy()
+    df["date"] = df.index.tz_convert("UTC").date if df.index.tz is not None else df.index.tz_localize("UTC").date
+    vals = []; cum_pv = 0.0; cum_v = 0.0; prev = None
+    for _, row in df.iterrows():
+        if prev is None or row["date"] != prev:
+            cum_pv = 0.0; cum_v = 0.0; prev = row["date"]
+        cum_pv += row["c"] * (row["v"] if not np.isnan(row["v"]) else 0.0)
+        cum_v += (row["v"] if not np.isnan(row["v"]) else 0.0)
+        vals.append(cum_pv / cum_v if cum_v > 0 else row["c"])
+    return pd.Series(vals, index=c.index)
+
+
+def ref_range_filter_direction(c, h, l, length=20, atr_mult=1.5):
+    base = ta.ema(c, length)
+    atr_val = ta.atr(h, l, c, 14)
+    upper = base + atr_mult * atr_val
+    lower = base - atr_mult * atr_val
+    direction = pd.Series(index=c.index, dtype=int)
+    curr = -1
+    for i in range(len(c)):
+        if np.isnan(upper.iloc[i]) or np.isnan(lower.iloc[i]):
+            direction.iloc[i] = curr
+            continue
+        if c.iloc[i] > upper.iloc[i]:
+            curr = 1
+        elif c.iloc[i] < lower.iloc[i]:
+            curr = -1
+        direction.iloc[i] = curr
+    return direction.ffill().fillna(-1)
+
+
+# --- data ---------------------------------------------------------------------------
+
+
+def synthetic(n: int, seed: int = 7, nan_frac: float = 0.0, freq: str = "15min", tz="UTC") -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.004, n)))
+    spread = np.abs(rng.normal(0, 0.003, n)) * close
+    high = close + spread * rng.random(n); low = close - spread * rng.random(n)
+    vol = rng.gamma(2.0, 50.0, n)
+    vol[rng.random(n) < 0.02] = 0.0
+    if nan_frac:
+        for a in (close, high, low, vol):
+            a[rng.random(n) < nan_frac] = np.nan
+    idx = pd.date_range("2024-01-01", periods=n, freq=freq, tz=tz)
+    return pd.DataFrame({"high": high, "low": low, "close": close, "volume": vol}, index=idx)
+
+
+def cases(df):
+    h, l, c, v = df["high"], df["low"], df["close"], df["volume"]
+    return {
+        "supertrend": (lambda: ta.supertrend(h, l, c, 10, 3.0), lambda: ref_supertrend(h, l, c, 10, 3.0)),
+        "supertrend_m0.5": (lambda: ta.supertrend(h, l, c, 10, 0.5), lambda: ref_supertrend(h, l, c, 10, 0.5)),   # nhiều lần đảo chiều
+        "range_filter": (lambda: ta.range_filter_direction(c, h, l, 20, 1.5), lambda: ref_range_filter_direction(c, h, l, 20, 1.5)),
+        "vwap": (lambda: ta.vwap(c, v), lambda: ref_vwap(c, v)),
+    }
+
+
+def _flat(n: int) -> pd.DataFrame:
+    df = synthetic(n, 9)
+    df[["high", "low", "close"]] = 100.0
+    return df
+
+
+DATASETS = {
+    "len1": lambda: synthetic(1, 1),
+    "len2": lambda: synthetic(2, 2),
+    "len40": lambda: synthetic(40, 3),
+    "len1500": lambda: synthetic(1500, 4),
+    "nan_1pct": lambda: synthetic(1500, 5, 0.01),
+    "nan_20pct": lambda: synthetic(400, 6, 0.2),
+    "flat": lambda: _flat(300),
+    "flat_zero_volume": lambda: _flat(300).assign(volume=0.0),
+    # ranh giới phiên: 1h qua nhiều ngày, index không tz và tz lệch UTC (ngày địa phương != ngày UTC)
+    "sessions_1h": lambda: synthetic(24 * 5 + 7, 10, freq="1h"),
+    "sessions_naive": lambda: synthetic(24 * 3, 11, freq="1h", tz=None),
+    "sessions_tz": lambda: synthetic(24 * 3, 12, freq="1h", tz="Asia/Ho_Chi_Minh"),
+}
+
+
+def _assert_same(a, b, what):
+    assert a.index.equals(b.index), what
+    np.testing.assert_array_equal(a.to_numpy(np.float64), b.to_numpy(np.float64), err_msg=what)
+
+
+# --- tests --------------------------------------------------------------------------
+
+
+@pytest.mark.parametrize("name", sorted(DATASETS))
+def test_kernels_match_loops(name):
+    for kernel, (new, ref) in cases(DATASETS[name]()).items():
+        _assert_same(new(), ref(), f"{name}:{kernel}")
+
+
+def test_supertrend_without_numba(monkeypatch):
+    # có numba thì test trên chạy bản JIT -> ép cả đường Python thuần
+    monkeypatch.setattr(ta, "_st_loop_jit", None)
+    for name in ("len1500", "nan_1pct", "flat"):
+        df = DATASETS[name]()
+        _assert_same(ta.supertrend(df["high"], df["low"], df["close"]),
+                     ref_supertrend(df["high"], df["low"], df["close"]), name)
+
+
+def test_vwap_resets_each_utc_day():
+    df = synthetic(48, 13, freq="1h", tz="Asia/Ho_Chi_Minh")   # UTC+7: ngày UTC mới lúc 07:00 địa phương
+    out = ta.vwap(df["close"], df["volume"])
+    first = np.flatnonzero(df.index.tz_convert("UTC").hour == 0)
+    assert len(first)
+    for i in first:   # bar đầu phiên: vwap = giá của chính bar đó
+        assert out.iloc[i] == pytest.approx(df["close"].iloc[i], rel=1e-12)
+    flat = _flat(10).assign(volume=0.0)
+    np.testing.assert_array_equal(ta.vwap(flat["close"], flat["volume"]).to_numpy(), 100.0)   # không có volume -> giá
+
+
+def test_vwap_empty():
+    df = synthetic(0)
+    assert len(ta.vwap(df["close"], df["volume"])) == 0
@@ -0,0 +1,83 @@
+# tests/test_vfi_cache.py — cached / tail-evaluated VFI features vs calc_vfi_features
+import numpy as np
+import pytest
+
+from candles import TF_MS, Candles
+from fake_exchange import SpotBasis, SyntheticMarket
+from indicators import _compute_one_tf
+from vfi_cache import VfiCache
+from vfi_module import calc_vfi_features
+from conftest import NOW_MS
+
+BARS, PER_BAR, CLOSES, CONSUMERS = 80, 20, 3, 3
+
+
+def _klines(mkt, n):
+    return Candles.from_ohlcv(mkt.klines("BTCUSDT", TF_MS["15m"], start=None, end=None, limit=n,
+                                         now_ms=NOW_MS).tolist())
+
+
+@pytest.mark.parametrize("with_spot", [False, True])
+def test_cycle_stream_matches_uncached(with_spot):
+    mkt = SyntheticMarket(["BTC/USDT"])
+    full = _klines(mkt, BARS + CLOSES)
+    spot_full = None
+    if with_spot:
+        spot_full = _klines(SpotBasis(mkt), BARS + CLOSES)
+        spot_full.close[::17] = np.nan   # vài bar spot thiếu (join điền NaN)
+    cache = VfiCache()
+    rng = np.random.default_rng(5)
+    for cyc in range(CLOSES * PER_BAR):
+        end = BARS + cyc // PER_BAR
+        win = full[end - BARS:end]
+        w = Candles(win.timestamp, win.open, win.high.copy(), win.low, win.close.copy(), win.volume.copy())
+        if rng.random() < 0.7:   # forming bar di chuyển
+            w.close[-1] *= 1 + rng.normal(0, 1e-3)
+            w.high[-1] = max(w.high[-1], w.close[-1])
+            w.volume[-1] *= 1 + rng.random() if rng.random() < 0.9 else 0.0
+        sp = None
+        if spot_full is not None:
+            sw = spot_full[end - BARS:end]
+            sp = Candles(sw.timestamp, sw.open, sw.high, sw.low, sw.close.copy(), sw.volume)
+            sp.close[-1] = w.close[-1] * sp.open[-1] / w.open[-1]
+        ind = _compute_one_tf(w, "M15")
+        kw = {"vwap": ind["vwap"], "atr": ind["atr"], "spot_df_m15": sp}
+        got = [cache.features("BTC/USDT", w, **kw) for _ in range(CONSUMERS)][-1]
+        ref = calc_vfi_features(w, **kw)
+        assert set(got) == set(ref)
+        for k, r in ref.items():
+            x = got[k]
+            if k == "FSD" and x is not None and r is not None:
+                assert abs(x - r) <= 1e-12 * max(abs(r), 1e-12), (cyc, k)   # std cộng dồn vs diff.std()
+            else:
+                assert x == r or (x != x and r != r), (cyc, k, r, x)
+    m = cache.metrics()
+    assert m["full"] == CLOSES and m["tail"] > 0 and m["hit"] >= (CONSUMERS - 1) * CLOSES * PER_BAR
+
+
+def test_other_inputs_use_their_own_entry():
+    full = _klines(SyntheticMarket(["BTC/USDT"]), BARS)
+    cache = VfiCache()
+    ind = _compute_one_tf(full, "M15")
+    a = cache.features("X", full, vwap=ind["vwap"], atr=ind["atr"])
+    b = cache.features("X", full)
+    assert a == calc_vfi_features(full, vwap=ind["vwap"], atr=ind["atr"]) and b == calc_vfi_features(full)
+    assert cache.metrics()["full"] == 2
+    a["VSS"] = -1.0   # bản copy: sửa không chạm entry
+    assert cache.features("X", full, vwap=ind["vwap"], atr=ind["atr"])["VSS"] != -1.0
+
+
+def test_spot_corrected_mid_window_recomputes():
+    mkt = SyntheticMarket(["BTC/USDT"])
+    full, spot = _klines(mkt, BARS), _klines(SpotBasis(mkt), BARS)
+    cache = VfiCache()
+    ind = _compute_one_tf(full, "M15")
+    kw = {"vwap": ind["vwap"], "atr": ind["atr"]}
+    cache.features("BTC/USDT", full, spot_df_m15=spot, **kw)
+    # merge lại sửa một close spot giữa cửa sổ; độ dài, bar đóng cuối, forming bar giữ nguyên
+    fixed = Candles(spot.timestamp, spot.open, spot.high, spot.low, spot.close.copy(), spot.volume)
+    fixed.close[BARS // 2] *= 1.01
+    got = cache.features("BTC/USDT", full, spot_df_m15=fixed, **kw)
+    ref = calc_vfi_features(full, spot_df_m15=fixed, **kw)
+    assert got["FSD"] == pytest.approx(ref["FSD"], rel=1e-12)
+    assert cache.metrics()["full"] == 2
@@ -0,0 +1,69 @@
+# tests/test_vfi_module.py — vectorized VFI series vs per-bar calc_vfi_features / vfi_score
+import numpy as np
+import pytest
+
+from candles import TF_MS, Candles
+from fake_exchange import SyntheticMarket
+from indicators import _compute_one_tf
+from vfi_module import (VFI_KEYS, calc_vfi_features, calc_vfi_series, vfi_features_at, vfi_score,
+                        vfi_score_series)
+from conftest import NOW_MS
+
+TOL = 1e-9
+
+
+def _bars(n=120):
+    rows = SyntheticMarket(["BTC/USDT"]).klines("BTCUSDT", TF_MS["15m"], start=None, end=None, limit=n,
+                                                now_ms=NOW_MS)
+    rows[::17, 5] = 0.0            # bar không volume
+    rows[50, 3] = rows[50, 2] + 1  # high < low -> bar lỗi
+    sr = rows.copy()
+    sr[:, 4] *= 1 + 1e-3 * np.sin(np.arange(len(sr)) / 7.0)
+    return Candles.from_ohlcv(rows.tolist()), Candles.from_ohlcv(sr.tolist())
+
+
+def _close(ref, x, what):
+    if ref is None or x is None:
+        assert (ref is None) == (x is None), what
+    elif ref != ref or x != x:
+        assert (ref != ref) == (x != x), what
+    else:
+        assert abs(ref - x) / max(1.0, abs(ref)) <= TOL, (what, ref, x)
+
+
+@pytest.mark.parametrize("with_spot", [False, True])
+@pytest.mark.parametrize("with_ind", [False, True])
+def test_series_matches_per_bar(with_spot, with_ind):
+    df, spot = _bars()
+    spot = spot if with_spot else None
+    ind = _compute_one_tf(df, "M15")
+    kw = {"vwap": ind["vwap"], "atr": ind["atr"]} if with_ind else {}
+    ser = calc_vfi_series(df, spot_df_m15=spot, **kw)
+    sc = vfi_score_series(ser)
+    for i in range(len(df)):
+        f = calc_vfi_features(df[:i + 1], spot_df_m15=None if spot is None else spot[:i + 1],
+                              **{k: v.iloc[:i + 1] for k, v in kw.items()})
+        got = vfi_features_at(ser, i)
+        for k in VFI_KEYS:
+            _close(f.get(k), got[k], (i, k))
+        for d in ("LONG", "SHORT"):
+            _close(vfi_score(f, d), float(sc[d][i]), (i, d))
+    assert bool(np.isfinite(ser["FSD"][-1])) == with_spot
+
+
+def test_short_history_is_all_zero():
+    df, _ = _bars()
+    ser = calc_vfi_series(df[:29])
+    assert all(not ser[k].any() for k in VFI_KEYS if k != "FSD") and np.isnan(ser["FSD"]).all()
+
+
+def test_batch_score_matches_scalar():
+    from vfi_module import vfi_feature_matrix, vfi_score_batch
+    df, spot = _bars()
+    feats = [calc_vfi_features(df[:i + 1], spot_df_m15=spot[:i + 1] if i % 2 else None) for i in range(25, len(df))]
+    feats += [{}, {"VSS": None, "FSD": None}, {"VSS": 2.0, "TBA": 1.5, "FSD": 3.0}]   # key thiếu / None
+    sb = vfi_score_batch(vfi_feature_matrix(feats))
+    for i, f in enumerate(feats):
+        for d in ("LONG", "SHORT"):
+            assert float(sb[d][i]) == vfi_score(f, d), (i, d)
+    assert vfi_feature_matrix([]).shape == (0, len(VFI_KEYS))
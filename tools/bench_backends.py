@@ -0,0 +1,79 @@
+# tools/bench_backends.py
+# Indicator backends: throughput per backend + drift between the other in-tree definitions
+# (parity lives in tests/test_indicator_backends.py)
+import argparse, importlib.util, json, os, time
+from typing import Dict
+
+import numpy as np
+
+import indicators as ind
+from candles import Candles
+from indicator_backends import available
+from tools.synthetic import series
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_PUBLIC = tuple(k for k, s in ind.REGISTRY.items() if s.public)
+
+def _datasets(bars: int, cache_root=None, tf: str = "15m", n_rec: int = 3) -> Dict[str, Candles]:
+    out = {f"syn:{s}": c for s, c in series(3, bars, tf)}
+    if cache_root:
+        from candle_cache import DiskCandleCache
+        cache = DiskCandleCache(cache_root)
+        for sd, t in cache.series():
+            if t == tf and sum(k.startswith("rec:") for k in out) < n_rec:
+                out[f"rec:{sd}"] = Candles.from_frame(np.array(cache.read(sd, t, last=bars)))
+    return out
+
+def _load_ta():
+    # indicators.py che package indicators/ -> nạp ta.py theo đường dẫn
+    spec = importlib.util.spec_from_file_location("indicators_ta", os.path.join(_ROOT, "indicators", "ta.py"))
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+def _definitions(c: Candles) -> Dict[str, float]:
+    """How far the other in-tree definitions are from the registry ones (not backend errors)."""
+    import vfi_module
+    ta = _load_ta()
+    df = c.to_frame()
+    h, l, cl = df["high"], df["low"], df["close"]
+    ref = ind._compute_one_tf(c)
+    pairs = {"ta.rsi (Wilder) vs rsi (SMA)": (ta.rsi(cl, 14), ref["rsi"]),
+             "ta.atr vs atr": (ta.atr(h, l, cl, 14), ref["atr"]),
+             "ta.adx vs adx": (ta.adx(h, l, cl, 14), ref["adx"]),
+             "vfi_module._atr (RMA) vs atr": (vfi_module._atr(df, 14), ref["atr"]),
+             "vfi_module._vwap vs vwap": (vfi_module._vwap(df), ref["vwap"])}
+    out = {}
+    for name, (a, b) in pairs.items():
+        a, b = np.asarray(a, dtype=np.float64)[-len(b):], b.to_numpy(dtype=np.float64)
+        ok = ~(np.isnan(a) | np.isnan(b))
+        out[name] = round(float((np.abs(a[ok] - b[ok]) / np.maximum(np.abs(b[ok]), 1e-12)).max()), 6) if ok.any() else None
+    return out
+
+def main():
+    p = argparse.ArgumentParser(description="Indicator backends: throughput per backend + drift between in-tree definitions")
+    p.add_argument("--bars", type=int, default=1000)
+    p.add_argument("--tf", default="15m")
+    p.add_argument("--reps", type=int, default=20)
+    p.add_argument("--cache-root", default=None, help="also run on recorded bars from a candle cache")
+    args = p.parse_args()
+    data = _datasets(args.bars, args.cache_root, args.tf)
+    series_ = list(data.values())
+    for backend in available():
+        # throughput: mọi output public trên các series tổng hợp / ghi lại
+        ind.set_backend(backend)
+        try:
+            best = np.inf
+            for _ in range(args.reps):
+                t0 = time.perf_counter()
+                for c in series_:
+                    ind._compute_one_tf(c).materialize(_PUBLIC)
+                best = min(best, time.perf_counter() - t0)
+        finally:
+            ind.set_backend("pandas")
+        print(json.dumps({"backend": backend, "series": len(series_), "bars": args.bars,
+                          "ms_per_series": round(best / len(series_) * 1e3, 3)}))
+    print(json.dumps({"definitions_max_rel": _definitions(series_[0])}))
+
+if __name__ == "__main__":
+    main()
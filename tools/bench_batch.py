@@ -0,0 +1,35 @@
+# tools/bench_batch.py
+# Throughput of the batched 2-D indicator pass vs per-symbol _compute_one_tf
+# (parity lives in tests/test_batch_indicators.py)
+import argparse, json, time
+
+from batch_indicators import BatchIndicatorEngine
+from indicators import _compute_one_tf
+from tools.synthetic import series
+
+def main():
+    p = argparse.ArgumentParser(description="Throughput: batched 2-D indicators vs per-symbol")
+    p.add_argument("--bars", type=int, default=1000)
+    p.add_argument("--symbols", default="19,100,300", help="comma list of universe sizes")
+    p.add_argument("--tf", default="15m")
+    p.add_argument("--reps", type=int, default=3)
+    args = p.parse_args()
+    sizes = [int(x) for x in str(args.symbols).split(",") if x.strip()]
+    universe = series(max(sizes), args.bars, args.tf)
+    for n in sizes:
+        subset = universe[:n]
+        raw = {s: {"M15": {"df": c}} for s, c in subset}
+        eng = BatchIndicatorEngine()
+        t_one = t_batch = float("inf")
+        for _ in range(args.reps):
+            t0 = time.perf_counter()
+            for _, c in subset: _compute_one_tf(c).materialize()
+            t1 = time.perf_counter()
+            eng.compute_many(raw, {})
+            t2 = time.perf_counter()
+            t_one, t_batch = min(t_one, t1 - t0), min(t_batch, t2 - t1)
+        print(json.dumps({"symbols": n, "bars": args.bars, "per_symbol_ms": round(t_one * 1e3, 1),
+                          "batch_ms": round(t_batch * 1e3, 1), "speedup": round(t_one / t_batch, 1)}))
+
+if __name__ == "__main__":
+    main()
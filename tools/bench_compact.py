@@ -0,0 +1,40 @@
+# tools/bench_compact.py
+# Compact float32 indicator storage: retained memory vs float64 outputs
+# (parity lives in tests/test_compact_store.py)
+import argparse, json, tracemalloc
+from typing import Optional
+
+from compact_store import CompactStore
+from indicators import CORE_OUTPUTS, IndicatorEngine
+from tools.synthetic import universe
+
+def main():
+    p = argparse.ArgumentParser(description="Compact indicator storage: retained memory vs float64")
+    p.add_argument("--symbols", type=int, default=100)
+    p.add_argument("--bars", type=int, default=1000)
+    p.add_argument("--budget-mb", type=float, default=256.0)
+    args = p.parse_args()
+    raw = universe(args.symbols, args.bars)
+    eng = IndicatorEngine()
+
+    def run(store: Optional[CompactStore]):
+        tracemalloc.start()
+        ind = {}
+        for s, r in raw.items():
+            ind[s] = eng.compute_all(s, r, {})
+            if store is not None:
+                store.attach(s, ind[s])
+            for t in ind[s].values():
+                t.materialize(CORE_OUTPUTS)
+        held = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return ind, held
+
+    _, mem64 = run(None)
+    store = CompactStore(args.budget_mb)
+    _, mem32 = run(store)
+    print(json.dumps({"symbols": args.symbols, "bars": args.bars, "store": store.metrics(),
+                      "held_mb": {"float64": round(mem64 / 2**20, 1), "compact": round(mem32 / 2**20, 1)}}))
+
+if __name__ == "__main__":
+    main()
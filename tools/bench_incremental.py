@@ -0,0 +1,55 @@
+# tools/bench_incremental.py
+# Incremental vs batch indicators, one call per closed bar on a sliding window
+# (parity lives in tests/test_incremental_indicators.py)
+import argparse, json, time
+from typing import List, Tuple
+
+import numpy as np
+
+from candles import Candles
+from incremental_indicators import IncrementalIndicatorEngine, OUTPUTS
+from indicators import _compute_one_tf
+from tools.synthetic import series as synthetic_series
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark: incremental vs batch indicators, one call per new bar")
+    p.add_argument("--bars", type=int, default=600)
+    p.add_argument("--window", type=int, default=200)
+    p.add_argument("--symbols", type=int, default=3)
+    p.add_argument("--tf", default="15m")
+    p.add_argument("--repeat", type=int, default=1,
+                   help="calls per closed bar on the same window (a higher tf read every lower-tf cycle)")
+    p.add_argument("--cache-root", default=None, help="use recorded bars from a candle cache instead")
+    args = p.parse_args()
+    series: List[Tuple[str, Candles]] = []
+    if args.cache_root:
+        from candle_cache import DiskCandleCache
+        cache = DiskCandleCache(args.cache_root)
+        for sd, tf in cache.series():
+            if tf == args.tf and len(series) < args.symbols:
+                series.append((sd, Candles.from_frame(np.array(cache.read(sd, tf, last=args.bars)))))
+    else:
+        series = synthetic_series(args.symbols, args.bars, args.tf)
+    for name, c in series:
+        eng = IncrementalIndicatorEngine()
+        t_inc = t_batch = 0.0
+        calls = 0
+        # cửa sổ trượt như store: mỗi lần thêm một bar, cắt bar đầu
+        for end in range(min(args.window, len(c)), len(c) + 1):
+            win = c[max(0, end - args.window):end]
+            for _ in range(max(1, args.repeat)):
+                t0 = time.perf_counter()
+                eng.update(name, args.tf, win)
+                t1 = time.perf_counter()
+                ref = _compute_one_tf(win, args.tf)
+                for k in OUTPUTS:
+                    ref[k]
+                t_batch += time.perf_counter() - t1
+                t_inc += t1 - t0
+                calls += 1
+        print(json.dumps({"series": name, "calls": calls, "window": args.window,
+                          "incremental_ms": round(1e3 * t_inc / max(calls, 1), 3),
+                          "batch_ms": round(1e3 * t_batch / max(calls, 1), 3), "stats": dict(eng.stats)}))
+
+if __name__ == "__main__":
+    main()
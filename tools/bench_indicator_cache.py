@@ -0,0 +1,40 @@
+# tools/bench_indicator_cache.py
+# Indicator cache hit rate and cost on a simulated 15 s cycle stream
+# (parity lives in tests/test_indicator_cache.py)
+import argparse, json, time
+
+import numpy as np
+
+from candles import TF_MS, Candles
+from indicator_cache import IndicatorCache
+from indicators import _compute_one_tf
+from tools.synthetic import series
+
+def main():
+    p = argparse.ArgumentParser(description="Indicator cache: hit rate and cost on a simulated cycle stream")
+    p.add_argument("--bars", type=int, default=500)
+    p.add_argument("--cycles", type=int, default=240, help="15 s cycles to simulate")
+    p.add_argument("--tf", default="1h")
+    args = p.parse_args()
+    tf_ms = TF_MS[args.tf]
+    (_, full), = series(1, args.bars + args.cycles, args.tf)
+    cache = IndicatorCache()
+    rng = np.random.default_rng(3)
+    t_cache, t_full = 0.0, 0.0
+    # mỗi chu kỳ 15 s: cửa sổ `bars` kết thúc ở bar đang hình thành; close của nó dao động quanh giá trị cuối
+    per_bar = max(1, tf_ms // 15_000)
+    for cyc in range(args.cycles):
+        end = args.bars + cyc // per_bar
+        win = full[end - args.bars:end]
+        w = Candles(win.timestamp, win.open, win.high, win.low, win.close.copy(), win.volume)
+        if rng.random() < 0.7:
+            w.close[-1] *= 1 + rng.normal(0, 1e-3)
+        t0 = time.perf_counter(); cache.compute("BTC/USDT", args.tf, w, "x").materialize()
+        t1 = time.perf_counter(); _compute_one_tf(w).materialize()
+        t2 = time.perf_counter()
+        t_cache += t1 - t0; t_full += t2 - t1
+    print(json.dumps({"metrics": cache.metrics(),
+                      "cache_ms": round(t_cache * 1e3, 1), "uncached_ms": round(t_full * 1e3, 1)}))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+# tools/bench_mtf.py
+# MTF alignment: MtfIndex gather vs per-bar truncate-and-recompute
+# (parity lives in tests/test_mtf_align.py)
+import argparse, json, time
+
+import numpy as np
+
+from candles import TF_MS
+from indicators import _compute_one_tf
+from mtf_align import MtfIndex, higher_from_base
+from tools.synthetic import series
+
+def main():
+    p = argparse.ArgumentParser(description="MTF alignment: gather timing vs per-bar recompute")
+    p.add_argument("--bars", type=int, default=100_000, help="base bars")
+    p.add_argument("--tf", default="15m")
+    p.add_argument("--htf", default="1h,4h,1d")
+    p.add_argument("--samples", type=int, default=40, help="base bars timed the slow way")
+    args = p.parse_args()
+    keys = ("close", "ema21", "ema200", "adx", "rsi")
+    (_, base), = series(1, args.bars, args.tf)
+    base = base[np.arange(len(base)) % 997 != 5]   # vài lỗ dữ liệu
+    htfs = [t.strip() for t in args.htf.split(",") if t.strip()]
+    higher = higher_from_base(base, args.tf, htfs)
+    feats = {tf: _compute_one_tf(c, tf).materialize(keys) for tf, c in higher.items()}
+
+    t0 = time.perf_counter()
+    mi = MtfIndex.from_candles(base, args.tf, higher)
+    for tf in htfs:
+        mi.gather_many(tf, {k: feats[tf][k].to_numpy() for k in keys})
+    t_fast = time.perf_counter() - t0
+
+    rng = np.random.default_rng(5)
+    picks = np.unique(np.r_[0, len(base) - 1, rng.integers(0, len(base), args.samples)])
+    t0 = time.perf_counter()
+    for i in picks:
+        t = int(base.timestamp[i]) + TF_MS[args.tf]
+        for tf in htfs:
+            # cách cũ: cắt khung lớn tới bar đã đóng rồi tính lại, lấy iloc[-1]
+            n = int(np.count_nonzero(higher[tf].timestamp + TF_MS[tf] <= t))
+            for k in ("ema200", "adx"):
+                if n:
+                    float(_compute_one_tf(higher[tf][:n])[k].iloc[-1])
+    t_slow = (time.perf_counter() - t0) / len(picks) * len(base)
+    print(json.dumps({"base_bars": len(base), "htf": {tf: len(c) for tf, c in higher.items()},
+                      "first_complete": mi.first_complete(),
+                      "align_gather_ms": round(t_fast * 1e3, 2), "per_bar_recompute_est_sec": round(t_slow, 1)}))
+
+if __name__ == "__main__":
+    main()
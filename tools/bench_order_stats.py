@@ -0,0 +1,45 @@
+# tools/bench_order_stats.py
+# Rolling order statistics: per-bar RollingOrderStat vs pandas batch vs naive O(n·w) rank
+# (parity lives in tests/test_order_stats.py)
+import argparse, json, time
+
+import numpy as np, pandas as pd
+
+from order_stats import RollingOrderStat, rolling_rank
+
+def _naive_rank(x: np.ndarray, n: int, minp: int) -> np.ndarray:
+    # O(n·w): so sánh lại cả cửa sổ mỗi bar (mốc so sánh tốc độ)
+    out = np.full(len(x), np.nan)
+    for i in range(len(x)):
+        w = x[max(0, i - n + 1):i + 1]
+        w = w[np.isfinite(w)]
+        if np.isfinite(x[i]) and len(w) >= minp:
+            out[i] = ((w < x[i]).sum() + ((w == x[i]).sum() + 1) / 2.0) / len(w)
+    return out
+
+def main():
+    p = argparse.ArgumentParser(description="Rolling order statistics: per-bar state vs pandas batch vs naive rank")
+    p.add_argument("--bars", type=int, default=5000)
+    p.add_argument("--window", type=int, default=500)
+    p.add_argument("--min-periods", type=int, default=50)
+    args = p.parse_args()
+    rng = np.random.default_rng(11)
+    x = np.round(rng.gamma(2.0, 1.0, args.bars), 2)   # làm tròn -> có giá trị trùng
+    x[rng.random(args.bars) < 0.01] = np.nan
+    s = pd.Series(x)
+    w, mp = args.window, args.min_periods
+    st = RollingOrderStat(w, mp)
+    t0 = time.perf_counter()
+    for v in x:
+        st.peek(float(v))
+        st.push(float(v))
+        st.median(), st.quantile(0.9)
+    t_inc = time.perf_counter() - t0
+    t0 = time.perf_counter(); rolling_rank(s, w, mp); t_batch = time.perf_counter() - t0
+    t0 = time.perf_counter(); _naive_rank(x, w, mp); t_naive = time.perf_counter() - t0
+    print(json.dumps({"bars": args.bars, "window": w,
+                      "incremental_us_per_bar": round(t_inc / len(x) * 1e6, 2),
+                      "batch_ms": round(t_batch * 1e3, 2), "naive_ms": round(t_naive * 1e3, 1)}))
+
+if __name__ == "__main__":
+    main()
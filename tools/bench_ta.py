@@ -0,0 +1,40 @@
+# tools/bench_ta.py
+# Speed of indicators/ta.py path-dependent kernels vs the original per-bar .iloc loops
+# (the loops and the parity checks live in tests/test_ta.py)
+import argparse, importlib.util, json, os, time
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _load(name: str, *parts: str):
+    # indicators.py (module) che mất package indicators/ -> nạp theo đường dẫn
+    spec = importlib.util.spec_from_file_location(name, os.path.join(_ROOT, *parts))
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+ref = _load("test_ta", "tests", "test_ta.py")
+ta = ref.ta
+
+def _best(fn, reps: int) -> float:
+    best = float("inf")
+    for _ in range(reps):
+        t0 = time.perf_counter(); fn(); best = min(best, time.perf_counter() - t0)
+    return best
+
+def main():
+    p = argparse.ArgumentParser(description="indicators/ta.py kernels: speedup vs original loops")
+    p.add_argument("--bars", type=int, default=5000)
+    p.add_argument("--reps", type=int, default=5, help="best-of reps for the new kernels")
+    args = p.parse_args()
+
+    print(json.dumps({"jit": ta._st_loop_jit is not None}))
+    df = ref.synthetic(args.bars)
+    for name, (new, old) in ref.cases(df).items():
+        new()   # warm-up (JIT compile nếu có numba)
+        t_new = _best(new, args.reps)
+        t_ref = _best(old, 1)
+        print(json.dumps({"kernel": name, "bars": args.bars, "ref_ms": round(t_ref * 1e3, 2),
+                          "new_ms": round(t_new * 1e3, 3), "speedup": round(t_ref / t_new, 1)}))
+
+if __name__ == "__main__":
+    main()
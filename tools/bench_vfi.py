@@ -0,0 +1,55 @@
+# tools/bench_vfi.py
+# VFI timing: calc_vfi_series vs per-bar calc_vfi_features, vfi_score_batch vs scalar vfi_score
+# (parity lives in tests/test_vfi_module.py)
+import argparse, json, time
+
+import numpy as np
+
+from candles import TF_MS, Candles
+from fake_exchange import SyntheticMarket
+from indicators import _compute_one_tf
+from vfi_module import (calc_vfi_features, calc_vfi_series, vfi_feature_matrix, vfi_score, vfi_score_batch,
+                        vfi_score_series)
+
+def main():
+    p = argparse.ArgumentParser(description="VFI timing: series vs per-bar calc_vfi_features, batch vs scalar vfi_score")
+    p.add_argument("--bars", type=int, default=3000)
+    p.add_argument("--spot", action="store_true", help="include a spot series (FSD)")
+    args = p.parse_args()
+    mkt = SyntheticMarket(["BTC/USDT", "ETH/USDT"])
+    rows = mkt.klines("BTCUSDT", TF_MS["15m"], start=None, end=None, limit=args.bars)
+    df = Candles.from_ohlcv(rows.tolist())
+    spot = None
+    if args.spot:
+        sr = rows.copy()
+        sr[:, 4] *= 1 + 1e-3 * np.sin(np.arange(len(sr)) / 7.0)
+        spot = Candles.from_ohlcv(sr.tolist())
+    ind = _compute_one_tf(df, "M15")
+    kw = {"vwap": ind["vwap"], "atr": ind["atr"]}
+
+    feats = []
+    t0 = time.perf_counter()
+    vfi_score_series(calc_vfi_series(df, spot_df_m15=spot, **kw))
+    t_series = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for i in range(len(df)):
+        sub = {k: v.iloc[:i + 1] for k, v in kw.items()}
+        f = calc_vfi_features(df[:i + 1], spot_df_m15=None if spot is None else spot[:i + 1], **sub)
+        feats.append(f)
+        vfi_score(f, "LONG"), vfi_score(f, "SHORT")
+    t_loop = time.perf_counter() - t0
+    # mỗi dict feature coi như một symbol: vfi_score_batch vs vfi_score từng dòng
+    t0 = time.perf_counter()
+    for f in feats:
+        vfi_score(f, "LONG"), vfi_score(f, "SHORT")
+    t_scalar = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    vfi_score_batch(vfi_feature_matrix(feats))
+    t_batch = time.perf_counter() - t0
+    print(json.dumps({"bars": len(df), "spot": bool(spot),
+                      "series_ms": round(t_series * 1e3, 2), "per_bar_loop_sec": round(t_loop, 2),
+                      "score_rows": len(feats), "score_batch_ms": round(t_batch * 1e3, 2),
+                      "score_scalar_ms": round(t_scalar * 1e3, 2)}))
+
+if __name__ == "__main__":
+    main()
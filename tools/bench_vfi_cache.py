@@ -0,0 +1,58 @@
+# tools/bench_vfi_cache.py
+# VFI cache: recomputations avoided and cost on a simulated 15 s cycle stream
+# (parity lives in tests/test_vfi_cache.py)
+import argparse, json, time
+
+import numpy as np
+
+from candles import TF_MS, Candles
+from fake_exchange import SyntheticMarket, SpotBasis
+from indicators import _compute_one_tf
+from vfi_cache import VfiCache
+from vfi_module import calc_vfi_features
+
+def main():
+    p = argparse.ArgumentParser(description="VFI cache: recomputations avoided and cost on a simulated cycle stream")
+    p.add_argument("--bars", type=int, default=500)
+    p.add_argument("--cycles", type=int, default=480, help="15 s cycles to simulate")
+    p.add_argument("--consumers", type=int, default=3, help="VFI reads per cycle (lag guard, decision, OrderManager)")
+    p.add_argument("--spot", action="store_true", help="pass a spot twin (FSD)")
+    args = p.parse_args()
+    tf_ms = TF_MS["15m"]
+    mkt = SyntheticMarket(["BTC/USDT"])
+    full = Candles.from_ohlcv(mkt.klines("BTCUSDT", tf_ms, start=None, end=None, limit=args.bars + args.cycles).tolist())
+    spot_full = None
+    if args.spot:
+        spot_full = Candles.from_ohlcv(SpotBasis(mkt).klines("BTCUSDT", tf_ms, start=None, end=None,
+                                                             limit=args.bars + args.cycles).tolist())
+        spot_full.close[::97] = np.nan   # vài bar spot thiếu (join điền NaN)
+    cache = VfiCache()
+    rng = np.random.default_rng(5)
+    per_bar = tf_ms // 15_000
+    t_cache, t_ref = 0.0, 0.0
+    for cyc in range(args.cycles):
+        end = args.bars + cyc // per_bar
+        win = full[end - args.bars:end]
+        w = Candles(win.timestamp, win.open, win.high.copy(), win.low, win.close.copy(), win.volume.copy())
+        if rng.random() < 0.7:   # forming bar di chuyển
+            w.close[-1] *= 1 + rng.normal(0, 1e-3)
+            w.high[-1] = max(w.high[-1], w.close[-1])
+            w.volume[-1] *= 1 + rng.random() if rng.random() < 0.9 else 0.0
+        sp = None
+        if spot_full is not None:
+            sw = spot_full[end - args.bars:end]
+            sp = Candles(sw.timestamp, sw.open, sw.high, sw.low, sw.close.copy(), sw.volume)
+            sp.close[-1] = w.close[-1] * sp.open[-1] / w.open[-1]
+        ind = _compute_one_tf(w, "M15")
+        vw, at = ind["vwap"], ind["atr"]
+        t0 = time.perf_counter()
+        [cache.features("BTC/USDT", w, vwap=vw, atr=at, spot_df_m15=sp) for _ in range(args.consumers)]
+        t1 = time.perf_counter()
+        [calc_vfi_features(w, vwap=vw, atr=at, spot_df_m15=sp) for _ in range(args.consumers)]
+        t2 = time.perf_counter()
+        t_cache += t1 - t0; t_ref += t2 - t1
+    print(json.dumps({"metrics": cache.metrics(),
+                      "cache_ms": round(t_cache * 1e3, 1), "uncached_ms": round(t_ref * 1e3, 1)}))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+# tools/bench_vote.py
+# VotePlan: decide_side per symbol vs one decide_side_batch for the universe
+# (parity lives in tests/test_engine_vote.py)
+import argparse, json, time
+
+import numpy as np
+
+from engine_vote import decide_side, decide_side_batch, vote_plan
+from indicators import IndicatorEngine
+from tools.synthetic import universe
+
+def main():
+    p = argparse.ArgumentParser(description="VotePlan timing: decide_side per symbol vs one decide_side_batch")
+    p.add_argument("--symbols", type=int, default=200)
+    p.add_argument("--bars", type=int, default=300)
+    p.add_argument("--reps", type=int, default=5)
+    args = p.parse_args()
+    rng = np.random.default_rng(3)
+    eng = IndicatorEngine()
+    keys = ("close", "ema21", "ema50", "ema200", "adx", "bbw")
+    inds = [{tf: {k: t[k] for k in keys} for tf, t in eng.compute_all(s, raw, {}).items()}
+            for s, raw in universe(args.symbols, args.bars).items()]
+    vfi = [{"long": float(rng.uniform(0, 100)), "short": float(rng.uniform(0, 100))} for _ in inds]
+    grp = [{"flow": (v["long"] - v["short"]) / 100.0} for v in vfi]
+    on = {"enabled": True}
+    cfg = {"enhance": {"ema_slope": on, "adx_slope": on, "early_anticipate": on}}
+    t_single = t_batch = float("inf")
+    for _ in range(args.reps):
+        t0 = time.perf_counter()
+        for i, g, v in zip(inds, grp, vfi):
+            decide_side({"indicators": i, "config": cfg, "group_scores": g, "vfi_scores": v})
+        t1 = time.perf_counter()
+        plan = vote_plan(cfg)
+        out, groups = decide_side_batch(inds, cfg, vfi, grp)
+        for i in range(len(inds)):
+            plan.vote(out, i, groups[i])
+        t2 = time.perf_counter()
+        t_single, t_batch = min(t_single, t1 - t0), min(t_batch, t2 - t1)
+    n = len(inds)
+    print(json.dumps({"symbols": n, "single_us_per_symbol": round(t_single / n * 1e6, 1),
+                      "batch_us_per_symbol": round(t_batch / n * 1e6, 1)}))
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,58 @@
 # tools/replay.py
-# Minimal backtest/replay placeholder
-import pandas as pd, json, argparse
+# Minimal backtest/replay: base bars + higher timeframes aligned look-ahead-free (mtf_align)
+import pandas as pd, numpy as np, json, argparse, time
+from candles import Candles
+from indicators import _compute_one_tf
+from mtf_align import MtfIndex, higher_from_base
+from vfi_module import calc_vfi_series, vfi_score_series
+
+_KEYS = {"15m": ("close", "ema21", "ema50", "atr", "bbw", "rsi", "vwap"),
+         "1h": ("close", "ema21", "ema50", "ema200", "adx", "bbw", "bbw_pctl"),
+         "4h": ("close", "ema21", "ema50", "ema200", "adx"),
+         "1d": ("close", "ema21", "ema50", "ema200")}
+
 def main():
     p = argparse.ArgumentParser()
     p.add_argument("--csv", required=False, help="OHLCV csv")
+    p.add_argument("--cache-root", default=None, help="candle_cache root (shared with DataFeed data.cache)")
+    p.add_argument("--symbol", default="BTC/USDT")
+    p.add_argument("--tf", default="15m")
+    p.add_argument("--htf", default="1h,4h,1d", help="higher timeframes joined onto each base bar")
+    p.add_argument("--out", default=None, help="write the aligned feature frame (csv)")
     args = p.parse_args()
-    print(json.dumps({"winrate": 0.0, "pf": 0.0, "avgR": 0.0, "mdd": 0.0}))
+    base = None
+    higher = {}
+    htfs = [t.strip() for t in args.htf.split(",") if t.strip()]
+    if args.cache_root:
+        from candle_cache import DiskCandleCache
+        cache = DiskCandleCache(args.cache_root)
+        base = Candles.from_frame(np.array(cache.read(args.symbol, args.tf)))
+        for tf in htfs:
+            arr = cache.read(args.symbol, tf)
+            if len(arr):
+                higher[tf] = Candles.from_frame(np.array(arr))
+    elif args.csv:
+        base = Candles.from_frame(pd.read_csv(args.csv))
+    res = {"bars": len(base) if base is not None else 0, "winrate": 0.0, "pf": 0.0, "avgR": 0.0, "mdd": 0.0}
+    if base is not None and len(base):
+        # khung lớn không có trong cache -> dựng từ bar base
+        higher.update(higher_from_base(base, args.tf, [tf for tf in htfs if tf not in higher]))
+        t0 = time.perf_counter()
+        mi = MtfIndex.from_candles(base, args.tf, higher)
+        cols = {"timestamp": base.timestamp}
+        bind = _compute_one_tf(base, args.tf)
+        cols.update({k: bind[k].to_numpy() for k in _KEYS.get(args.tf, ("close",))})
+        if args.tf == "15m":   # VFI từng bar (live đọc phần tử cuối), cùng vwap/atr như engine_flow._calc_vfi
+            vfi = calc_vfi_series(base, vwap=bind["vwap"], atr=bind["atr"])
+            cols.update({f"vfi_{k}": v for k, v in vfi.items()})
+            cols.update({f"vfi_{d.lower()}": v for d, v in vfi_score_series(vfi).items()})
+        for tf, c in higher.items():
+            ind = _compute_one_tf(c, tf)   # indicator nhân quả: giá trị tại bar j chỉ dùng bar <= j
+            cols.update(mi.gather_many(tf, {k: ind[k].to_numpy() for k in _KEYS.get(tf, ("close",))}))
+        res.update({"htf": {tf: len(c) for tf, c in higher.items()}, "first_complete": mi.first_complete(),
+                    "features": len(cols) - 1, "build_sec": round(time.perf_counter() - t0, 3)})
+        if args.out:
+            pd.DataFrame(cols).to_csv(args.out, index=False)
+    print(json.dumps(res))
 if __name__ == "__main__":
     main()
@@ -0,0 +1,21 @@
+# tools/synthetic.py
+# Synthetic inputs shared by the tools/bench_*.py scripts (fake_exchange.SyntheticMarket, no network)
+from typing import Any, Dict, List, Optional, Tuple
+
+from candles import TF_MS, Candles
+from fake_exchange import SyntheticMarket, _default_symbols
+
+_TFS = (("M5", "5m"), ("M15", "15m"), ("H1", "1h"), ("H4", "4h"), ("D1", "1d"))
+
+def series(n_sym: int, bars: int, tf: str = "15m", symbols: Optional[List[str]] = None) -> List[Tuple[str, Candles]]:
+    """[(symbol_id, Candles)] ending at the current (forming) bar."""
+    mkt = SyntheticMarket(symbols or _default_symbols(n_sym))
+    return [(s, Candles.from_ohlcv(mkt.klines(s, TF_MS[tf], start=None, end=None, limit=bars).tolist()))
+            for s in mkt.symbols]
+
+def universe(n_sym: int, bars: int) -> Dict[str, Dict[str, Any]]:
+    """raw_tf per symbol (M5..D1), shaped like DataFeed.fetch_all_timeframes."""
+    syms = [f"S{i}/USDT" for i in range(n_sym)]
+    mkt = SyntheticMarket(syms)
+    return {s: {tf: {"df": Candles.from_ohlcv(mkt.klines(s.replace("/", ""), TF_MS[ctf], start=None, end=None,
+                                                           limit=bars).tolist())} for tf, ctf in _TFS} for s in syms}
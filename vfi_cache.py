@@ -0,0 +1,153 @@
+# vfi_cache.py — VFI features memoized per (symbol, last closed M15 bar, forming bar), shared by every consumer of a cycle
+from __future__ import annotations
+import math, zlib
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+from candles import as_candles
+from rolling_state import RollMean, row, same_row
+from vfi_module import EPS, calc_vfi_features
+
+_NAN = float("nan")
+_ZERO = {"VSS": 0.0, "TBA": 0.0, "WI_long": 0.0, "WI_short": 0.0, "VP": 0.0}
+
+def _tail(x) -> float:
+    return float(x.iloc[-1]) if hasattr(x, "iloc") else float(np.asarray(x)[-1])
+
+def _spot_fp(s) -> tuple:
+    # phần đã đóng của spot: độ dài, bar đóng cuối, crc32 các close đã đóng (spot được vá / sửa giữa cửa sổ
+    # khi merge lại -> FSD trên bar đóng đổi dù bar cuối giữ nguyên)
+    if s is None:
+        return ()
+    n = len(s)
+    if n < 2:
+        return (n,)
+    return (n,) + row(s, n - 2) + (zlib.crc32(np.ascontiguousarray(s.close[:-1], dtype=np.float64).tobytes()),)
+
+class _DiffStd:
+    """
+    Futures-minus-spot close over the closed bars: count, mean, M2 (NaN
+    skipped, two-pass like pandas). fsd() folds the forming diff in with one
+    Welford step instead of a new diff.std() over the window.
+    """
+    __slots__ = ("k", "mean", "m2", "last")
+
+    def __init__(self, fut, spot):
+        d = np.asarray(fut, dtype=np.float64) - np.asarray(spot, dtype=np.float64)
+        d = d[~np.isnan(d)]
+        self.k = len(d)
+        self.mean = float(d.sum() / self.k) if self.k else 0.0
+        self.m2 = float(((self.mean - d) ** 2).sum()) if self.k else 0.0
+        self.last = float(d[-1]) if self.k else _NAN
+
+    def fsd(self, x: float) -> Optional[float]:
+        k, mean, m2, last = self.k, self.mean, self.m2, self.last
+        if x == x:
+            k += 1
+            delta = x - mean
+            mean += delta / k
+            m2 += delta * (x - mean)
+            last = x
+        std = math.sqrt(m2 / (k - 1)) if k > 1 and m2 > 0 else 0.0
+        if k < 20 or not std > 0:
+            return None
+        return float(np.clip(last / (std + EPS), 0.2, 5.0))
+
+class _Entry:
+    __slots__ = ("n", "first_ts", "closed_row", "spot_fp", "forming", "feats", "vol", "fsd")
+
+    def __init__(self, c, s, forming: tuple, feats: Dict[str, Any]):
+        n = len(c)
+        self.n, self.first_ts = n, int(c.timestamp[0])
+        self.closed_row = row(c, n - 2)
+        self.spot_fp = _spot_fp(s)
+        self.forming, self.feats = forming, feats
+        self.vol: Optional[RollMean] = None   # SMA20 volume trên bar đã đóng, dựng khi forming bar đổi lần đầu
+        self.fsd: Optional[_DiffStd] = None    # thống kê diff futures-spot trên bar đã đóng, dựng cùng lúc
+
+    def matches(self, c, s) -> bool:
+        n = len(c)
+        return n == self.n and int(c.timestamp[0]) == self.first_ts and same_row(row(c, n - 2), self.closed_row) \
+            and same_row(_spot_fp(s), self.spot_fp)
+
+class VfiCache:
+    """
+    calc_vfi_features for the M15 window of a symbol, computed once per
+    window state:
+      - hit:  same window and forming bar (lag guard, decision, OrderManager
+              in one cycle; also later cycles while the bar doesn't move)
+      - tail: same closed bars, forming bar changed -> only the last bar is
+              evaluated: SMA20(volume) from state seeded on the closed bars
+              (pandas rolling semantics, so values are identical), ATR/VWAP
+              read from the indicator series passed in; FSD (spot given,
+              same length as the window, e.g. DataFeed's spot twin) from
+              futures-minus-spot stats of the closed bars plus the forming
+              diff (float rounding vs diff.std(), ~1e-15 relative)
+      - full: new closed bar / other window / no vwap+atr / spot of another
+              length / spot closed bars changed -> calc_vfi_features, stored
+    One entry per (symbol, which inputs were passed); returned dicts are copies.
+    """
+    def __init__(self):
+        self._entries: Dict[tuple, _Entry] = {}
+        self.stats = {"hit": 0, "tail": 0, "full": 0}
+
+    def metrics(self) -> Dict[str, Any]:
+        calls = sum(self.stats.values())
+        return {**self.stats, "avoided": self.stats["hit"] + self.stats["tail"],
+                "hit_rate": round((self.stats["hit"] + self.stats["tail"]) / calls, 3) if calls else 0.0}
+
+    def features(self, symbol: str, df_m15, vwap=None, atr=None, spot_df_m15=None) -> Dict[str, Any]:
+        c = as_candles(df_m15)
+        n = len(c)
+        if n < 30:
+            return calc_vfi_features(c, vwap=vwap, atr=atr, spot_df_m15=spot_df_m15)
+        key = (symbol, vwap is None, atr is None, spot_df_m15 is None)
+        s = None if spot_df_m15 is None else as_candles(spot_df_m15)
+        # forming bar + giá trị cuối của atr/vwap (+ bar cuối spot) trong một tuple phẳng
+        forming = row(c, n - 1) + tuple(_tail(x) for x in (atr, vwap) if x is not None)
+        if s is not None:
+            forming += row(s, len(s) - 1) if len(s) else (_NAN,)
+        e = self._entries.get(key)
+        if e is not None and e.matches(c, s):
+            if same_row(forming, e.forming):
+                self.stats["hit"] += 1
+                return dict(e.feats)
+            if vwap is not None and atr is not None and (s is None or len(s) == n):
+                if e.vol is None:
+                    e.vol = RollMean(20, 5)
+                    for x in c.volume[:-1]:
+                        x = float(x)
+                        e.vol.push(0.0 if x < 0 else x)
+                feats = self._last_bar(forming, e.vol)
+                if s is not None and "FSD" in feats:
+                    if e.fsd is None:
+                        e.fsd = _DiffStd(c.close[:-1], s.close[:-1])
+                    feats["FSD"] = e.fsd.fsd(float(c.close[-1]) - float(s.close[-1]))
+                e.forming, e.feats = forming, feats
+                self.stats["tail"] += 1
+                return dict(e.feats)
+        feats = calc_vfi_features(c, vwap=vwap, atr=atr, spot_df_m15=spot_df_m15)
+        self._entries[key] = _Entry(c, s, forming, feats)
+        self.stats["full"] += 1
+        return dict(feats)
+
+    @staticmethod
+    def _last_bar(forming: tuple, vol: RollMean) -> Dict[str, Any]:
+        # calc_vfi_features chỉ cho bar cuối, cùng thứ tự phép tính để ra đúng từng bit
+        _, o, h, l, c, v, ATR, vw = forming[:8]
+        if (c <= 0) or (h < l):
+            return dict(_ZERO)
+        v = 0.0 if v < 0 else v
+        ma = vol.peek(v)
+        ma = _NAN if ma == 0 else ma
+        VSS = v / ma if ma == ma else 0.0
+        body = abs(c - o)
+        upper = (h - c) if c >= o else (h - o)
+        lower = (o - l) if c >= o else (c - l)
+        TBA = body / (ATR + EPS)
+        WI_long, WI_short = lower / (body + EPS), upper / (body + EPS)
+        VP = abs(c - vw) / (ATR + EPS)
+        return {"VSS": float(np.clip(VSS, 0.0, 5.0)), "TBA": float(np.clip(TBA, 0.0, 5.0)),
+                "WI_long": float(np.clip(WI_long, 0.0, 5.0)), "WI_short": float(np.clip(WI_short, 0.0, 5.0)),
+                "VP": float(np.clip(VP, 0.0, 5.0)), "FSD": None}
@@ -1,12 +1,15 @@
 # vfi_module.py — BabyShark Volume Flow Intelligence
 from __future__ import annotations
-from typing import Dict, Optional
+from typing import Any, Dict, Iterable, Optional
 import pandas as pd
 import numpy as np
 
 EPS = 1e-9
+VFI_KEYS = ("VSS", "TBA", "WI_long", "WI_short", "VP", "FSD")
 
 def _to_num(s):
+    if isinstance(s, np.ndarray):   # cột Candles -> Series (không copy nếu đã float64)
+        s = pd.Series(np.asarray(s, dtype=np.float64), copy=False)
     return pd.to_numeric(s, errors="coerce")
 
 def _safe(v):
@@ -28,21 +31,24 @@ def _tr(h,l,c):
     h  = _to_num(h); l=_to_num(l)
     return pd.concat([(h-l).abs(), (h-pc).abs(), (l-pc).abs()], axis=1).max(axis=1)
 
-def _atr(df: pd.DataFrame, n: int = 14) -> pd.Series:
+def _atr(df, n: int = 14) -> pd.Series:
     return _rma(_tr(df["high"], df["low"], df["close"]), n)
 
-def _vwap(df: pd.DataFrame) -> pd.Series:
+def _vwap_raw(df) -> pd.Series:
     tp = (_to_num(df["high"]) + _to_num(df["low"]) + _to_num(df["close"])) / 3.0
     vol = _to_num(df["volume"]).replace(0, np.nan)
     cum_pv = (tp * vol).cumsum()
     cum_v  = vol.cumsum()
-    return (cum_pv / (cum_v.replace(0, np.nan))).fillna(method="ffill").fillna(method="bfill")
+    return cum_pv / (cum_v.replace(0, np.nan))
+
+def _vwap(df) -> pd.Series:
+    return _vwap_raw(df).fillna(method="ffill").fillna(method="bfill")
 
 def calc_vfi_features(
-    df_m15: pd.DataFrame,
+    df_m15,
     vwap: Optional[pd.Series] = None,
     atr:  Optional[pd.Series] = None,
-    spot_df_m15: Optional[pd.DataFrame] = None
+    spot_df_m15=None
 ) -> Dict[str, float]:
     """
     Trích xuất features ít nhiễu, dùng cho entry/exit:
@@ -51,8 +57,9 @@ def calc_vfi_features(
       - WI_long/WI_short: wick/body           (0..5)
       - VP: |close - vwap| / ATR              (0..5)
       - FSD: futures/spot delta chuẩn hóa     (0.2..5, tuỳ chọn)
+    df_m15 / spot_df_m15: Candles hoặc DataFrame (chỉ đọc, không copy).
     """
-    df = df_m15.copy()
+    df = df_m15
     if df is None or len(df) < 30:
         return {"VSS":0.0,"TBA":0.0,"WI_long":0.0,"WI_short":0.0,"VP":0.0}
 
@@ -101,6 +108,74 @@ def calc_vfi_features(
         "FSD": None if FSD is None else float(np.clip(FSD, 0.2, 5.0)),
     }
 
+def calc_vfi_series(
+    df_m15,
+    vwap=None,
+    atr=None,
+    spot_df_m15=None
+) -> Dict[str, np.ndarray]:
+    """
+    calc_vfi_features for every bar in one vectorized pass: out[k][i] equals
+    calc_vfi_features(df[:i+1], vwap[:i+1], atr[:i+1])[k], FSD is NaN where
+    that returns None. All inputs are causal (rolling/ewm/cumsum), so the
+    last element is the live value. spot_df_m15 is aligned to df by its
+    tail (same as the per-bar call when both have the same length).
+    """
+    n = 0 if df_m15 is None else len(df_m15)
+    out = {k: np.zeros(n) for k in VFI_KEYS}
+    out["FSD"][:] = np.nan
+    if n < 30:
+        return out
+    df = df_m15
+    c = _to_num(df["close"])
+    o = _to_num(df["open"])
+    h = _to_num(df["high"])
+    l = _to_num(df["low"])
+    v = _to_num(df["volume"]).clip(lower=0)
+
+    body  = (c - o).abs()
+    upper = (h - c).where(c >= o, (h - o))
+    lower = (o - l).where(c >= o, (c - l))
+
+    vol_ma20 = _sma(v, 20).replace(0, np.nan)
+    VSS = np.where(vol_ma20.isna(), 0.0, (v / vol_ma20).to_numpy())
+
+    ATR = np.asarray(atr, dtype=np.float64) if atr is not None else _atr(df, 14).to_numpy()
+    bn = body.to_numpy()
+    TBA = bn / (ATR + EPS)
+    WI_long  = lower.to_numpy() / (bn + EPS)
+    WI_short = upper.to_numpy() / (bn + EPS)
+
+    # vwap của lát cắt [:i+1] tại i = ffill tới i (bfill chỉ chạm các bar đầu, không bao giờ là bar cuối)
+    vw = np.asarray(vwap, dtype=np.float64) if vwap is not None else _vwap_raw(df).ffill().to_numpy()
+    cn = c.to_numpy()
+    VP = np.abs(cn - vw) / (ATR + EPS)
+
+    # bar < 30 hoặc bar lỗi (close <= 0, high < low) -> 0 như bản từng bar
+    ok = (np.arange(n) >= 29) & ~((cn <= 0) | (h.to_numpy() < l.to_numpy()))
+    for k, x in (("VSS", VSS), ("TBA", TBA), ("WI_long", WI_long), ("WI_short", WI_short), ("VP", VP)):
+        out[k] = np.where(ok, np.clip(x, 0.0, 5.0), 0.0)
+
+    if spot_df_m15 is not None and len(spot_df_m15) >= n - 5:
+        sc = _to_num(spot_df_m15["close"]).to_numpy()
+        m = min(len(sc), n)
+        sp = np.full(n, np.nan)
+        sp[n - m:] = sc[len(sc) - m:]
+        diff = pd.Series(cn - sp)
+        sd = diff.expanding(min_periods=20).std().to_numpy()   # diff.std() trên lát cắt, bỏ NaN
+        last = diff.ffill().to_numpy()                          # diff.dropna().iloc[-1]
+        with np.errstate(invalid="ignore"):
+            fsd = np.where(sd > 0, np.clip(last / (sd + EPS), 0.2, 5.0), np.nan)
+        out["FSD"] = np.where(ok, fsd, np.nan)
+    return out
+
+def vfi_features_at(series: Dict[str, np.ndarray], i: int = -1) -> Dict[str, float]:
+    """Row i of calc_vfi_series in the calc_vfi_features dict shape (FSD None when absent)."""
+    out = {k: float(series[k][i]) for k in VFI_KEYS}
+    if out["FSD"] != out["FSD"]:
+        out["FSD"] = None
+    return out
+
 def vfi_score(features: Dict[str, float], direction: str) -> float:
     """
     Điểm 0..100; trọng số giả định:
@@ -124,6 +199,38 @@ def vfi_score(features: Dict[str, float], direction: str) -> float:
 
     return float(np.clip(base, 0.0, 100.0))
 
+def vfi_score_series(features: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """vfi_score over every bar of calc_vfi_series, both directions: {"LONG": arr, "SHORT": arr}."""
+    VSS = np.asarray(features["VSS"], dtype=np.float64)
+    TBA = np.asarray(features["TBA"], dtype=np.float64)
+    VP  = np.asarray(features["VP"], dtype=np.float64)
+    fsd = features.get("FSD")
+    mult = None if fsd is None else np.where(np.isnan(fsd), 1.0, np.clip(fsd, 0.6, 2.0))
+    out = {}
+    for direction, key in (("LONG", "WI_long"), ("SHORT", "WI_short")):
+        WI = np.asarray(features[key], dtype=np.float64)
+        base = (
+            40.0 * np.clip((VSS - 1.0) / 1.5, 0.0, 1.0) +
+            30.0 * np.clip((TBA - 0.7) / 0.8, 0.0, 1.0) +
+            20.0 * np.clip(1.0 - np.clip(WI, 0.0, 2.0) / 1.2, 0.0, 1.0) +
+            10.0 * np.clip(1.0 - np.clip(VP, 0.0, 2.0) / 1.2, 0.0, 1.0)
+        )
+        if mult is not None:
+            base = base * mult
+        out[direction] = np.clip(base, 0.0, 100.0)
+    return out
+
+def vfi_feature_matrix(feats: Iterable[Dict[str, Any]]) -> np.ndarray:
+    """calc_vfi_features dicts -> (n, len(VFI_KEYS)) float64, one row per symbol; missing -> 0 (as vfi_score), FSD None -> NaN."""
+    rows = [[_safe(f.get(k)) if k != "FSD" else (np.nan if f.get(k) is None else _safe(f[k])) for k in VFI_KEYS]
+            for f in feats]
+    return np.array(rows, dtype=np.float64).reshape(-1, len(VFI_KEYS))
+
+def vfi_score_batch(X: np.ndarray) -> Dict[str, np.ndarray]:
+    """vfi_score for many symbols in one vectorized call: X from vfi_feature_matrix -> {"LONG": arr, "SHORT": arr}."""
+    X = np.asarray(X, dtype=np.float64)
+    return vfi_score_series({k: X[:, j] for j, k in enumerate(VFI_KEYS)})
+
 def vfi_exit_signal(prev: Dict[str,float], now: Dict[str,float], direction: str, wick_th: float=0.8) -> str:
     """
     Tín hiệu thoát dựa trên suy yếu lực/absorption/đảo chiều footprint.
@@ -2,6 +2,8 @@
 from __future__ import annotations
 from typing import Dict, Any
 
+from engine_vote import last_value
+
 def _sgn(pos: bool, neg: bool) -> float:
     if pos and not neg: return 1.0
     if neg and not pos: return -1.0
@@ -46,7 +48,8 @@ def vote_volatility(ind: Dict[str, Any]) -> float:
     s = 0.0
     h1 = ind.get("H1", {}) or {}
     try:
-        p = float(h1.get("bbw_pctl", 0.5) or 0.5)
+        p = last_value(h1.get("bbw_pctl"), 0.5)
+        p = 0.5 if p != p else p   # chưa đủ cửa sổ -> trung tính
         s += _sgn(p >= 0.7, p <= 0.3) * 1.0
     except Exception:
         pass